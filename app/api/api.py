@@ -2,16 +2,31 @@
 API endpoints for BigQuery metadata.
 """
 
-from fastapi import APIRouter, Query, Path, HTTPException, status
-from typing import List, Dict, Any, Annotated
+from fastapi import APIRouter, Depends, Header, Query, Path, HTTPException, Response, status
+from fastapi.responses import StreamingResponse
+from typing import List, Dict, Any, Annotated, Iterable, Iterator, Literal
 from pydantic import BaseModel, Field
+import json
+import zlib
 
+from app.dependencies import get_db, get_search
 from app.storage.db import Database
+from app.storage.instrumentation import query_stats
+from app.search.results import (
+    DEFAULT_SEARCH_LIMIT, MAX_BATCH_QUERIES, MAX_BATCH_RESULTS, MAX_SEARCH_LIMIT
+)
 from app.search.search import MetadataSearch
+from app.search.similar import DEFAULT_SIMILAR, MAX_SIMILAR, MIN_SIMILARITY
+from app.search.suggest import DEFAULT_SUGGESTIONS, MAX_SUGGESTIONS
+from app.utils.pagination import MAX_PAGE_SIZE, next_cursor
 
 api_router = APIRouter()
-db = Database()
-search_engine = MetadataSearch()
+
+# Size of the chunks written to the export stream
+EXPORT_CHUNK_SIZE = 64 * 1024
+
+# Export entity names accepted by /export, mapped to the storage entity types
+EXPORT_ENTITIES = {"datasets": "dataset", "tables": "table", "fields": "field"}
 
 
 class SearchQuery(BaseModel):
@@ -20,6 +35,12 @@ class SearchQuery(BaseModel):
     query: str
     project_id: str | None = None
     entity_type: str | None = None
+    limit: int = Field(DEFAULT_SEARCH_LIMIT, ge=1, le=MAX_SEARCH_LIMIT)
+    offset: int = Field(0, ge=0)
+    fuzzy: bool = False
+    semantic: bool = False
+    facets: bool = False
+    filters: Dict[Literal["project", "dataset", "table_type", "field_type"], str] = {}
 
     model_config = {
         "json_schema_extra": {
@@ -27,7 +48,44 @@ class SearchQuery(BaseModel):
                 {
                     "query": "user",
                     "project_id": "my-project",
-                    "entity_type": "table"
+                    "entity_type": "table",
+                    "limit": 20,
+                    "offset": 0,
+                    "fuzzy": False,
+                    "semantic": False,
+                    "facets": True,
+                    "filters": {"table_type": "TABLE"}
+                }
+            ]
+        }
+    }
+
+
+class BatchQuery(BaseModel):
+    """A query of a batch search, with its own page size."""
+
+    query: str
+    limit: int | None = Field(None, ge=1, le=MAX_SEARCH_LIMIT)
+
+
+class BatchSearchQuery(BaseModel):
+    """Batch search query model."""
+
+    queries: List[str | BatchQuery] = Field(..., min_length=1, max_length=MAX_BATCH_QUERIES)
+    project_id: str | None = None
+    entity_type: str | None = None
+    limit: int = Field(DEFAULT_SEARCH_LIMIT, ge=1, le=MAX_SEARCH_LIMIT)
+    max_results: int = Field(MAX_BATCH_RESULTS, ge=1, le=MAX_BATCH_RESULTS)
+
+    model_config = {
+        "json_schema_extra": {
+            "examples": [
+                {
+                    "queries": ["customer_id", {"query": "order date", "limit": 5}],
+                    "project_id": "my-project",
+                    "entity_type": "field",
+                    "limit": 10,
+                    "max_results": 1000
                 }
             ]
         }
@@ -42,6 +100,10 @@ class AdvancedSearchQuery(BaseModel):
     type: str | None = None
     project_id: str | None = None
     dataset_id: str | None = None
+    query: str | None = None
+    explain: bool = False
+    limit: int = Field(DEFAULT_SEARCH_LIMIT, ge=1, le=MAX_SEARCH_LIMIT)
+    offset: int = Field(0, ge=0)
 
     model_config = {
         "json_schema_extra": {
@@ -51,50 +113,173 @@ class AdvancedSearchQuery(BaseModel):
                     "description": "customer",
                     "type": "table",
                     "project_id": "my-project",
-                    "dataset_id": "my-dataset"
+                    "dataset_id": "my-dataset",
+                    "limit": 20,
+                    "offset": 0
+                },
+                {
+                    "query": "name:cust* type:STRING dataset:sales -deprecated",
+                    "project_id": "my-project",
+                    "explain": True
                 }
             ]
         }
     }
 
 
+def _set_next_cursor(response: Response, items: List[Dict[str, Any]], limit: int | None):
+    """Expose the cursor for the next page in the response headers.
+
+    The body of the listing endpoints stays a plain list; clients that page
+    read the ``X-Next-Cursor`` header and pass it back as ``cursor``.
+
+    Args:
+        response: The outgoing response.
+        items: The rows of the current page.
+        limit: The requested page size.
+    """
+    cursor = next_cursor(items, limit)
+    if cursor:
+        response.headers["X-Next-Cursor"] = cursor
+
+
+def _invalid_cursor(e: ValueError) -> HTTPException:
+    """Build the error returned for a malformed cursor."""
+    return HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+
+def _accepts_gzip(accept_encoding: str | None) -> bool:
+    """Whether an Accept-Encoding header allows gzip.
+
+    ``gzip;q=0`` refuses gzip, and ``*`` stands for the codings not listed.
+
+    Args:
+        accept_encoding: The Accept-Encoding request header.
+    """
+    weights = {}
+    for coding in (accept_encoding or "").lower().split(","):
+        name, _, params = coding.partition(";")
+        weight = 1.0
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key == "q":
+                try:
+                    weight = float(value)
+                except ValueError:
+                    weight = 0.0
+        if name.strip():
+            weights[name.strip()] = weight
+
+    return weights.get("gzip", weights.get("*", 0.0)) > 0
+
+
+def _ndjson_chunks(records: Iterable[Dict[str, Any]], compress: bool) -> Iterator[bytes]:
+    """Encode records as NDJSON, optionally gzip-compressed.
+
+    Lines are buffered into chunks of roughly ``EXPORT_CHUNK_SIZE`` bytes so the
+    stream is not flushed once per row.
+
+    Args:
+        records: The records to encode.
+        compress: Whether to gzip the stream.
+
+    Yields:
+        Chunks of the encoded stream.
+    """
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31) if compress else None
+    buffer = []
+    size = 0
+
+    def emit(data: bytes) -> bytes:
+        return compressor.compress(data) if compressor else data
+
+    for record in records:
+        line = json.dumps(record, separators=(",", ":"), default=str).encode("utf-8") + b"\n"
+        buffer.append(line)
+        size += len(line)
+
+        if size >= EXPORT_CHUNK_SIZE:
+            chunk = emit(b"".join(buffer))
+            buffer, size = [], 0
+            if chunk:
+                yield chunk
+
+    tail = emit(b"".join(buffer))
+    if compressor:
+        tail += compressor.flush()
+    if tail:
+        yield tail
+
+
 @api_router.get("/projects", response_model=List[str])
-async def get_projects():
+async def get_projects(
+    db: Annotated[Database, Depends(get_db)],
+):
     """Get all projects."""
     return db.get_projects()
 
 
 @api_router.get("/datasets", response_model=List[Dict[str, Any]])
 async def get_datasets(
-    project_id: Annotated[str | None, Query(description="Optional project ID to filter by")] = None
+    response: Response,
+    db: Annotated[Database, Depends(get_db)],
+    project_id: Annotated[str | None, Query(description="Optional project ID to filter by")] = None,
+    limit: Annotated[int | None, Query(ge=1, le=MAX_PAGE_SIZE, description="Page size")] = None,
+    cursor: Annotated[str | None, Query(description="Cursor from X-Next-Cursor")] = None,
 ):
     """Get datasets.
 
     Args:
         project_id: Optional project ID to filter by.
+        limit: Optional page size.
+        cursor: Optional cursor of the page to fetch.
     """
-    return db.get_datasets(project_id=project_id)
+    try:
+        datasets = db.get_datasets(project_id=project_id, limit=limit, cursor=cursor)
+    except ValueError as e:
+        raise _invalid_cursor(e)
+
+    _set_next_cursor(response, datasets, limit)
+    return datasets
 
 
 @api_router.get("/tables", response_model=List[Dict[str, Any]])
 async def get_tables(
+    response: Response,
+    db: Annotated[Database, Depends(get_db)],
     project_id: Annotated[str | None, Query(description="Optional project ID to filter by")] = None,
     dataset_id: Annotated[str | None, Query(description="Optional dataset ID to filter by")] = None,
+    limit: Annotated[int | None, Query(ge=1, le=MAX_PAGE_SIZE, description="Page size")] = None,
+    cursor: Annotated[str | None, Query(description="Cursor from X-Next-Cursor")] = None,
 ):
     """Get tables.
 
     Args:
         project_id: Optional project ID to filter by.
         dataset_id: Optional dataset ID to filter by.
+        limit: Optional page size.
+        cursor: Optional cursor of the page to fetch.
     """
-    return db.get_tables(project_id=project_id, dataset_id=dataset_id)
+    try:
+        tables = db.get_tables(
+            project_id=project_id, dataset_id=dataset_id, limit=limit, cursor=cursor
+        )
+    except ValueError as e:
+        raise _invalid_cursor(e)
+
+    _set_next_cursor(response, tables, limit)
+    return tables
 
 
 @api_router.get("/fields", response_model=List[Dict[str, Any]])
 async def get_fields(
+    response: Response,
+    db: Annotated[Database, Depends(get_db)],
     project_id: Annotated[str | None, Query(description="Optional project ID to filter by")] = None,
     dataset_id: Annotated[str | None, Query(description="Optional dataset ID to filter by")] = None,
     table_id: Annotated[str | None, Query(description="Optional table ID to filter by")] = None,
+    limit: Annotated[int | None, Query(ge=1, le=MAX_PAGE_SIZE, description="Page size")] = None,
+    cursor: Annotated[str | None, Query(description="Cursor from X-Next-Cursor")] = None,
 ):
     """Get fields.
 
@@ -102,9 +287,67 @@ async def get_fields(
         project_id: Optional project ID to filter by.
         dataset_id: Optional dataset ID to filter by.
         table_id: Optional table ID to filter by.
+        limit: Optional page size.
+        cursor: Optional cursor of the page to fetch.
     """
-    return db.get_fields(
-        project_id=project_id, dataset_id=dataset_id, table_id=table_id
+    try:
+        fields = db.get_fields(
+            project_id=project_id,
+            dataset_id=dataset_id,
+            table_id=table_id,
+            limit=limit,
+            cursor=cursor,
+        )
+    except ValueError as e:
+        raise _invalid_cursor(e)
+
+    _set_next_cursor(response, fields, limit)
+    return fields
+
+
+@api_router.get("/export")
+async def export_catalog(
+    db: Annotated[Database, Depends(get_db)],
+    project_id: Annotated[str | None, Query(description="Optional project ID to filter by")] = None,
+    dataset_id: Annotated[str | None, Query(description="Optional dataset ID to filter by")] = None,
+    entities: Annotated[str, Query(description="Comma-separated entity types to export")] = "datasets,tables,fields",
+    gzip: Annotated[bool, Query(description="Gzip-encode the stream")] = False,
+    accept_encoding: Annotated[str | None, Header()] = None,
+):
+    """Stream datasets, tables and fields as newline-delimited JSON.
+
+    Each line is one object with a ``type`` key of ``dataset``, ``table`` or
+    ``field``. The stream is gzip-encoded when ``gzip`` is set or the client
+    accepts gzip.
+
+    Args:
+        project_id: Optional project ID to filter by.
+        dataset_id: Optional dataset ID to filter by.
+        entities: Comma-separated subset of datasets, tables and fields.
+        gzip: Whether to gzip-encode the stream.
+        accept_encoding: The Accept-Encoding request header.
+    """
+    requested = [e.strip() for e in entities.split(",") if e.strip()]
+    unknown = [e for e in requested if e not in EXPORT_ENTITIES]
+
+    if not requested or unknown:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"entities must be a subset of {', '.join(EXPORT_ENTITIES)}"
+        )
+
+    compress = gzip or _accepts_gzip(accept_encoding)
+    records = db.iter_export(
+        project_id=project_id,
+        dataset_id=dataset_id,
+        entity_types=[EXPORT_ENTITIES[e] for e in requested]
+    )
+
+    headers = {"Content-Encoding": "gzip"} if compress else {}
+    return StreamingResponse(
+        _ndjson_chunks(records, compress),
+        media_type="application/x-ndjson",
+        headers=headers
     )
 
 
@@ -112,6 +355,7 @@ async def get_fields(
 async def get_table_with_fields(
     dataset_id: Annotated[str, Path(description="Dataset ID")],
     table_id: Annotated[str, Path(description="Table ID")],
+    db: Annotated[Database, Depends(get_db)],
 ):
     """Get a table with its fields.
 
@@ -127,22 +371,139 @@ async def get_table_with_fields(
     return table
 
 
-@api_router.post("/search", response_model=Dict[str, List[Dict[str, Any]]])
-async def search(query: SearchQuery):
+# Not async: the candidates are compared in Python, off the event loop
+@api_router.get("/tables/{dataset_id}/{table_id}/similar", response_model=Dict[str, Any])
+def similar_tables(
+    dataset_id: Annotated[str, Path(description="Dataset ID")],
+    table_id: Annotated[str, Path(description="Table ID")],
+    search_engine: Annotated[MetadataSearch, Depends(get_search)],
+    project_id: Annotated[str | None, Query(description="Optional project ID to filter by")] = None,
+    limit: Annotated[int, Query(ge=1, le=MAX_SIMILAR, description="Number of similar tables")] = DEFAULT_SIMILAR,
+    min_similarity: Annotated[
+        float, Query(ge=0, le=1, description="Minimum Jaccard similarity of the columns")
+    ] = MIN_SIMILARITY,
+):
+    """Find the tables with the most similar schemas to a table.
+
+    Tables are compared by the Jaccard similarity of their sets of
+    (column name, type) pairs, found with MinHash signatures and LSH.
+
+    Args:
+        dataset_id: Dataset ID.
+        table_id: Table ID.
+        project_id: Optional project ID of the table and of the similar tables.
+        limit: Number of similar tables.
+        min_similarity: Minimum similarity, between 0 and 1.
+    """
+    result = search_engine.similar_tables(
+        dataset_id, table_id, project_id=project_id, limit=limit, min_similarity=min_similarity
+    )
+
+    if result is None:
+        raise HTTPException(status_code=404, detail="Table not found")
+
+    return result
+
+
+# Not async: the entity searches block on executor futures, off the event loop
+@api_router.post("/search", response_model=Dict[str, Any])
+def search(
+    query: SearchQuery,
+    search_engine: Annotated[MetadataSearch, Depends(get_search)],
+):
     """Search for datasets, tables, and fields.
 
+    Each entity type returns at most ``limit`` results, best first, after
+    skipping ``offset``. ``meta.totals`` gives the number of matches of each
+    entity type. With ``fuzzy``, a query that matches nothing is corrected
+    to the closest catalog name. With ``semantic``, results are the entries
+    whose names and descriptions are most similar to the query. With
+    ``facets``, ``facets`` counts the matches of each entity type by project,
+    dataset, table type and field type; ``filters`` keeps the matches having
+    the given facet values.
+
     Args:
         query: Search query.
     """
-    return search_engine.search(
-        query=query.query, project_id=query.project_id, entity_type=query.entity_type
+    if query.semantic:
+        return search_engine.semantic_search(
+            query=query.query,
+            project_id=query.project_id,
+            entity_type=query.entity_type,
+            limit=query.limit,
+            offset=query.offset
+        )
+
+    search = search_engine.fuzzy_search if query.fuzzy else search_engine.search
+    return search(
+        query=query.query,
+        project_id=query.project_id,
+        entity_type=query.entity_type,
+        limit=query.limit,
+        offset=query.offset,
+        facets=query.facets,
+        filters=query.filters
+    )
+
+
+# Not async: a large batch would block the event loop
+@api_router.post("/search/batch", response_model=Dict[str, Any])
+def batch_search(
+    query: BatchSearchQuery,
+    search_engine: Annotated[MetadataSearch, Depends(get_search)],
+):
+    """Search for many names at once.
+
+    The queries run together rather than as one request each. ``results``
+    maps each query to its result, with at most its ``limit`` (or the batch
+    ``limit``) results per entity type. All the results together are at
+    most ``max_results``: queries past the budget get fewer results and are
+    listed in ``meta.truncated``.
+
+    Args:
+        query: Batch search query.
+    """
+    queries = [
+        (q, query.limit) if isinstance(q, str) else (q.query, q.limit or query.limit)
+        for q in query.queries
+    ]
+    return search_engine.batch_search(
+        queries,
+        project_id=query.project_id,
+        entity_type=query.entity_type,
+        max_results=query.max_results
     )
 
 
-@api_router.post("/advanced-search", response_model=Dict[str, List[Dict[str, Any]]])
-async def advanced_search(query: AdvancedSearchQuery):
+# Not async: the first call builds the completions, off the event loop
+@api_router.get("/suggest", response_model=List[Dict[str, Any]])
+def suggest(
+    search_engine: Annotated[MetadataSearch, Depends(get_search)],
+    prefix: Annotated[str, Query(description="Typed prefix of a name")],
+    limit: Annotated[int, Query(ge=1, le=MAX_SUGGESTIONS, description="Number of completions")] = DEFAULT_SUGGESTIONS,
+):
+    """Complete a prefix with dataset, table and field names, most common first.
+
+    Args:
+        prefix: Typed prefix of a name.
+        limit: Number of completions.
+    """
+    return search_engine.suggest(prefix, limit)
+
+
+# Not async: the entity searches block on executor futures, off the event loop
+@api_router.post("/advanced-search", response_model=Dict[str, Any])
+def advanced_search(
+    query: AdvancedSearchQuery,
+    search_engine: Annotated[MetadataSearch, Depends(get_search)],
+):
     """Advanced search with specific filters.
 
+    ``query`` is a structured query such as ``name:cust* type:STRING
+    dataset:sales "exact phrase" -deprecated``. With ``explain``, ``plan``
+    gives the steps chosen for each entity type, index lookups first, and
+    the plan of the database.
+
     Args:
         query: Advanced search query.
     """
@@ -152,17 +513,97 @@ async def advanced_search(query: AdvancedSearchQuery):
         "type": query.type or "",
     }
 
-    return search_engine.advanced_search(
-        terms=terms, 
-        project_id=query.project_id,
-        dataset_id=query.dataset_id
-    )
+    try:
+        return search_engine.advanced_search(
+            terms=terms, 
+            project_id=query.project_id,
+            dataset_id=query.dataset_id,
+            limit=query.limit,
+            offset=query.offset,
+            query=query.query,
+            explain=query.explain
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+
+@api_router.get("/stats", response_model=Dict[str, Any])
+async def get_stats(
+    db: Annotated[Database, Depends(get_db)],
+    project_id: Annotated[str | None, Query(description="Optional project ID")] = None,
+    dataset_id: Annotated[str | None, Query(description="Optional dataset ID, requires project_id")] = None,
+):
+    """Get counts of datasets, tables and fields and the field type distribution.
+
+    Args:
+        project_id: Optional project ID.
+        dataset_id: Optional dataset ID within the project.
+    """
+    if dataset_id and not project_id:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="dataset_id requires project_id"
+        )
+
+    return db.get_stats(project_id=project_id, dataset_id=dataset_id)
+
+
+@api_router.get("/metrics/queries", response_model=Dict[str, Any])
+async def get_query_metrics(
+    reset: Annotated[bool, Query(description="Clear the statistics after reading them")] = False,
+):
+    """Get SQL statement statistics per storage operation.
+
+    Statistics are only recorded when ``SQL_INSTRUMENTATION=1``.
+
+    Args:
+        reset: Whether to clear the statistics after reading them.
+    """
+    metrics = query_stats.snapshot()
+    if reset:
+        query_stats.reset()
+    return metrics
+
+
+@api_router.get("/metrics/search-cache", response_model=Dict[str, Any])
+async def get_search_cache_metrics(
+    search_engine: Annotated[MetadataSearch, Depends(get_search)],
+    reset: Annotated[bool, Query(description="Clear the counters after reading them")] = False,
+):
+    """Get the hit rate and size of the search result cache.
+
+    Args:
+        reset: Whether to clear the counters after reading them.
+    """
+    return search_engine.cache.stats(reset=reset)
+
+
+@api_router.delete("/projects/{project_id}")
+async def delete_project(
+    project_id: Annotated[str, Path(description="Project ID")],
+    db: Annotated[Database, Depends(get_db)],
+):
+    """Delete a project and all its datasets, tables and fields.
+
+    Args:
+        project_id: Project ID.
+    """
+    success = db.delete_project(project_id=project_id)
+    
+    if not success:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, 
+            detail=f"Project {project_id} not found"
+        )
+    
+    return {"message": f"Project {project_id} deleted successfully"}
 
 
 @api_router.delete("/datasets/{project_id}/{dataset_id}")
 async def delete_dataset(
     project_id: Annotated[str, Path(description="Project ID")],
     dataset_id: Annotated[str, Path(description="Dataset ID")],
+    db: Annotated[Database, Depends(get_db)],
 ):
     """Delete a dataset and all its associated tables and fields.
 
@@ -186,6 +627,7 @@ async def delete_table(
     project_id: Annotated[str, Path(description="Project ID")],
     dataset_id: Annotated[str, Path(description="Dataset ID")],
     table_id: Annotated[str, Path(description="Table ID")],
+    db: Annotated[Database, Depends(get_db)],
 ):
     """Delete a table and all its associated fields.
 
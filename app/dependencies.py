@@ -0,0 +1,85 @@
+"""
+Services shared by the API and web routes, injected as FastAPI dependencies.
+"""
+import logging
+import threading
+
+from fastapi import Request
+
+from app.search.memory import InMemorySearch
+from app.search.search import MetadataSearch
+from app.storage.db import CATALOG_SNAPSHOT, Database
+
+logger = logging.getLogger(__name__)
+
+
+class Services:
+    """Storage and search services of an application, created on first use."""
+
+    def __init__(self):
+        """Initialize without touching the database."""
+        self._db = None
+        self._search = None
+        self._lock = threading.Lock()
+        self.startup_error: str | None = None
+
+    @property
+    def db(self) -> Database:
+        """The database."""
+        if self._db is None:
+            with self._lock:
+                if self._db is None:
+                    self._db = Database()
+        return self._db
+
+    @property
+    def search(self) -> MetadataSearch:
+        """The search engine."""
+        if self._search is None:
+            with self._lock:
+                if self._search is None:
+                    self._search = MetadataSearch()
+        return self._search
+
+    def warm_up(self) -> None:
+        """Connect to the database and prepare it for serving.
+
+        Runs in the background at startup, so the application accepts
+        connections while the database is still coming up.
+        """
+        try:
+            self.db.ensure_schema()
+            if CATALOG_SNAPSHOT:
+                self.db.load_snapshot()
+            if isinstance(self.search.backend, InMemorySearch):
+                self.search.backend.build()
+            self.startup_error = None
+            logger.info("Storage is ready")
+        except Exception as e:
+            self.startup_error = str(e)
+            logger.error(f"Storage initialization failed: {e}")
+
+    def start_warm_up(self) -> threading.Thread:
+        """Run ``warm_up`` in a background thread.
+
+        Returns:
+            The started thread.
+        """
+        thread = threading.Thread(target=self.warm_up, name="storage-warm-up", daemon=True)
+        thread.start()
+        return thread
+
+
+def get_services(request: Request) -> Services:
+    """Get the services of the application serving the request."""
+    return request.app.state.services
+
+
+def get_db(request: Request) -> Database:
+    """Get the database."""
+    return get_services(request).db
+
+
+def get_search(request: Request) -> MetadataSearch:
+    """Get the search engine."""
+    return get_services(request).search
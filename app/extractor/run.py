@@ -11,7 +11,7 @@ import os
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../..")))
 
 from app.extractor.bq_client import BigQueryMetadataClient
-from app.storage.db import Database
+from app.storage.db import Database, KEEP_GENERATIONS
 from app.storage.models import Dataset, Table, Field
 
 logging.basicConfig(
@@ -20,14 +20,25 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-def run_extraction(project_id: str, output_file: str = None, save_to_db: bool = True, workers: int = 4):
+def run_extraction(
+    project_id: str,
+    output_file: str = None,
+    save_to_db: bool = True,
+    workers: int = 4,
+    keep_generations: int = KEEP_GENERATIONS
+):
     """Run the extraction process.
     
+    The extracted metadata is loaded into a new catalog generation which
+    replaces the project's current one once the extraction has completed.
+    
     Args:
         project_id: The GCP project ID to extract metadata from.
         output_file: Optional file to save the extracted metadata to.
         save_to_db: Whether to save the metadata to the database.
         workers: Number of worker threads for parallel processing.
+        keep_generations: Number of generations of the project to keep,
+            including the new one.
     """
     client = BigQueryMetadataClient(project_id)
     logger.info(f"Starting extraction for project {project_id} with {workers} worker threads")
@@ -46,67 +57,81 @@ def run_extraction(project_id: str, output_file: str = None, save_to_db: bool =
             "fields": []
         }
     
-    # Process datasets incrementally
+    # Load the extraction into a new generation that stays invisible to readers
+    # until every dataset has been loaded
     if save_to_db:
         db = Database()
+        generation_id = db.begin_generation(project_id)
     
-    # Extract and process one dataset at a time
-    for dataset_metadata in client.extract_metadata_by_dataset(max_workers=workers):
-        dataset_data = dataset_metadata["dataset"]
-        tables_data = dataset_metadata["tables"]
-        fields_data = dataset_metadata["fields"]
-        
-        # Update counters
-        total_datasets += 1
-        total_tables += len(tables_data)
-        total_fields += len(fields_data)
-        
-        # Save to output file if needed
-        if output_file:
-            all_metadata["datasets"].append(dataset_data)
-            all_metadata["tables"].extend(tables_data)
-            all_metadata["fields"].extend(fields_data)
-        
-        # Save to database if needed
-        if save_to_db:
-            # Save dataset
-            dataset = Dataset(
-                id=dataset_data["id"],
-                full_id=dataset_data["full_id"],
-                friendly_name=dataset_data["friendly_name"],
-                description=dataset_data["description"],
-                project_id=project_id
-            )
-            db.save_dataset(dataset)
+    try:
+        # Extract and process one dataset at a time
+        for dataset_metadata in client.extract_metadata_by_dataset(max_workers=workers):
+            dataset_data = dataset_metadata["dataset"]
+            tables_data = dataset_metadata["tables"]
+            fields_data = dataset_metadata["fields"]
             
-            # Save tables
-            for table_data in tables_data:
-                table = Table(
-                    id=table_data["id"],
-                    full_id=table_data["full_id"],
-                    friendly_name=table_data["friendly_name"],
-                    description=table_data["description"],
-                    table_type=table_data["table_type"],
-                    dataset_id=table_data["dataset_id"],
-                    project_id=project_id
-                )
-                db.save_table(table)
+            # Update counters
+            total_datasets += 1
+            total_tables += len(tables_data)
+            total_fields += len(fields_data)
+            
+            # Save to output file if needed
+            if output_file:
+                all_metadata["datasets"].append(dataset_data)
+                all_metadata["tables"].extend(tables_data)
+                all_metadata["fields"].extend(fields_data)
             
-            # Save fields
-            for field_data in fields_data:
-                field = Field(
-                    name=field_data["name"],
-                    field_type=field_data["field_type"],
-                    description=field_data["description"],
-                    mode=field_data["mode"],
-                    table_id=field_data["table_id"],
-                    dataset_id=field_data["dataset_id"],
-                    full_id=field_data["full_id"],
+            # Save to database if needed
+            if save_to_db:
+                dataset = Dataset(
+                    id=dataset_data["id"],
+                    full_id=dataset_data["full_id"],
+                    friendly_name=dataset_data["friendly_name"],
+                    description=dataset_data["description"],
                     project_id=project_id
                 )
-                db.save_field(field)
-            
-            logger.info(f"Saved dataset {dataset_data['id']} with {len(tables_data)} tables and {len(fields_data)} fields to database")
+                
+                tables = [
+                    Table(
+                        id=table_data["id"],
+                        full_id=table_data["full_id"],
+                        friendly_name=table_data["friendly_name"],
+                        description=table_data["description"],
+                        table_type=table_data["table_type"],
+                        dataset_id=table_data["dataset_id"],
+                        project_id=project_id
+                    )
+                    for table_data in tables_data
+                ]
+                
+                fields = [
+                    Field(
+                        name=field_data["name"],
+                        field_type=field_data["field_type"],
+                        description=field_data["description"],
+                        mode=field_data["mode"],
+                        table_id=field_data["table_id"],
+                        dataset_id=field_data["dataset_id"],
+                        full_id=field_data["full_id"],
+                        project_id=project_id
+                    )
+                    for field_data in fields_data
+                ]
+                
+                # The generation starts empty, so rows are bulk inserted
+                # without per-row existence checks
+                db.bulk_load(generation_id, datasets=[dataset], tables=tables, fields=fields)
+                
+                logger.info(f"Saved dataset {dataset_data['id']} with {len(tables_data)} tables and {len(fields_data)} fields to database")
+    except BaseException:
+        if save_to_db:
+            logger.error(f"Extraction failed, discarding generation {generation_id}")
+            db.abort_generation(generation_id)
+        raise
+    
+    # Switch readers over to the new generation in one step
+    if save_to_db:
+        db.activate_generation(generation_id, keep=keep_generations)
     
     # Write to output file if needed
     if output_file:
@@ -124,14 +149,27 @@ def main():
     parser.add_argument("--no-db", action="store_true", help="Don't save to database")
     parser.add_argument("--workers", "-w", type=int, default=4, 
                         help="Number of worker threads for parallel processing (default: 4)")
+    parser.add_argument("--keep-generations", type=int, default=KEEP_GENERATIONS,
+                        help=f"Number of catalog generations to keep (default: {KEEP_GENERATIONS})")
+    parser.add_argument("--rollback", action="store_true",
+                        help="Switch the project back to its previous generation instead of extracting")
     
     args = parser.parse_args()
     
+    if args.rollback:
+        generation_id = Database().rollback_generation(args.project)
+        if generation_id is None:
+            logger.error(f"No previous generation to roll back to for project {args.project}")
+            sys.exit(1)
+        logger.info(f"Project {args.project} now serves generation {generation_id}")
+        return
+    
     run_extraction(
         project_id=args.project,
         output_file=args.output,
         save_to_db=not args.no_db,
-        workers=args.workers
+        workers=args.workers,
+        keep_generations=args.keep_generations
     )
 
 if __name__ == "__main__":
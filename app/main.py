@@ -5,32 +5,106 @@ Main application entry point for BigQuery Metadata Search.
 import uvicorn
 import sys
 import os
+from contextlib import asynccontextmanager
 
-from fastapi import FastAPI
+from fastapi import FastAPI, Request, status
+from fastapi.responses import JSONResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 
 from app.api.api import api_router
+from app.dependencies import Services
+from app.storage.instrumentation import SQL_INSTRUMENTATION, end_request, start_request
 from app.web.routes import web_router
 
-app = FastAPI(
-    title="BigQuery Metadata Search",
-    description="Search and browse BigQuery metadata",
-    version="1.0.0",
-    openapi_tags=[
-        {"name": "api", "description": "API endpoints for metadata"},
-        {"name": "web", "description": "Web UI routes"},
-    ],
-)
 
-# API routes
-app.include_router(api_router, prefix="/api")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Connect to the database in the background while the app starts serving."""
+    app.state.services.start_warm_up()
+    yield
 
-# Web UI routes
-app.include_router(web_router)
 
-# Mount static files
-app.mount("/static", StaticFiles(directory="app/web/static"), name="static")
+def create_app(services: Services | None = None) -> FastAPI:
+    """Create the application.
+
+    Creating the application does not connect to the database. The schema is
+    created and the catalog snapshot loaded in the background at startup;
+    ``/readyz`` reports when the database can serve requests.
+
+    Args:
+        services: Optional services to use instead of the default ones.
+
+    Returns:
+        The application.
+    """
+    app = FastAPI(
+        title="BigQuery Metadata Search",
+        description="Search and browse BigQuery metadata",
+        version="1.0.0",
+        openapi_tags=[
+            {"name": "api", "description": "API endpoints for metadata"},
+            {"name": "web", "description": "Web UI routes"},
+        ],
+        lifespan=lifespan,
+    )
+    app.state.services = services or Services()
+
+    # API routes
+    app.include_router(api_router, prefix="/api")
+
+    # Web UI routes
+    app.include_router(web_router)
+
+    if SQL_INSTRUMENTATION:
+        @app.middleware("http")
+        async def count_queries(request: Request, call_next):
+            """Count the SQL statements run while serving each request."""
+            token = start_request()
+            try:
+                response = await call_next(request)
+            finally:
+                queries = end_request(token, f"{request.method} {request.url.path}")
+            response.headers["X-Query-Count"] = str(queries.count)
+            return response
+
+    @app.get("/healthz", include_in_schema=False)
+    async def healthz():
+        """Liveness probe: the process is serving requests."""
+        return {"status": "ok"}
+
+    @app.get("/readyz", include_in_schema=False)
+    def readyz():
+        """Readiness probe: the database is reachable and its schema exists."""
+        services = app.state.services
+        db = services.db
+
+        if not db.schema_ready and services.startup_error is not None:
+            # The warm-up gave up; try again now that we are asked
+            try:
+                db.ensure_schema(max_retries=1)
+                services.startup_error = None
+            except Exception as e:
+                services.startup_error = str(e)
+
+        if db.schema_ready and db.ping():
+            return {"status": "ready"}
+
+        return JSONResponse(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            content={
+                "status": "starting" if services.startup_error is None else "unavailable",
+                "detail": services.startup_error,
+            },
+        )
+
+    # Mount static files
+    app.mount("/static", StaticFiles(directory="app/web/static"), name="static")
+
+    return app
+
+
+app = create_app()
 
 if __name__ == "__main__":
     uvicorn.run("app.main:app", host="0.0.0.0", port=8000, reload=True)
@@ -0,0 +1,108 @@
+"""
+Indexes of the catalog rebuilt in the background.
+
+``BackgroundIndex`` holds an index built from the catalog and the catalog
+version it was built for. The first lookup builds it; later lookups keep
+using it while a rebuild for a newer catalog version runs in a background
+thread. Requests with a deadline check ``ready`` first, which builds the
+first index in the background too, and search the database until it is done.
+"""
+import logging
+import threading
+from typing import Any
+
+from app.storage.db import Database
+
+logger = logging.getLogger(__name__)
+
+
+class BackgroundIndex:
+    """An index of the current catalog, rebuilt when the catalog changes.
+
+    Subclasses implement ``_build``; the indexes it returns have a
+    ``version`` attribute.
+    """
+
+    # Name of the index in logs and thread names
+    label = "index"
+
+    def __init__(self, db: Database):
+        """Initialize the holder; the index is built on first use.
+
+        Args:
+            db: The database holding the catalog.
+        """
+        self.db = db
+        self._index = None
+        self._lock = threading.Lock()
+        self._rebuilding = False
+
+    def _build(self, previous: Any | None) -> Any:
+        """Build the index of the current catalog.
+
+        Args:
+            previous: The index being replaced, if any.
+
+        Returns:
+            The new index.
+        """
+        raise NotImplementedError
+
+    def build(self) -> Any:
+        """Build the index of the current catalog, unless it is up to date.
+
+        Returns:
+            The index.
+        """
+        with self._lock:
+            if self._index is None or self._index.version != self.db.catalog_version():
+                self._index = self._build(self._index)
+            return self._index
+
+    def _rebuild_in_background(self) -> None:
+        with self._lock:
+            if self._rebuilding:
+                return
+            self._rebuilding = True
+
+        def run():
+            try:
+                self.build()
+            except Exception as e:
+                logger.error(f"Rebuilding the {self.label} failed: {e}")
+            finally:
+                self._rebuilding = False
+
+        threading.Thread(
+            target=run, name=f"{self.label.replace(' ', '-')}-rebuild", daemon=True
+        ).start()
+
+    def ready(self) -> bool:
+        """Whether an index can be looked up without building it.
+
+        Starts building the first index in the background if there is none.
+
+        Returns:
+            True if there is an index, even of an older catalog version.
+        """
+        if self._index is None:
+            self._rebuild_in_background()
+            return False
+        return True
+
+    def index(self) -> Any:
+        """Get the index to look up.
+
+        Returns:
+            The current index, or the previous one while a rebuild for a
+            newer catalog version is running.
+        """
+        index = self._index
+
+        if index is None:
+            return self.build()
+
+        if index.version != self.db.catalog_version():
+            self._rebuild_in_background()
+
+        return index
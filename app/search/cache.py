@@ -0,0 +1,280 @@
+"""
+Cache of search results.
+
+Results are cached in process in an LRU map limited to ``SEARCH_CACHE_SIZE``
+entries of at most ``SEARCH_CACHE_TTL`` seconds. Keys are built from the
+normalized search parameters and the catalog version, so any catalog write or
+completed extraction makes the cached results unreachable; the in-process
+entries of older versions are dropped as soon as a new version is seen.
+
+With ``SEARCH_CACHE_URL`` set to a Redis URL, results are also stored in Redis
+so that all workers share them. This needs the ``redis`` package
+(``pip install .[cache]``). Redis errors are logged and treated as misses.
+
+Callers get their own copy of a result; paged results have ``meta.cached``
+set when served from the cache, as their timings are those of the search
+that filled it. Concurrent lookups of the same missing key wait for the
+first one to compute it instead of running the same search again.
+"""
+from collections import OrderedDict
+import copy
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from typing import Dict, Any, Callable
+
+logger = logging.getLogger(__name__)
+
+# Maximum number of results cached in process; 0 disables the cache
+SEARCH_CACHE_SIZE = int(os.environ.get("SEARCH_CACHE_SIZE", "1024"))
+
+# Seconds a cached result is served for
+SEARCH_CACHE_TTL = float(os.environ.get("SEARCH_CACHE_TTL", "300"))
+
+# Optional Redis URL of a cache shared by all workers
+SEARCH_CACHE_URL = os.environ.get("SEARCH_CACHE_URL")
+
+# Prefix of the keys stored in the shared cache
+KEY_PREFIX = "bq-metadata-search"
+
+
+def complete(value: Any) -> bool:
+    """Whether a result can be cached: not if entity types timed out."""
+    return not (isinstance(value, dict) and value.get("meta", {}).get("timed_out"))
+
+
+def _served(value: Any, cached: bool) -> Any:
+    """Copy a result for a caller, marking whether it came from the cache."""
+    value = copy.deepcopy(value)
+    if isinstance(value, dict) and isinstance(value.get("meta"), dict):
+        value["meta"]["cached"] = cached
+    return value
+
+
+def normalize_text(value: str | None) -> str:
+    """Normalize a search term: searches ignore case and repeated spaces."""
+    return " ".join((value or "").lower().split())
+
+
+class RedisCache:
+    """Search results shared between processes through Redis."""
+
+    def __init__(self, url: str, ttl: float):
+        """Connect to Redis.
+
+        Args:
+            url: The Redis URL, e.g. ``redis://localhost:6379/0``.
+            ttl: Seconds entries are kept for.
+
+        Raises:
+            ImportError: If the redis package is not installed.
+        """
+        import redis
+
+        self.client = redis.Redis.from_url(url, socket_timeout=0.5)
+        self.ttl = max(int(ttl), 1)
+
+    def get(self, key: str) -> Any | None:
+        """Get a cached value, or None on a miss or an error."""
+        try:
+            data = self.client.get(key)
+        except Exception as e:
+            logger.warning(f"Search cache read failed: {e}")
+            return None
+        return json.loads(data) if data is not None else None
+
+    def set(self, key: str, value: Any) -> None:
+        """Store a value, ignoring errors."""
+        try:
+            self.client.set(key, json.dumps(value), ex=self.ttl)
+        except Exception as e:
+            logger.warning(f"Search cache write failed: {e}")
+
+
+class SearchCache:
+    """LRU cache of search results with a TTL, keyed by catalog version."""
+
+    def __init__(self, max_size: int, ttl: float, shared: RedisCache | None = None):
+        """Initialize an empty cache.
+
+        Args:
+            max_size: Maximum number of entries kept in process; 0 disables caching.
+            ttl: Seconds an entry is served for.
+            shared: Optional cache shared with other processes.
+        """
+        self.max_size = max_size
+        self.ttl = ttl
+        self.shared = shared
+        self._entries: OrderedDict[str, tuple] = OrderedDict()
+        # Key -> event set when the search computing it is done
+        self._computing: Dict[str, threading.Event] = {}
+        self._version = None
+        self._lock = threading.Lock()
+        self._reset_counters()
+
+    @classmethod
+    def from_env(cls) -> "SearchCache":
+        """Create the cache configured by the environment."""
+        shared = None
+
+        if SEARCH_CACHE_URL and SEARCH_CACHE_SIZE > 0:
+            try:
+                shared = RedisCache(SEARCH_CACHE_URL, SEARCH_CACHE_TTL)
+            except ImportError:
+                logger.error("SEARCH_CACHE_URL is set but the redis package is not installed")
+
+        return cls(SEARCH_CACHE_SIZE, SEARCH_CACHE_TTL, shared=shared)
+
+    @property
+    def enabled(self) -> bool:
+        """Whether results are cached."""
+        return self.max_size > 0
+
+    def _reset_counters(self) -> None:
+        self.hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+        self.waits = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def key(kind: str, version: int, **params) -> str:
+        """Build the key of a search.
+
+        Args:
+            kind: The search method, e.g. ``search``.
+            version: The catalog version searched.
+            **params: The normalized search parameters.
+
+        Returns:
+            The key.
+        """
+        digest = hashlib.sha1(
+            json.dumps(params, sort_keys=True, default=str).encode("utf-8")
+        ).hexdigest()
+        return f"{KEY_PREFIX}:{kind}:{version}:{digest}"
+
+    def _check_version(self, version: int) -> None:
+        """Drop the entries of older catalog versions; called with the lock held."""
+        if version != self._version:
+            if self._entries:
+                self.invalidations += 1
+            self._entries.clear()
+            self._version = version
+
+    def get_or_compute(self, key: str, version: int, compute: Callable[[], Any]) -> Any:
+        """Get a cached result, or compute and cache it.
+
+        Args:
+            key: The key from ``key``.
+            version: The catalog version the key was built for.
+            compute: Function running the search.
+
+        Results missing timed out entity types are not cached. While a key
+        is computed, other lookups of it wait for the result.
+
+        Returns:
+            A copy of the result.
+        """
+        if not self.enabled:
+            return compute()
+
+        while True:
+            now = time.monotonic()
+
+            with self._lock:
+                self._check_version(version)
+                entry = self._entries.get(key)
+
+                if entry is not None:
+                    expires_at, value = entry
+                    if expires_at > now:
+                        self._entries.move_to_end(key)
+                        self.hits += 1
+                        return _served(value, True)
+                    del self._entries[key]
+                    self.expirations += 1
+
+                computing = self._computing.get(key)
+                if computing is None:
+                    computing = self._computing[key] = threading.Event()
+                    break
+                self.waits += 1
+
+            # Look up again once the other search is done; it may not be cached
+            computing.wait()
+
+        try:
+            return self._compute(key, version, now, compute)
+        finally:
+            with self._lock:
+                del self._computing[key]
+            computing.set()
+
+    def _compute(self, key: str, version: int, now: float, compute: Callable[[], Any]) -> Any:
+        """Get a result missing in process from the shared cache or compute it, and cache it."""
+        value = self.shared.get(key) if self.shared is not None else None
+        cached = value is not None
+
+        if cached:
+            with self._lock:
+                self.shared_hits += 1
+        else:
+            with self._lock:
+                self.misses += 1
+            value = compute()
+            if not complete(value):
+                return _served(value, False)
+            if self.shared is not None:
+                self.shared.set(key, value)
+
+        with self._lock:
+            if self._version == version:
+                self._entries[key] = (now + self.ttl, value)
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_size:
+                    self._entries.popitem(last=False)
+                    self.evictions += 1
+
+        return _served(value, cached)
+
+    def clear(self) -> None:
+        """Drop all in-process entries."""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self, reset: bool = False) -> Dict[str, Any]:
+        """Get the hit-rate statistics of the cache.
+
+        Args:
+            reset: Whether to clear the counters after reading them.
+
+        Returns:
+            Dict with the counters, the hit rate and the cache size.
+        """
+        with self._lock:
+            lookups = self.hits + self.shared_hits + self.misses
+            stats = {
+                "enabled": self.enabled,
+                "shared": self.shared is not None,
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "ttl_seconds": self.ttl,
+                "catalog_version": self._version,
+                "hits": self.hits,
+                "shared_hits": self.shared_hits,
+                "misses": self.misses,
+                "waits": self.waits,
+                "hit_rate": round((self.hits + self.shared_hits) / lookups, 4) if lookups else None,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+            }
+            if reset:
+                self._reset_counters()
+        return stats
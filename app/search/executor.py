@@ -0,0 +1,161 @@
+"""
+Concurrent execution of the per-entity search queries.
+
+A search runs one query per entity type. ``EntityExecutor`` runs them on a
+thread pool, each in its own session and therefore on its own connection,
+so a slow field scan does not hold back the dataset and table hits. Every
+entity type gets ``SEARCH_ENTITY_TIMEOUT_MS``: its statements are cancelled
+by the database when the time is up (``app.storage.deadlines``), and the
+search returns the other entity types without waiting for it.
+
+Paged results report the time taken by each entity type in
+``meta.timings_ms``, and the entity types that timed out in
+``meta.timed_out``.
+"""
+from concurrent.futures import ThreadPoolExecutor, wait
+import contextvars
+import logging
+import os
+import time
+from typing import Dict, Any, Callable
+
+from sqlalchemy.exc import OperationalError
+
+from app.storage.deadlines import deadline_passed, statement_deadline
+from app.search.results import add_meta, empty_result
+
+logger = logging.getLogger(__name__)
+
+# Threads running entity queries, shared by all searches; 1 runs the entity
+# types of a search one after the other
+SEARCH_WORKERS = int(os.environ.get("SEARCH_WORKERS", "6"))
+
+# Milliseconds each entity type of a search may take; 0 disables the timeout
+SEARCH_ENTITY_TIMEOUT_MS = float(os.environ.get("SEARCH_ENTITY_TIMEOUT_MS", "5000"))
+
+# Result key -> entity type
+ENTITY_TYPES = {"datasets": "dataset", "tables": "table", "fields": "field"}
+
+
+class EntityTimeout(Exception):
+    """An entity query was cancelled at its deadline."""
+
+
+class EntityExecutor:
+    """Runs the entity types of a search concurrently, each with a timeout."""
+
+    def __init__(self, workers: int, timeout_ms: float):
+        """Initialize the executor; the thread pool is started on first use.
+
+        Args:
+            workers: Threads running entity queries; 1 runs them in the caller.
+            timeout_ms: Milliseconds each entity type may take; 0 for no limit.
+        """
+        self.workers = workers
+        self.timeout_ms = timeout_ms
+        self._pool = None
+
+    @classmethod
+    def from_env(cls) -> "EntityExecutor":
+        """Create the executor configured by the environment."""
+        return cls(SEARCH_WORKERS, SEARCH_ENTITY_TIMEOUT_MS)
+
+    @property
+    def pool(self) -> ThreadPoolExecutor:
+        """The thread pool, started on first use."""
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="search")
+        return self._pool
+
+    def run(
+        self,
+        search: Callable[[str], Dict[str, Any]],
+        entity_type: str | None,
+        limit: int | None,
+        offset: int
+    ) -> Dict[str, Any]:
+        """Search each entity type and merge the results.
+
+        Args:
+            search: Function searching one entity type, given its name
+                ('dataset', 'table' or 'field'), and returning a search result.
+            entity_type: Optional entity type to filter by.
+            limit: Optional number of results per entity type.
+            offset: Number of results per entity type to skip.
+
+        Returns:
+            Dict with datasets, tables, and fields; if paged, ``meta`` also has
+            the timings and the timed out entity types.
+        """
+        keys = [
+            key for key, name in ENTITY_TYPES.items()
+            if not entity_type or entity_type.lower() == name
+        ]
+        started = time.monotonic()
+        deadline = started + self.timeout_ms / 1000 if self.timeout_ms > 0 else None
+        timings: Dict[str, float] = {}
+
+        def run_one(key: str) -> Dict[str, Any]:
+            try:
+                with statement_deadline(deadline):
+                    try:
+                        return search(ENTITY_TYPES[key])
+                    except OperationalError:
+                        if deadline_passed():
+                            raise EntityTimeout(key)
+                        raise
+            finally:
+                timings[key] = round((time.monotonic() - started) * 1000, 1)
+
+        if self.workers > 1 and len(keys) > 1:
+            # Each task gets its own copy of the context, for the deadline
+            # and the statement instrumentation
+            futures = {
+                key: self.pool.submit(contextvars.copy_context().run, run_one, key)
+                for key in keys
+            }
+            wait(futures.values(), timeout=deadline - time.monotonic() if deadline else None)
+            outcomes = {key: self._outcome(future) for key, future in futures.items()}
+        else:
+            outcomes = {}
+            for key in keys:
+                try:
+                    outcomes[key] = run_one(key)
+                except EntityTimeout:
+                    outcomes[key] = None
+
+        result = empty_result()
+        totals = {}
+        timed_out = []
+
+        for key, outcome in outcomes.items():
+            if outcome is None:
+                timed_out.append(key)
+                timings.setdefault(key, round((time.monotonic() - started) * 1000, 1))
+                totals[key] = {"value": 0, "relation": "gte"}
+                continue
+            result[key] = outcome[key]
+            if "facets" in outcome:
+                result.setdefault("facets", {})[key] = outcome["facets"][key]
+            if "meta" in outcome:
+                totals[key] = outcome["meta"]["totals"][key]
+
+        if timed_out:
+            logger.warning(f"Search timed out after {self.timeout_ms:.0f} ms for {', '.join(timed_out)}")
+
+        add_meta(result, limit, offset, totals)
+        if limit is not None:
+            result["meta"]["timings_ms"] = dict(timings)
+            result["meta"]["timed_out"] = timed_out
+        return result
+
+    @staticmethod
+    def _outcome(future) -> Dict[str, Any] | None:
+        """The result of an entity query, or None if it timed out."""
+        if not future.done():
+            future.cancel()
+            return None
+        try:
+            return future.result()
+        except EntityTimeout:
+            return None
@@ -0,0 +1,126 @@
+"""
+Facet counts of search results, and facet filters.
+
+A facet groups the matches of a search by the value of a column: the
+``project`` and ``dataset`` of every entity type, the ``table_type`` of
+tables and the ``field_type`` of fields. The counts of all the facets of an
+entity type come from one aggregation over its matches: a ``GROUP BY
+GROUPING SETS`` on PostgreSQL, and a ``UNION ALL`` of ``GROUP BY`` over the
+matches materialized once on SQLite. Like totals, facets count at most
+``TOTAL_COUNT_CAP`` matches, so they are exact when the total is.
+
+Facet filters are equality predicates on the same columns, which are
+indexed, rather than more ``LIKE`` conditions. A filter on a facet that an
+entity type does not have, such as ``field_type`` for tables, matches none
+of its rows.
+"""
+from typing import List, Dict, Any, Iterable
+
+from sqlalchemy import case, false, func, literal, select, union_all
+from sqlalchemy.orm import Query, Session
+
+from app.storage.models import DatasetModel, TableModel, FieldModel
+from app.search.results import TOTAL_COUNT_CAP
+
+# Facets, in display order
+FACETS = ("project", "dataset", "table_type", "field_type")
+
+# Values returned per facet, the most common first
+FACET_SIZE = 20
+
+
+def facet_columns(model) -> Dict[str, Any]:
+    """Get the columns of the facets of an entity type.
+
+    Args:
+        model: DatasetModel, TableModel or FieldModel.
+
+    Returns:
+        The facet names and their columns.
+    """
+    if model is DatasetModel:
+        return {"project": DatasetModel.project_id, "dataset": DatasetModel.dataset_name}
+    if model is TableModel:
+        return {
+            "project": TableModel.project_id,
+            "dataset": TableModel.dataset_id,
+            "table_type": TableModel.table_type,
+        }
+    return {
+        "project": FieldModel.project_id,
+        "dataset": FieldModel.dataset_id,
+        "field_type": FieldModel.field_type,
+    }
+
+
+def filter_facets(rows_query: Query, model, filters: Dict[str, str] | None) -> Query:
+    """Keep the rows having the values of facet filters.
+
+    Args:
+        rows_query: The query selecting the matches.
+        model: The model it selects.
+        filters: Facet names and the values to keep.
+
+    Returns:
+        The filtered query.
+    """
+    columns = facet_columns(model)
+    for name, value in (filters or {}).items():
+        column = columns.get(name)
+        rows_query = rows_query.filter(column == value if column is not None else false())
+    return rows_query
+
+
+def top_values(counts: Iterable[tuple]) -> Dict[str, List[Dict[str, Any]]]:
+    """Arrange (facet, value, count) rows as the facets of a result.
+
+    Args:
+        counts: The count of each facet value; None values are dropped.
+
+    Returns:
+        For each facet, up to ``FACET_SIZE`` dicts with a ``value`` and its
+        ``count``, most common first.
+    """
+    facets: Dict[str, List[Dict[str, Any]]] = {}
+    for name, value, count in counts:
+        if value is not None:
+            facets.setdefault(name, []).append({"value": value, "count": count})
+
+    return {
+        name: sorted(values, key=lambda v: (-v["count"], v["value"]))[:FACET_SIZE]
+        for name, values in facets.items()
+    }
+
+
+def facet_counts(session: Session, rows_query: Query, model) -> Dict[str, List[Dict[str, Any]]]:
+    """Count the matches of a search by facet value, in one query.
+
+    Args:
+        session: The session the search runs in.
+        rows_query: The query selecting the matches.
+        model: The model it selects.
+
+    Returns:
+        The facets of the matches, see ``top_values``.
+    """
+    columns = facet_columns(model)
+    names = list(columns)
+    matches = rows_query.order_by(None).with_entities(
+        *[column.label(name) for name, column in columns.items()]
+    ).limit(TOTAL_COUNT_CAP).cte("facet_matches")
+
+    if session.get_bind().dialect.name == "postgresql":
+        grouped = {name: func.grouping(matches.c[name]) == 0 for name in names}
+        statement = select(
+            case(*[(grouped[name], name) for name in names[:-1]], else_=names[-1]),
+            case(*[(grouped[name], matches.c[name]) for name in names[:-1]],
+                 else_=matches.c[names[-1]]),
+            func.count()
+        ).group_by(func.grouping_sets(*[matches.c[name] for name in names]))
+    else:
+        statement = union_all(*[
+            select(literal(name), matches.c[name], func.count()).group_by(matches.c[name])
+            for name in names
+        ])
+
+    return top_values(session.execute(statement))
@@ -0,0 +1,326 @@
+"""
+Typo-tolerant matching of dataset, table and field names.
+
+``SymSpellIndex`` is a symmetric delete dictionary over the distinct names of
+the catalog and the words of those names (``app.search.tokenize``). Every
+term is stored under the strings obtained by deleting up to
+``MAX_EDIT_DISTANCE`` characters from its first ``PREFIX_LENGTH``
+characters. A lookup generates the same deletes of the misspelled word, so
+the candidates are found with a few dictionary reads, and only those are
+checked with an edit distance that counts adjacent transpositions as one
+edit. Suggestions are ranked by distance, then by how many catalog entries
+carry the term.
+
+The index is built from one grouped query per catalog table and rebuilt in
+the background when the catalog version changes, like the in-memory search
+index.
+"""
+from array import array
+from bisect import bisect_left
+from collections import Counter
+import logging
+import time
+from typing import List, Dict, Any, Tuple
+
+from sqlalchemy import func
+
+from app.storage.db import Database, visible
+from app.storage.models import DatasetModel, TableModel, FieldModel
+from app.search.background import BackgroundIndex
+from app.search.tokenize import identifier_words
+
+logger = logging.getLogger(__name__)
+
+# Maximum number of edits between a word and its suggestions
+MAX_EDIT_DISTANCE = 2
+
+# Number of leading characters of a term indexed by its deletes
+PREFIX_LENGTH = 7
+
+# Number of suggestions returned
+SUGGESTION_LIMIT = 5
+
+# Name column of each catalog table
+NAME_COLUMNS = (
+    (DatasetModel, DatasetModel.dataset_name),
+    (TableModel, TableModel.table_name),
+    (FieldModel, FieldModel.name),
+)
+
+
+def edit_distance(a: str, b: str, max_distance: int) -> int:
+    """Edit distance between two strings, counting adjacent transpositions as one edit.
+
+    Common prefixes and suffixes are skipped, and only the cells of the
+    dynamic programming table within ``max_distance`` of the diagonal are
+    computed.
+
+    Args:
+        a: A string.
+        b: Another string.
+        max_distance: The largest distance of interest.
+
+    Returns:
+        The distance, or ``max_distance + 1`` if it is larger than ``max_distance``.
+    """
+    if abs(len(a) - len(b)) > max_distance:
+        return max_distance + 1
+
+    start = 0
+    limit = min(len(a), len(b))
+    while start < limit and a[start] == b[start]:
+        start += 1
+    a, b = _strip_suffix(a[start:], b[start:])
+
+    if not a or not b:
+        return min(max(len(a), len(b)), max_distance + 1)
+
+    too_far = max_distance + 1
+    previous2 = None
+    previous = [j if j <= max_distance else too_far for j in range(len(b) + 1)]
+
+    for i in range(1, len(a) + 1):
+        low = max(1, i - max_distance)
+        high = min(len(b), i + max_distance)
+        current = [too_far] * (len(b) + 1)
+        if i <= max_distance:
+            current[0] = i
+        row_min = too_far
+        char = a[i - 1]
+
+        for j in range(low, high + 1):
+            value = previous[j - 1] + (char != b[j - 1])
+            if previous[j] + 1 < value:
+                value = previous[j] + 1
+            if current[j - 1] + 1 < value:
+                value = current[j - 1] + 1
+            if (previous2 is not None and j > 1
+                    and char == b[j - 2] and a[i - 2] == b[j - 1]
+                    and previous2[j - 2] + 1 < value):
+                value = previous2[j - 2] + 1
+            current[j] = value
+            if value < row_min:
+                row_min = value
+
+        if row_min > max_distance:
+            return too_far
+        previous2, previous = previous, current
+
+    return min(previous[-1], too_far)
+
+
+def _strip_suffix(a: str, b: str) -> Tuple[str, str]:
+    """Remove the common suffix of two strings."""
+    size = 0
+    limit = min(len(a), len(b))
+    while size < limit and a[-1 - size] == b[-1 - size]:
+        size += 1
+    return (a[:len(a) - size], b[:len(b) - size]) if size else (a, b)
+
+
+def deletes(word: str, max_distance: int) -> set:
+    """The strings obtained by deleting up to some characters from a word prefix.
+
+    Args:
+        word: The word.
+        max_distance: The maximum number of characters deleted.
+
+    Returns:
+        The prefix of the word and its deletes.
+    """
+    found = {word[:PREFIX_LENGTH]}
+    frontier = found
+
+    for _ in range(max_distance):
+        frontier = {
+            item[:i] + item[i + 1:]
+            for item in frontier
+            for i in range(len(item))
+        } - found
+        found |= frontier
+
+    return found
+
+
+def word_distance(word: str) -> int:
+    """Number of edits tolerated in a word: none in very short words."""
+    if len(word) <= 2:
+        return 0
+    if len(word) <= 4:
+        return min(1, MAX_EDIT_DISTANCE)
+    return MAX_EDIT_DISTANCE
+
+
+class SymSpellIndex:
+    """Symmetric delete dictionary of the names of a catalog version."""
+
+    __slots__ = ("version", "terms", "counts", "lookup_table", "length_starts")
+
+    def __init__(self, counts: Dict[str, int], version: int = 0):
+        """Build the dictionary.
+
+        Args:
+            counts: The terms, lowercased, and the number of entries carrying each.
+            version: The catalog version of the terms.
+        """
+        started = time.monotonic()
+        self.version = version
+        # Term IDs follow term lengths, so the terms of a posting list that
+        # have the right length are found by binary search
+        self.terms = sorted(counts, key=lambda term: (len(term), term))
+        self.counts = array("I", (min(counts[term], 2 ** 32 - 1) for term in self.terms))
+        self.length_starts = array("I")
+        for term_id, term in enumerate(self.terms):
+            while len(self.length_starts) <= len(term):
+                self.length_starts.append(term_id)
+        self.length_starts.append(len(self.terms))
+        # Single term IDs are stored as ints, to save the lists
+        self.lookup_table: Dict[str, int | List[int]] = {}
+
+        table = self.lookup_table
+        for term_id, term in enumerate(self.terms):
+            for key in deletes(term, MAX_EDIT_DISTANCE):
+                entry = table.get(key)
+                if entry is None:
+                    table[key] = term_id
+                elif isinstance(entry, int):
+                    table[key] = [entry, term_id]
+                else:
+                    entry.append(term_id)
+
+        logger.info(
+            f"Built fuzzy name index of catalog version {version}: {len(self.terms)} terms, "
+            f"{len(table)} deletes in {time.monotonic() - started:.1f}s"
+        )
+
+    def lookup(self, word: str, limit: int = SUGGESTION_LIMIT) -> List[Tuple[str, int, int]]:
+        """Find the terms close to a word.
+
+        Args:
+            word: The word, lowercased.
+            limit: Maximum number of terms returned.
+
+        Returns:
+            (term, distance, count) tuples, closest and most common first.
+        """
+        max_distance = word_distance(word)
+        starts = self.length_starts
+        first = starts[min(max(len(word) - max_distance, 0), len(starts) - 1)]
+        end = starts[min(len(word) + max_distance + 1, len(starts) - 1)]
+        seen = set()
+        matches = []
+
+        for key in deletes(word, max_distance):
+            entry = self.lookup_table.get(key)
+            if entry is None:
+                continue
+
+            if isinstance(entry, int):
+                candidates = (entry,) if first <= entry < end else ()
+            else:
+                candidates = entry[bisect_left(entry, first):bisect_left(entry, end)]
+
+            for term_id in candidates:
+                if term_id in seen:
+                    continue
+                seen.add(term_id)
+
+                term = self.terms[term_id]
+                distance = edit_distance(word, term, max_distance)
+                if distance <= max_distance:
+                    matches.append((term, distance, self.counts[term_id]))
+
+        matches.sort(key=lambda match: (match[1], -match[2], match[0]))
+        return matches[:limit]
+
+
+def load_counts(db: Database) -> Tuple[Dict[str, int], int]:
+    """Count the names of the catalog and the words of those names.
+
+    Args:
+        db: The database holding the catalog.
+
+    Returns:
+        The counts of the lowercased terms, and the catalog version counted.
+    """
+    counts = Counter()
+
+    with db.get_session() as session:
+        version = db.catalog_version()
+        for model, column in NAME_COLUMNS:
+            rows = session.query(column, func.count()).filter(visible(model)).group_by(column)
+            for name, count in rows.yield_per(10000):
+                if not name:
+                    continue
+                name = name.lower()
+                counts[name] += count
+                for word in identifier_words(name):
+                    if word != name:
+                        counts[word] += count
+
+    return counts, version
+
+
+class FuzzySuggester(BackgroundIndex):
+    """Query corrections from a ``SymSpellIndex`` of the current catalog."""
+
+    label = "fuzzy name index"
+
+    def _build(self, previous: SymSpellIndex | None) -> SymSpellIndex:
+        """Index the names of the current catalog."""
+        counts, version = load_counts(self.db)
+        return SymSpellIndex(counts, version)
+
+    def suggest(self, query: str, limit: int = SUGGESTION_LIMIT) -> List[Dict[str, Any]]:
+        """Suggest corrections of a query.
+
+        A single-token query is matched as a whole name, e.g. ``custmer_id``
+        to ``customer_id``; the query is also corrected word by word, e.g.
+        ``custmer id`` to ``customer id``.
+
+        Args:
+            query: The query.
+            limit: Maximum number of suggestions.
+
+        Returns:
+            Dicts with the corrected ``text``, its edit ``distance`` from the
+            query and the ``count`` of catalog entries carrying it, closest
+            and most common first.
+        """
+        index = self.index()
+        text = " ".join(query.lower().split())
+        suggestions: Dict[str, Tuple[int, int]] = {}
+
+        if text and " " not in text:
+            for term, distance, count in index.lookup(text, limit):
+                suggestions[term] = (distance, count)
+
+        words = identifier_words(text)
+        corrected = []
+        total_distance = 0
+        counts = []
+
+        for word in words:
+            matches = index.lookup(word, 1)
+            if matches:
+                term, distance, count = matches[0]
+                corrected.append(term)
+                total_distance += distance
+                counts.append(count)
+            else:
+                corrected.append(word)
+
+        if total_distance and counts:
+            suggestions.setdefault(" ".join(corrected), (total_distance, min(counts)))
+
+        suggestions.pop(text, None)
+        # Whole names before word by word corrections of the same distance
+        ranked = sorted(
+            suggestions.items(),
+            key=lambda item: (item[1][0], -item[1][1], " " in item[0], item[0])
+        )
+
+        return [
+            {"text": term, "distance": distance, "count": count}
+            for term, (distance, count) in ranked[:limit]
+        ]
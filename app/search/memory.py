@@ -0,0 +1,490 @@
+"""
+In-process inverted index search backend.
+
+The index is built from the catalog snapshot (``app.storage.snapshot``), so
+it serves the same catalog whatever the database. Every entity type has its
+own index: a sorted vocabulary of terms, and the posting lists of the terms
+end to end, as a numpy array of row numbers with a parallel array of weighted
+term frequencies. Terms are identifier-aware words (``app.search.tokenize``);
+names count more than full IDs and friendly names, which count more than
+descriptions and types.
+
+Each query word matches the terms it is a prefix of, whose posting lists are
+adjacent. Rows are grouped by project, so a search in a project only reads
+the slice of its rows. The rows of the word with the shortest posting lists
+are intersected with those of the other words, probing long posting lists by
+binary search instead of scanning them, and the rows left are ranked with
+BM25. Scores, filters and facets are computed with array operations, and only
+the matches that can make the page are sorted, so a word found in most rows
+costs milliseconds rather than a Python loop over its matches.
+
+This needs ``numpy`` (``pip install .[memory]``); without it, searches use
+the database backends.
+
+The index is rebuilt in the background when the catalog version changes;
+searches keep using the previous index until the new one is ready.
+"""
+from array import array
+from bisect import bisect_left
+from collections import Counter
+import logging
+import time
+from typing import List, Dict, Any, Iterable, Tuple
+
+try:
+    import numpy as np
+except ImportError:  # Optional, see the "memory" extra
+    np = None
+
+from app.storage.snapshot import CatalogSnapshot
+from app.search.background import BackgroundIndex
+from app.search.facets import top_values
+from app.search.results import add_meta, empty_result, exact_total, scored
+from app.search.tokenize import identifier_terms, identifier_words
+
+logger = logging.getLogger(__name__)
+
+# Weight of a term occurrence in each kind of column
+NAME_WEIGHT = 4
+ID_WEIGHT = 2
+TEXT_WEIGHT = 1
+
+# BM25 parameters
+K1 = 1.2
+B = 0.75
+
+# Probe a posting list by binary search when it is this many times longer
+# than the list of candidate rows
+PROBE_RATIO = 8
+
+# Words that match more terms than this are intersected by merging their
+# posting lists rather than probing each of them
+MAX_PROBED_TERMS = 4
+
+MAX_FREQUENCY = 65535
+
+
+def _column(values: array):
+    """A snapshot column of string pool indexes, as an array without copying it."""
+    return np.frombuffer(values, dtype=np.uint32)
+
+
+def _best(scores, count: int):
+    """Positions of the ``count`` best scores, and of any score tied with the last."""
+    if count >= len(scores):
+        return np.arange(len(scores))
+    if count <= 0:
+        return np.arange(0)
+    threshold = np.partition(scores, len(scores) - count)[len(scores) - count]
+    return np.flatnonzero(scores >= threshold)
+
+
+class TermIndex:
+    """Inverted index over the rows of one entity type."""
+
+    __slots__ = ("terms", "offsets", "postings", "frequencies", "lengths", "length_norm")
+
+    def __init__(self, documents: Iterable[Iterable[Tuple[List[str], int]]]):
+        """Build the index.
+
+        Args:
+            documents: For each row, in row order, its (terms, weight) columns.
+        """
+        building: Dict[str, Tuple[array, array]] = {}
+        lengths = array("I")
+
+        for row, columns in enumerate(documents):
+            counts = Counter()
+            for terms, weight in columns:
+                for term in terms:
+                    counts[term] += weight
+
+            for term, count in counts.items():
+                entry = building.get(term)
+                if entry is None:
+                    entry = building[term] = (array("I"), array("H"))
+                entry[0].append(row)
+                entry[1].append(min(count, MAX_FREQUENCY))
+
+            lengths.append(sum(counts.values()))
+
+        # The posting lists of the sorted terms, end to end
+        self.terms = sorted(building)
+        self.offsets = np.zeros(len(self.terms) + 1, dtype=np.int64)
+        np.cumsum([len(building[term][0]) for term in self.terms], out=self.offsets[1:])
+        self.postings = np.frombuffer(
+            b"".join(building[term][0] for term in self.terms), dtype=np.uint32
+        )
+        self.frequencies = np.frombuffer(
+            b"".join(building[term][1] for term in self.terms), dtype=np.uint16
+        )
+
+        self.lengths = np.frombuffer(lengths, dtype=np.uint32)
+        average = self.lengths.mean() if len(lengths) else 0.0
+        self.length_norm = K1 * B / average if average else 0.0
+
+    def __len__(self) -> int:
+        return len(self.lengths)
+
+    def prefix_range(self, word: str) -> range:
+        """Positions in the vocabulary of the terms starting with a word."""
+        start = bisect_left(self.terms, word)
+        end = bisect_left(self.terms, word[:-1] + chr(ord(word[-1]) + 1))
+        return range(start, end)
+
+    def _idf(self, document_counts):
+        """BM25 inverse document frequency of terms, given the number of rows containing them."""
+        return np.log(1 + (len(self) - document_counts + 0.5) / (document_counts + 0.5))
+
+    def _scores(self, rows, frequencies, idf):
+        """BM25 contributions of term occurrences in rows."""
+        norms = K1 * (1 - B) + self.length_norm * self.lengths[rows]
+        return idf * frequencies * (K1 + 1) / (frequencies + norms)
+
+    def _matches(self, positions: range, start: int, end: int) -> Tuple:
+        """Rows in [start, end) containing any of the terms at some vocabulary positions.
+
+        Returns:
+            The sorted rows and their BM25 scores for these terms.
+        """
+        first, last = self.offsets[positions.start], self.offsets[positions.stop]
+        rows = self.postings[first:last]
+        frequencies = self.frequencies[first:last]
+        counts = np.diff(self.offsets[positions.start:positions.stop + 1])
+        idf = np.repeat(self._idf(counts), counts)
+
+        if len(positions) == 1:
+            lo, hi = np.searchsorted(rows, (start, end))
+            rows, frequencies, idf = rows[lo:hi], frequencies[lo:hi], idf[lo:hi]
+        else:
+            if start > 0 or end < len(self):
+                kept = (rows >= start) & (rows < end)
+                rows, frequencies, idf = rows[kept], frequencies[kept], idf[kept]
+            order = np.argsort(rows, kind="stable")
+            rows, frequencies, idf = rows[order], frequencies[order], idf[order]
+
+        scores = self._scores(rows, frequencies, idf)
+
+        if len(positions) > 1 and len(rows):
+            # Sum the scores of the terms found in the same row
+            firsts = np.flatnonzero(np.diff(rows, prepend=rows[0] + 1))
+            rows, scores = rows[firsts], np.add.reduceat(scores, firsts)
+        return rows, scores
+
+    def search(self, words: List[str], start: int = 0, end: int | None = None) -> Tuple:
+        """Find the rows matching every word as a term prefix.
+
+        Only the rows in [start, end) are read, e.g. those of a project.
+        Rows are intersected first, and scored with array operations.
+
+        Args:
+            words: The query words, lowercased.
+            start: The first row searched.
+            end: The row after the last row searched; by default, all rows.
+
+        Returns:
+            The matching rows, sorted, and their BM25 scores, as arrays.
+        """
+        end = len(self) if end is None else end
+        matched = []
+        for word in words:
+            positions = self.prefix_range(word)
+            if not positions:
+                return self.postings[:0], np.zeros(0)
+            size = self.offsets[positions.stop] - self.offsets[positions.start]
+            matched.append((size, positions))
+
+        # Start with the most selective word
+        matched.sort(key=lambda item: item[0])
+        rows, scores = self._matches(matched[0][1], start, end)
+
+        for size, positions in matched[1:]:
+            if not len(rows):
+                break
+            if len(positions) <= MAX_PROBED_TERMS and size > PROBE_RATIO * len(rows):
+                rows, scores = self._probe(positions, rows, scores)
+            else:
+                other_rows, other_scores = self._matches(positions, start, end)
+                rows, kept, other = np.intersect1d(
+                    rows, other_rows, assume_unique=True, return_indices=True
+                )
+                scores = scores[kept] + other_scores[other]
+
+        return rows, scores
+
+    def _probe(self, positions: range, rows, scores) -> Tuple:
+        """Keep the rows containing any of the terms, by binary search, adding their scores."""
+        found = np.zeros(len(rows), dtype=bool)
+        scores = scores.copy()
+
+        for position in positions:
+            first, last = self.offsets[position], self.offsets[position + 1]
+            postings = self.postings[first:last]
+            i = np.minimum(np.searchsorted(postings, rows), len(postings) - 1)
+            hits = postings[i] == rows
+            if hits.any():
+                scores[hits] += self._scores(
+                    rows[hits], self.frequencies[first:last][i[hits]], self._idf(last - first)
+                )
+                found |= hits
+
+        return rows[found], scores[found]
+
+
+class CatalogIndex:
+    """Inverted indexes of the datasets, tables and fields of a snapshot."""
+
+    __slots__ = ("snapshot", "datasets", "tables", "fields", "field_tables", "project_fields", "codes")
+
+    def __init__(self, snapshot: CatalogSnapshot):
+        """Build the indexes.
+
+        Args:
+            snapshot: The snapshot to index.
+        """
+        started = time.monotonic()
+        self.snapshot = snapshot
+        strings = snapshot.strings.values
+
+        # Terms of each distinct string, computed once
+        cache: Dict[int, List[str]] = {0: []}
+
+        def terms(index: int) -> List[str]:
+            value = cache.get(index)
+            if value is None:
+                value = cache[index] = identifier_terms(strings[index])
+            return value
+
+        s = snapshot
+        self.datasets = TermIndex(
+            (
+                (terms(s.ds_name[i]), NAME_WEIGHT),
+                (terms(s.ds_friendly_name[i]), ID_WEIGHT),
+                (terms(s.ds_description[i]), TEXT_WEIGHT),
+            )
+            for i in range(len(s.ds_name))
+        )
+        self.tables = TermIndex(
+            (
+                (terms(s.tb_name[i]), NAME_WEIGHT),
+                (terms(s.tb_full_id[i]), ID_WEIGHT),
+                (terms(s.tb_friendly_name[i]), ID_WEIGHT),
+                (terms(s.tb_description[i]), TEXT_WEIGHT),
+            )
+            for i in range(len(s.tb_name))
+        )
+
+        # Table of each field, from the field ranges of the tables
+        self.field_tables = array("I", bytes(4 * len(s.f_name)))
+        for table_index in range(len(s.tb_name)):
+            for i in range(s.tb_field_start[table_index], s.tb_field_end[table_index]):
+                self.field_tables[i] = table_index
+
+        def field_full_id(i: int) -> List[str]:
+            override = s.f_full_id_overrides.get(i)
+            if override is not None:
+                return identifier_terms(override)
+            return terms(s.tb_full_id[self.field_tables[i]]) + terms(s.f_name[i])
+
+        self.fields = TermIndex(
+            (
+                (terms(s.f_name[i]), NAME_WEIGHT),
+                (field_full_id(i), ID_WEIGHT),
+                (terms(s.f_description[i]), TEXT_WEIGHT),
+                (terms(s.f_type[i]), TEXT_WEIGHT),
+            )
+            for i in range(len(s.f_name))
+        )
+
+        # Field rows of each project, which are contiguous like its tables
+        self.project_fields: Dict[str, Tuple[int, int]] = {}
+        for project_id, (start, end) in s.project_tables.items():
+            ranges = [
+                (s.tb_field_start[i], s.tb_field_end[i]) for i in range(start, end)
+                if s.tb_field_end[i] > s.tb_field_start[i]
+            ]
+            self.project_fields[project_id] = (
+                (min(r[0] for r in ranges), max(r[1] for r in ranges)) if ranges else (0, 0)
+            )
+
+        # String pool index of each facet value, to filter by
+        self.codes: Dict[str, int] = {
+            strings[code]: code
+            for column in (s.ds_project, s.ds_name, s.tb_project, s.tb_dataset, s.tb_type, s.f_type)
+            for code in np.unique(_column(column)).tolist()
+        }
+
+        logger.info(
+            f"Built search index of catalog version {snapshot.version}: "
+            f"{len(self.datasets.terms) + len(self.tables.terms) + len(self.fields.terms)} terms "
+            f"in {time.monotonic() - started:.1f}s"
+        )
+
+    @property
+    def version(self) -> int:
+        """The catalog version of the indexed snapshot."""
+        return self.snapshot.version
+
+    def search(
+        self,
+        query: str,
+        project_id: str | None = None,
+        entity_type: str | None = None,
+        limit: int | None = None,
+        offset: int = 0,
+        facets: bool = False,
+        filters: Dict[str, str] | None = None
+    ) -> Dict[str, Any]:
+        """Search for datasets, tables, and fields.
+
+        Only the rows of ``project_id`` are read. Matches are filtered and
+        scored with array operations, and only the matches that can make the
+        page are sorted. Facets are counted over all the matching rows.
+
+        Args:
+            query: The search query.
+            project_id: Optional project ID to filter by.
+            entity_type: Optional entity type to filter by ('dataset', 'table', or 'field').
+            limit: Optional number of results per entity type.
+            offset: Number of results per entity type to skip.
+            facets: Whether to add the ``facets`` of the matches of each entity
+                type, see ``app.search.facets``.
+            filters: Optional facet values to filter by.
+
+        Returns:
+            Dict with datasets, tables, and fields that match the query, each
+            ordered by relevance, then in catalog order, and ``meta`` with
+            exact totals if paged.
+        """
+        result = empty_result()
+        totals = {}
+        words = list(dict.fromkeys(identifier_words(query)))
+
+        if not words:
+            return add_meta(result, limit, offset, totals)
+
+        s = self.snapshot
+        tables = self.field_tables
+        field_tables = _column(tables)
+        # Facet name -> function giving the string pool indexes of the values of rows
+        entities = [
+            ("datasets", "dataset", self.datasets, s.dataset, s.project_datasets, {
+                "project": lambda rows: _column(s.ds_project)[rows],
+                "dataset": lambda rows: _column(s.ds_name)[rows],
+            }),
+            ("tables", "table", self.tables, s.table, s.project_tables, {
+                "project": lambda rows: _column(s.tb_project)[rows],
+                "dataset": lambda rows: _column(s.tb_dataset)[rows],
+                "table_type": lambda rows: _column(s.tb_type)[rows],
+            }),
+            ("fields", "field", self.fields, lambda i: s.field(i, tables[i]), self.project_fields, {
+                "project": lambda rows: _column(s.tb_project)[field_tables[rows]],
+                "dataset": lambda rows: _column(s.tb_dataset)[field_tables[rows]],
+                "field_type": lambda rows: _column(s.f_type)[rows],
+            }),
+        ]
+
+        for key, name, index, to_result, project_rows, columns in entities:
+            if entity_type and entity_type.lower() != name:
+                continue
+
+            start, end = project_rows.get(project_id, (0, 0)) if project_id else (0, len(index))
+            rows, scores = index.search(words, start, end)
+
+            for facet, value in (filters or {}).items():
+                values_of = columns.get(facet)
+                if values_of is None or value not in self.codes:
+                    rows, scores = rows[:0], scores[:0]
+                else:
+                    kept = values_of(rows) == self.codes[value]
+                    rows, scores = rows[kept], scores[kept]
+
+            if facets:
+                result.setdefault("facets", {})[key] = self._count_facets(rows, columns)
+
+            if limit is None:
+                selected = np.arange(len(rows))
+            else:
+                selected = _best(scores, offset + limit)
+            # Best first, then in catalog order
+            selected = selected[np.lexsort((rows[selected], -scores[selected]))]
+            if limit is not None:
+                selected = selected[offset:offset + limit]
+
+            totals[key] = exact_total(len(rows))
+            result[key] = [
+                scored(to_result(row), score)
+                for row, score in zip(rows[selected].tolist(), scores[selected].tolist())
+            ]
+
+        return add_meta(result, limit, offset, totals)
+
+    def _count_facets(self, rows, columns) -> Dict[str, List[Dict[str, Any]]]:
+        """Count matching rows by facet value, see ``app.search.facets.top_values``."""
+        strings = self.snapshot.strings.values
+        counts = []
+        for facet, values_of in columns.items():
+            codes, code_counts = np.unique(values_of(rows), return_counts=True)
+            counts.extend(
+                (facet, strings[code], count)
+                for code, count in zip(codes.tolist(), code_counts.tolist())
+            )
+        return top_values(counts)
+
+
+class InMemorySearch(BackgroundIndex):
+    """Search backend answering from a ``CatalogIndex`` of the current catalog."""
+
+    label = "search index"
+
+    def __init__(self, db):
+        """Initialize the holder; the index is built on first use.
+
+        Args:
+            db: The database holding the catalog.
+        """
+        super().__init__(db)
+        self._warned = False
+
+    def available(self) -> bool:
+        """Whether numpy is installed."""
+        if np is None and not self._warned:
+            logger.warning("The in-memory search backend needs numpy: pip install .[memory]")
+            self._warned = True
+        return np is not None
+
+    def _build(self, previous: CatalogIndex | None) -> CatalogIndex:
+        """Index the snapshot of the current catalog."""
+        snapshot = self.db.load_snapshot()
+        if previous is not None and previous.version == snapshot.version:
+            return previous
+        return CatalogIndex(snapshot)
+
+    def search(
+        self,
+        query: str,
+        project_id: str | None = None,
+        entity_type: str | None = None,
+        limit: int | None = None,
+        offset: int = 0,
+        facets: bool = False,
+        filters: Dict[str, str] | None = None
+    ) -> Dict[str, Any]:
+        """Search for datasets, tables, and fields.
+
+        Args:
+            query: The search query.
+            project_id: Optional project ID to filter by.
+            entity_type: Optional entity type to filter by ('dataset', 'table', or 'field').
+            limit: Optional number of results per entity type.
+            offset: Number of results per entity type to skip.
+            facets: Whether to add the facets of the matches.
+            filters: Optional facet values to filter by.
+
+        Returns:
+            Dict with datasets, tables, and fields that match the query.
+        """
+        return self.index().search(
+            query, project_id=project_id, entity_type=entity_type, limit=limit, offset=offset,
+            facets=facets, filters=filters
+        )
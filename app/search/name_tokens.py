@@ -0,0 +1,286 @@
+"""
+Search backend over the token index of names and full IDs.
+
+Query words are split like the indexed names (``app.search.tokenize``), so
+``user id``, ``userId`` and ``USER_ID`` all look up the tokens ``user`` and
+``id``. Every word must be a prefix of a token of the row's name or full ID;
+each word is an index range lookup on ``name_tokens`` instead of ``ILIKE``
+predicates scanning the catalog tables. Descriptions, friendly names and
+field types are not indexed, so they are not searched.
+
+The tokens are written with the catalog rows; databases created before
+they existed are filled by ``alembic upgrade head`` (revision 0009).
+
+``batch_search`` answers many queries with one statement per entity type:
+the words of all the queries are a ``VALUES`` list joined against the
+tokens, and a window function keeps the best rows of each query.
+"""
+import logging
+from typing import List, Dict, Any, Sequence, Tuple
+
+from sqlalchemy import Integer, String, and_, case, func, select, text
+
+from app.storage.db import Database, visible
+from app.storage.models import DatasetModel, TableModel, FieldModel, NameTokenModel
+from app.search.facets import facet_counts, filter_facets
+from app.search.results import (
+    add_meta, dataset_result, empty_result, exact_total, field_result, name_score, ranked_rows, scored,
+    table_result
+)
+from app.search.tokenize import identifier_words
+
+logger = logging.getLogger(__name__)
+
+# Words of a batch query looked up, the others are ignored
+MAX_BATCH_WORDS = 8
+
+# Rows of the VALUES list of one statement, well within the bound
+# parameters SQLite and PostgreSQL accept
+BATCH_STATEMENT_ROWS = 2000
+
+
+def _token_prefix(entity_type: str, word: str):
+    """Select the IDs of the rows having a token starting with a word."""
+    return select(NameTokenModel.entity_id).where(
+        NameTokenModel.entity_type == entity_type,
+        NameTokenModel.token >= word,
+        NameTokenModel.token < word[:-1] + chr(ord(word[-1]) + 1)
+    )
+
+
+def _values(rows: Sequence[Tuple], columns: Dict[str, Any], name: str):
+    """Select literal rows, as a ``VALUES`` list both SQLite and PostgreSQL accept.
+
+    Args:
+        rows: The rows, as tuples of bound values.
+        columns: The names and types of their columns.
+        name: The name of the subquery.
+
+    Returns:
+        The subquery.
+    """
+    params = {}
+    tuples = []
+    for i, row in enumerate(rows):
+        keys = [f"{name}_{i}_{j}" for j in range(len(row))]
+        params.update(zip(keys, row))
+        tuples.append(f"({', '.join(':' + key for key in keys)})")
+
+    # VALUES columns are named column1, column2... by both databases
+    selected = ", ".join(f"column{j + 1} AS {column}" for j, column in enumerate(columns))
+    return text(
+        f"SELECT {selected} FROM (VALUES {', '.join(tuples)}) AS {name}_values"
+    ).bindparams(**params).columns(**columns).subquery(name)
+
+
+class NameTokenSearch:
+    """Search matching query words against the tokens of names and full IDs."""
+
+    def __init__(self, db: Database):
+        """Initialize the backend.
+
+        Args:
+            db: The database to search.
+        """
+        self.db = db
+        self._available = None
+
+    def available(self) -> bool:
+        """Whether the token index covers the catalog.
+
+        Returns:
+            True if there are tokens, or no catalog rows to index.
+        """
+        if self._available is None:
+            with self.db.get_session() as session:
+                self._available = (
+                    session.query(NameTokenModel.entity_id).first() is not None
+                    or session.query(DatasetModel.id).first() is None
+                )
+
+            if not self._available:
+                logger.warning(
+                    "The name token index is empty, falling back to LIKE search. "
+                    "Run `alembic upgrade head` to fill it."
+                )
+
+        return self._available
+
+    def search(
+        self,
+        query: str,
+        project_id: str | None = None,
+        entity_type: str | None = None,
+        limit: int | None = None,
+        offset: int = 0,
+        facets: bool = False,
+        filters: Dict[str, str] | None = None
+    ) -> Dict[str, Any]:
+        """Search for datasets, tables, and fields.
+
+        Args:
+            query: The search query.
+            project_id: Optional project ID to filter by.
+            entity_type: Optional entity type to filter by ('dataset', 'table', or 'field').
+            limit: Optional number of results per entity type.
+            offset: Number of results per entity type to skip.
+            facets: Whether to add the ``facets`` of the matches of each entity
+                type, see ``app.search.facets``.
+            filters: Optional facet values to filter by.
+
+        Returns:
+            Dict with datasets, tables, and fields whose names or full IDs
+            have a token starting with every word of the query, exact and
+            prefix name matches first, and ``meta`` if paged.
+        """
+        result = empty_result()
+        totals = {}
+        words = list(dict.fromkeys(identifier_words(query)))
+
+        if not words:
+            return add_meta(result, limit, offset, totals)
+
+        entities = [
+            ("datasets", NameTokenModel.DATASET, DatasetModel, dataset_result, DatasetModel.dataset_name),
+            ("tables", NameTokenModel.TABLE, TableModel, table_result, TableModel.table_name),
+            ("fields", NameTokenModel.FIELD, FieldModel, field_result, FieldModel.name),
+        ]
+
+        with self.db.get_session() as session:
+            for key, name, model, to_result, name_column in entities:
+                if entity_type and entity_type.lower() != name:
+                    continue
+
+                rows_query = session.query(model).filter(visible(model))
+
+                if project_id:
+                    rows_query = rows_query.filter(model.project_id == project_id)
+
+                rows_query = filter_facets(rows_query, model, filters)
+
+                for word in words:
+                    rows_query = rows_query.filter(model.id.in_(_token_prefix(name, word)))
+
+                rows, totals[key] = ranked_rows(
+                    session, rows_query, name_score(name_column, words), model.full_id, limit, offset
+                )
+                result[key] = [scored(to_result(row), value) for row, value in rows]
+
+                if facets:
+                    result.setdefault("facets", {})[key] = facet_counts(session, rows_query, model)
+
+        return add_meta(result, limit, offset, totals)
+
+    def batch_search(
+        self,
+        queries: Sequence[Tuple[str, int]],
+        project_id: str | None = None,
+        entity_type: str | None = None
+    ) -> List[Dict[str, Any]]:
+        """Run many searches together, matching whole words of names and full IDs.
+
+        Each entity type is searched with one statement for all the queries
+        (or for each ``BATCH_STATEMENT_ROWS`` of their words), so a batch
+        costs a few round trips whatever its size. A row matches a
+        query when its tokens include every word of the query; names made of
+        the words of the query rank first, whatever their case and
+        underscores, then names starting with them.
+
+        Args:
+            queries: The (query, limit) of each search.
+            project_id: Optional project ID to filter by.
+            entity_type: Optional entity type to filter by ('dataset', 'table', or 'field').
+
+        Returns:
+            The result of each query, in order, with ``meta`` totals.
+        """
+        results = [empty_result() for _ in queries]
+        totals: List[Dict[str, Any]] = [{} for _ in queries]
+
+        # The words of each query, in statements of at most BATCH_STATEMENT_ROWS
+        chunks = [[]]
+        for query_id, (query, limit) in enumerate(queries):
+            words = list(dict.fromkeys(identifier_words(query)))[:MAX_BATCH_WORDS]
+            if len(chunks[-1]) + len(words) > BATCH_STATEMENT_ROWS:
+                chunks.append([])
+            chunks[-1].extend(
+                (query_id, word, len(words), limit, "".join(words)) for word in words
+            )
+
+        entities = [
+            ("datasets", NameTokenModel.DATASET, DatasetModel, dataset_result, DatasetModel.dataset_name),
+            ("tables", NameTokenModel.TABLE, TableModel, table_result, TableModel.table_name),
+            ("fields", NameTokenModel.FIELD, FieldModel, field_result, FieldModel.name),
+        ]
+
+        with self.db.get_session() as session:
+            for key, name, model, to_result, name_column in entities:
+                if entity_type and entity_type.lower() != name:
+                    continue
+
+                for batch_rows in filter(None, chunks):
+                    for row in session.execute(
+                        self._batch_statement(batch_rows, name, model, name_column, project_id)
+                    ):
+                        results[row.query_id][key].append(scored(to_result(row), row.score))
+                        totals[row.query_id][key] = exact_total(row.total)
+
+        return [
+            add_meta(result, limit, 0, query_totals)
+            for result, query_totals, (_, limit) in zip(results, totals, queries)
+        ]
+
+    @staticmethod
+    def _batch_statement(batch_rows, entity_type: str, model, name_column, project_id):
+        """Select the best rows of each query of a batch for one entity type."""
+        batch = _values(
+            batch_rows,
+            {
+                "query_id": Integer, "word": String, "words": Integer, "page": Integer,
+                "query": String
+            },
+            "batch"
+        )
+
+        # Rows having a token for every word of a query: each word is an index
+        # lookup, and the rows found once per word are kept
+        matched = select(
+            batch.c.query_id,
+            NameTokenModel.entity_id,
+            func.max(batch.c.page).label("page"),
+            func.max(batch.c.query).label("query")
+        ).join(
+            NameTokenModel,
+            and_(NameTokenModel.entity_type == entity_type, NameTokenModel.token == batch.c.word)
+        ).group_by(
+            batch.c.query_id, NameTokenModel.entity_id
+        ).having(
+            func.count() == func.max(batch.c.words)
+        ).subquery("matched")
+
+        # Names without underscores, as the words of the query joined up
+        name = func.replace(func.lower(name_column), "_", "")
+        score = case(
+            (name == matched.c.query, 4),
+            (name.startswith(matched.c.query, autoescape=False), 2),
+            else_=1
+        )
+        window = {"partition_by": matched.c.query_id}
+        ranked = select(
+            *model.__table__.columns,
+            matched.c.query_id,
+            matched.c.page,
+            score.label("score"),
+            func.row_number().over(order_by=(score.desc(), model.full_id), **window).label("position"),
+            func.count().over(**window).label("total")
+        ).join(
+            matched, matched.c.entity_id == model.id
+        ).where(visible(model))
+
+        if project_id:
+            ranked = ranked.where(model.project_id == project_id)
+
+        ranked = ranked.subquery("ranked")
+        return select(ranked).where(ranked.c.position <= ranked.c.page).order_by(
+            ranked.c.query_id, ranked.c.position
+        )
@@ -0,0 +1,161 @@
+"""
+PostgreSQL full-text search backend.
+
+Migration 0007 adds a generated ``search_vector`` tsvector column to the
+datasets, tables and fields tables, with the entity name weighted above its
+full ID and description, and a GIN index on it. Searches match every term of
+the query as a word prefix and return the results ordered by ``ts_rank``.
+"""
+import logging
+import re
+from typing import Dict, Any
+
+from sqlalchemy import func, literal_column, text
+from sqlalchemy.dialects.postgresql import TSVECTOR
+
+from app.storage.db import Database, visible
+from app.storage.models import DatasetModel, TableModel, FieldModel
+from app.search.facets import facet_counts, filter_facets
+from app.search.results import (
+    add_meta, dataset_result, empty_result, field_result, ranked_rows, scored, table_result
+)
+
+logger = logging.getLogger(__name__)
+
+# Generated column holding the weighted document of each row
+SEARCH_VECTOR_COLUMN = "search_vector"
+
+# Text search configuration; identifiers should not be stemmed
+TS_CONFIG = "simple"
+
+# Characters that separate the words of a query, as the default parser does
+_WORD = re.compile(r"[^\W_]+")
+
+
+def prefix_tsquery(query: str) -> str | None:
+    """Build a tsquery matching every word of a query as a prefix.
+
+    Words are extracted the way ``to_tsvector`` splits identifiers, so
+    ``cust_id`` becomes ``cust:* & id:*``. Operators typed by the user are not
+    interpreted.
+
+    Args:
+        query: The search query.
+
+    Returns:
+        The tsquery text, or None if the query has no words.
+    """
+    words = _WORD.findall(query.lower())
+    if not words:
+        return None
+    return " & ".join(f"{word}:*" for word in words)
+
+
+class PostgresFullTextSearch:
+    """Ranked full-text search over the generated tsvector columns."""
+
+    def __init__(self, db: Database):
+        """Initialize the backend.
+
+        Args:
+            db: The database to search.
+        """
+        self.db = db
+        self._available = None
+
+    def available(self) -> bool:
+        """Whether migration 0007 has added the search columns.
+
+        Returns:
+            True if the fields table has the search vector column.
+        """
+        if self._available is None:
+            with self.db.get_session() as session:
+                self._available = session.execute(text(
+                    """
+                    SELECT EXISTS (
+                        SELECT 1 FROM information_schema.columns
+                        WHERE table_schema = current_schema()
+                            AND table_name = 'fields' AND column_name = :column
+                    )
+                    """
+                ), {"column": SEARCH_VECTOR_COLUMN}).scalar()
+
+            if not self._available:
+                logger.warning(
+                    "Full-text search columns are missing, falling back to LIKE search. "
+                    "Run `make migrate` to create them."
+                )
+
+        return self._available
+
+    def search(
+        self,
+        query: str,
+        project_id: str | None = None,
+        entity_type: str | None = None,
+        limit: int | None = None,
+        offset: int = 0,
+        facets: bool = False,
+        filters: Dict[str, str] | None = None
+    ) -> Dict[str, Any]:
+        """Search for datasets, tables, and fields.
+
+        Args:
+            query: The search query.
+            project_id: Optional project ID to filter by.
+            entity_type: Optional entity type to filter by ('dataset', 'table', or 'field').
+            limit: Optional number of results per entity type.
+            offset: Number of results per entity type to skip.
+            facets: Whether to add the ``facets`` of the matches of each entity
+                type, see ``app.search.facets``.
+            filters: Optional facet values to filter by.
+
+        Returns:
+            Dict with datasets, tables, and fields that match the query, each
+            ordered by relevance, and ``meta`` if paged.
+        """
+        result = empty_result()
+        totals = {}
+        tsquery_text = prefix_tsquery(query)
+
+        if tsquery_text is None:
+            return add_meta(result, limit, offset, totals)
+
+        entities = [
+            ("datasets", "dataset", DatasetModel, dataset_result),
+            ("tables", "table", TableModel, table_result),
+            ("fields", "field", FieldModel, field_result),
+        ]
+
+        with self.db.get_session() as session:
+            tsquery = func.to_tsquery(TS_CONFIG, tsquery_text)
+
+            for key, name, model, to_result in entities:
+                if entity_type and entity_type.lower() != name:
+                    continue
+
+                vector = literal_column(
+                    f"{model.__tablename__}.{SEARCH_VECTOR_COLUMN}", type_=TSVECTOR
+                )
+                rank = func.ts_rank(vector, tsquery)
+
+                rows_query = session.query(model).filter(
+                    visible(model),
+                    vector.op("@@")(tsquery)
+                )
+
+                if project_id:
+                    rows_query = rows_query.filter(model.project_id == project_id)
+
+                rows_query = filter_facets(rows_query, model, filters)
+
+                rows, totals[key] = ranked_rows(
+                    session, rows_query, rank, model.full_id, limit, offset
+                )
+                result[key] = [scored(to_result(row), value) for row, value in rows]
+
+                if facets:
+                    result.setdefault("facets", {})[key] = facet_counts(session, rows_query, model)
+
+        return add_meta(result, limit, offset, totals)
@@ -0,0 +1,333 @@
+"""
+Structured search queries, and their plans.
+
+A query is a list of terms, all of which must match::
+
+    name:cust* type:STRING dataset:sales "exact phrase" -deprecated
+
+``field:value`` compares a column: ``name``, ``type``, ``project``,
+``dataset``, ``table`` or ``description``. The value is matched exactly,
+as a prefix when it ends with ``*`` (``name:cust*``), or as a substring
+when it also starts with one (``name:*cust*``); ``description`` is always
+matched as a substring. Types are upper case, as in BigQuery. Words and
+quoted phrases without a field are substrings of the name, full ID or
+description, and ``-`` excludes what a term matches.
+
+Each entity type gets its own plan. Exact and prefix terms on a column
+leading a B-tree index are index lookups, ordered by the number of rows they
+select, the most selective first; every other term is a residual filter of
+the rows they find. The plan is what ``explain`` returns, with the plan of
+the database, which names the index it picked among the candidates of each
+lookup.
+"""
+import re
+from dataclasses import dataclass
+from typing import List, Dict, Any, Tuple
+
+from sqlalchemy import and_, false, func, literal_column, not_, or_, select
+from sqlalchemy.orm import Query, Session
+
+from app.storage.models import DatasetModel, TableModel, FieldModel
+from app.search.results import TOTAL_COUNT_CAP
+
+# Matches of a term
+EXACT = "exact"
+PREFIX = "prefix"
+SUBSTRING = "substring"
+
+# Terms without a field
+TEXT = "text"
+
+# Rows counted per lookup to order several lookups on SQLite, unless explained
+PROBE_ROWS = 1000
+
+# Columns compared by each field, for each entity type
+FIELD_COLUMNS = {
+    "name": {
+        DatasetModel: DatasetModel.dataset_name,
+        TableModel: TableModel.table_name,
+        FieldModel: FieldModel.name,
+    },
+    "type": {TableModel: TableModel.table_type, FieldModel: FieldModel.field_type},
+    "project": {model: model.project_id for model in (DatasetModel, TableModel, FieldModel)},
+    "dataset": {
+        DatasetModel: DatasetModel.dataset_name,
+        TableModel: TableModel.dataset_id,
+        FieldModel: FieldModel.dataset_id,
+    },
+    "table": {TableModel: TableModel.table_name, FieldModel: FieldModel.table_id},
+    "description": {model: model.description for model in (DatasetModel, TableModel, FieldModel)},
+}
+
+# A term: an optional "-", an optional "field:", then a quoted or bare value
+TERM_PATTERN = re.compile(r'(-?)(?:([A-Za-z_]+):)?(?:"([^"]*)"|(\S+))')
+
+
+@dataclass(frozen=True)
+class Predicate:
+    """A term of a structured query."""
+
+    field: str
+    value: str
+    match: str
+    negated: bool = False
+
+    def __str__(self) -> str:
+        value = f'"{self.value}"' if " " in self.value else self.value
+        if self.match == PREFIX:
+            value = f"{value}*"
+        elif self.match == SUBSTRING and self.field not in (TEXT, "description"):
+            value = f"*{value}*"
+        field = "" if self.field == TEXT else f"{self.field}:"
+        return f"{'-' if self.negated else ''}{field}{value}"
+
+
+def parse_query(text: str) -> List[Predicate]:
+    """Parse a structured query.
+
+    Args:
+        text: The query.
+
+    Returns:
+        Its terms, in order.
+
+    Raises:
+        ValueError: If a term has an unknown field or no value.
+    """
+    predicates = []
+    for match in TERM_PATTERN.finditer(text or ""):
+        negated, field, quoted, bare = match.groups()
+        field = field.lower() if field else TEXT
+
+        if field != TEXT and field not in FIELD_COLUMNS:
+            raise ValueError(
+                f"Unknown field '{field}', expected one of: {', '.join(FIELD_COLUMNS)}"
+            )
+
+        if quoted is not None:
+            # A quoted phrase is a substring of the text, an exact value of a field
+            value, kind = quoted, SUBSTRING if field == TEXT else EXACT
+        elif field == TEXT:
+            value, kind = bare.strip("*"), SUBSTRING
+        elif bare.startswith("*"):
+            value, kind = bare.strip("*"), SUBSTRING
+        elif bare.endswith("*"):
+            value, kind = bare.rstrip("*"), PREFIX
+        else:
+            value, kind = bare, EXACT
+
+        if field == "description":
+            kind = SUBSTRING
+        if field == "type":
+            value = value.upper()
+
+        if not value:
+            raise ValueError(f"Missing value in '{match.group(0)}'")
+
+        predicates.append(Predicate(field, value, kind, bool(negated)))
+
+    return predicates
+
+
+def form_predicates(terms: Dict[str, str]) -> List[Predicate]:
+    """Translate the fields of the advanced search form to substring terms.
+
+    Args:
+        terms: The ``name``, ``description`` and ``type`` searched for.
+
+    Returns:
+        The terms of the non-empty fields.
+    """
+    predicates = []
+    for field in ("name", "description", "type"):
+        value = (terms.get(field) or "").strip()
+        if value:
+            predicates.append(
+                Predicate(field, value.upper() if field == "type" else value, SUBSTRING)
+            )
+    return predicates
+
+
+def _indexes(model) -> Dict[str, List[str]]:
+    """Map the columns leading a B-tree index of a model to the index names."""
+    indexes = {}
+    for index in sorted(model.__table__.indexes, key=lambda index: index.name):
+        indexes.setdefault(index.expressions[0].name, []).append(index.name)
+    return indexes
+
+
+def _text_columns(model) -> Tuple:
+    """Columns searched by terms without a field."""
+    return (FIELD_COLUMNS["name"][model], model.full_id, model.description)
+
+
+def _clause(predicate: Predicate, model, unindexed: bool = False):
+    """Build the condition of a term on a model, negation aside.
+
+    ``unindexed`` writes the column as ``+column``, which SQLite cannot
+    look up in an index.
+    """
+    if predicate.field == TEXT:
+        return or_(*[
+            column.icontains(predicate.value, autoescape=True) for column in _text_columns(model)
+        ])
+
+    column = FIELD_COLUMNS[predicate.field][model]
+    if unindexed:
+        column = literal_column(f"+{model.__tablename__}.{column.name}", column.type)
+    value = predicate.value
+
+    if predicate.match == EXACT:
+        return column == value
+
+    if predicate.match == PREFIX:
+        # The range is an index scan, LIKE rechecks it under any collation
+        return and_(
+            column >= value,
+            column < value[:-1] + chr(ord(value[-1]) + 1),
+            column.startswith(value, autoescape=True)
+        )
+
+    return column.icontains(value, autoescape=True)
+
+
+@dataclass
+class PlanStep:
+    """A term of a plan, and how it is applied."""
+
+    predicate: Predicate
+    clause: Any
+    indexes: Tuple[str, ...] = ()
+    rows: int | None = None
+
+    def describe(self) -> Dict[str, Any]:
+        """Describe the step, as returned by ``explain``."""
+        return {
+            "term": str(self.predicate),
+            "access": "index" if self.indexes else "filter",
+            "indexes": list(self.indexes),
+            "rows": self.rows,
+        }
+
+
+def _estimate(session: Session, rows_query: Query, model, clause, cap: int) -> int:
+    """Count the rows a condition selects, up to ``cap``."""
+    matches = rows_query.filter(clause).order_by(None).with_entities(model.id).limit(
+        cap
+    ).subquery()
+    return session.execute(select(func.count()).select_from(matches)).scalar()
+
+
+def plan_query(
+    session: Session,
+    rows_query: Query,
+    model,
+    predicates: List[Predicate],
+    estimate: bool = False
+) -> List[PlanStep] | None:
+    """Order the terms of a query for an entity type.
+
+    Index lookups come first, the fewest rows first. Selectivities are
+    measured if asked, up to ``TOTAL_COUNT_CAP`` rows, and otherwise only
+    when there are several lookups to order on SQLite, which keeps no
+    statistics to pick an index: up to ``PROBE_ROWS`` rows each, an extra
+    index scan per lookup.
+
+    Args:
+        session: The session the search runs in.
+        rows_query: The query selecting the rows in scope.
+        model: The model it selects.
+        predicates: The terms of the query.
+        estimate: Whether to count the rows of every index lookup.
+
+    Returns:
+        The steps of the plan, or None if a term names a column the entity
+        type does not have, so nothing matches.
+    """
+    lookups = []
+    filters = []
+    indexes = _indexes(model)
+
+    for predicate in predicates:
+        if predicate.field != TEXT and model not in FIELD_COLUMNS[predicate.field]:
+            if predicate.negated:
+                continue
+            return None
+
+        clause = _clause(predicate, model)
+        if predicate.negated:
+            # Rows without a value are not excluded
+            filters.append(PlanStep(predicate, not_(func.coalesce(clause, false()))))
+            continue
+
+        column = None if predicate.field == TEXT else FIELD_COLUMNS[predicate.field][model]
+        candidates = indexes.get(column.name) if column is not None else None
+        if candidates and predicate.match in (EXACT, PREFIX):
+            lookups.append(PlanStep(predicate, clause, tuple(candidates)))
+        else:
+            filters.append(PlanStep(predicate, clause))
+
+    # Exact values are more selective than prefixes, and win ties
+    lookups.sort(key=lambda step: step.predicate.match != EXACT)
+    if estimate or (len(lookups) > 1 and session.get_bind().dialect.name == "sqlite"):
+        cap = TOTAL_COUNT_CAP if estimate else PROBE_ROWS
+        for step in lookups:
+            step.rows = _estimate(session, rows_query, model, step.clause, cap)
+        lookups.sort(key=lambda step: step.rows)
+
+    # Cheap comparisons first, substrings of the text last
+    filters.sort(key=lambda step: (step.predicate.match == SUBSTRING, step.predicate.field == TEXT))
+    return lookups + filters
+
+
+def apply_plan(rows_query: Query, model, steps: List[PlanStep], dialect: str) -> Query:
+    """Filter a query by the steps of a plan, in order.
+
+    When several lookups were measured, SQLite is kept off the indexes of
+    all but the most selective one, as it has no statistics to choose it;
+    PostgreSQL plans from its own.
+
+    Args:
+        rows_query: The query selecting the rows in scope.
+        model: The model it selects.
+        steps: The steps of the plan.
+        dialect: The name of the database dialect.
+
+    Returns:
+        The filtered query.
+    """
+    if not steps:
+        return rows_query
+
+    first = steps[0]
+    if dialect == "sqlite" and first.indexes and first.rows is not None:
+        steps = [first] + [
+            PlanStep(step.predicate, _clause(step.predicate, model, unindexed=True))
+            if step.indexes else step
+            for step in steps[1:]
+        ]
+    return rows_query.filter(and_(*[step.clause for step in steps]))
+
+
+def database_plan(session: Session, rows_query: Query) -> List[str]:
+    """Get the plan the database chooses for a query.
+
+    Args:
+        session: The session the search runs in.
+        rows_query: The query.
+
+    Returns:
+        The lines of ``EXPLAIN`` on PostgreSQL, of ``EXPLAIN QUERY PLAN`` on SQLite.
+    """
+    dialect = session.get_bind().dialect
+    compiled = rows_query.order_by(None).statement.compile(dialect=dialect)
+    prefix = "EXPLAIN" if dialect.name == "postgresql" else "EXPLAIN QUERY PLAN"
+    params = (
+        tuple(
+            compiled.params[compiled.escaped_bind_names.get(key, key)]
+            for key in compiled.positiontup
+        )
+        if compiled.positional else compiled.params
+    )
+    rows = session.connection().exec_driver_sql(f"{prefix} {compiled}", params)
+    return [str(row[-1]) for row in rows]
@@ -0,0 +1,232 @@
+"""
+Conversion of catalog rows into search results.
+
+All search backends return the same result shape, built by these helpers.
+
+Searches given a ``limit`` return one page per entity type, ranked by
+relevance, with a ``score`` in every result and the totals of every entity
+type in ``meta``. A total is ``{"value": n, "relation": "eq"}`` when exact.
+Counting every match of a broad query would cost as much as returning them,
+so counts stop at ``TOTAL_COUNT_CAP``: beyond it the relation is ``"gte"``,
+or ``"estimate"`` with the query planner's estimate on PostgreSQL.
+"""
+import logging
+from typing import List, Dict, Any
+
+from sqlalchemy import case, func, literal
+from sqlalchemy.orm import Query, Session
+
+logger = logging.getLogger(__name__)
+
+# Page size of searches when the caller does not give one
+DEFAULT_SEARCH_LIMIT = 50
+
+# Upper bound on the page size of searches
+MAX_SEARCH_LIMIT = 1000
+
+# Upper bounds on the queries of a batch search and on the results it returns
+MAX_BATCH_QUERIES = 1000
+MAX_BATCH_RESULTS = 10000
+
+# Matches counted exactly before falling back to an estimate
+TOTAL_COUNT_CAP = 10000
+
+# Entity types of a search result, in order
+ENTITY_KEYS = ("datasets", "tables", "fields")
+
+
+def empty_result() -> Dict[str, List[Dict[str, Any]]]:
+    """Result of a search that matched nothing."""
+    return {
+        "datasets": [],
+        "tables": [],
+        "fields": []
+    }
+
+
+def exact_total(value: int) -> Dict[str, Any]:
+    """Total of matches that were all counted."""
+    return {"value": value, "relation": "eq"}
+
+
+def add_meta(
+    result: Dict[str, Any],
+    limit: int | None,
+    offset: int,
+    totals: Dict[str, Dict[str, Any]]
+) -> Dict[str, Any]:
+    """Add the ``meta`` entry of a paged search to its result.
+
+    Unpaged searches (``limit`` None) are returned unchanged.
+
+    Args:
+        result: The result.
+        limit: The page size.
+        offset: The number of results skipped.
+        totals: The totals of the entity types searched.
+
+    Returns:
+        The result.
+    """
+    if limit is not None:
+        result["meta"] = {
+            "limit": limit,
+            "offset": offset,
+            "totals": {key: totals.get(key, exact_total(0)) for key in ENTITY_KEYS}
+        }
+    return result
+
+
+def scored(item: Dict[str, Any], score) -> Dict[str, Any]:
+    """Add the relevance score to a search result.
+
+    Scores keep 6 significant digits rather than decimal places, so the
+    small BM25 scores of common words still rank results.
+    """
+    item["score"] = float(f"{float(score or 0.0):.6g}")
+    return item
+
+
+def _planner_estimate(session: Session, query: Query) -> int | None:
+    """Number of rows PostgreSQL expects a query to return."""
+    try:
+        compiled = query.order_by(None).statement.compile(dialect=session.get_bind().dialect)
+        plan = session.connection().exec_driver_sql(
+            f"EXPLAIN (FORMAT JSON) {compiled}", compiled.params
+        ).scalar()
+        return int(plan[0]["Plan"]["Plan Rows"])
+    except Exception as e:
+        logger.warning(f"Could not estimate the number of matches: {e}")
+        return None
+
+
+def count_total(
+    session: Session,
+    query: Query,
+    limit: int,
+    offset: int,
+    page_size: int
+) -> Dict[str, Any]:
+    """Count the matches of a paged query cheaply.
+
+    A page that is not full gives the total for free. Otherwise at most
+    ``TOTAL_COUNT_CAP + 1`` matches are counted.
+
+    Args:
+        session: The session the query runs in.
+        query: The query selecting the matches, without limit and offset.
+        limit: The page size.
+        offset: The number of results skipped.
+        page_size: The number of results on the page.
+
+    Returns:
+        The total, with its relation.
+    """
+    if page_size < limit and (page_size or not offset):
+        return exact_total(offset + page_size)
+
+    count = query.order_by(None).limit(TOTAL_COUNT_CAP + 1).count()
+
+    if count <= TOTAL_COUNT_CAP:
+        return exact_total(count)
+
+    if session.get_bind().dialect.name == "postgresql":
+        estimate = _planner_estimate(session, query)
+        if estimate is not None:
+            return {"value": max(estimate, count), "relation": "estimate"}
+
+    return {"value": TOTAL_COUNT_CAP, "relation": "gte"}
+
+
+def ranked_rows(
+    session: Session,
+    query: Query,
+    score,
+    tiebreak,
+    limit: int | None,
+    offset: int
+):
+    """Run a search query, best matches first.
+
+    The database orders and limits the rows, so only the page is
+    materialized.
+
+    Args:
+        session: The session the query runs in.
+        query: The query selecting the matching rows.
+        score: The relevance expression, higher is better.
+        tiebreak: Column ordering rows of equal score.
+        limit: The page size, or None for all rows.
+        offset: The number of rows skipped.
+
+    Returns:
+        The (row, score) pairs, and the total of matches or None if not paged.
+    """
+    ranked = query.add_columns(score).order_by(score.desc(), tiebreak)
+
+    if limit is None:
+        return ranked.all(), None
+
+    rows = ranked.limit(limit).offset(offset).all()
+    return rows, count_total(session, query, limit, offset, len(rows))
+
+
+def name_score(name_column, terms: List[str]):
+    """Relevance of a LIKE match: exact names first, then name prefixes."""
+    score = literal(0)
+    for term in terms:
+        score = score + case(
+            (func.lower(name_column) == term.lower(), 4),
+            (name_column.ilike(f"{term}%"), 2),
+            (name_column.ilike(f"%{term}%"), 1),
+            else_=0
+        )
+    return score
+
+
+def total_label(total: Dict[str, Any]) -> str:
+    """Format a total for display, e.g. ``10,000+`` or ``~1,200,000``."""
+    value = f"{total['value']:,}"
+    if total["relation"] == "gte":
+        return f"{value}+"
+    if total["relation"] == "estimate":
+        return f"~{value}"
+    return value
+
+
+def dataset_result(ds) -> Dict[str, Any]:
+    """Convert a dataset row into a search result."""
+    return {
+        "id": ds.dataset_name,
+        "full_id": ds.full_id,
+        "project_id": ds.project_id,
+        "friendly_name": ds.friendly_name,
+        "description": ds.description
+    }
+
+
+def table_result(t) -> Dict[str, Any]:
+    """Convert a table row into a search result."""
+    return {
+        "id": t.table_name,
+        "full_id": t.full_id,
+        "dataset_id": t.dataset_id,
+        "project_id": t.project_id,
+        "friendly_name": t.friendly_name,
+        "description": t.description,
+        "table_type": t.table_type
+    }
+
+
+def field_result(f) -> Dict[str, Any]:
+    """Convert a field row into a search result."""
+    return {
+        "name": f.name,
+        "full_id": f.full_id,
+        "table_id": f.table_id,
+        "dataset_id": f.dataset_id,
+        "project_id": f.project_id,
+        "field_type": f.field_type,
+        "description": f.description,
+        "mode": f.mode
+    }
@@ -1,284 +1,689 @@
 """
 Search functionality for BigQuery metadata.
 """
-from sqlalchemy import or_, and_
-from typing import List, Dict, Any
+from sqlalchemy import and_, or_
+from typing import List, Dict, Any, Sequence, Tuple
 import logging
+import os
+import threading
 
-from app.storage.db import Database
+from app.storage.db import Database, visible
 from app.storage.models import DatasetModel, TableModel, FieldModel
+from app.search.background import BackgroundIndex
+from app.search.cache import SearchCache, normalize_text
+from app.search.executor import EntityExecutor
+from app.search.facets import facet_counts, filter_facets
+from app.search.fuzzy import FuzzySuggester
+from app.search.memory import InMemorySearch
+from app.search.name_tokens import NameTokenSearch
+from app.search.query_language import (
+    TEXT, apply_plan, database_plan, form_predicates, parse_query, plan_query
+)
+from app.search.postgres import PostgresFullTextSearch
+from app.search.results import (
+    ENTITY_KEYS, MAX_BATCH_RESULTS, add_meta, dataset_result, empty_result, field_result,
+    name_score, ranked_rows, scored, table_result
+)
+from app.search.semantic import SemanticSearch
+from app.search.similar import DEFAULT_SIMILAR, MIN_SIMILARITY, SimilarTables
+from app.search.sqlite_fts import SqliteFullTextSearch
+from app.search.suggest import DEFAULT_SUGGESTIONS, NameSuggester
+from app.search.trigram import PostgresTrigramSearch
 
 logger = logging.getLogger(__name__)
 
+# Backend used by search(): "auto" picks the best one for the database,
+# "trigram" prefers substring matching with the pg_trgm indexes, "memory"
+# searches an in-process inverted index of the catalog, "tokens" looks up the
+# words of names and full IDs in the name_tokens table and "like" always
+# uses the portable LIKE queries below
+SEARCH_BACKEND = os.environ.get("SEARCH_BACKEND", "auto")
+
 class MetadataSearch:
     """Search functionality for BigQuery metadata."""
     
     def __init__(self):
         """Initialize the search engine."""
         self.db = Database()
+        self._backend = None
+        self._backend_selected = False
+        self._trigram = None
+        self._trigram_selected = False
+        self._select_lock = threading.Lock()
+        self.cache = SearchCache.from_env()
+        self.executor = EntityExecutor.from_env()
+        self.fuzzy = FuzzySuggester(self.db)
+        self.suggester = NameSuggester(self.db)
+        self.semantic = SemanticSearch(self.db)
+        self.name_tokens = NameTokenSearch(self.db)
+        self.similar = SimilarTables(self.db)
+    
+    def _select_backend(self):
+        """Pick the search backend for the configured database.
+        
+        Returns:
+            A backend with a ``search`` method, or None to use the LIKE
+            queries of this class.
+        """
+        if SEARCH_BACKEND == "like":
+            return None
+        
+        if SEARCH_BACKEND == "memory":
+            backend = InMemorySearch(self.db)
+            if backend.available():
+                return backend
+        
+        if SEARCH_BACKEND == "trigram" and self.trigram is not None:
+            return self.trigram
+        
+        if SEARCH_BACKEND == "tokens" and self.name_tokens.available():
+            return self.name_tokens
+        
+        dialect = self.db.engine.dialect.name
+        
+        if dialect == "postgresql":
+            backend = PostgresFullTextSearch(self.db)
+            if backend.available():
+                return backend
+        elif dialect == "sqlite":
+            backend = SqliteFullTextSearch(self.db)
+            if backend.available():
+                return backend
+        
+        return self.trigram
+    
+    @property
+    def trigram(self):
+        """The pg_trgm backend, or None if the trigram indexes are missing.
+        
+        It also answers advanced_search(), whose substring conditions the
+        full-text backend cannot express.
+        """
+        if not self._trigram_selected:
+            self._trigram = None
+            if SEARCH_BACKEND != "like" and self.db.engine.dialect.name == "postgresql":
+                backend = PostgresTrigramSearch(self.db)
+                if backend.available():
+                    self._trigram = backend
+            self._trigram_selected = True
+        return self._trigram
+    
+    @property
+    def backend(self):
+        """The search backend, selected on first use."""
+        # The entity threads of the first search may get here together
+        with self._select_lock:
+            if not self._backend_selected:
+                self._backend = self._select_backend()
+                self._backend_selected = True
+        return self._backend
     
     def search(
         self, 
         query: str, 
         project_id: str | None = None,
-        entity_type: str | None = None
-    ) -> Dict[str, List[Dict[str, Any]]]:
+        entity_type: str | None = None,
+        limit: int | None = None,
+        offset: int = 0,
+        facets: bool = False,
+        filters: Dict[str, str] | None = None
+    ) -> Dict[str, Any]:
         """Search for datasets, tables, and fields.
         
+        Results are cached until the catalog changes, see ``app.search.cache``.
+        
         Args:
             query: The search query.
             project_id: Optional project ID to filter by.
             entity_type: Optional entity type to filter by ('dataset', 'table', or 'field').
+            limit: Optional number of results per entity type. Paged results
+                are ranked, carry a score and come with ``meta`` totals and
+                timings; their entity types are searched concurrently, see
+                ``app.search.executor``.
+            offset: Number of results per entity type to skip.
+            facets: Whether to count the matches of each entity type by
+                project, dataset, table type and field type, see
+                ``app.search.facets``.
+            filters: Optional facet values to filter by, e.g.
+                ``{"field_type": "STRING"}``.
             
         Returns:
-            Dict with datasets, tables, and fields that match the query.
+            Dict with datasets, tables, and fields that match the query, and
+            ``facets`` if requested.
         """
-        result = {
-            "datasets": [],
-            "tables": [],
-            "fields": []
-        }
-        
         # Skip if query is empty
         if not query or len(query.strip()) == 0:
+            return add_meta(empty_result(), limit, offset, {})
+        
+        filters = {name: value for name, value in (filters or {}).items() if value}
+        
+        def run():
+            return self._search(query, project_id, entity_type, limit, offset, facets, filters)
+        
+        if not self._index_ready():
+            # Searched with the LIKE queries until the index is built, uncached
+            return run()
+        
+        return self._cached(
+            "search", run,
+            query=normalize_text(query), project_id=project_id,
+            entity_type=normalize_text(entity_type), limit=limit, offset=offset,
+            facets=facets, filters=filters
+        )
+    
+    def fuzzy_search(
+        self,
+        query: str,
+        project_id: str | None = None,
+        entity_type: str | None = None,
+        limit: int | None = None,
+        offset: int = 0,
+        facets: bool = False,
+        filters: Dict[str, str] | None = None
+    ) -> Dict[str, Any]:
+        """Search, correcting typos in queries that match nothing.
+        
+        If the query finds nothing, it is looked up in the fuzzy name index
+        (``app.search.fuzzy``), and the closest correction is searched instead.
+        Queries are not corrected until the index is built in the background.
+        
+        Args:
+            query: The search query.
+            project_id: Optional project ID to filter by.
+            entity_type: Optional entity type to filter by ('dataset', 'table', or 'field').
+            limit: Optional number of results per entity type.
+            offset: Number of results per entity type to skip.
+            facets: Whether to add the facets of the matches.
+            filters: Optional facet values to filter by.
+            
+        Returns:
+            The result of ``search``. When the query was corrected, it also has
+            ``corrected_query``, the query searched, and ``suggestions``, the
+            corrections with their edit ``distance`` and catalog ``count``.
+        """
+        result = self.search(
+            query, project_id=project_id, entity_type=entity_type, limit=limit, offset=offset,
+            facets=facets, filters=filters
+        )
+        
+        if not query or not query.strip() or any(result[key] for key in ENTITY_KEYS):
+            return result
+        
+        if not self.fuzzy.ready():
+            return result
+        
+        suggestions = self.fuzzy.suggest(query)
+        
+        if not suggestions:
             return result
         
+        corrected = suggestions[0]["text"]
+        result = self.search(
+            corrected, project_id=project_id, entity_type=entity_type, limit=limit, offset=offset,
+            facets=facets, filters=filters
+        )
+        result["corrected_query"] = corrected
+        result["suggestions"] = suggestions
+        return result
+    
+    def semantic_search(
+        self,
+        query: str,
+        project_id: str | None = None,
+        entity_type: str | None = None,
+        limit: int | None = None,
+        offset: int = 0
+    ) -> Dict[str, Any]:
+        """Search by similarity of words rather than by matching them.
+        
+        Names, friendly names and descriptions are compared to the query as
+        hashed n-gram vectors (``app.search.semantic``), so results need not
+        contain every query word. Without numpy, or while the vectors are
+        built in the background, this is a regular ``search``.
+        
+        Args:
+            query: The search query.
+            project_id: Optional project ID to filter by.
+            entity_type: Optional entity type to filter by ('dataset', 'table', or 'field').
+            limit: Optional number of results per entity type.
+            offset: Number of results per entity type to skip.
+            
+        Returns:
+            Dict with datasets, tables, and fields most similar to the query
+            first, with their cosine similarity as score.
+        """
+        if not self.semantic.available() or not self.semantic.ready():
+            return self.search(
+                query, project_id=project_id, entity_type=entity_type, limit=limit, offset=offset
+            )
+        
+        if not query or len(query.strip()) == 0:
+            return add_meta(empty_result(), limit, offset, {})
+        
+        def run():
+            return self.semantic.search(
+                query, project_id=project_id, entity_type=entity_type, limit=limit, offset=offset
+            )
+        
+        return self._cached(
+            "semantic_search", run,
+            query=normalize_text(query), project_id=project_id,
+            entity_type=normalize_text(entity_type), limit=limit, offset=offset
+        )
+    
+    def batch_search(
+        self,
+        queries: Sequence[Tuple[str, int]],
+        project_id: str | None = None,
+        entity_type: str | None = None,
+        max_results: int = MAX_BATCH_RESULTS
+    ) -> Dict[str, Any]:
+        """Run many searches of names together.
+        
+        With the token index (``app.search.name_tokens``), all the queries
+        are answered by one statement per entity type, matching whole words
+        of names and full IDs. Otherwise each query is a regular ``search``.
+        
+        Args:
+            queries: The (query, limit) of each search; repeated queries are
+                searched once, with the largest limit.
+            project_id: Optional project ID to filter by.
+            entity_type: Optional entity type to filter by ('dataset', 'table', or 'field').
+            max_results: Maximum number of results of all the queries.
+            
+        Returns:
+            Dict with the ``results`` of each query, keyed by query, and
+            ``meta`` with the number of results ``returned`` and the queries
+            whose results were ``truncated`` to stay within ``max_results``.
+        """
+        limits: Dict[str, int] = {}
+        for query, limit in queries:
+            # No query can return more than the whole budget
+            limits[query] = min(max(limit, limits.get(query, 0)), max_results)
+        
+        if self.name_tokens.available():
+            results = self.name_tokens.batch_search(
+                list(limits.items()), project_id=project_id, entity_type=entity_type
+            )
+        else:
+            results = [
+                self.search(query, project_id=project_id, entity_type=entity_type, limit=limit)
+                for query, limit in limits.items()
+            ]
+        
+        # Spend the budget on the queries in order
+        budget = max_results
+        truncated = []
+        batch = {}
+        for query, result in zip(limits, results):
+            result = dict(result)
+            for key in ENTITY_KEYS:
+                if len(result[key]) > budget:
+                    result[key] = result[key][:budget]
+                    if query not in truncated:
+                        truncated.append(query)
+                budget -= len(result[key])
+            batch[query] = result
+        
+        return {
+            "results": batch,
+            "meta": {"returned": max_results - budget, "truncated": truncated}
+        }
+    
+    def similar_tables(
+        self,
+        dataset_id: str,
+        table_id: str,
+        project_id: str | None = None,
+        limit: int = DEFAULT_SIMILAR,
+        min_similarity: float = MIN_SIMILARITY
+    ) -> Dict[str, Any] | None:
+        """Find the tables whose columns are most like those of a table.
+        
+        Candidates come from the LSH buckets of the MinHash signatures of
+        table schemas (``app.search.similar``), and are ranked by the Jaccard
+        similarity of their (column name, type) sets.
+        
+        Args:
+            dataset_id: The dataset ID of the table.
+            table_id: The table ID.
+            project_id: Optional project ID of the table, and of the similar tables.
+            limit: Maximum number of similar tables.
+            min_similarity: Minimum Jaccard similarity of the similar tables.
+            
+        Returns:
+            Dict with the ``table`` and its ``similar`` tables, most similar
+            first, or None if the table does not exist.
+        """
+        def run():
+            return self.similar.similar(
+                dataset_id, table_id, project_id=project_id, limit=limit,
+                min_similarity=min_similarity
+            )
+        
+        return self._cached(
+            "similar_tables", run,
+            dataset_id=dataset_id, table_id=table_id, project_id=project_id, limit=limit,
+            min_similarity=min_similarity
+        )
+    
+    def suggest(self, prefix: str, limit: int = DEFAULT_SUGGESTIONS) -> List[Dict[str, Any]]:
+        """Complete a prefix with dataset, table and field names.
+        
+        Completions come from an in-process index (``app.search.suggest``),
+        so typeahead requests do not query the database.
+        
+        Args:
+            prefix: The typed prefix; case is ignored.
+            limit: Maximum number of completions.
+            
+        Returns:
+            Dicts with the ``text`` of each name and the ``count`` of catalog
+            entries carrying it, most common first.
+        """
+        return self.suggester.suggest(prefix, limit)
+    
+    def _search(
+        self,
+        query: str,
+        project_id: str | None,
+        entity_type: str | None,
+        limit: int | None,
+        offset: int,
+        facets: bool = False,
+        filters: Dict[str, str] | None = None
+    ) -> Dict[str, Any]:
+        """Run a search, bypassing the cache."""
+        if limit is None:
+            return self._search_entities(
+                query, project_id, entity_type, limit, offset, facets, filters
+            )
+        
+        def search_entity(name: str) -> Dict[str, Any]:
+            return self._search_entities(query, project_id, name, limit, offset, facets, filters)
+        
+        return self.executor.run(search_entity, entity_type, limit, offset)
+    
+    def _search_entities(
+        self,
+        query: str,
+        project_id: str | None,
+        entity_type: str | None,
+        limit: int | None,
+        offset: int,
+        facets: bool = False,
+        filters: Dict[str, str] | None = None
+    ) -> Dict[str, Any]:
+        """Search the entity types in turn, in one session."""
+        result = empty_result()
+        totals = {}
+        
+        if self.backend is not None and self._index_ready():
+            return self.backend.search(
+                query, project_id=project_id, entity_type=entity_type, limit=limit, offset=offset,
+                facets=facets, filters=filters
+            )
+        
         # Prepare search terms
-        search_terms = [f"%{term}%" for term in query.strip().split()]
+        search_terms = query.strip().split()
+        
+        entities = [
+            (
+                "datasets", "dataset", DatasetModel, dataset_result, DatasetModel.dataset_name,
+                (DatasetModel.dataset_name, DatasetModel.friendly_name, DatasetModel.description)
+            ),
+            (
+                "tables", "table", TableModel, table_result, TableModel.table_name,
+                (TableModel.table_name, TableModel.full_id, TableModel.friendly_name,
+                 TableModel.description)
+            ),
+            (
+                "fields", "field", FieldModel, field_result, FieldModel.name,
+                (FieldModel.name, FieldModel.full_id, FieldModel.description,
+                 FieldModel.field_type)
+            ),
+        ]
         
         with self.db.get_session() as session:
-            # Search datasets
-            if not entity_type or entity_type.lower() == 'dataset':
-                dataset_query = session.query(DatasetModel)
-                
-                if project_id:
-                    dataset_query = dataset_query.filter(DatasetModel.project_id == project_id)
-                
-                for term in search_terms:
-                    dataset_query = dataset_query.filter(
-                        or_(
-                            DatasetModel.dataset_name.ilike(term),
-                            DatasetModel.friendly_name.ilike(term),
-                            DatasetModel.description.ilike(term)
-                        )
-                    )
+            for key, name, model, to_result, name_column, columns in entities:
+                if entity_type and entity_type.lower() != name:
+                    continue
                 
-                datasets = dataset_query.all()
-                
-                result["datasets"] = [
-                    {
-                        "id": ds.dataset_name,
-                        "full_id": ds.full_id,
-                        "project_id": ds.project_id,
-                        "friendly_name": ds.friendly_name,
-                        "description": ds.description
-                    }
-                    for ds in datasets
-                ]
-            
-            # Search tables
-            if not entity_type or entity_type.lower() == 'table':
-                table_query = session.query(TableModel)
+                rows_query = session.query(model).filter(visible(model))
                 
                 if project_id:
-                    table_query = table_query.filter(TableModel.project_id == project_id)
-                
-                for term in search_terms:
-                    table_query = table_query.filter(
-                        or_(
-                            TableModel.table_name.ilike(term),
-                            TableModel.full_id.ilike(term),
-                            TableModel.friendly_name.ilike(term),
-                            TableModel.description.ilike(term)
-                        )
-                    )
+                    rows_query = rows_query.filter(model.project_id == project_id)
                 
-                tables = table_query.all()
-                
-                result["tables"] = [
-                    {
-                        "id": t.table_name,
-                        "full_id": t.full_id,
-                        "dataset_id": t.dataset_id,
-                        "project_id": t.project_id,
-                        "friendly_name": t.friendly_name,
-                        "description": t.description,
-                        "table_type": t.table_type
-                    }
-                    for t in tables
-                ]
-            
-            # Search fields
-            if not entity_type or entity_type.lower() == 'field':
-                field_query = session.query(FieldModel)
-                
-                if project_id:
-                    field_query = field_query.filter(FieldModel.project_id == project_id)
+                rows_query = filter_facets(rows_query, model, filters)
                 
                 for term in search_terms:
-                    field_query = field_query.filter(
-                        or_(
-                            FieldModel.name.ilike(term),
-                            FieldModel.full_id.ilike(term),
-                            FieldModel.description.ilike(term),
-                            FieldModel.field_type.ilike(term)
-                        )
+                    rows_query = rows_query.filter(
+                        or_(*[column.ilike(f"%{term}%") for column in columns])
                     )
                 
-                fields = field_query.all()
+                result[key], totals[key] = self._fetch(
+                    session, rows_query, model, to_result,
+                    name_score(name_column, search_terms), limit, offset
+                )
                 
-                result["fields"] = [
-                    {
-                        "name": f.name,
-                        "full_id": f.full_id,
-                        "table_id": f.table_id,
-                        "dataset_id": f.dataset_id,
-                        "project_id": f.project_id,
-                        "field_type": f.field_type,
-                        "description": f.description,
-                        "mode": f.mode
-                    }
-                    for f in fields
-                ]
+                if facets:
+                    result.setdefault("facets", {})[key] = facet_counts(session, rows_query, model)
         
-        return result
+        return add_meta(result, limit, offset, totals)
 
     def advanced_search(
         self,
         terms: Dict[str, str],
         project_id: str | None = None,
-        dataset_id: str | None = None
-    ) -> Dict[str, List[Dict[str, Any]]]:
+        dataset_id: str | None = None,
+        limit: int | None = None,
+        offset: int = 0,
+        query: str | None = None,
+        explain: bool = False
+    ) -> Dict[str, Any]:
         """Advanced search with specific filters.
         
+        Results are cached like those of ``search``.
+        
         Args:
             terms: Dict mapping field names to search terms.
                 Supported fields: name, description, type.
             project_id: Optional project ID to filter by.
             dataset_id: Optional dataset ID to filter by.
+            limit: Optional number of results per entity type.
+            offset: Number of results per entity type to skip.
+            query: Optional structured query, see ``app.search.query_language``;
+                the terms are added to it as substring terms.
+            explain: Whether to add the ``plan`` of each entity type.
             
         Returns:
             Dict with datasets, tables, and fields that match the query.
+            
+        Raises:
+            ValueError: If the structured query is invalid.
         """
-        result = {
-            "datasets": [],
-            "tables": [],
-            "fields": []
-        }
+        predicates = None
+        if query or explain:
+            predicates = form_predicates(terms) + parse_query(query)
+        
+        def run():
+            if predicates is not None:
+                return self._structured_search(
+                    predicates, project_id, dataset_id, limit, offset, explain
+                )
+            return self._advanced_search(terms, project_id, dataset_id, limit, offset)
+        
+        return self._cached(
+            "advanced_search", run,
+            terms={k: normalize_text(v) for k, v in terms.items() if v},
+            project_id=project_id, dataset_id=dataset_id, limit=limit, offset=offset,
+            query=" ".join((query or "").split()), explain=explain
+        )
+    
+    def _advanced_search(
+        self,
+        terms: Dict[str, str],
+        project_id: str | None,
+        dataset_id: str | None,
+        limit: int | None,
+        offset: int
+    ) -> Dict[str, Any]:
+        """Run an advanced search, bypassing the cache."""
+        result = empty_result()
+        totals = {}
         
         name_term = terms.get("name", "")
         description_term = terms.get("description", "")
         type_term = terms.get("type", "")
         
+        if self.trigram is not None:
+            return self.trigram.advanced_search(
+                terms, project_id=project_id, dataset_id=dataset_id, limit=limit, offset=offset
+            )
+        
+        # (key, model, converter, name column, name columns, type column, filtered by dataset)
+        entities = [
+            (
+                "datasets", DatasetModel, dataset_result, DatasetModel.dataset_name,
+                (DatasetModel.dataset_name,), None, False
+            ),
+            (
+                "tables", TableModel, table_result, TableModel.table_name,
+                (TableModel.table_name, TableModel.full_id), TableModel.table_type, True
+            ),
+            (
+                "fields", FieldModel, field_result, FieldModel.name,
+                (FieldModel.name, FieldModel.full_id), FieldModel.field_type, True
+            ),
+        ]
+        
         with self.db.get_session() as session:
-            # Search datasets
-            dataset_query = session.query(DatasetModel)
-            
-            if project_id:
-                dataset_query = dataset_query.filter(DatasetModel.project_id == project_id)
-            
-            conditions = []
-            
-            if name_term:
-                conditions.append(DatasetModel.dataset_name.ilike(f"%{name_term}%"))
-            
-            if description_term:
-                conditions.append(DatasetModel.description.ilike(f"%{description_term}%"))
-            
-            if conditions:
-                dataset_query = dataset_query.filter(and_(*conditions))
-                datasets = dataset_query.all()
+            for key, model, to_result, name_column, name_columns, type_column, by_dataset in entities:
+                rows_query = session.query(model).filter(visible(model))
                 
-                result["datasets"] = [
-                    {
-                        "id": ds.dataset_name,
-                        "full_id": ds.full_id,
-                        "project_id": ds.project_id,
-                        "friendly_name": ds.friendly_name,
-                        "description": ds.description
-                    }
-                    for ds in datasets
-                ]
-            
-            # Search tables
-            table_query = session.query(TableModel)
-            
-            if project_id:
-                table_query = table_query.filter(TableModel.project_id == project_id)
+                if project_id:
+                    rows_query = rows_query.filter(model.project_id == project_id)
                 
-            if dataset_id:
-                table_query = table_query.filter(TableModel.dataset_id == dataset_id)
-            
-            conditions = []
-            
-            if name_term:
-                conditions.append(or_(
-                    TableModel.table_name.ilike(f"%{name_term}%"),
-                    TableModel.full_id.ilike(f"%{name_term}%")
-                ))
-            
-            if description_term:
-                conditions.append(TableModel.description.ilike(f"%{description_term}%"))
-            
-            if type_term:
-                conditions.append(TableModel.table_type.ilike(f"%{type_term}%"))
-            
-            if conditions:
-                table_query = table_query.filter(and_(*conditions))
-                tables = table_query.all()
+                if dataset_id and by_dataset:
+                    rows_query = rows_query.filter(model.dataset_id == dataset_id)
                 
-                result["tables"] = [
-                    {
-                        "id": t.table_name,
-                        "full_id": t.full_id,
-                        "dataset_id": t.dataset_id,
-                        "project_id": t.project_id,
-                        "friendly_name": t.friendly_name,
-                        "description": t.description,
-                        "table_type": t.table_type
-                    }
-                    for t in tables
-                ]
-            
-            # Search fields
-            field_query = session.query(FieldModel)
-            
-            if project_id:
-                field_query = field_query.filter(FieldModel.project_id == project_id)
+                conditions = []
                 
-            if dataset_id:
-                field_query = field_query.filter(FieldModel.dataset_id == dataset_id)
-            
-            conditions = []
-            
-            if name_term:
-                conditions.append(or_(
-                    FieldModel.name.ilike(f"%{name_term}%"),
-                    FieldModel.full_id.ilike(f"%{name_term}%")
-                ))
-            
-            if description_term:
-                conditions.append(FieldModel.description.ilike(f"%{description_term}%"))
-            
-            if type_term:
-                conditions.append(FieldModel.field_type.ilike(f"%{type_term}%"))
-            
-            if conditions:
-                field_query = field_query.filter(and_(*conditions))
-                fields = field_query.all()
+                if name_term:
+                    conditions.append(or_(*[c.ilike(f"%{name_term}%") for c in name_columns]))
+                
+                if description_term:
+                    conditions.append(model.description.ilike(f"%{description_term}%"))
+                
+                if type_term and type_column is not None:
+                    conditions.append(type_column.ilike(f"%{type_term}%"))
+                
+                if conditions:
+                    rows_query = rows_query.filter(and_(*conditions))
+                    result[key], totals[key] = self._fetch(
+                        session, rows_query, model, to_result,
+                        name_score(name_column, [name_term] if name_term else []),
+                        limit, offset
+                    )
+        
+        return add_meta(result, limit, offset, totals)
+    
+    def _structured_search(
+        self,
+        predicates,
+        project_id: str | None,
+        dataset_id: str | None,
+        limit: int | None,
+        offset: int,
+        explain: bool
+    ) -> Dict[str, Any]:
+        """Run a structured query along its plans, bypassing the cache."""
+        result = empty_result()
+        totals = {}
+        plans = {}
+        
+        if not predicates:
+            return add_meta(result, limit, offset, totals)
+        
+        # Names and text terms rank results like the name of the field mode
+        name_terms = [
+            p.value for p in predicates if p.field in (TEXT, "name") and not p.negated
+        ]
+        
+        # (key, model, converter, name column, filtered by dataset)
+        entities = [
+            ("datasets", DatasetModel, dataset_result, DatasetModel.dataset_name, False),
+            ("tables", TableModel, table_result, TableModel.table_name, True),
+            ("fields", FieldModel, field_result, FieldModel.name, True),
+        ]
+        
+        with self.db.get_session() as session:
+            for key, model, to_result, name_column, by_dataset in entities:
+                rows_query = session.query(model).filter(visible(model))
                 
-                result["fields"] = [
-                    {
-                        "name": f.name,
-                        "full_id": f.full_id,
-                        "table_id": f.table_id,
-                        "dataset_id": f.dataset_id,
-                        "project_id": f.project_id,
-                        "field_type": f.field_type,
-                        "description": f.description,
-                        "mode": f.mode
+                if project_id:
+                    rows_query = rows_query.filter(model.project_id == project_id)
+                
+                if dataset_id and by_dataset:
+                    rows_query = rows_query.filter(model.dataset_id == dataset_id)
+                
+                steps = plan_query(session, rows_query, model, predicates, estimate=explain)
+                if steps is None:
+                    plans[key] = {"steps": [], "database": [], "skipped": True}
+                    continue
+                
+                rows_query = apply_plan(rows_query, model, steps, self.db.engine.dialect.name)
+                result[key], totals[key] = self._fetch(
+                    session, rows_query, model, to_result, name_score(name_column, name_terms),
+                    limit, offset
+                )
+                
+                if explain:
+                    plans[key] = {
+                        "steps": [step.describe() for step in steps],
+                        "database": database_plan(session, rows_query),
+                        "skipped": False
                     }
-                    for f in fields
-                ]
         
-        return result
+        if explain:
+            result["plan"] = plans
+        return add_meta(result, limit, offset, totals)
+    
+    def _index_ready(self) -> bool:
+        """Whether the backend can search without building its in-process index.
+        
+        The index is built in the background instead, as a build cannot be
+        cancelled at the deadline of the entity types.
+        """
+        backend = self.backend
+        return not isinstance(backend, BackgroundIndex) or backend.ready()
+    
+    def _cached(self, kind: str, run, **params) -> Dict[str, Any]:
+        """Serve a search from the cache of the current catalog version.
+        
+        Args:
+            kind: The search method.
+            run: Function running the search.
+            **params: The normalized search parameters.
+            
+        Returns:
+            The result.
+        """
+        if not self.cache.enabled:
+            return run()
+        
+        version = self.db.catalog_version()
+        return self.cache.get_or_compute(self.cache.key(kind, version, **params), version, run)
+    
+    def _fetch(self, session, rows_query, model, to_result, score, limit, offset):
+        """Run a LIKE query, ranked and paged if a limit is given.
+        
+        Returns:
+            The results and their total, None if not paged.
+        """
+        if limit is None:
+            return [to_result(row) for row in rows_query.all()], None
+        
+        rows, total = ranked_rows(session, rows_query, score, model.full_id, limit, offset)
+        return [scored(to_result(row), value) for row, value in rows], total
+
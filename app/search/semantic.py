@@ -0,0 +1,489 @@
+"""
+Semantic search over names and descriptions with hashed n-gram vectors.
+
+Every dataset, table and field is a sparse vector over ``SEMANTIC_DIMENSIONS``
+feature buckets: the words of its name, friendly name and description
+(``app.search.tokenize``) and the character trigrams of those words are
+hashed into the buckets with a sign, weighted by their inverse document
+frequency, and the vector is normalized. Texts sharing words or parts of
+words are close, so ``customers`` finds ``customer_id`` and ``cust_no``, and
+descriptions are matched by meaning of their words rather than as
+substrings. Synonyms that never share a word part (``client`` and ``account
+holder``) are not related by these vectors. The default 2^18 buckets keep
+unrelated features from sharing one, which would relate texts with no
+letters in common.
+
+The vectors of each entity type are stored by bucket, like the columns of a
+sparse matrix: the rows having each bucket and their weights, end to end in
+anonymous temporary files mapped in memory (``numpy.memmap``), so the
+operating system pages them in and out instead of them counting against the
+process heap. A query is hashed the same way, and its cosine similarity to
+every row is summed over the rows of its own buckets only, so it costs
+milliseconds over millions of fields and totals are exact. Expect about
+8 bytes of disk per feature of an entry, 100 to 300 bytes per entry.
+
+The rows are streamed from the database, without loading the catalog
+snapshot, and a page of results is read back by row ID. This needs
+``numpy`` (``pip install .[semantic]``); without it, the semantic mode is
+unavailable. The index is rebuilt in the background when the catalog
+version changes, like ``app.search.memory``.
+"""
+import logging
+import os
+import tempfile
+import time
+import zlib
+from array import array
+from functools import lru_cache
+from itertools import islice
+from typing import List, Dict, Any, Iterable, Tuple
+
+try:
+    import numpy as np
+except ImportError:  # Optional, see the "semantic" extra
+    np = None
+
+from sqlalchemy import select
+
+from app.storage.db import Database, visible
+from app.storage.models import DatasetModel, TableModel, FieldModel
+from app.search.background import BackgroundIndex
+from app.search.results import (
+    add_meta, dataset_result, empty_result, exact_total, field_result, scored, table_result
+)
+from app.search.tokenize import identifier_words
+
+logger = logging.getLogger(__name__)
+
+# Number of hashed feature buckets of the vectors
+SEMANTIC_DIMENSIONS = int(os.environ.get("SEMANTIC_DIMENSIONS", str(2 ** 18)))
+
+# Directory of the memory-mapped vector files, the system temp dir by default
+SEMANTIC_INDEX_DIR = os.environ.get("SEMANTIC_INDEX_DIR") or None
+
+# Entries less similar than this to the query are not results
+MIN_SIMILARITY = 0.2
+
+# Words of descriptions that say nothing about their meaning
+STOP_WORDS = frozenset(
+    "a an and are as at be by for from has in is it its of on or that the this to was "
+    "were which with".split()
+)
+
+# Weight of the words of each kind of column
+NAME_WEIGHT = 2.0
+TEXT_WEIGHT = 1.0
+
+# Rows vectorized at once while building
+BUILD_BLOCK_SIZE = 65536
+
+# Distinct texts whose features are kept while building
+FEATURE_CACHE_SIZE = 65536
+
+# Result rows read back per statement
+FETCH_BATCH_SIZE = 500
+
+
+def text_features(text: str | None) -> Tuple[List[int], List[float]]:
+    """Hash the words and word trigrams of a text.
+
+    Each word counts 1 as a whole, plurals folded to the singular, and 1
+    spread over its trigrams, so words sharing most of their letters get
+    most of the similarity of equal words. Stop words are skipped.
+
+    Args:
+        text: The text, or None.
+
+    Returns:
+        The signed feature values: their buckets and values, a bucket
+        possibly repeated.
+    """
+    buckets: List[int] = []
+    values: List[float] = []
+
+    if not text:
+        return buckets, values
+
+    for word in identifier_words(text):
+        if word in STOP_WORDS:
+            continue
+        padded = f"<{word}>"
+        trigrams = [padded[i:i + 3] for i in range(len(padded) - 2)]
+        weight = 1.0 / len(trigrams)
+        if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+            word = word[:-1]
+        for feature, value in [(word, 1.0)] + [(f"#{gram}", weight) for gram in trigrams]:
+            hashed = zlib.crc32(feature.encode())
+            buckets.append(hashed % SEMANTIC_DIMENSIONS)
+            values.append(-value if hashed & 0x80000000 else value)
+
+    return buckets, values
+
+
+def _feature_arrays(text: str | None) -> Tuple:
+    """The features of a text as (int64 buckets, float32 values) arrays."""
+    buckets, values = text_features(text)
+    return np.asarray(buckets, dtype=np.int64), np.asarray(values, dtype=np.float32)
+
+
+def _array(size: int, dtype, directory: str | None):
+    """A zeroed array in an anonymous temporary file mapped in memory."""
+    return np.memmap(
+        tempfile.TemporaryFile(dir=directory, prefix="semantic-"),
+        dtype=dtype, mode="w+", shape=(max(size, 1),)
+    )[:size]
+
+
+class VectorIndex:
+    """Normalized TF-IDF vectors of the rows of one entity type, by bucket.
+
+    The rows having bucket ``b`` are ``rows[offsets[b]:offsets[b + 1]]``, in
+    row order, with their weights in ``weights`` at the same positions.
+    """
+
+    __slots__ = ("ids", "projects", "idf", "offsets", "rows", "weights")
+
+    def __init__(self, ids, projects, idf, offsets, rows, weights):
+        """Hold built vectors.
+
+        Args:
+            ids: The database row ID of each row.
+            projects: The project of each row, as a code of ``SemanticIndex``.
+            idf: The inverse document frequency of each bucket.
+            offsets: The position of the first entry of each bucket, and
+                the number of entries.
+            rows: The row of each entry.
+            weights: The normalized weight of each entry.
+        """
+        self.ids = ids
+        self.projects = projects
+        self.idf = idf
+        self.offsets = offsets
+        self.rows = rows
+        self.weights = weights
+
+    @classmethod
+    def build(
+        cls,
+        rows: Iterable[Tuple[int, int, List[Tuple[str | None, float]]]],
+        features,
+        directory: str | None = None
+    ) -> "VectorIndex":
+        """Vectorize rows into memory-mapped arrays.
+
+        The rows are read once, block by block: their summed features are
+        spilled to temporary files while the document frequencies are
+        counted, then read back, weighted, normalized and scattered to
+        their buckets.
+
+        Args:
+            rows: (row ID, project code, (text, weight) columns) of each row.
+            features: Function giving the (buckets, values) arrays of a text.
+            directory: Where to create the vector files.
+
+        Returns:
+            The vectors.
+        """
+        dimensions = SEMANTIC_DIMENSIONS
+        ids, projects = array("q"), array("I")
+        document_frequency = np.zeros(dimensions, dtype=np.int64)
+        spills = [tempfile.TemporaryFile(dir=directory, prefix="semantic-") for _ in range(3)]
+        block_sizes = []
+        rows = iter(rows)
+
+        try:
+            # Term frequencies, block by block
+            while True:
+                block = list(islice(rows, BUILD_BLOCK_SIZE))
+                if not block:
+                    break
+
+                start = len(ids)
+                row_ids, buckets, values = [], [], []
+                for row, (entity_id, project, columns) in enumerate(block):
+                    ids.append(entity_id)
+                    projects.append(project)
+                    for text, weight in columns:
+                        text_buckets, text_values = features(text)
+                        if len(text_buckets):
+                            row_ids.append(np.full(len(text_buckets), row, dtype=np.int64))
+                            buckets.append(text_buckets)
+                            values.append(text_values * weight)
+
+                if not row_ids:
+                    block_sizes.append(0)
+                    continue
+
+                # One entry per (row, bucket), sorted by row, signed values that cancel dropped
+                cells, inverse = np.unique(
+                    np.concatenate(row_ids) * dimensions + np.concatenate(buckets),
+                    return_inverse=True
+                )
+                sums = np.bincount(inverse, weights=np.concatenate(values))
+                cells, sums = cells[sums != 0], sums[sums != 0]
+                cell_buckets = cells % dimensions
+
+                (cells // dimensions + start).astype(np.uint32).tofile(spills[0])
+                cell_buckets.astype(np.uint32).tofile(spills[1])
+                sums.astype(np.float32).tofile(spills[2])
+                document_frequency += np.bincount(cell_buckets, minlength=dimensions)
+                block_sizes.append(len(cells))
+
+            count = len(ids)
+            idf = (np.log((1 + count) / (1 + document_frequency)) + 1).astype(np.float32)
+            offsets = np.zeros(dimensions + 1, dtype=np.int64)
+            np.cumsum(document_frequency, out=offsets[1:])
+            entry_rows = _array(int(offsets[-1]), np.uint32, directory)
+            weights = _array(int(offsets[-1]), np.float32, directory)
+
+            # Weight, normalize and scatter to the buckets, block by block
+            cursor = offsets[:-1].copy()
+            for spill in spills:
+                spill.seek(0)
+            for size in block_sizes:
+                block_rows = np.fromfile(spills[0], dtype=np.uint32, count=size)
+                block_buckets = np.fromfile(spills[1], dtype=np.uint32, count=size).astype(np.int64)
+                block_values = np.fromfile(spills[2], dtype=np.float32, count=size)
+                if not size:
+                    continue
+
+                block_values *= idf[block_buckets]
+                local = (block_rows - block_rows[0]).astype(np.int64)
+                block_values /= np.sqrt(np.bincount(local, weights=block_values ** 2))[local]
+
+                order = np.argsort(block_buckets, kind="stable")
+                block_buckets = block_buckets[order]
+                rank = np.arange(size) - np.searchsorted(block_buckets, block_buckets)
+                positions = cursor[block_buckets] + rank
+                entry_rows[positions] = block_rows[order]
+                weights[positions] = block_values[order]
+                cursor += np.bincount(block_buckets, minlength=dimensions)
+        finally:
+            for spill in spills:
+                spill.close()
+
+        return cls(
+            np.asarray(ids, dtype=np.int64), np.asarray(projects, dtype=np.uint32),
+            idf, offsets, entry_rows, weights
+        )
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def matches(self, buckets, values, project: int | None = None) -> Tuple:
+        """Find the rows similar to a query.
+
+        Args:
+            buckets: The feature buckets of the query.
+            values: The feature values of the query.
+            project: Optional project of the rows, as a code of ``SemanticIndex``.
+
+        Returns:
+            The rows at least ``MIN_SIMILARITY`` similar to the query, in row
+            order, and their cosine similarities.
+        """
+        buckets, inverse = np.unique(buckets, return_inverse=True)
+        query = np.bincount(inverse, weights=values) * self.idf[buckets]
+        norm = np.linalg.norm(query)
+
+        if not norm or not len(self.ids):
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+        query /= norm
+
+        similarities = np.zeros(len(self.ids), dtype=np.float32)
+        for bucket, value in zip(buckets.tolist(), query.tolist()):
+            start, end = self.offsets[bucket], self.offsets[bucket + 1]
+            similarities[self.rows[start:end]] += np.float32(value) * self.weights[start:end]
+
+        found = similarities >= MIN_SIMILARITY
+        if project is not None:
+            found &= self.projects == project
+        rows = np.flatnonzero(found)
+        return rows, similarities[rows]
+
+
+class SemanticIndex:
+    """Vectors of the visible datasets, tables and fields of the catalog."""
+
+    __slots__ = ("db", "version", "datasets", "tables", "fields", "project_codes")
+
+    def __init__(self, db: Database, version: int, directory: str | None = None):
+        """Build the vectors from the rows of the database.
+
+        Args:
+            db: The database holding the catalog.
+            version: The catalog version, read before the rows.
+            directory: Where to create the vector files.
+        """
+        started = time.monotonic()
+        self.db = db
+        self.version = version
+        self.project_codes: Dict[str, int] = {}
+
+        # Features of the distinct strings of a build, mostly repeated names
+        features = lru_cache(maxsize=FEATURE_CACHE_SIZE)(_feature_arrays)
+
+        with db.get_session() as session:
+            self.datasets = VectorIndex.build(self._stream(
+                session, DatasetModel, (DatasetModel.dataset_name, NAME_WEIGHT),
+                (DatasetModel.friendly_name, TEXT_WEIGHT), (DatasetModel.description, TEXT_WEIGHT)
+            ), features, directory)
+            self.tables = VectorIndex.build(self._stream(
+                session, TableModel, (TableModel.table_name, NAME_WEIGHT),
+                (TableModel.friendly_name, TEXT_WEIGHT), (TableModel.description, TEXT_WEIGHT)
+            ), features, directory)
+            self.fields = VectorIndex.build(self._stream(
+                session, FieldModel, (FieldModel.name, NAME_WEIGHT),
+                (FieldModel.description, TEXT_WEIGHT)
+            ), features, directory)
+
+        logger.info(
+            f"Built semantic index of catalog version {version}: "
+            f"{len(self.datasets) + len(self.tables) + len(self.fields)} vectors "
+            f"in {time.monotonic() - started:.1f}s"
+        )
+
+    def _stream(self, session, model, *columns) -> Iterable[Tuple[int, int, List]]:
+        """Stream the (row ID, project code, (text, weight) columns) of visible rows."""
+        weights = [weight for _, weight in columns]
+        rows = session.execute(
+            select(model.id, model.project_id, *[column for column, _ in columns])
+            .where(visible(model))
+            .order_by(model.id)
+            .execution_options(stream_results=True, yield_per=BUILD_BLOCK_SIZE)
+        )
+        for entity_id, project_id, *texts in rows:
+            # Code 0 is no project
+            project = self.project_codes.setdefault(project_id, len(self.project_codes) + 1)
+            yield entity_id, project, list(zip(texts, weights))
+
+    def _fetch(self, model, to_result, ids: List[int]) -> List[Dict[str, Any] | None]:
+        """Read rows back by ID, None for those no longer visible."""
+        found = {}
+        with self.db.get_session() as session:
+            for start in range(0, len(ids), FETCH_BATCH_SIZE):
+                for row in session.query(model).filter(
+                    model.id.in_(ids[start:start + FETCH_BATCH_SIZE]), visible(model)
+                ):
+                    found[row.id] = to_result(row)
+        return [found.get(entity_id) for entity_id in ids]
+
+    def search(
+        self,
+        query: str,
+        project_id: str | None = None,
+        entity_type: str | None = None,
+        limit: int | None = None,
+        offset: int = 0
+    ) -> Dict[str, Any]:
+        """Find the datasets, tables, and fields most similar to a query.
+
+        Args:
+            query: The search query.
+            project_id: Optional project ID to filter by.
+            entity_type: Optional entity type to filter by ('dataset', 'table', or 'field').
+            limit: Optional number of results per entity type.
+            offset: Number of results per entity type to skip.
+
+        Returns:
+            Dict with datasets, tables, and fields at least ``MIN_SIMILARITY``
+            similar to the query, most similar first, with their cosine
+            similarity as score, and ``meta`` with exact totals if paged.
+            Rows changed since the index was built are left out of the page.
+        """
+        result = empty_result()
+        totals = {}
+        buckets, values = text_features(query)
+
+        if not buckets:
+            return add_meta(result, limit, offset, totals)
+
+        buckets = np.asarray(buckets, dtype=np.int64)
+        values = np.asarray(values, dtype=np.float32)
+        entities = [
+            ("datasets", "dataset", self.datasets, DatasetModel, dataset_result),
+            ("tables", "table", self.tables, TableModel, table_result),
+            ("fields", "field", self.fields, FieldModel, field_result),
+        ]
+
+        for key, name, vectors, model, to_result in entities:
+            if entity_type and entity_type.lower() != name:
+                continue
+
+            project = self.project_codes.get(project_id, 0) if project_id else None
+            rows, similarities = vectors.matches(buckets, values, project)
+            totals[key] = exact_total(len(rows))
+
+            # Only sort the matches of the page
+            order = np.arange(len(rows))
+            if limit is not None and offset + limit < len(rows):
+                order = np.argpartition(-similarities, offset + limit - 1)[:offset + limit]
+
+            order = order[np.lexsort((rows[order], -similarities[order]))]
+
+            if limit is not None:
+                order = order[offset:offset + limit]
+
+            items = self._fetch(model, to_result, vectors.ids[rows[order]].tolist())
+            result[key] = [
+                scored(item, float(similarity))
+                for item, similarity in zip(items, similarities[order].tolist())
+                if item is not None
+            ]
+
+        return add_meta(result, limit, offset, totals)
+
+
+class SemanticSearch(BackgroundIndex):
+    """Semantic search answering from a ``SemanticIndex`` of the current catalog."""
+
+    label = "semantic index"
+
+    def __init__(self, db, directory: str | None = SEMANTIC_INDEX_DIR):
+        """Initialize the holder; the index is built on first use.
+
+        Args:
+            db: The database holding the catalog.
+            directory: Where to create the vector files.
+        """
+        super().__init__(db)
+        self.directory = directory
+        self._warned = False
+
+    def available(self) -> bool:
+        """Whether numpy is installed."""
+        if np is None and not self._warned:
+            logger.warning("Semantic search needs numpy: pip install .[semantic]")
+            self._warned = True
+        return np is not None
+
+    def _build(self, previous: SemanticIndex | None) -> SemanticIndex:
+        """Vectorize the rows of the current catalog."""
+        version = self.db.catalog_version()
+        if previous is not None and previous.version == version:
+            return previous
+        return SemanticIndex(self.db, version, self.directory)
+
+    def search(
+        self,
+        query: str,
+        project_id: str | None = None,
+        entity_type: str | None = None,
+        limit: int | None = None,
+        offset: int = 0
+    ) -> Dict[str, Any]:
+        """Find the datasets, tables, and fields most similar to a query.
+
+        Args:
+            query: The search query.
+            project_id: Optional project ID to filter by.
+            entity_type: Optional entity type to filter by ('dataset', 'table', or 'field').
+            limit: Optional number of results per entity type.
+            offset: Number of results per entity type to skip.
+
+        Returns:
+            Dict with datasets, tables, and fields similar to the query.
+        """
+        return self.index().search(
+            query, project_id=project_id, entity_type=entity_type, limit=limit, offset=offset
+        )
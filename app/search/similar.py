@@ -0,0 +1,203 @@
+"""
+Tables with similar schemas, found with MinHash signatures.
+
+The similarity of two tables is the Jaccard similarity of their sets of
+(column name, type) pairs: the columns they share over the columns of
+either. Every table has a MinHash signature of its set, banded into LSH
+buckets (``app.storage.signatures``); the tables sharing a bucket with the
+target are the candidates, their similarity is estimated from the
+signatures, and the best are ranked by their exact similarity, computed
+from their fields. Tables sharing no bucket are missed, which is unlikely
+above a similarity of 0.5 and likely below 0.2.
+
+The signatures are written with the catalog rows, or marked out of date
+when single fields are saved and recomputed before the next lookup;
+databases created before they existed are filled by ``alembic upgrade
+head`` (revision 0011).
+"""
+from collections import defaultdict
+from typing import List, Dict, Any, Set, Tuple
+
+from sqlalchemy import and_, func, or_, select
+from sqlalchemy.exc import IntegrityError
+
+from app.storage.db import Database, visible
+from app.storage.models import TableModel, FieldModel, TableSignatureModel, TableBandModel
+from app.storage.signatures import (
+    band_buckets, column_key, estimate_similarity, update_stale_signatures
+)
+from app.search.results import table_result
+
+# Number of similar tables returned by default, and at most
+DEFAULT_SIMILAR = 10
+MAX_SIMILAR = 100
+
+# Tables less similar than this are not returned by default
+MIN_SIMILARITY = 0.3
+
+# Tables sharing the most buckets with the target that are estimated
+MAX_CANDIDATES = 500
+
+# Estimates are off by about 0.05 with 128 values: candidates this much
+# below the minimum similarity are still compared exactly
+ESTIMATE_MARGIN = 0.1
+
+
+def jaccard(columns: Set[str], other: Set[str]) -> float:
+    """Get the Jaccard similarity of two sets of columns."""
+    union = len(columns | other)
+    return len(columns & other) / union if union else 0.0
+
+
+class SimilarTables:
+    """Lookup of the tables whose columns are most like those of a table."""
+
+    def __init__(self, db: Database):
+        """Initialize the lookup.
+
+        Args:
+            db: The database to search.
+        """
+        self.db = db
+
+    def similar(
+        self,
+        dataset_id: str,
+        table_id: str,
+        project_id: str | None = None,
+        limit: int = DEFAULT_SIMILAR,
+        min_similarity: float = MIN_SIMILARITY
+    ) -> Dict[str, Any] | None:
+        """Find the tables with the schemas most similar to a table's.
+
+        Args:
+            dataset_id: The dataset ID of the table.
+            table_id: The table ID.
+            project_id: Optional project ID of the table, and of the similar tables.
+            limit: Maximum number of similar tables.
+            min_similarity: Minimum Jaccard similarity of the similar tables.
+
+        Returns:
+            Dict with the ``table``, its ``similar`` tables, most similar
+            first, each with its ``similarity``, the ``estimated_similarity``
+            of the signatures, its number of ``shared_columns`` and its
+            ``column_count``, and ``meta`` with the number of ``candidates``
+            found in the LSH buckets; None if the table does not exist.
+        """
+        self._sign_stale_tables()
+
+        with self.db.get_session() as session:
+            target_query = session.query(TableModel, TableSignatureModel).outerjoin(
+                TableSignatureModel, TableSignatureModel.entity_id == TableModel.id
+            ).filter(
+                TableModel.dataset_id == dataset_id,
+                TableModel.table_name == table_id,
+                visible(TableModel)
+            )
+            if project_id:
+                target_query = target_query.filter(TableModel.project_id == project_id)
+
+            found = target_query.order_by(TableModel.project_id).first()
+            if not found:
+                return None
+
+            table, signature = found
+            result = {
+                "table": {**table_result(table), "column_count": signature.column_count if signature else 0},
+                "similar": [],
+                "meta": {"candidates": 0},
+            }
+            if not signature:
+                return result
+
+            candidates = self._candidates(session, table, signature.signature, project_id)
+            result["meta"]["candidates"] = len(candidates)
+
+            # Estimated similarities, then exact ones for the best estimates
+            estimated = sorted(
+                (
+                    (estimate_similarity(signature.signature, row.signature), row.TableModel)
+                    for row in candidates
+                ),
+                key=lambda item: (-item[0], item[1].full_id)
+            )
+            estimated = [
+                item for item in estimated if item[0] >= min_similarity - ESTIMATE_MARGIN
+            ][:2 * limit + 10]
+
+            columns = self._columns(session, [table] + [row for _, row in estimated])
+            target_columns = columns[table.id]
+            similar = []
+            for estimate, row in estimated:
+                similarity = jaccard(target_columns, columns[row.id])
+                if similarity >= min_similarity:
+                    similar.append({
+                        **table_result(row),
+                        "similarity": round(similarity, 4),
+                        "estimated_similarity": round(estimate, 4),
+                        "shared_columns": len(target_columns & columns[row.id]),
+                        "column_count": len(columns[row.id]),
+                    })
+
+            similar.sort(key=lambda item: (-item["similarity"], item["full_id"]))
+            result["similar"] = similar[:limit]
+            return result
+
+    def _sign_stale_tables(self) -> None:
+        """Recompute the signatures of the tables whose fields were saved."""
+        with self.db.get_session() as session:
+            try:
+                if update_stale_signatures(session):
+                    session.commit()
+            except IntegrityError:
+                # A concurrent lookup signed them first
+                session.rollback()
+
+    @staticmethod
+    def _candidates(session, table, signature: bytes, project_id: str | None) -> List:
+        """Select the visible tables sharing LSH buckets with a signature, with their signatures."""
+        shared = select(
+            TableBandModel.entity_id, func.count().label("shared")
+        ).where(
+            # One primary key lookup per band, SQLite scans for a row value IN list
+            or_(*[
+                and_(TableBandModel.band == band, TableBandModel.bucket == bucket)
+                for band, bucket in enumerate(band_buckets(signature))
+            ]),
+            TableBandModel.entity_id != table.id
+        ).group_by(TableBandModel.entity_id).subquery("shared")
+
+        candidates_query = session.query(TableModel, TableSignatureModel.signature).join(
+            shared, shared.c.entity_id == TableModel.id
+        ).join(
+            TableSignatureModel, TableSignatureModel.entity_id == TableModel.id
+        ).filter(visible(TableModel))
+        if project_id:
+            candidates_query = candidates_query.filter(TableModel.project_id == project_id)
+
+        return candidates_query.order_by(
+            shared.c.shared.desc(), TableModel.id
+        ).limit(MAX_CANDIDATES).all()
+
+    @staticmethod
+    def _columns(session, tables: List) -> Dict[int, Set[str]]:
+        """Get the column keys of table rows, by row ID."""
+        ids: Dict[Tuple[str, str, str, int], int] = {
+            (t.project_id, t.dataset_id, t.table_name, t.generation): t.id for t in tables
+        }
+        columns = defaultdict(set)
+        rows = session.execute(
+            select(
+                FieldModel.project_id, FieldModel.dataset_id, FieldModel.table_id,
+                FieldModel.generation, FieldModel.name, FieldModel.field_type
+            ).where(or_(*[
+                and_(
+                    FieldModel.project_id == project, FieldModel.dataset_id == dataset,
+                    FieldModel.table_id == table, FieldModel.generation == generation
+                )
+                for project, dataset, table, generation in ids
+            ]))
+        )
+        for project, dataset, table, generation, name, field_type in rows:
+            columns[ids[(project, dataset, table, generation)]].add(column_key(name, field_type))
+        return columns
@@ -0,0 +1,141 @@
+"""
+SQLite FTS5 search backend.
+
+Searches the FTS5 tables of the catalog tables (``app.storage.fts``),
+matching every word of the query as a word prefix, and ranks the results
+with BM25.
+"""
+import logging
+from typing import Dict, Any
+
+from sqlalchemy import Float, Integer, text
+
+from app.storage.db import Database, visible
+from app.storage.fts import FTS_TABLES, fts_installed
+from app.storage.models import DatasetModel, TableModel, FieldModel
+from app.search.facets import facet_counts, filter_facets
+from app.search.results import (
+    add_meta, dataset_result, empty_result, field_result, ranked_rows, scored, table_result
+)
+from app.search.tokenize import identifier_words
+
+logger = logging.getLogger(__name__)
+
+
+def match_query(query: str) -> str | None:
+    """Build an FTS5 query matching every word of a query as a prefix.
+
+    Words are quoted, so FTS5 operators typed by the user are not
+    interpreted.
+
+    Args:
+        query: The search query.
+
+    Returns:
+        The FTS5 query, or None if the query has no words.
+    """
+    words = list(dict.fromkeys(identifier_words(query)))
+    if not words:
+        return None
+    return " AND ".join(f'"{word}"*' for word in words)
+
+
+class SqliteFullTextSearch:
+    """BM25-ranked search over the FTS5 tables."""
+
+    def __init__(self, db: Database):
+        """Initialize the backend.
+
+        Args:
+            db: The database to search.
+        """
+        self.db = db
+        self._available = None
+
+    def available(self) -> bool:
+        """Whether the FTS tables have been created.
+
+        Returns:
+            True if all FTS tables exist.
+        """
+        if self._available is None:
+            with self.db.get_session() as session:
+                self._available = fts_installed(session.connection())
+
+            if not self._available:
+                logger.warning(
+                    "SQLite full-text search tables are missing, falling back to LIKE search. "
+                    "Run `python scripts/migrate_sqlite_fts.py` to create them."
+                )
+
+        return self._available
+
+    def search(
+        self,
+        query: str,
+        project_id: str | None = None,
+        entity_type: str | None = None,
+        limit: int | None = None,
+        offset: int = 0,
+        facets: bool = False,
+        filters: Dict[str, str] | None = None
+    ) -> Dict[str, Any]:
+        """Search for datasets, tables, and fields.
+
+        Args:
+            query: The search query.
+            project_id: Optional project ID to filter by.
+            entity_type: Optional entity type to filter by ('dataset', 'table', or 'field').
+            limit: Optional number of results per entity type.
+            offset: Number of results per entity type to skip.
+            facets: Whether to add the ``facets`` of the matches of each entity
+                type, see ``app.search.facets``.
+            filters: Optional facet values to filter by.
+
+        Returns:
+            Dict with datasets, tables, and fields that match the query, each
+            ordered by relevance, and ``meta`` if paged.
+        """
+        result = empty_result()
+        totals = {}
+        fts_query = match_query(query)
+
+        if fts_query is None:
+            return add_meta(result, limit, offset, totals)
+
+        entities = [
+            ("datasets", "dataset", DatasetModel, dataset_result),
+            ("tables", "table", TableModel, table_result),
+            ("fields", "field", FieldModel, field_result),
+        ]
+
+        with self.db.get_session() as session:
+            for key, name, model, to_result in entities:
+                if entity_type and entity_type.lower() != name:
+                    continue
+
+                fts_table, _, weights = FTS_TABLES[model.__tablename__]
+                matches = text(
+                    f"SELECT rowid AS id, bm25({fts_table}, {', '.join(map(str, weights))}) AS rank "
+                    f"FROM {fts_table} WHERE {fts_table} MATCH :match"
+                ).bindparams(match=fts_query).columns(id=Integer, rank=Float).subquery()
+
+                rows_query = session.query(model).join(
+                    matches, matches.c.id == model.id
+                ).filter(visible(model))
+
+                if project_id:
+                    rows_query = rows_query.filter(model.project_id == project_id)
+
+                rows_query = filter_facets(rows_query, model, filters)
+
+                # BM25 scores are negative, better matches are lower
+                rows, totals[key] = ranked_rows(
+                    session, rows_query, -matches.c.rank, model.full_id, limit, offset
+                )
+                result[key] = [scored(to_result(row), value) for row, value in rows]
+
+                if facets:
+                    result.setdefault("facets", {})[key] = facet_counts(session, rows_query, model)
+
+        return add_meta(result, limit, offset, totals)
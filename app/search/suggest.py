@@ -0,0 +1,236 @@
+"""
+Prefix completion of dataset, table and field names for typeahead.
+
+``NameCompletions`` keeps the distinct names of the catalog sorted by their
+lowercased form, with the number of catalog entries carrying each. The names
+starting with a prefix are a contiguous range found with ``bisect``, and the
+most common of them are returned. The top completions of the prefixes whose
+ranges hold more than ``SCAN_LIMIT`` names are computed when the index is
+built, so no lookup ranks more than ``SCAN_LIMIT`` names.
+
+``NameSuggester`` rebuilds the completions when the catalog changes. Names
+are counted per project, and a project is recounted only when its current
+generation or its catalog version changed, so after an extraction or an
+edit only the changed project is read again.
+"""
+from bisect import bisect_left
+from collections import Counter
+import heapq
+import logging
+import time
+from typing import List, Dict, Any, Tuple
+
+from sqlalchemy import func
+
+from app.storage.db import Database
+from app.storage.models import (
+    CatalogGenerationModel, ProjectVersionModel, DatasetModel, TableModel, FieldModel
+)
+from app.search.background import BackgroundIndex
+
+logger = logging.getLogger(__name__)
+
+# Default and maximum number of completions returned
+DEFAULT_SUGGESTIONS = 10
+MAX_SUGGESTIONS = 50
+
+# Prefixes matching more names than this have their top completions precomputed
+SCAN_LIMIT = 1000
+
+# Name column of each catalog table
+NAME_COLUMNS = (
+    (DatasetModel, DatasetModel.dataset_name),
+    (TableModel, TableModel.table_name),
+    (FieldModel, FieldModel.name),
+)
+
+
+class NameCompletions:
+    """Sorted names of a catalog version with their counts."""
+
+    __slots__ = ("version", "keys", "names", "counts", "top")
+
+    def __init__(self, counts: Dict[str, int], version: int = 0):
+        """Build the completions.
+
+        Args:
+            counts: The names and the number of catalog entries carrying each.
+                Names differing only in case are merged under their most
+                common spelling.
+            version: The catalog version of the names.
+        """
+        started = time.monotonic()
+        self.version = version
+
+        merged: Dict[str, List] = {}
+        for name, count in counts.items():
+            key = name.lower()
+            entry = merged.get(key)
+            if entry is None:
+                merged[key] = [count, name, count]
+            else:
+                entry[0] += count
+                if count > entry[2]:
+                    entry[1], entry[2] = name, count
+
+        self.keys = sorted(merged)
+        self.names = [merged[key][1] for key in self.keys]
+        self.counts = [merged[key][0] for key in self.keys]
+
+        # Top completions of the prefixes of many names, found by splitting
+        # the ranges of the shorter prefixes
+        self.top: Dict[str, List[int]] = {}
+        keys = self.keys
+        ranges = [("", 0, len(keys))]
+
+        while ranges:
+            longer = []
+            for prefix, start, end in ranges:
+                length = len(prefix) + 1
+                i = start
+                while i < end:
+                    if len(keys[i]) < length:
+                        i += 1
+                        continue
+                    child = keys[i][:length]
+                    j = bisect_left(keys, _after(child), i, end)
+                    if j - i > SCAN_LIMIT:
+                        self.top[child] = self._most_common(range(i, j), MAX_SUGGESTIONS)
+                        longer.append((child, i, j))
+                    i = j
+            ranges = longer
+
+        logger.info(
+            f"Built name completions of catalog version {version}: {len(self.keys)} names "
+            f"in {time.monotonic() - started:.1f}s"
+        )
+
+    def _most_common(self, positions, limit: int) -> List[int]:
+        """The positions of the most common names, ties in name order."""
+        counts = self.counts
+        return heapq.nsmallest(limit, positions, key=lambda position: (-counts[position], position))
+
+    def complete(self, prefix: str, limit: int = DEFAULT_SUGGESTIONS) -> List[Dict[str, Any]]:
+        """Complete a prefix.
+
+        Args:
+            prefix: The typed prefix; case is ignored.
+            limit: Maximum number of completions.
+
+        Returns:
+            Dicts with the ``text`` of the name and the ``count`` of catalog
+            entries carrying it, most common first.
+        """
+        key = prefix.strip().lower()
+        if not key:
+            return []
+
+        top = self.top.get(key)
+
+        if top is not None:
+            positions = top[:limit]
+        else:
+            start = bisect_left(self.keys, key)
+            end = bisect_left(self.keys, _after(key), start)
+            positions = self._most_common(range(start, end), limit)
+
+        return [{"text": self.names[p], "count": self.counts[p]} for p in positions]
+
+
+def _after(prefix: str) -> str:
+    """The smallest string after all the strings starting with a prefix."""
+    return prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
+
+def project_signatures(session) -> Dict[str, Tuple]:
+    """Get what identifies the names of each project.
+
+    Returns:
+        For each project, its current generation and its catalog version.
+    """
+    rows = session.query(
+        CatalogGenerationModel.project_id,
+        CatalogGenerationModel.id,
+        ProjectVersionModel.version
+    ).outerjoin(
+        ProjectVersionModel, ProjectVersionModel.project_id == CatalogGenerationModel.project_id
+    ).filter(
+        CatalogGenerationModel.status == CatalogGenerationModel.CURRENT
+    )
+
+    return {project_id: (generation, version) for project_id, generation, version in rows}
+
+
+def count_project_names(session, project_id: str, generation: int) -> Counter:
+    """Count the names of a generation of a project.
+
+    Returns:
+        The number of datasets, tables and fields carrying each name.
+    """
+    counts = Counter()
+    for model, column in NAME_COLUMNS:
+        rows = session.query(column, func.count()).filter(
+            model.generation == generation,
+            model.project_id == project_id
+        ).group_by(column)
+        for name, count in rows.yield_per(10000):
+            if name:
+                counts[name] += count
+    return counts
+
+
+class NameSuggester(BackgroundIndex):
+    """Completions of the names of the current catalog, updated project by project."""
+
+    label = "name completions"
+
+    def __init__(self, db: Database):
+        """Initialize the suggester; the completions are built on first use.
+
+        Args:
+            db: The database holding the catalog.
+        """
+        super().__init__(db)
+        # Project ID -> (signature, name counts)
+        self._projects: Dict[str, Tuple[Tuple, Counter]] = {}
+
+    def _build(self, previous: NameCompletions | None) -> NameCompletions:
+        """Recount the projects that changed and merge the counts of all projects."""
+        version = self.db.catalog_version()
+        recounted = 0
+
+        with self.db.get_session() as session:
+            signatures = project_signatures(session)
+            projects = {}
+
+            for project_id, signature in signatures.items():
+                cached = self._projects.get(project_id)
+                if cached is not None and cached[0] == signature:
+                    projects[project_id] = cached
+                    continue
+
+                generation = signature[0]
+                projects[project_id] = (signature, count_project_names(session, project_id, generation))
+                recounted += 1
+
+        self._projects = projects
+        logger.info(f"Recounted the names of {recounted} of {len(projects)} projects")
+
+        counts = Counter()
+        for _, project_counts in projects.values():
+            counts.update(project_counts)
+
+        return NameCompletions(counts, version)
+
+    def suggest(self, prefix: str, limit: int = DEFAULT_SUGGESTIONS) -> List[Dict[str, Any]]:
+        """Complete a prefix with the names of the catalog.
+
+        Args:
+            prefix: The typed prefix; case is ignored.
+            limit: Maximum number of completions.
+
+        Returns:
+            Dicts with the ``text`` of the name and the ``count`` of catalog
+            entries carrying it, most common first.
+        """
+        return self.index().complete(prefix, min(limit, MAX_SUGGESTIONS))
@@ -0,0 +1,96 @@
+"""
+Splitting of identifiers into words for search indexes.
+
+BigQuery names mix conventions: ``customer_id``, ``customerId`` and
+``HTTPStatusCode`` should all be found by searching for their words. The
+word tokenizers of the databases already split on underscores and dots, so
+what remains is to separate the words of camelCase and PascalCase names.
+"""
+import re
+from typing import List
+
+# A run of letters or digits, as separated by the database tokenizers
+_TOKEN = re.compile(r"[^\W_]+")
+
+# Words inside a token: acronyms, capitalized or lowercase words, and numbers
+_WORD = re.compile(r"[A-Z]+(?=[A-Z][a-z])|[A-Z]?[a-z]+|[A-Z]+|\d+")
+
+
+def identifier_words(text: str) -> List[str]:
+    """Split text into lowercase words, breaking up snake_case and camelCase.
+
+    Args:
+        text: The text to split.
+
+    Returns:
+        The words in order of appearance, e.g. ``["http", "status", "code"]``
+        for ``HTTPStatusCode``.
+    """
+    words = []
+    for token in _TOKEN.findall(text):
+        parts = _WORD.findall(token)
+        words.extend(part.lower() for part in (parts or [token]))
+    return words
+
+
+def identifier_terms(text: str) -> List[str]:
+    """Split text into the terms of a search index.
+
+    These are the words of ``identifier_words``, plus every camelCase token
+    as a whole, so that ``customerid`` still matches ``customerId``.
+
+    Args:
+        text: The text to split.
+
+    Returns:
+        The terms, lowercased, possibly repeated.
+    """
+    terms = []
+    for token in _TOKEN.findall(text):
+        parts = _WORD.findall(token)
+        terms.extend(part.lower() for part in (parts or [token]))
+        if len(parts) > 1:
+            terms.append(token.lower())
+    return terms
+
+
+def split_identifier(text: str | None) -> str | None:
+    """Add the words of camelCase tokens to a text before it is indexed.
+
+    The original text is kept, so whole tokens such as ``customerid`` still
+    match, and the words of each camelCase token are appended to it.
+
+    Args:
+        text: The text to index, or None.
+
+    Returns:
+        The text followed by the extra words, or None if text is None.
+    """
+    if not text:
+        return text
+
+    extra = []
+    for token in _TOKEN.findall(text):
+        parts = _WORD.findall(token)
+        if len(parts) > 1:
+            extra.extend(parts)
+
+    if not extra:
+        return text
+    return f"{text} {' '.join(extra)}"
+
+
+def register_sqlite_functions(dbapi_connection, connection_record=None) -> None:
+    """Make ``split_identifier`` callable from SQL on a SQLite connection.
+
+    The triggers maintaining the FTS5 tables call it, so every connection
+    that writes the catalog must have it. Used as an engine ``connect``
+    event listener.
+
+    Args:
+        dbapi_connection: The sqlite3 connection.
+        connection_record: Unused, passed by the event.
+    """
+    dbapi_connection.create_function(
+        "split_identifier", 1, split_identifier, deterministic=True
+    )
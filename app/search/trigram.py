@@ -0,0 +1,250 @@
+"""
+PostgreSQL trigram search backend.
+
+Migration 0008, run with ``alembic -x trigram=on upgrade head``, creates
+``pg_trgm`` GIN indexes on the names, full IDs and descriptions of datasets,
+tables and fields. With these indexes the ``ILIKE '%fragment%'`` predicates of
+both searches are answered from the indexes, so identifier fragments such as
+``cust_id`` or ``_ts`` are matched as substrings without scanning the tables.
+Results are ordered by ``word_similarity`` to the search terms.
+"""
+from functools import reduce
+import logging
+import operator
+from typing import Dict, Any
+
+from sqlalchemy import and_, func, literal, or_, text
+
+from app.storage.db import Database, visible
+from app.storage.models import DatasetModel, TableModel, FieldModel
+from app.search.facets import facet_counts, filter_facets
+from app.search.results import (
+    add_meta, dataset_result, empty_result, field_result, ranked_rows, scored, table_result
+)
+
+logger = logging.getLogger(__name__)
+
+# Index whose presence shows that migration 0008 created the trigram indexes
+TRIGRAM_MARKER_INDEX = "ix_fields_name_trgm"
+
+# Columns matched by search(), for each entity
+SEARCH_COLUMNS = {
+    "dataset": (
+        DatasetModel.dataset_name, DatasetModel.friendly_name, DatasetModel.description
+    ),
+    "table": (
+        TableModel.table_name, TableModel.full_id, TableModel.friendly_name,
+        TableModel.description
+    ),
+    "field": (
+        FieldModel.name, FieldModel.full_id, FieldModel.description, FieldModel.field_type
+    ),
+}
+
+
+def like_pattern(term: str) -> str:
+    """Build an ILIKE pattern matching a term as a literal substring.
+
+    ``%`` and ``_`` are escaped, so ``_ts`` only matches an underscore
+    followed by ``ts``.
+
+    Args:
+        term: The search term.
+
+    Returns:
+        The pattern, to be used with ``escape="\\\\"``.
+    """
+    escaped = term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return f"%{escaped}%"
+
+
+def _contains(column, term: str):
+    return column.ilike(like_pattern(term), escape="\\")
+
+
+def _similarity(term: str, columns):
+    """Score of the best matching column; columns that are NULL are ignored."""
+    return func.greatest(*[func.word_similarity(term, column) for column in columns])
+
+
+def _total(scores):
+    return reduce(operator.add, scores)
+
+
+class PostgresTrigramSearch:
+    """Substring search answered by pg_trgm indexes, ordered by similarity."""
+
+    def __init__(self, db: Database):
+        """Initialize the backend.
+
+        Args:
+            db: The database to search.
+        """
+        self.db = db
+        self._available = None
+
+    def available(self) -> bool:
+        """Whether migration 0008 created the trigram indexes.
+
+        Returns:
+            True if the trigram indexes exist.
+        """
+        if self._available is None:
+            with self.db.get_session() as session:
+                self._available = session.execute(text(
+                    """
+                    SELECT EXISTS (
+                        SELECT 1 FROM pg_indexes
+                        WHERE schemaname = current_schema() AND indexname = :index_name
+                    )
+                    """
+                ), {"index_name": TRIGRAM_MARKER_INDEX}).scalar()
+
+        return self._available
+
+    def search(
+        self,
+        query: str,
+        project_id: str | None = None,
+        entity_type: str | None = None,
+        limit: int | None = None,
+        offset: int = 0,
+        facets: bool = False,
+        filters: Dict[str, str] | None = None
+    ) -> Dict[str, Any]:
+        """Search for datasets, tables, and fields containing every term.
+
+        Args:
+            query: The search query.
+            project_id: Optional project ID to filter by.
+            entity_type: Optional entity type to filter by ('dataset', 'table', or 'field').
+            limit: Optional number of results per entity type.
+            offset: Number of results per entity type to skip.
+            facets: Whether to add the ``facets`` of the matches of each entity
+                type, see ``app.search.facets``.
+            filters: Optional facet values to filter by.
+
+        Returns:
+            Dict with datasets, tables, and fields that match the query, each
+            ordered by similarity to the terms, and ``meta`` if paged.
+        """
+        result = empty_result()
+        totals = {}
+        terms = query.strip().split()
+
+        if not terms:
+            return add_meta(result, limit, offset, totals)
+
+        entities = [
+            ("datasets", "dataset", DatasetModel, dataset_result),
+            ("tables", "table", TableModel, table_result),
+            ("fields", "field", FieldModel, field_result),
+        ]
+
+        with self.db.get_session() as session:
+            for key, name, model, to_result in entities:
+                if entity_type and entity_type.lower() != name:
+                    continue
+
+                columns = SEARCH_COLUMNS[name]
+                rows_query = session.query(model).filter(visible(model))
+
+                if project_id:
+                    rows_query = rows_query.filter(model.project_id == project_id)
+
+                rows_query = filter_facets(rows_query, model, filters)
+
+                for term in terms:
+                    rows_query = rows_query.filter(or_(*[_contains(c, term) for c in columns]))
+
+                score = _total([_similarity(term, columns) for term in terms])
+                rows, totals[key] = ranked_rows(
+                    session, rows_query, score, model.full_id, limit, offset
+                )
+                result[key] = [scored(to_result(row), value) for row, value in rows]
+
+                if facets:
+                    result.setdefault("facets", {})[key] = facet_counts(session, rows_query, model)
+
+        return add_meta(result, limit, offset, totals)
+
+    def advanced_search(
+        self,
+        terms: Dict[str, str],
+        project_id: str | None = None,
+        dataset_id: str | None = None,
+        limit: int | None = None,
+        offset: int = 0
+    ) -> Dict[str, Any]:
+        """Advanced search with specific filters, like ``MetadataSearch.advanced_search``.
+
+        Args:
+            terms: Dict mapping field names to search terms.
+                Supported fields: name, description, type.
+            project_id: Optional project ID to filter by.
+            dataset_id: Optional dataset ID to filter by.
+            limit: Optional number of results per entity type.
+            offset: Number of results per entity type to skip.
+
+        Returns:
+            Dict with datasets, tables, and fields that match the query, each
+            ordered by similarity to the name and description terms, and
+            ``meta`` if paged.
+        """
+        result = empty_result()
+        totals = {}
+
+        name_term = terms.get("name", "")
+        description_term = terms.get("description", "")
+        type_term = terms.get("type", "")
+
+        entities = [
+            (
+                "datasets", DatasetModel, dataset_result,
+                (DatasetModel.dataset_name,), None, False
+            ),
+            (
+                "tables", TableModel, table_result,
+                (TableModel.table_name, TableModel.full_id), TableModel.table_type, True
+            ),
+            (
+                "fields", FieldModel, field_result,
+                (FieldModel.name, FieldModel.full_id), FieldModel.field_type, True
+            ),
+        ]
+
+        with self.db.get_session() as session:
+            for key, model, to_result, name_columns, type_column, by_dataset in entities:
+                rows_query = session.query(model).filter(visible(model))
+
+                if project_id:
+                    rows_query = rows_query.filter(model.project_id == project_id)
+
+                if dataset_id and by_dataset:
+                    rows_query = rows_query.filter(model.dataset_id == dataset_id)
+
+                conditions = []
+                scores = []
+
+                if name_term:
+                    conditions.append(or_(*[_contains(c, name_term) for c in name_columns]))
+                    scores.append(_similarity(name_term, name_columns))
+
+                if description_term:
+                    conditions.append(_contains(model.description, description_term))
+                    scores.append(_similarity(description_term, [model.description]))
+
+                if type_term and type_column is not None:
+                    conditions.append(_contains(type_column, type_term))
+
+                if not conditions:
+                    continue
+
+                rows_query = rows_query.filter(and_(*conditions))
+                score = _total(scores) if scores else literal(1.0)
+                rows, totals[key] = ranked_rows(
+                    session, rows_query, score, model.full_id, limit, offset
+                )
+                result[key] = [scored(to_result(row), value) for row, value in rows]
+
+        return add_meta(result, limit, offset, totals)
@@ -2,18 +2,40 @@
 Database connection and operations.
 """
 import os
-from sqlalchemy import create_engine
+from dataclasses import asdict
+from collections import defaultdict
+from sqlalchemy import create_engine, event, select, insert, func, tuple_
 from sqlalchemy.orm import sessionmaker, Session
 from sqlalchemy.exc import IntegrityError
 from sqlalchemy.pool import NullPool
 import logging
+import threading
 import time
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Iterator
 
 from app.storage.models import (
     Base, Dataset, Table, Field,
-    DatasetModel, TableModel, FieldModel
+    CatalogGenerationModel, CatalogStateModel, CatalogStatModel, ProjectVersionModel,
+    DatasetModel, TableModel, FieldModel, NameTokenModel, TableSignatureModel, TableBandModel,
+    StaleSignatureModel
 )
+from app.storage.partitioning import (
+    LIST, drop_project_partitions, ensure_project_partitions, get_partitioning
+)
+from app.storage.deadlines import enforce_deadlines
+from app.storage.fts import index_rows, resume_insert_triggers, suspend_insert_triggers
+from app.storage.instrumentation import SQL_INSTRUMENTATION, instrument_engine
+from app.storage.snapshot import CatalogSnapshot
+from app.storage.tokens import delete_tokens, insert_tokens
+from app.storage.signatures import (
+    column_key, delete_signatures, insert_signatures, mark_stale, update_signatures
+)
+from app.storage.stats import (
+    StatsDelta, apply_deltas, count_items, dataset_deltas, field_type_key,
+    rebuild_stats, summarize, table_deltas
+)
+from app.search.tokenize import register_sqlite_functions
+from app.utils.pagination import decode_cursor
 
 logger = logging.getLogger(__name__)
 
@@ -23,6 +45,52 @@ DATABASE_URL = os.environ.get(
     "sqlite:///./bq_metadata.db"
 )
 
+# Number of rows sent per statement by bulk loads
+BULK_INSERT_BATCH_SIZE = 5000
+
+# Number of generations of a project kept after a load, including the current
+# one. Retired generations are what rollback_generation switches back to.
+KEEP_GENERATIONS = int(os.environ.get("KEEP_GENERATIONS", "2"))
+
+# Seconds for which the catalog version read from the database is reused
+CATALOG_VERSION_TTL = float(os.environ.get("CATALOG_VERSION_TTL", "2"))
+
+# Serve the browse reads from an in-memory snapshot of the catalog
+CATALOG_SNAPSHOT = os.environ.get("CATALOG_SNAPSHOT", "0") == "1"
+
+# Number of rows fetched per round trip when streaming the catalog
+EXPORT_BATCH_SIZE = 1000
+
+# Columns emitted by the export, labelled with the keys used by the API
+EXPORT_COLUMNS = {
+    "dataset": (
+        DatasetModel.dataset_name.label("id"),
+        DatasetModel.full_id,
+        DatasetModel.project_id,
+        DatasetModel.friendly_name,
+        DatasetModel.description,
+    ),
+    "table": (
+        TableModel.table_name.label("id"),
+        TableModel.full_id,
+        TableModel.dataset_id,
+        TableModel.project_id,
+        TableModel.friendly_name,
+        TableModel.description,
+        TableModel.table_type,
+    ),
+    "field": (
+        FieldModel.name,
+        FieldModel.full_id,
+        FieldModel.table_id,
+        FieldModel.dataset_id,
+        FieldModel.project_id,
+        FieldModel.field_type,
+        FieldModel.description,
+        FieldModel.mode,
+    ),
+}
+
 # Configure additional engine arguments based on DB type
 engine_args = {}
 
@@ -32,6 +100,77 @@ if DATABASE_URL.startswith("postgresql"):
     if os.environ.get("DISABLE_POOL", "0") == "1":
         engine_args["poolclass"] = NullPool
 
+def visible(model):
+    """Build the filter restricting a catalog model to the current generations.
+
+    The subquery is not correlated, so the database evaluates it once per
+    statement against the small ``catalog_generations`` table.
+
+    Args:
+        model: DatasetModel, TableModel or FieldModel.
+
+    Returns:
+        A SQL expression to pass to ``Query.filter``.
+    """
+    return model.generation.in_(
+        select(CatalogGenerationModel.id).where(
+            CatalogGenerationModel.status == CatalogGenerationModel.CURRENT
+        )
+    )
+
+
+def _catalog_row(item: Dataset | Table | Field, generation: int) -> Dict[str, Any]:
+    """Convert a metadata dataclass into a row for a bulk insert.
+
+    Args:
+        item: The dataset, table or field.
+        generation: The generation the row belongs to.
+
+    Returns:
+        Column values keyed by column name.
+    """
+    row = asdict(item)
+    if isinstance(item, Dataset):
+        row["dataset_name"] = row.pop("id")
+    elif isinstance(item, Table):
+        row["table_name"] = row.pop("id")
+    row["generation"] = generation
+    return row
+
+
+def _paginate(query, column, limit: int | None, cursor: str | None):
+    """Apply keyset pagination on a unique, indexed column.
+
+    Rows are ordered by ``column`` and the page starts strictly after the key
+    encoded in ``cursor``, so every page is an index range scan regardless of
+    how deep into the result set it is.
+
+    Args:
+        query: The query to paginate.
+        column: The unique column to order and seek on.
+        limit: Optional maximum number of rows to return.
+        cursor: Optional cursor returned with the previous page.
+
+    Returns:
+        The paginated query.
+
+    Raises:
+        ValueError: If the cursor is malformed.
+    """
+    if limit is None and cursor is None:
+        return query
+
+    if cursor is not None:
+        query = query.filter(column > decode_cursor(cursor))
+
+    query = query.order_by(column)
+
+    if limit is not None:
+        query = query.limit(limit)
+
+    return query
+
+
 class Database:
     """Database operations for BigQuery metadata."""
     
@@ -48,16 +187,50 @@ class Database:
         """Initialize the database connection."""
         self.engine = create_engine(DATABASE_URL, **engine_args)
         self.SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=self.engine)
+        if SQL_INSTRUMENTATION:
+            instrument_engine(self.engine)
+        enforce_deadlines(self.engine)
+        if self.engine.dialect.name == "sqlite":
+            # Called by the triggers maintaining the FTS5 search tables
+            event.listen(self.engine, "connect", register_sqlite_functions)
+        self._partitioning = None
+        self._partitioning_checked = False
+        self._catalog_version = None
+        self._catalog_version_checked_at = 0.0
+        self._snapshot = None
+        self._snapshot_lock = threading.Lock()
+        self._schema_ready = False
+        self._schema_lock = threading.Lock()
+    
+    @property
+    def schema_ready(self) -> bool:
+        """Whether the schema has been created or verified."""
+        return self._schema_ready
+    
+    def ensure_schema(self, max_retries: int = 5, retry_delay: float = 2) -> None:
+        """Create the tables if they don't exist.
         
-        # Try to connect to the database with retries (useful for Docker startup)
-        max_retries = 5
-        retry_delay = 2
+        Creating the engine does not connect to the database; this is the first
+        call that does. It is idempotent and cheap once it has succeeded.
         
+        Args:
+            max_retries: Number of connection attempts (useful for Docker startup).
+            retry_delay: Seconds to wait after the first failed attempt, doubled
+                after each further one.
+                
+        Raises:
+            Exception: The last connection error if all attempts failed.
+        """
         for attempt in range(max_retries):
+            if self._schema_ready:
+                return
+            
             try:
-                # Create tables if they don't exist
-                Base.metadata.create_all(bind=self.engine)
-                break
+                with self._schema_lock:
+                    if not self._schema_ready:
+                        Base.metadata.create_all(bind=self.engine)
+                        self._schema_ready = True
+                return
             except Exception as e:
                 if attempt < max_retries - 1:
                     logger.warning(f"Database connection attempt {attempt + 1} failed: {e}. Retrying in {retry_delay} seconds...")
@@ -67,10 +240,183 @@ class Database:
                     logger.error(f"Failed to connect to database after {max_retries} attempts: {e}")
                     raise
     
+    def ping(self) -> bool:
+        """Check whether the database is reachable.
+        
+        Returns:
+            True if a trivial query succeeded.
+        """
+        try:
+            with self.engine.connect() as connection:
+                connection.execute(select(1))
+            return True
+        except Exception as e:
+            logger.warning(f"Database is not reachable: {e}")
+            return False
+    
     def get_session(self) -> Session:
-        """Get a database session."""
+        """Get a database session.
+        
+        The schema is created on first use if ``ensure_schema`` has not been
+        called yet.
+        """
+        if not self._schema_ready:
+            self.ensure_schema(max_retries=1)
         return self.SessionLocal()
     
+    def partitioning(self) -> str | None:
+        """Get how the catalog tables are partitioned by project.
+        
+        Returns:
+            ``"list"`` or ``"hash"`` on a partitioned PostgreSQL database,
+            None otherwise.
+        """
+        if not self._partitioning_checked:
+            with self.engine.connect() as connection:
+                self._partitioning = get_partitioning(connection)
+            self._partitioning_checked = True
+        return self._partitioning
+    
+    def catalog_version(self) -> int:
+        """Get the version of the catalog.
+        
+        The version changes whenever the visible catalog changes, in this or
+        any other process. It is read from the database at most once every
+        ``CATALOG_VERSION_TTL`` seconds, and immediately after a write made
+        through this instance.
+        
+        Returns:
+            The catalog version.
+        """
+        now = time.monotonic()
+        
+        if (
+            self._catalog_version is None
+            or now - self._catalog_version_checked_at > CATALOG_VERSION_TTL
+        ):
+            with self.get_session() as session:
+                version = session.query(CatalogStateModel.version).filter_by(id=1).scalar()
+            self._catalog_version = version or 0
+            self._catalog_version_checked_at = now
+        
+        return self._catalog_version
+    
+    def load_snapshot(self) -> CatalogSnapshot:
+        """Load the in-memory snapshot of the catalog.
+        
+        Concurrent callers wait for the load in progress rather than starting
+        their own. If the catalog changes during the load, the version recorded is the
+        one read before the load, so the next read reloads it again.
+        
+        Returns:
+            The loaded snapshot.
+        """
+        with self._snapshot_lock:
+            with self.get_session() as session:
+                version = session.query(CatalogStateModel.version).filter_by(id=1).scalar() or 0
+                
+                if self._snapshot is None or self._snapshot.version != version:
+                    self._snapshot = CatalogSnapshot.load(session, version, visible)
+            
+            return self._snapshot
+    
+    def snapshot(self) -> CatalogSnapshot | None:
+        """Get the snapshot of the catalog to serve reads from.
+        
+        Returns:
+            The snapshot, reloaded if the catalog version changed, or None if
+            ``CATALOG_SNAPSHOT`` is not enabled.
+        """
+        if not CATALOG_SNAPSHOT:
+            return None
+        
+        snapshot = self._snapshot
+        
+        if snapshot is None or snapshot.version != self.catalog_version():
+            snapshot = self.load_snapshot()
+        
+        return snapshot
+    
+    def _bump_catalog_version(self, session: Session, project_id: str) -> None:
+        """Increment the catalog version as part of a write transaction.
+        
+        Args:
+            session: The session making the write.
+            project_id: The project written, whose version is incremented too.
+        """
+        updated = session.query(CatalogStateModel).filter_by(id=1).update(
+            {"version": CatalogStateModel.version + 1}, synchronize_session=False
+        )
+        
+        if not updated:
+            session.add(CatalogStateModel(id=1, version=1))
+        
+        updated = session.query(ProjectVersionModel).filter_by(project_id=project_id).update(
+            {"version": ProjectVersionModel.version + 1}, synchronize_session=False
+        )
+        
+        if not updated:
+            session.add(ProjectVersionModel(project_id=project_id, version=1))
+        
+        # Re-read the version on the next call
+        self._catalog_version = None
+    
+    def _prepare_project(self, session: Session, project_id: str) -> None:
+        """Prepare storage for a project before its first rows are written.
+        
+        Args:
+            session: The session that will write the rows.
+            project_id: The project ID.
+        """
+        if self.partitioning() == LIST:
+            ensure_project_partitions(session.connection(), project_id)
+    
+    def _current_generation(self, session: Session, project_id: str) -> int:
+        """Get the current generation of a project, creating it if needed.
+        
+        Rows written through ``save_*`` go into the current generation, so
+        projects that were never bulk loaded still get one.
+        
+        Args:
+            session: The session to use.
+            project_id: The project ID.
+            
+        Returns:
+            The ID of the current generation.
+        """
+        generation_id = session.query(CatalogGenerationModel.id).filter_by(
+            project_id=project_id,
+            status=CatalogGenerationModel.CURRENT
+        ).scalar()
+        
+        if generation_id is None:
+            self._prepare_project(session, project_id)
+            generation = CatalogGenerationModel(
+                project_id=project_id,
+                status=CatalogGenerationModel.CURRENT,
+                activated_at=func.now()
+            )
+            session.add(generation)
+            session.flush()
+            generation_id = generation.id
+        
+        return generation_id
+    
+    def _index_names(self, session: Session, entity_type: str, row, name_column) -> None:
+        """Replace the name tokens of a saved catalog row.
+        
+        Args:
+            session: The session saving the row.
+            entity_type: ``dataset``, ``table`` or ``field``.
+            row: The new or updated model instance.
+            name_column: The name column of the model.
+        """
+        session.flush()
+        delete_tokens(session, entity_type, [row.id])
+        insert_tokens(session, entity_type, [
+            (row.id, row.generation, getattr(row, name_column.key), row.full_id)
+        ])
+    
     def save_dataset(self, dataset: Dataset) -> None:
         """Save a dataset to the database.
         
@@ -81,7 +427,11 @@ class Database:
         
         with self.get_session() as session:
             try:
-                existing = session.query(DatasetModel).filter_by(dataset_name=dataset.id).first()
+                db_model.generation = self._current_generation(session, dataset.project_id)
+                existing = session.query(DatasetModel).filter_by(
+                    full_id=dataset.full_id,
+                    generation=db_model.generation
+                ).first()
                 
                 if existing:
                     # Update existing record
@@ -91,7 +441,14 @@ class Database:
                 else:
                     # Insert new record
                     session.add(db_model)
+                    apply_deltas(
+                        session, db_model.generation, dataset.project_id, count_items(datasets=[dataset])
+                    )
                 
+                self._index_names(
+                    session, NameTokenModel.DATASET, existing or db_model, DatasetModel.dataset_name
+                )
+                self._bump_catalog_version(session, dataset.project_id)
                 session.commit()
             except IntegrityError as e:
                 logger.error(f"Error saving dataset {dataset.id} ({dataset.full_id}): {e}")
@@ -108,13 +465,18 @@ class Database:
         
         with self.get_session() as session:
             try:
-                existing = session.query(TableModel).filter_by(full_id=table.full_id).first()
+                db_model.generation = self._current_generation(session, table.project_id)
+                existing = session.query(TableModel).filter_by(
+                    full_id=table.full_id,
+                    generation=db_model.generation
+                ).first()
                 
                 if not existing:
                     # Try by table_name and dataset_id for backward compatibility
                     existing = session.query(TableModel).filter_by(
                         table_name=table.id,
-                        dataset_id=table.dataset_id
+                        dataset_id=table.dataset_id,
+                        generation=db_model.generation
                     ).first()
                 
                 if existing:
@@ -125,7 +487,15 @@ class Database:
                 else:
                     # Insert new record
                     session.add(db_model)
+                    apply_deltas(
+                        session, db_model.generation, table.project_id, count_items(tables=[table])
+                    )
                 
+                self._index_names(
+                    session, NameTokenModel.TABLE, existing or db_model, TableModel.table_name
+                )
+                update_signatures(session, [(existing or db_model).id])
+                self._bump_catalog_version(session, table.project_id)
                 session.commit()
             except IntegrityError as e:
                 logger.error(f"Error saving table {table.id} ({table.full_id}): {e}")
@@ -142,9 +512,20 @@ class Database:
         
         with self.get_session() as session:
             try:
-                existing = session.query(FieldModel).filter_by(full_id=field.full_id).first()
+                db_model.generation = self._current_generation(session, field.project_id)
+                existing = session.query(FieldModel).filter_by(
+                    full_id=field.full_id,
+                    generation=db_model.generation
+                ).first()
                 
                 if existing:
+                    if field.field_type is not None and field.field_type != existing.field_type:
+                        # Move the field to its new type in the statistics
+                        apply_deltas(session, db_model.generation, field.project_id, StatsDelta({
+                            (existing.dataset_id, CatalogStatModel.FIELD_TYPE, field_type_key(existing.field_type)): -1,
+                            (existing.dataset_id, CatalogStatModel.FIELD_TYPE, field_type_key(field.field_type)): 1
+                        }))
+                    
                     # Update existing record
                     for key, value in vars(db_model).items():
                         if key != '_sa_instance_state' and key != 'id' and value is not None:
@@ -152,38 +533,363 @@ class Database:
                 else:
                     # Insert new record
                     session.add(db_model)
+                    apply_deltas(
+                        session, db_model.generation, field.project_id, count_items(fields=[field])
+                    )
                 
+                self._index_names(session, NameTokenModel.FIELD, existing or db_model, FieldModel.name)
+                mark_stale(session, select(TableModel.id).filter_by(
+                    project_id=field.project_id,
+                    dataset_id=field.dataset_id,
+                    table_name=field.table_id,
+                    generation=db_model.generation
+                ))
+                self._bump_catalog_version(session, field.project_id)
                 session.commit()
             except IntegrityError as e:
                 logger.error(f"Error saving field {field.full_id}: {e}")
                 session.rollback()
                 raise
     
+    def begin_generation(self, project_id: str) -> int:
+        """Start loading a new generation of a project's catalog.
+        
+        Rows loaded into the generation with ``bulk_load`` stay invisible until
+        ``activate_generation`` is called.
+        
+        Args:
+            project_id: The project ID.
+            
+        Returns:
+            The ID of the new generation.
+        """
+        with self.get_session() as session:
+            self._prepare_project(session, project_id)
+            generation = CatalogGenerationModel(
+                project_id=project_id,
+                status=CatalogGenerationModel.LOADING
+            )
+            session.add(generation)
+            session.commit()
+            logger.info(f"Started generation {generation.id} for project {project_id}")
+            return generation.id
+    
+    def bulk_load(
+        self,
+        generation_id: int,
+        datasets: List[Dataset] = (),
+        tables: List[Table] = (),
+        fields: List[Field] = ()
+    ) -> None:
+        """Insert metadata into a generation that is being loaded.
+        
+        The generation starts empty, so rows are inserted in batches of
+        ``BULK_INSERT_BATCH_SIZE`` without checking for existing rows. The
+        statistics, name tokens and schema signatures of the generation, and
+        the SQLite full-text indexes, are written in the same transaction. Tables get their signatures from the
+        fields loaded with them, or are recomputed when fields are loaded
+        after their table.
+        
+        Args:
+            generation_id: The generation returned by ``begin_generation``.
+            datasets: Datasets to insert.
+            tables: Tables to insert.
+            fields: Fields to insert.
+        """
+        with self.get_session() as session:
+            table_ids = {}
+            
+            # Index the rows in batches rather than from a trigger per row
+            fts = self.engine.dialect.name == "sqlite" and suspend_insert_triggers(session.connection())
+            
+            # (entity type, model, items, attribute holding the name)
+            for entity_type, model, items, name_attribute in (
+                (NameTokenModel.DATASET, DatasetModel, datasets, "id"),
+                (NameTokenModel.TABLE, TableModel, tables, "id"),
+                (NameTokenModel.FIELD, FieldModel, fields, "name")
+            ):
+                for start in range(0, len(items), BULK_INSERT_BATCH_SIZE):
+                    batch = items[start:start + BULK_INSERT_BATCH_SIZE]
+                    # A Core insert, as the ORM splices the RETURNING rows of
+                    # every page quadratically; rows are matched back by full
+                    # ID, as sort_by_parameter_order inserts one row per
+                    # statement on SQLite
+                    rows = [_catalog_row(item, generation_id) for item in batch]
+                    inserted = dict(session.connection().execute(
+                        insert(model.__table__).returning(model.full_id, model.id), rows
+                    ).all())
+                    ids = [inserted[item.full_id] for item in batch]
+                    if fts:
+                        index_rows(session.connection(), model.__tablename__, zip(ids, rows))
+                    insert_tokens(session, entity_type, (
+                        (row_id, generation_id, getattr(item, name_attribute), item.full_id)
+                        for row_id, item in zip(ids, batch)
+                    ))
+                    if model is TableModel:
+                        table_ids.update(
+                            ((item.dataset_id, item.id), row_id) for row_id, item in zip(ids, batch)
+                        )
+            
+            self._sign_tables(session, generation_id, table_ids, fields)
+            
+            if fts:
+                resume_insert_triggers(session.connection())
+            
+            project_id = session.get(CatalogGenerationModel, generation_id).project_id
+            apply_deltas(session, generation_id, project_id, count_items(datasets, tables, fields))
+            session.commit()
+    
+    def _sign_tables(
+        self,
+        session: Session,
+        generation_id: int,
+        table_ids: Dict[tuple, int],
+        fields: List[Field]
+    ) -> None:
+        """Write the schema signatures of the tables of a bulk load.
+        
+        Args:
+            session: The session of the load.
+            generation_id: The generation being loaded.
+            table_ids: The row ID of each (dataset ID, table ID) loaded.
+            fields: The fields loaded.
+        """
+        columns = defaultdict(set)
+        for field in fields:
+            columns[(field.dataset_id, field.table_id)].add(column_key(field.name, field.field_type))
+        
+        insert_signatures(session, (
+            (row_id, generation_id, columns.get(key, ())) for key, row_id in table_ids.items()
+        ))
+        
+        # Fields of tables loaded by an earlier call
+        earlier = [key for key in columns if key not in table_ids]
+        if earlier:
+            update_signatures(session, session.execute(
+                select(TableModel.id).where(
+                    TableModel.generation == generation_id,
+                    tuple_(TableModel.dataset_id, TableModel.table_name).in_(earlier)
+                )
+            ).scalars().all())
+    
+    def activate_generation(self, generation_id: int, keep: int = KEEP_GENERATIONS) -> None:
+        """Make a loaded generation the current one for its project.
+        
+        The previous current generation is retired and the pointer is switched
+        in a single transaction, so readers see either the old or the new
+        catalog. Generations beyond the ``keep`` most recent are then deleted.
+        
+        Args:
+            generation_id: The generation to activate.
+            keep: Number of generations to keep, including the new one.
+            
+        Raises:
+            ValueError: If the generation does not exist.
+        """
+        with self.get_session() as session:
+            generation = session.get(CatalogGenerationModel, generation_id)
+            
+            if generation is None:
+                raise ValueError(f"Generation {generation_id} does not exist")
+            
+            session.query(CatalogGenerationModel).filter_by(
+                project_id=generation.project_id,
+                status=CatalogGenerationModel.CURRENT
+            ).update({"status": CatalogGenerationModel.RETIRED}, synchronize_session=False)
+            session.flush()
+            
+            generation.status = CatalogGenerationModel.CURRENT
+            generation.activated_at = func.now()
+            self._bump_catalog_version(session, generation.project_id)
+            session.commit()
+            project_id = generation.project_id
+        
+        logger.info(f"Activated generation {generation_id} for project {project_id}")
+        self.gc_generations(project_id, keep=keep)
+    
+    def abort_generation(self, generation_id: int) -> None:
+        """Discard a generation that failed to load.
+        
+        Args:
+            generation_id: The generation to discard.
+        """
+        with self.get_session() as session:
+            self._delete_generations(session, [generation_id])
+            session.commit()
+        
+        logger.info(f"Aborted generation {generation_id}")
+    
+    def rollback_generation(self, project_id: str) -> int | None:
+        """Switch a project back to its most recent retired generation.
+        
+        Args:
+            project_id: The project ID.
+            
+        Returns:
+            The ID of the generation that is now current, or None if there was
+            no retired generation to roll back to.
+        """
+        with self.get_session() as session:
+            previous = session.query(CatalogGenerationModel).filter_by(
+                project_id=project_id,
+                status=CatalogGenerationModel.RETIRED
+            ).order_by(CatalogGenerationModel.id.desc()).first()
+            
+            if previous is None:
+                return None
+            
+            # The generation being rolled back from is not kept around
+            current_ids = [
+                g.id for g in session.query(CatalogGenerationModel.id).filter_by(
+                    project_id=project_id,
+                    status=CatalogGenerationModel.CURRENT
+                )
+            ]
+            self._delete_generations(session, current_ids)
+            session.flush()
+            
+            previous.status = CatalogGenerationModel.CURRENT
+            previous.activated_at = func.now()
+            self._bump_catalog_version(session, project_id)
+            session.commit()
+            
+            logger.info(f"Rolled project {project_id} back to generation {previous.id}")
+            return previous.id
+    
+    def gc_generations(self, project_id: str, keep: int = KEEP_GENERATIONS) -> List[int]:
+        """Delete old generations of a project.
+        
+        The current generation and the most recent retired ones are kept, up to
+        ``keep`` generations in total. Loads that never completed and are older
+        than the current generation are deleted as well.
+        
+        Args:
+            project_id: The project ID.
+            keep: Number of generations to keep, including the current one.
+            
+        Returns:
+            IDs of the deleted generations.
+        """
+        with self.get_session() as session:
+            generations = session.query(CatalogGenerationModel).filter_by(
+                project_id=project_id
+            ).order_by(CatalogGenerationModel.id.desc()).all()
+            
+            current_id = next(
+                (g.id for g in generations if g.status == CatalogGenerationModel.CURRENT),
+                None
+            )
+            retired = [g.id for g in generations if g.status == CatalogGenerationModel.RETIRED]
+            stale = [
+                g.id for g in generations
+                if g.status == CatalogGenerationModel.LOADING
+                and current_id is not None and g.id < current_id
+            ]
+            
+            expired = retired[max(keep - 1, 0):] + stale
+            
+            if expired:
+                self._delete_generations(session, expired)
+                session.commit()
+                logger.info(f"Deleted generations {expired} of project {project_id}")
+            
+            return expired
+    
+    def list_generations(self, project_id: str) -> List[Dict[str, Any]]:
+        """List the generations of a project, newest first.
+        
+        Args:
+            project_id: The project ID.
+            
+        Returns:
+            List of generation metadata.
+        """
+        with self.get_session() as session:
+            generations = session.query(CatalogGenerationModel).filter_by(
+                project_id=project_id
+            ).order_by(CatalogGenerationModel.id.desc()).all()
+            
+            return [
+                {
+                    "id": g.id,
+                    "project_id": g.project_id,
+                    "status": g.status,
+                    "created_at": g.created_at,
+                    "activated_at": g.activated_at
+                }
+                for g in generations
+            ]
+    
+    def _delete_generations(self, session: Session, generation_ids: List[int]) -> None:
+        """Delete generations and all their rows.
+        
+        Args:
+            session: The session to use.
+            generation_ids: The generations to delete.
+        """
+        if not generation_ids:
+            return
+        
+        for model in (
+            FieldModel, TableModel, DatasetModel, CatalogStatModel, NameTokenModel,
+            TableSignatureModel, TableBandModel, StaleSignatureModel
+        ):
+            session.query(model).filter(
+                model.generation.in_(generation_ids)
+            ).delete(synchronize_session=False)
+        
+        session.query(CatalogGenerationModel).filter(
+            CatalogGenerationModel.id.in_(generation_ids)
+        ).delete(synchronize_session=False)
+    
     def get_projects(self) -> List[str]:
         """Get all projects in the database.
         
         Returns:
             List of project IDs.
         """
+        snapshot = self.snapshot()
+        if snapshot is not None:
+            return snapshot.get_projects()
+        
         with self.get_session() as session:
-            projects = session.query(DatasetModel.project_id).distinct().all()
+            projects = session.query(DatasetModel.project_id).filter(
+                visible(DatasetModel)
+            ).distinct().all()
             return [p[0] for p in projects]
     
-    def get_datasets(self, project_id: str | None = None) -> List[Dict[str, Any]]:
+    def get_datasets(
+        self,
+        project_id: str | None = None,
+        limit: int | None = None,
+        cursor: str | None = None
+    ) -> List[Dict[str, Any]]:
         """Get all datasets in the database.
         
         Args:
             project_id: Optional project ID to filter by.
+            limit: Optional maximum number of datasets to return.
+            cursor: Optional cursor to resume after, as returned by
+                ``app.utils.pagination.next_cursor``.
             
         Returns:
-            List of dataset metadata.
+            List of dataset metadata, ordered by full ID when paginated.
+
+        Raises:
+            ValueError: If the cursor is malformed.
         """
+        if limit is None and cursor is None:
+            snapshot = self.snapshot()
+            if snapshot is not None:
+                return snapshot.get_datasets(project_id)
+        
         with self.get_session() as session:
-            query = session.query(DatasetModel)
+            query = session.query(DatasetModel).filter(visible(DatasetModel))
             
             if project_id:
                 query = query.filter(DatasetModel.project_id == project_id)
             
+            query = _paginate(query, DatasetModel.full_id, limit, cursor)
             datasets = query.all()
             
             return [
@@ -200,19 +906,31 @@ class Database:
     def get_tables(
         self, 
         project_id: str | None = None, 
-        dataset_id: str | None = None
+        dataset_id: str | None = None,
+        limit: int | None = None,
+        cursor: str | None = None
     ) -> List[Dict[str, Any]]:
         """Get tables from the database.
         
         Args:
             project_id: Optional project ID to filter by.
             dataset_id: Optional dataset ID to filter by.
+            limit: Optional maximum number of tables to return.
+            cursor: Optional cursor to resume after.
             
         Returns:
-            List of table metadata.
+            List of table metadata, ordered by full ID when paginated.
+
+        Raises:
+            ValueError: If the cursor is malformed.
         """
+        if limit is None and cursor is None:
+            snapshot = self.snapshot()
+            if snapshot is not None:
+                return snapshot.get_tables(project_id, dataset_id)
+        
         with self.get_session() as session:
-            query = session.query(TableModel)
+            query = session.query(TableModel).filter(visible(TableModel))
             
             if project_id:
                 query = query.filter(TableModel.project_id == project_id)
@@ -220,6 +938,7 @@ class Database:
             if dataset_id:
                 query = query.filter(TableModel.dataset_id == dataset_id)
             
+            query = _paginate(query, TableModel.full_id, limit, cursor)
             tables = query.all()
             
             return [
@@ -239,7 +958,9 @@ class Database:
         self,
         project_id: str | None = None,
         dataset_id: str | None = None,
-        table_id: str | None = None
+        table_id: str | None = None,
+        limit: int | None = None,
+        cursor: str | None = None
     ) -> List[Dict[str, Any]]:
         """Get fields from the database.
         
@@ -247,12 +968,17 @@ class Database:
             project_id: Optional project ID to filter by.
             dataset_id: Optional dataset ID to filter by.
             table_id: Optional table ID to filter by.
+            limit: Optional maximum number of fields to return.
+            cursor: Optional cursor to resume after.
             
         Returns:
-            List of field metadata.
+            List of field metadata, ordered by full ID when paginated.
+
+        Raises:
+            ValueError: If the cursor is malformed.
         """
         with self.get_session() as session:
-            query = session.query(FieldModel)
+            query = session.query(FieldModel).filter(visible(FieldModel))
             
             if project_id:
                 query = query.filter(FieldModel.project_id == project_id)
@@ -261,20 +987,11 @@ class Database:
                 query = query.filter(FieldModel.dataset_id == dataset_id)
             
             if table_id:
-                # If we have all the components to build a full_id pattern, use that
-                if dataset_id and project_id:
-                    table_full_id = f"{project_id}.{dataset_id}.{table_id}"
-                    query = query.filter(FieldModel.full_id.like(f"{table_full_id}.%"))
-                elif dataset_id:
-                    # Try to get project_id from dataset
-                    dataset = session.query(DatasetModel).filter_by(dataset_name=dataset_id).first()
-                    if dataset:
-                        table_full_id = f"{dataset.project_id}.{dataset_id}.{table_id}"
-                        query = query.filter(FieldModel.full_id.like(f"{table_full_id}.%"))
-                else:
-                    # Fall back to direct table_id match if we can't build a full_id pattern
-                    query = query.filter(FieldModel.table_id == table_id)
+                # Together with the filters above this is served by the
+                # (project_id, dataset_id, table_id) index
+                query = query.filter(FieldModel.table_id == table_id)
             
+            query = _paginate(query, FieldModel.full_id, limit, cursor)
             fields = query.all()
             
             return [
@@ -301,28 +1018,40 @@ class Database:
         Returns:
             Table metadata with fields.
         """
+        snapshot = self.snapshot()
+        if snapshot is not None:
+            return snapshot.get_table_with_fields(dataset_id, table_id)
+        
         with self.get_session() as session:
             # First try to find by id (for backward compatibility)
             table = session.query(TableModel).filter_by(
                 dataset_id=dataset_id, 
                 table_name=table_id
-            ).first()
+            ).filter(visible(TableModel)).first()
             
             # If not found, try to find by full_id
             if not table:
-                full_id = f"{session.query(DatasetModel).filter_by(dataset_name=dataset_id).first().project_id}.{dataset_id}.{table_id}"
-                table = session.query(TableModel).filter_by(full_id=full_id).first()
+                dataset = session.query(DatasetModel).filter_by(
+                    dataset_name=dataset_id
+                ).filter(visible(DatasetModel)).first()
+                
+                if dataset:
+                    full_id = f"{dataset.project_id}.{dataset_id}.{table_id}"
+                    table = session.query(TableModel).filter_by(
+                        full_id=full_id,
+                        generation=dataset.generation
+                    ).first()
             
             if not table:
                 return None
             
-            # Get fields using table's full_id
-            fields = []
-            if table:
-                # Extract table_id part from full_id for backward compatibility
-                fields = session.query(FieldModel).filter(
-                    FieldModel.full_id.like(f"{table.full_id}.%")
-                ).all()
+            # Get fields using the table's path
+            fields = session.query(FieldModel).filter_by(
+                project_id=table.project_id,
+                dataset_id=table.dataset_id,
+                table_id=table.table_name,
+                generation=table.generation
+            ).all()
             
             return {
                 "id": table.table_name,
@@ -344,6 +1073,177 @@ class Database:
                 ]
             }
     
+    def get_stats(
+        self,
+        project_id: str | None = None,
+        dataset_id: str | None = None
+    ) -> Dict[str, Any]:
+        """Get counts of datasets, tables and fields and the field types.
+        
+        The counts are read from the statistics maintained by the writes, so
+        the cost does not depend on the size of the catalog.
+        
+        Args:
+            project_id: Optional project ID. Without it, the totals of all
+                projects are returned along with the counts of each project.
+            dataset_id: Optional dataset ID, requires ``project_id``.
+            
+        Returns:
+            Dict with datasets, tables, fields and field_types counts.
+        """
+        with self.get_session() as session:
+            query = session.query(
+                CatalogStatModel.project_id,
+                CatalogStatModel.metric,
+                CatalogStatModel.key,
+                CatalogStatModel.value
+            ).filter(
+                visible(CatalogStatModel),
+                CatalogStatModel.dataset_id == (dataset_id if project_id and dataset_id else "")
+            )
+            
+            if project_id:
+                query = query.filter(CatalogStatModel.project_id == project_id)
+            
+            rows = query.all()
+        
+        stats = {"project_id": project_id, "dataset_id": dataset_id if project_id else None}
+        stats.update(summarize((metric, key, value) for _, metric, key, value in rows))
+        
+        if not project_id:
+            projects = {}
+            for row_project_id, metric, key, value in rows:
+                projects.setdefault(row_project_id, []).append((metric, key, value))
+            stats["projects"] = [
+                {"project_id": p, **summarize(project_rows)}
+                for p, project_rows in sorted(projects.items())
+            ]
+        
+        return stats
+    
+    def rebuild_stats(self, project_id: str | None = None) -> None:
+        """Recompute the statistics from the catalog tables.
+        
+        Only needed to repair the statistics, e.g. after rows were changed
+        outside of this class.
+        
+        Args:
+            project_id: Optional project to recompute, all projects by default.
+        """
+        with self.get_session() as session:
+            query = session.query(CatalogGenerationModel.id)
+            
+            if project_id:
+                query = query.filter_by(project_id=project_id)
+            
+            rebuild_stats(session, [g.id for g in query])
+            session.commit()
+    
+    def iter_export(
+        self,
+        project_id: str | None = None,
+        dataset_id: str | None = None,
+        entity_types: List[str] | None = None
+    ) -> Iterator[Dict[str, Any]]:
+        """Stream the catalog row by row.
+
+        Rows are read through a server-side cursor in batches of
+        ``EXPORT_BATCH_SIZE``, so memory use does not depend on the size of the
+        catalog. All entity types are read in the same session.
+
+        Args:
+            project_id: Optional project ID to filter by.
+            dataset_id: Optional dataset ID to filter by.
+            entity_types: Entity types to export, in order. Defaults to
+                datasets, tables and fields.
+
+        Yields:
+            Metadata dicts with an additional ``type`` key.
+        """
+        models = {"dataset": DatasetModel, "table": TableModel, "field": FieldModel}
+        dataset_columns = {
+            "dataset": DatasetModel.dataset_name,
+            "table": TableModel.dataset_id,
+            "field": FieldModel.dataset_id,
+        }
+
+        with self.get_session() as session:
+            for entity_type in entity_types or ["dataset", "table", "field"]:
+                model = models[entity_type]
+                stmt = select(*EXPORT_COLUMNS[entity_type]).where(visible(model))
+
+                if project_id:
+                    stmt = stmt.where(model.project_id == project_id)
+
+                if dataset_id:
+                    stmt = stmt.where(dataset_columns[entity_type] == dataset_id)
+
+                rows = session.execute(
+                    stmt.order_by(model.full_id).execution_options(
+                        stream_results=True, yield_per=EXPORT_BATCH_SIZE
+                    )
+                )
+
+                for row in rows:
+                    record = {"type": entity_type}
+                    record.update(row._mapping)
+                    yield record
+    
+    def delete_project(self, project_id: str) -> bool:
+        """Delete a project with all its generations, datasets, tables and fields.
+        
+        When the catalog is list-partitioned by project, the project's
+        partitions are detached and dropped instead of deleting their rows.
+        
+        Args:
+            project_id: The project ID.
+            
+        Returns:
+            True if the project was deleted, False if it does not exist.
+        """
+        with self.get_session() as session:
+            try:
+                exists = session.query(CatalogGenerationModel.id).filter_by(
+                    project_id=project_id
+                ).first()
+                
+                if not exists:
+                    return False
+                
+                for model in (NameTokenModel, TableSignatureModel, TableBandModel, StaleSignatureModel):
+                    session.query(model).filter(
+                        model.generation.in_(
+                            select(CatalogGenerationModel.id).where(
+                                CatalogGenerationModel.project_id == project_id
+                            )
+                        )
+                    ).delete(synchronize_session=False)
+                
+                if self.partitioning() == LIST:
+                    drop_project_partitions(session.connection(), project_id)
+                else:
+                    for model in (FieldModel, TableModel):
+                        session.query(model).filter_by(
+                            project_id=project_id
+                        ).delete(synchronize_session=False)
+                
+                for model in (DatasetModel, CatalogStatModel):
+                    session.query(model).filter_by(
+                        project_id=project_id
+                    ).delete(synchronize_session=False)
+                session.query(CatalogGenerationModel).filter_by(
+                    project_id=project_id
+                ).delete(synchronize_session=False)
+                
+                self._bump_catalog_version(session, project_id)
+                session.commit()
+                logger.info(f"Deleted project {project_id}")
+                return True
+            except Exception as e:
+                logger.error(f"Error deleting project {project_id}: {e}")
+                session.rollback()
+                return False
+    
     def delete_dataset(self, dataset_id: str, project_id: str) -> bool:
         """Delete a dataset and all its associated tables and fields.
         
@@ -360,32 +1260,46 @@ class Database:
                 dataset = session.query(DatasetModel).filter_by(
                     dataset_name=dataset_id,
                     project_id=project_id
-                ).first()
+                ).filter(visible(DatasetModel)).first()
                 
                 if not dataset:
                     return False
                 
-                # Get all tables in the dataset
-                tables = session.query(TableModel).filter_by(
-                    dataset_id=dataset_id,
-                    project_id=project_id
-                ).all()
+                deltas = dataset_deltas(session, dataset.generation, project_id, dataset_id)
+                
+                for entity_type, model in (
+                    (NameTokenModel.FIELD, FieldModel), (NameTokenModel.TABLE, TableModel)
+                ):
+                    delete_tokens(session, entity_type, select(model.id).where(
+                        model.project_id == project_id,
+                        model.dataset_id == dataset_id,
+                        model.generation == dataset.generation
+                    ))
+                delete_tokens(session, NameTokenModel.DATASET, [dataset.id])
+                delete_signatures(session, select(TableModel.id).where(
+                    TableModel.project_id == project_id,
+                    TableModel.dataset_id == dataset_id,
+                    TableModel.generation == dataset.generation
+                ))
                 
                 # Delete all fields associated with tables in this dataset
-                for table in tables:
-                    # Delete fields using table's full_id
-                    session.query(FieldModel).filter(
-                        FieldModel.full_id.like(f"{table.full_id}.%")
-                    ).delete(synchronize_session=False)
+                session.query(FieldModel).filter_by(
+                    project_id=project_id,
+                    dataset_id=dataset_id,
+                    generation=dataset.generation
+                ).delete(synchronize_session=False)
                 
                 # Delete all tables in the dataset
                 session.query(TableModel).filter_by(
                     dataset_id=dataset_id,
-                    project_id=project_id
+                    project_id=project_id,
+                    generation=dataset.generation
                 ).delete(synchronize_session=False)
                 
                 # Delete the dataset
                 session.delete(dataset)
+                apply_deltas(session, dataset.generation, project_id, deltas)
+                self._bump_catalog_version(session, project_id)
                 session.commit()
                 return True
             except Exception as e:
@@ -411,18 +1325,36 @@ class Database:
                     dataset_id=dataset_id,
                     table_name=table_id,
                     project_id=project_id
-                ).first()
+                ).filter(visible(TableModel)).first()
                 
                 if not table:
                     return False
                 
+                deltas = table_deltas(
+                    session, table.generation, project_id, dataset_id, table_id
+                )
+                
+                delete_tokens(session, NameTokenModel.FIELD, select(FieldModel.id).where(
+                    FieldModel.project_id == project_id,
+                    FieldModel.dataset_id == dataset_id,
+                    FieldModel.table_id == table_id,
+                    FieldModel.generation == table.generation
+                ))
+                delete_tokens(session, NameTokenModel.TABLE, [table.id])
+                delete_signatures(session, [table.id])
+                
                 # Delete all fields associated with this table
-                session.query(FieldModel).filter(
-                    FieldModel.full_id.like(f"{table.full_id}.%")
+                session.query(FieldModel).filter_by(
+                    project_id=project_id,
+                    dataset_id=dataset_id,
+                    table_id=table_id,
+                    generation=table.generation
                 ).delete(synchronize_session=False)
                 
                 # Delete the table
                 session.delete(table)
+                apply_deltas(session, table.generation, project_id, deltas)
+                self._bump_catalog_version(session, project_id)
                 session.commit()
                 return True
             except Exception as e:
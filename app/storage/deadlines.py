@@ -0,0 +1,81 @@
+"""
+Deadlines of the SQL statements run in a context.
+
+Code running inside ``statement_deadline`` has its statements cancelled by
+the database once the deadline passes: PostgreSQL statements get a
+``statement_timeout`` of the time left, and SQLite statements are
+interrupted by a progress handler. Either way the statement fails with an
+``OperationalError``, which ``deadline_passed`` tells apart from other errors.
+
+The deadline is held in a context variable, so it applies to the sessions
+opened in the context, and to threads started with a copy of it.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+import time
+from typing import Iterator
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# Number of SQLite virtual machine instructions between deadline checks
+SQLITE_CHECK_INTERVAL = 1000
+
+# time.monotonic() after which statements are cancelled, if any
+_deadline: ContextVar[float | None] = ContextVar("statement_deadline", default=None)
+
+
+@contextmanager
+def statement_deadline(deadline: float | None) -> Iterator[None]:
+    """Cancel the statements run in the block after a deadline.
+
+    Args:
+        deadline: A ``time.monotonic()`` value, or None for no deadline.
+    """
+    token = _deadline.set(deadline)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def deadline_passed() -> bool:
+    """Whether the deadline of the current context has passed."""
+    deadline = _deadline.get()
+    return deadline is not None and time.monotonic() >= deadline
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    deadline = _deadline.get()
+
+    if conn.dialect.name == "sqlite":
+        # Rows are stepped through while fetching, so the handler stays set
+        # until the next statement or the connection is returned to the pool
+        dbapi_connection = conn.connection.driver_connection
+        if deadline is None:
+            dbapi_connection.set_progress_handler(None, 0)
+        else:
+            dbapi_connection.set_progress_handler(
+                lambda: time.monotonic() >= deadline, SQLITE_CHECK_INTERVAL
+            )
+    elif deadline is not None and conn.dialect.name == "postgresql":
+        # LOCAL: the timeout ends with the transaction
+        remaining_ms = max(int((deadline - time.monotonic()) * 1000), 1)
+        cursor.execute(f"SET LOCAL statement_timeout = {remaining_ms}")
+
+
+def _reset_sqlite(dbapi_connection, connection_record):
+    if dbapi_connection is not None:
+        dbapi_connection.set_progress_handler(None, 0)
+
+
+def enforce_deadlines(engine: Engine) -> None:
+    """Attach the deadline hooks to an engine.
+
+    Args:
+        engine: The engine whose statements may have a deadline.
+    """
+    if not event.contains(engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+        if engine.dialect.name == "sqlite":
+            event.listen(engine, "checkin", _reset_sqlite)
@@ -0,0 +1,179 @@
+"""
+SQLite FTS5 indexes of the catalog tables.
+
+Each catalog table has an external-content FTS5 table (``datasets_fts``,
+``tables_fts`` and ``fields_fts``) indexing the columns that the LIKE search
+matches. The FTS tables store only the index; rows are read from the catalog
+tables by rowid. Triggers on the catalog tables keep the indexes in sync, and
+pass every value through ``split_identifier`` so that the words of camelCase
+identifiers are indexed next to the identifier itself.
+
+``Database.bulk_load`` drops the insert triggers for the length of its
+transaction and writes the index rows of the new rows itself, in batches,
+splitting their values in Python instead of once per row from SQL.
+
+``install_fts`` creates the tables and triggers on an existing database; run
+``python scripts/migrate_sqlite_fts.py``.
+"""
+import logging
+from typing import List, Dict, Any, Iterable, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+
+from app.search.tokenize import split_identifier
+
+logger = logging.getLogger(__name__)
+
+# Catalog table -> (FTS table, indexed columns, BM25 weight of each column).
+# Names weigh most, then friendly names and full IDs, descriptions and types.
+FTS_TABLES = {
+    "datasets": ("datasets_fts", ("dataset_name", "friendly_name", "description"), (10.0, 5.0, 2.0)),
+    "tables": ("tables_fts", ("table_name", "full_id", "friendly_name", "description"), (10.0, 5.0, 5.0, 2.0)),
+    "fields": ("fields_fts", ("name", "full_id", "description", "field_type"), (10.0, 5.0, 2.0, 1.0)),
+}
+
+TOKENIZER = "unicode61 remove_diacritics 2"
+
+
+def _split_values(columns, row: str) -> str:
+    return ", ".join(f"split_identifier({row}.{column})" for column in columns)
+
+
+def _insert_trigger(table_name: str) -> str:
+    """Statement creating the trigger indexing the rows inserted into a catalog table."""
+    fts_table, columns, _ = FTS_TABLES[table_name]
+    return (
+        f"CREATE TRIGGER IF NOT EXISTS {fts_table}_ai AFTER INSERT ON {table_name} BEGIN "
+        f"{_insert_new(table_name)} END"
+    )
+
+
+def _insert_new(table_name: str) -> str:
+    """Trigger statement indexing the new row of a catalog table."""
+    fts_table, columns, _ = FTS_TABLES[table_name]
+    return (
+        f"INSERT INTO {fts_table} (rowid, {', '.join(columns)}) "
+        f"VALUES (new.id, {_split_values(columns, 'new')});"
+    )
+
+
+def _ddl(table_name: str) -> List[str]:
+    """Statements creating the FTS table and the triggers of a catalog table."""
+    fts_table, columns, _ = FTS_TABLES[table_name]
+    column_list = ", ".join(columns)
+
+    insert_new = _insert_new(table_name)
+    delete_old = (
+        f"INSERT INTO {fts_table} ({fts_table}, rowid, {column_list}) "
+        f"VALUES ('delete', old.id, {_split_values(columns, 'old')});"
+    )
+
+    return [
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts_table} USING fts5("
+        f"{column_list}, content='{table_name}', content_rowid='id', tokenize='{TOKENIZER}')",
+        _insert_trigger(table_name),
+        f"CREATE TRIGGER IF NOT EXISTS {fts_table}_ad AFTER DELETE ON {table_name} BEGIN "
+        f"{delete_old} END",
+        f"CREATE TRIGGER IF NOT EXISTS {fts_table}_au AFTER UPDATE ON {table_name} BEGIN "
+        f"{delete_old} {insert_new} END",
+    ]
+
+
+def fts_installed(connection: Connection) -> bool:
+    """Whether the FTS tables exist in a SQLite database."""
+    names = connection.execute(text(
+        "SELECT name FROM sqlite_master WHERE type = 'table' AND name LIKE '%\\_fts' ESCAPE '\\'"
+    )).scalars().all()
+    return all(fts_table in names for fts_table, _, _ in FTS_TABLES.values())
+
+
+def install_fts(connection: Connection) -> None:
+    """Create the FTS tables and triggers, and index the existing rows.
+
+    It is safe to rerun, and then rebuilds the indexes. The connection must
+    have ``split_identifier`` registered, as ``Database`` connections do.
+
+    Args:
+        connection: A connection to the SQLite database, in a transaction.
+    """
+    for table_name, (fts_table, columns, _) in FTS_TABLES.items():
+        for statement in _ddl(table_name):
+            connection.execute(text(statement))
+
+        # 'rebuild' would index the raw values, not the split ones
+        connection.execute(text(f"INSERT INTO {fts_table} ({fts_table}) VALUES ('delete-all')"))
+        connection.execute(text(
+            f"INSERT INTO {fts_table} (rowid, {', '.join(columns)}) "
+            f"SELECT id, {_split_values(columns, table_name)} FROM {table_name}"
+        ))
+        logger.info(f"Indexed {table_name} in {fts_table}")
+
+
+def uninstall_fts(connection: Connection) -> None:
+    """Drop the FTS tables and triggers.
+
+    Args:
+        connection: A connection to the SQLite database, in a transaction.
+    """
+    for fts_table, _, _ in FTS_TABLES.values():
+        for suffix in ("ai", "ad", "au"):
+            connection.execute(text(f"DROP TRIGGER IF EXISTS {fts_table}_{suffix}"))
+        connection.execute(text(f"DROP TABLE IF EXISTS {fts_table}"))
+
+
+def suspend_insert_triggers(connection: Connection) -> bool:
+    """Drop the insert triggers of the FTS tables, if they are installed.
+
+    The caller indexes the rows it inserts with ``index_rows``, and calls
+    ``resume_insert_triggers`` in the same transaction, so other connections
+    never see the triggers missing, and a rollback restores them.
+
+    pysqlite only begins a transaction before DML, and would autocommit the
+    drops, so the transaction is begun here if it has not been yet.
+
+    Args:
+        connection: A connection to the SQLite database.
+
+    Returns:
+        Whether the FTS tables are installed, and the triggers were dropped.
+    """
+    if not connection.connection.dbapi_connection.in_transaction:
+        connection.exec_driver_sql("BEGIN")
+
+    if not fts_installed(connection):
+        return False
+
+    for fts_table, _, _ in FTS_TABLES.values():
+        connection.execute(text(f"DROP TRIGGER IF EXISTS {fts_table}_ai"))
+    return True
+
+
+def resume_insert_triggers(connection: Connection) -> None:
+    """Recreate the insert triggers dropped by ``suspend_insert_triggers``.
+
+    Args:
+        connection: The connection that dropped them, in the same transaction.
+    """
+    for table_name in FTS_TABLES:
+        connection.execute(text(_insert_trigger(table_name)))
+
+
+def index_rows(connection: Connection, table_name: str, rows: Iterable[Tuple[int, Dict[str, Any]]]) -> None:
+    """Write the FTS index entries of new catalog rows.
+
+    Args:
+        connection: A connection to the SQLite database, in a transaction.
+        table_name: ``datasets``, ``tables`` or ``fields``.
+        rows: (id, column values keyed by column name) of each row.
+    """
+    fts_table, columns, _ = FTS_TABLES[table_name]
+    values = [
+        {"id": row_id, **{column: split_identifier(row.get(column)) for column in columns}}
+        for row_id, row in rows
+    ]
+    if values:
+        connection.execute(text(
+            f"INSERT INTO {fts_table} (rowid, {', '.join(columns)}) "
+            f"VALUES (:id, {', '.join(':' + column for column in columns)})"
+        ), values)
@@ -0,0 +1,264 @@
+"""
+Opt-in instrumentation of the SQL statements run by the storage layer.
+
+When enabled, every statement executed on the engine is timed and attributed
+to the application method that issued it, such as
+``Database.get_table_with_fields`` or ``MetadataSearch.search``. The timings
+are aggregated into a histogram per method, statements slower than
+``SLOW_QUERY_MS`` are logged, and requests that run more than
+``N_PLUS_ONE_THRESHOLD`` statements are logged as likely N+1 patterns.
+"""
+import bisect
+from contextvars import ContextVar
+import logging
+import os
+import sys
+import threading
+import time
+from typing import Dict, Any
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+# Record statement timings for the storage layer
+SQL_INSTRUMENTATION = os.environ.get("SQL_INSTRUMENTATION", "0") == "1"
+
+# Statements slower than this many milliseconds are logged
+SLOW_QUERY_MS = float(os.environ.get("SLOW_QUERY_MS", "200"))
+
+# Requests running more statements than this are logged
+N_PLUS_ONE_THRESHOLD = int(os.environ.get("N_PLUS_ONE_THRESHOLD", "20"))
+
+# Upper bounds of the histogram buckets, in milliseconds
+BUCKETS_MS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+# Maximum length of the statements written to the slow-query log
+MAX_LOGGED_STATEMENT = 500
+
+
+class OperationStats:
+    """Timing histogram of the statements issued by one operation."""
+
+    __slots__ = ("count", "total_ms", "max_ms", "rows", "buckets")
+
+    def __init__(self):
+        """Initialize empty statistics."""
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.rows = 0
+        self.buckets = [0] * (len(BUCKETS_MS) + 1)
+
+    def record(self, elapsed_ms: float, rows: int | None) -> None:
+        """Record one statement.
+
+        Args:
+            elapsed_ms: Execution time in milliseconds.
+            rows: Rows returned or affected, if known.
+        """
+        self.count += 1
+        self.total_ms += elapsed_ms
+        self.max_ms = max(self.max_ms, elapsed_ms)
+        self.rows += rows or 0
+        self.buckets[bisect.bisect_left(BUCKETS_MS, elapsed_ms)] += 1
+
+    def percentile(self, fraction: float) -> float:
+        """Estimate a percentile from the histogram.
+
+        Args:
+            fraction: The percentile as a fraction, e.g. 0.95.
+
+        Returns:
+            The upper bound of the bucket containing the percentile, or the
+            maximum for the last bucket.
+        """
+        rank = fraction * self.count
+        seen = 0
+        for i, count in enumerate(self.buckets):
+            seen += count
+            if seen >= rank and count:
+                return float(BUCKETS_MS[i]) if i < len(BUCKETS_MS) else self.max_ms
+        return self.max_ms
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Summarize the statistics."""
+        return {
+            "count": self.count,
+            "rows": self.rows,
+            "total_ms": round(self.total_ms, 3),
+            "mean_ms": round(self.total_ms / self.count, 3) if self.count else 0.0,
+            "max_ms": round(self.max_ms, 3),
+            "p50_ms": self.percentile(0.5),
+            "p95_ms": self.percentile(0.95),
+            "p99_ms": self.percentile(0.99),
+            "histogram": {
+                f"le_{bound}": count
+                for bound, count in zip(BUCKETS_MS + ("inf",), self.buckets)
+            }
+        }
+
+
+class RequestQueries:
+    """Statements run while serving one request."""
+
+    __slots__ = ("count", "total_ms", "operations")
+
+    def __init__(self):
+        """Initialize an empty record."""
+        self.count = 0
+        self.total_ms = 0.0
+        self.operations: Dict[str, int] = {}
+
+
+class QueryStats:
+    """Statement statistics aggregated per operation, shared by all threads."""
+
+    def __init__(self):
+        """Initialize empty statistics."""
+        self._lock = threading.Lock()
+        self._operations: Dict[str, OperationStats] = {}
+        self.slow_queries = 0
+
+    def record(self, operation: str, elapsed_ms: float, rows: int | None) -> None:
+        """Record one statement.
+
+        Args:
+            operation: The method that issued the statement.
+            elapsed_ms: Execution time in milliseconds.
+            rows: Rows returned or affected, if known.
+        """
+        with self._lock:
+            stats = self._operations.get(operation)
+            if stats is None:
+                stats = self._operations[operation] = OperationStats()
+            stats.record(elapsed_ms, rows)
+            if elapsed_ms >= SLOW_QUERY_MS:
+                self.slow_queries += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Get the statistics of all operations, slowest in total first."""
+        with self._lock:
+            operations = sorted(
+                self._operations.items(), key=lambda item: item[1].total_ms, reverse=True
+            )
+            return {
+                "enabled": SQL_INSTRUMENTATION,
+                "slow_query_ms": SLOW_QUERY_MS,
+                "slow_queries": self.slow_queries,
+                "operations": {name: stats.to_dict() for name, stats in operations}
+            }
+
+    def reset(self) -> None:
+        """Clear all statistics."""
+        with self._lock:
+            self._operations = {}
+            self.slow_queries = 0
+
+
+query_stats = QueryStats()
+
+_current_request: ContextVar[RequestQueries | None] = ContextVar(
+    "sql_request_queries", default=None
+)
+
+# Frames of these modules are skipped when looking for the calling operation
+_INTERNAL_MODULES = (__name__,)
+
+
+def caller_operation() -> str:
+    """Find the application method that issued the statement being executed.
+
+    Returns:
+        The qualified name of the innermost frame in the ``app`` package,
+        e.g. ``Database.get_tables``, or ``"unknown"``.
+    """
+    frame = sys._getframe(1)
+    while frame is not None:
+        module = frame.f_globals.get("__name__", "")
+        if module.startswith("app.") and module not in _INTERNAL_MODULES:
+            # Attribute nested helpers to the method defining them
+            return frame.f_code.co_qualname.split(".<locals>")[0]
+        frame = frame.f_back
+    return "unknown"
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start_time", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info["query_start_time"].pop()
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    # DB-API drivers report -1 when the count is unknown, e.g. SELECT on SQLite
+    rows = cursor.rowcount if cursor.rowcount >= 0 else None
+    operation = caller_operation()
+
+    query_stats.record(operation, elapsed_ms, rows)
+
+    request = _current_request.get()
+    if request is not None:
+        request.count += 1
+        request.total_ms += elapsed_ms
+        request.operations[operation] = request.operations.get(operation, 0) + 1
+
+    if elapsed_ms >= SLOW_QUERY_MS:
+        logger.warning(
+            f"Slow query in {operation}: {elapsed_ms:.1f} ms, rows={rows}: "
+            f"{' '.join(statement.split())[:MAX_LOGGED_STATEMENT]}"
+        )
+
+
+def _handle_error(context):
+    # after_cursor_execute is not called for failed statements
+    if context.connection is not None:
+        start_times = context.connection.info.get("query_start_time")
+        if start_times:
+            start_times.pop()
+
+
+def instrument_engine(engine: Engine) -> None:
+    """Attach the timing hooks to an engine.
+
+    Args:
+        engine: The engine to instrument.
+    """
+    if not event.contains(engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+        event.listen(engine, "handle_error", _handle_error)
+        logger.info(f"SQL instrumentation enabled, slow query threshold {SLOW_QUERY_MS} ms")
+
+
+def start_request() -> Any:
+    """Start counting the statements of a request.
+
+    Returns:
+        A token to pass to ``end_request``.
+    """
+    return _current_request.set(RequestQueries())
+
+
+def end_request(token: Any, label: str) -> RequestQueries:
+    """Stop counting the statements of a request and flag N+1 patterns.
+
+    Args:
+        token: The token returned by ``start_request``.
+        label: Description of the request for the log, e.g. ``GET /api/tables``.
+
+    Returns:
+        The statements run by the request.
+    """
+    request = _current_request.get()
+    _current_request.reset(token)
+
+    if request.count > N_PLUS_ONE_THRESHOLD:
+        top = sorted(request.operations.items(), key=lambda item: item[1], reverse=True)[:3]
+        logger.warning(
+            f"Possible N+1 queries: {label} ran {request.count} statements "
+            f"({request.total_ms:.1f} ms), mostly from "
+            + ", ".join(f"{name} x{count}" for name, count in top)
+        )
+
+    return request
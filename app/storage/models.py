@@ -1,7 +1,9 @@
 """
 Database models for storing BigQuery metadata.
 """
-from sqlalchemy import Column, String, Text, Integer, ForeignKey, Index, DateTime
+from sqlalchemy import (
+    BigInteger, Column, String, Text, Integer, ForeignKey, Index, DateTime, LargeBinary, SmallInteger, text
+)
 from sqlalchemy.orm import declarative_base
 from sqlalchemy.sql import func
 from dataclasses import dataclass
@@ -44,23 +46,117 @@ class Field:
     mode: str | None = None
 
 
+class CatalogGenerationModel(Base):
+    """SQLAlchemy model for catalog generations.
+
+    Every extraction of a project is loaded as a new generation. Catalog rows
+    carry the ID of the generation they belong to, and only rows of the
+    generation whose status is ``current`` for their project are visible.
+    """
+    __tablename__ = "catalog_generations"
+    
+    LOADING = "loading"
+    CURRENT = "current"
+    RETIRED = "retired"
+    
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    project_id = Column(String(255), nullable=False)
+    status = Column(String(20), nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    activated_at = Column(DateTime(timezone=True))
+    
+    __table_args__ = (
+        Index("ix_catalog_generations_project_status", "project_id", "status"),
+        Index("ix_catalog_generations_status", "status"),
+        # At most one current generation per project
+        Index(
+            "uq_catalog_generations_current",
+            "project_id",
+            unique=True,
+            postgresql_where=text("status = 'current'"),
+            sqlite_where=text("status = 'current'"),
+        ),
+    )
+
+
+class CatalogStateModel(Base):
+    """SQLAlchemy model for the catalog version.
+
+    A single row whose version is incremented by every write that changes the
+    visible catalog. In-process caches compare it to the version they were
+    built from to find out whether they are stale.
+    """
+    __tablename__ = "catalog_state"
+    
+    id = Column(Integer, primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+
+
+class ProjectVersionModel(Base):
+    """SQLAlchemy model for the catalog version of each project.
+
+    Incremented with the catalog version by the writes that change the
+    visible catalog of the project, so that in-process indexes kept per
+    project can tell which projects changed.
+    """
+    __tablename__ = "project_versions"
+    
+    project_id = Column(String(255), primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+
+
+class CatalogStatModel(Base):
+    """SQLAlchemy model for catalog statistics.
+
+    Counts of datasets, tables and fields, and of fields per type, for each
+    generation of a project. Rows with an empty ``dataset_id`` hold the totals
+    of the project. The counts are updated by the writes that change them.
+    """
+    __tablename__ = "catalog_stats"
+    
+    DATASETS = "datasets"
+    TABLES = "tables"
+    FIELDS = "fields"
+    FIELD_TYPE = "field_type"
+    
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    generation = Column(Integer, nullable=False)
+    project_id = Column(String(255), nullable=False)
+    dataset_id = Column(String(255), nullable=False, default="")
+    metric = Column(String(20), nullable=False)
+    key = Column(String(50), nullable=False, default="")
+    value = Column(BigInteger, nullable=False, default=0)
+    
+    __table_args__ = (
+        Index(
+            "uq_catalog_stats",
+            "generation", "project_id", "dataset_id", "metric", "key",
+            unique=True
+        ),
+    )
+
+
 class DatasetModel(Base):
     """SQLAlchemy model for datasets."""
     __tablename__ = "datasets"
     
     id = Column(Integer, primary_key=True, autoincrement=True)
     dataset_name = Column(String(255), nullable=False)  # Renamed from id
-    full_id = Column(String(255), unique=True, nullable=False)
+    full_id = Column(String(255), nullable=False)
     project_id = Column(String(255), nullable=False)
     friendly_name = Column(String(255))
     description = Column(Text)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
     
+    generation = Column(Integer, nullable=False, default=0, server_default="0")
+    
+    # full_id is unique within a generation and indexed by uq_*_full_id_generation.
+    # See migrations/versions/0002_index_audit.py for the query each index serves.
     __table_args__ = (
+        Index("uq_datasets_full_id_generation", "full_id", "generation", unique=True),
         Index("ix_datasets_project", "project_id"),
-        Index("ix_datasets_name", "dataset_name"),
-        Index("ix_datasets_full_id", "full_id"),
+        Index("ix_datasets_name_project", "dataset_name", "project_id"),
     )
     
     @classmethod
@@ -81,7 +177,7 @@ class TableModel(Base):
     
     id = Column(Integer, primary_key=True, autoincrement=True)
     table_name = Column(String(255), nullable=False)  # Renamed from id
-    full_id = Column(String(255), unique=True, nullable=False)
+    full_id = Column(String(255), nullable=False)
     dataset_id = Column(String(255), nullable=False)  # No longer a foreign key to datasets.id
     project_id = Column(String(255), nullable=False)
     friendly_name = Column(String(255))
@@ -90,11 +186,14 @@ class TableModel(Base):
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
     
+    generation = Column(Integer, nullable=False, default=0, server_default="0")
+    
     __table_args__ = (
-        Index("ix_tables_dataset", "dataset_id"),
-        Index("ix_tables_project", "project_id"),
+        Index("uq_tables_full_id_generation", "full_id", "generation", unique=True),
+        Index("ix_tables_project_dataset", "project_id", "dataset_id"),
+        Index("ix_tables_dataset_name", "dataset_id", "table_name"),
         Index("ix_tables_name", "table_name"),
-        Index("ix_tables_full_id", "full_id"),
+        Index("ix_tables_type", "table_type"),
     )
     
     @classmethod
@@ -116,7 +215,7 @@ class FieldModel(Base):
     __tablename__ = "fields"
     
     id = Column(Integer, primary_key=True, autoincrement=True)
-    full_id = Column(String(255), unique=True, nullable=False)
+    full_id = Column(String(255), nullable=False)
     name = Column(String(255), nullable=False)
     table_id = Column(String(255), nullable=False)  # This is now table_name in TableModel
     dataset_id = Column(String(255), nullable=False)  # This is now dataset_name in DatasetModel
@@ -127,12 +226,16 @@ class FieldModel(Base):
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
     
+    generation = Column(Integer, nullable=False, default=0, server_default="0")
+    
     __table_args__ = (
+        Index("uq_fields_full_id_generation", "full_id", "generation", unique=True),
+        Index("ix_fields_project_dataset_table", "project_id", "dataset_id", "table_id"),
+        Index("ix_fields_project_full_id", "project_id", "full_id"),
         Index("ix_fields_table", "table_id"),
         Index("ix_fields_dataset", "dataset_id"),
-        Index("ix_fields_project", "project_id"),
         Index("ix_fields_name", "name"),
-        Index("ix_fields_full_id", "full_id"),
+        Index("ix_fields_type", "field_type"),
     )
     
     @classmethod
@@ -148,3 +251,82 @@ class FieldModel(Base):
             description=field.description,
             mode=field.mode
         )
+
+
+class NameTokenModel(Base):
+    """SQLAlchemy model for the tokens of catalog names.
+
+    The normalized words of the name and full ID of every dataset, table and
+    field row, written with the row (``app.storage.tokens``). Query words are
+    looked up in it by equality or prefix instead of scanning the names.
+    """
+    __tablename__ = "name_tokens"
+    
+    DATASET = "dataset"
+    TABLE = "table"
+    FIELD = "field"
+    
+    entity_type = Column(String(10), primary_key=True)
+    entity_id = Column(Integer, primary_key=True)
+    token = Column(String(255), primary_key=True)
+    generation = Column(Integer, nullable=False)
+    
+    __table_args__ = (
+        Index("ix_name_tokens_lookup", "entity_type", "token", "entity_id"),
+        Index("ix_name_tokens_generation", "generation"),
+    )
+
+
+class TableSignatureModel(Base):
+    """SQLAlchemy model for the MinHash signatures of table schemas.
+
+    One row per table row with fields: the MinHash signature of the set of
+    its (column name, type) pairs, written with the table's fields
+    (``app.storage.signatures``).
+    """
+    __tablename__ = "table_signatures"
+    
+    entity_id = Column(Integer, primary_key=True)
+    generation = Column(Integer, nullable=False)
+    column_count = Column(Integer, nullable=False)
+    signature = Column(LargeBinary, nullable=False)
+    
+    __table_args__ = (
+        Index("ix_table_signatures_generation", "generation"),
+    )
+
+
+class StaleSignatureModel(Base):
+    """SQLAlchemy model for the table rows whose signatures are out of date.
+
+    Saving a field marks its table rather than recomputing the signature of
+    the whole table on every save; the signatures are recomputed before the
+    next similar-tables lookup (``app.storage.signatures``).
+    """
+    __tablename__ = "stale_signatures"
+    
+    entity_id = Column(Integer, primary_key=True)
+    generation = Column(Integer, nullable=False)
+    
+    __table_args__ = (
+        Index("ix_stale_signatures_generation", "generation"),
+    )
+
+
+class TableBandModel(Base):
+    """SQLAlchemy model for the LSH buckets of table signatures.
+
+    Each band of a signature hashes to a bucket; tables sharing a bucket in
+    any band are the candidates of a similar-tables lookup.
+    """
+    __tablename__ = "table_bands"
+    
+    band = Column(SmallInteger, primary_key=True)
+    bucket = Column(BigInteger, primary_key=True)
+    entity_id = Column(Integer, primary_key=True)
+    generation = Column(Integer, nullable=False)
+    
+    __table_args__ = (
+        Index("ix_table_bands_entity", "entity_id"),
+        Index("ix_table_bands_generation", "generation"),
+    )
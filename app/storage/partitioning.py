@@ -0,0 +1,262 @@
+"""
+PostgreSQL declarative partitioning of the catalog tables by project.
+
+The ``tables`` and ``fields`` tables can be partitioned on ``project_id``,
+either by list (one partition per project plus a default partition) or by hash
+(a fixed number of partitions). Queries that filter on ``project_id`` are
+pruned to a single partition. With list partitioning, deleting a project
+detaches and drops its partitions instead of deleting its rows.
+
+Partitioning is enabled by migration 0004 (see ``docs/USAGE.md``).
+"""
+import hashlib
+import logging
+import re
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+
+logger = logging.getLogger(__name__)
+
+# Catalog tables partitioned by project_id
+PARTITIONED_TABLES = ("tables", "fields")
+
+LIST = "list"
+HASH = "hash"
+
+# pg_partitioned_table.partstrat values
+_STRATEGIES = {"l": LIST, "h": HASH}
+
+
+def quote_literal(value: str) -> str:
+    """Quote a string as a SQL literal, for DDL that cannot take parameters."""
+    return "'" + value.replace("'", "''") + "'"
+
+
+def partition_name(table_name: str, project_id: str) -> str:
+    """Name of the list partition holding a project's rows.
+
+    Project IDs may contain characters that are not valid in identifiers, so
+    the name is a sanitized prefix of the ID followed by a short digest.
+
+    Args:
+        table_name: The partitioned table.
+        project_id: The project ID.
+
+    Returns:
+        The partition table name.
+    """
+    slug = re.sub(r"[^a-z0-9]+", "_", project_id.lower())[:32]
+    digest = hashlib.md5(project_id.encode("utf-8")).hexdigest()[:8]
+    return f"{table_name}_p_{slug}_{digest}"
+
+
+def get_partitioning(connection: Connection) -> str | None:
+    """Detect how the fields table is partitioned.
+
+    Args:
+        connection: A connection to the database.
+
+    Returns:
+        ``LIST``, ``HASH`` or None if the table is not partitioned.
+    """
+    if connection.dialect.name != "postgresql":
+        return None
+
+    strategy = connection.execute(text(
+        """
+        SELECT p.partstrat FROM pg_partitioned_table p
+        JOIN pg_class c ON c.oid = p.partrelid
+        WHERE c.relname = 'fields' AND pg_table_is_visible(c.oid)
+        """
+    )).scalar()
+
+    return _STRATEGIES.get(strategy)
+
+
+def ensure_project_partitions(connection: Connection, project_id: str) -> None:
+    """Create the list partitions of a project if they do not exist.
+
+    This must happen before the first row of the project is written, since a
+    partition cannot be created for values already stored in the default
+    partition.
+
+    Args:
+        connection: A connection to the database.
+        project_id: The project ID.
+    """
+    for table_name in PARTITIONED_TABLES:
+        connection.execute(text(
+            f"CREATE TABLE IF NOT EXISTS {partition_name(table_name, project_id)} "
+            f"PARTITION OF {table_name} FOR VALUES IN ({quote_literal(project_id)})"
+        ))
+
+
+def drop_project_partitions(connection: Connection, project_id: str) -> None:
+    """Detach and drop the list partitions of a project.
+
+    Args:
+        connection: A connection to the database.
+        project_id: The project ID.
+    """
+    for table_name in PARTITIONED_TABLES:
+        name = partition_name(table_name, project_id)
+        exists = connection.execute(
+            text("SELECT to_regclass(:name) IS NOT NULL"), {"name": name}
+        ).scalar()
+
+        if exists:
+            connection.execute(text(f"ALTER TABLE {table_name} DETACH PARTITION {name}"))
+            connection.execute(text(f"DROP TABLE {name}"))
+
+
+def _partitioned_index_def(indexdef: str) -> str:
+    """Adapt an index definition of a plain table to its partitioned version.
+
+    Unique indexes on a partitioned table must contain the partition key.
+    Since every full_id starts with the project ID, adding project_id to a
+    unique index does not change what it enforces.
+    """
+    if indexdef.startswith("CREATE UNIQUE INDEX") and "project_id" not in indexdef:
+        indexdef = re.sub(r"USING (\w+) \(", r"USING \1 (project_id, ", indexdef, count=1)
+    return indexdef
+
+
+def _table_layout(connection: Connection, table_name: str) -> tuple:
+    """Read what is needed to rebuild a table under a new layout.
+
+    Args:
+        connection: A connection to the database.
+        table_name: The table to inspect.
+
+    Returns:
+        Tuple of the (name, definition) pairs of its indexes, its non-generated
+        columns and the sequence of its id column.
+    """
+    index_defs = connection.execute(text(
+        """
+        SELECT indexname, indexdef FROM pg_indexes
+        WHERE schemaname = current_schema() AND tablename = :table_name
+        """
+    ), {"table_name": table_name}).all()
+    columns = connection.execute(text(
+        """
+        SELECT column_name FROM information_schema.columns
+        WHERE table_schema = current_schema() AND table_name = :table_name
+            AND is_generated = 'NEVER'
+        ORDER BY ordinal_position
+        """
+    ), {"table_name": table_name}).scalars().all()
+    sequence = connection.execute(
+        text("SELECT pg_get_serial_sequence(:table_name, 'id')"), {"table_name": table_name}
+    ).scalar()
+
+    return index_defs, columns, sequence
+
+
+def partition_table(
+    connection: Connection,
+    table_name: str,
+    strategy: str,
+    modulus: int = 16
+) -> None:
+    """Convert a catalog table into a table partitioned by project_id.
+
+    The rows are copied into a new partitioned table, which then replaces the
+    original one along with its indexes. The conversion rewrites the whole
+    table and runs in the caller's transaction, so it should be done in a
+    maintenance window.
+
+    Args:
+        connection: A connection to the database.
+        table_name: The table to convert, one of ``PARTITIONED_TABLES``.
+        strategy: ``LIST`` or ``HASH``.
+        modulus: Number of partitions for hash partitioning.
+    """
+    staging = f"{table_name}__partitioned"
+    partition_clause = "LIST" if strategy == LIST else "HASH"
+
+    index_defs, columns, sequence = _table_layout(connection, table_name)
+
+    connection.execute(text(
+        f"CREATE TABLE {staging} (LIKE {table_name} INCLUDING DEFAULTS INCLUDING GENERATED) "
+        f"PARTITION BY {partition_clause} (project_id)"
+    ))
+
+    if strategy == LIST:
+        project_ids = connection.execute(
+            text(f"SELECT DISTINCT project_id FROM {table_name}")
+        ).scalars().all()
+        for project_id in project_ids:
+            connection.execute(text(
+                f"CREATE TABLE {partition_name(table_name, project_id)} PARTITION OF {staging} "
+                f"FOR VALUES IN ({quote_literal(project_id)})"
+            ))
+        connection.execute(text(
+            f"CREATE TABLE {table_name}_p_default PARTITION OF {staging} DEFAULT"
+        ))
+    else:
+        for remainder in range(modulus):
+            connection.execute(text(
+                f"CREATE TABLE {table_name}_p_h{remainder} PARTITION OF {staging} "
+                f"FOR VALUES WITH (MODULUS {modulus}, REMAINDER {remainder})"
+            ))
+
+    column_list = ", ".join(columns)
+    connection.execute(text(
+        f"INSERT INTO {staging} ({column_list}) SELECT {column_list} FROM {table_name}"
+    ))
+
+    if sequence:
+        connection.execute(text(f"ALTER SEQUENCE {sequence} OWNED BY NONE"))
+
+    connection.execute(text(f"DROP TABLE {table_name}"))
+    connection.execute(text(f"ALTER TABLE {staging} RENAME TO {table_name}"))
+
+    if sequence:
+        connection.execute(text(f"ALTER SEQUENCE {sequence} OWNED BY {table_name}.id"))
+
+    connection.execute(text(f"ALTER TABLE {table_name} ADD PRIMARY KEY (id, project_id)"))
+
+    for index_name, indexdef in index_defs:
+        if index_name == f"{table_name}_pkey":
+            continue
+        connection.execute(text(_partitioned_index_def(indexdef)))
+
+    logger.info(f"Partitioned {table_name} by {strategy} on project_id")
+
+
+def unpartition_table(connection: Connection, table_name: str) -> None:
+    """Convert a partitioned catalog table back into a plain table.
+
+    Args:
+        connection: A connection to the database.
+        table_name: The table to convert.
+    """
+    staging = f"{table_name}__plain"
+
+    index_defs, columns, sequence = _table_layout(connection, table_name)
+
+    column_list = ", ".join(columns)
+    connection.execute(text(
+        f"CREATE TABLE {staging} (LIKE {table_name} INCLUDING DEFAULTS INCLUDING GENERATED)"
+    ))
+    connection.execute(text(
+        f"INSERT INTO {staging} ({column_list}) SELECT {column_list} FROM {table_name}"
+    ))
+
+    if sequence:
+        connection.execute(text(f"ALTER SEQUENCE {sequence} OWNED BY NONE"))
+
+    connection.execute(text(f"DROP TABLE {table_name} CASCADE"))
+    connection.execute(text(f"ALTER TABLE {staging} RENAME TO {table_name}"))
+
+    if sequence:
+        connection.execute(text(f"ALTER SEQUENCE {sequence} OWNED BY {table_name}.id"))
+
+    connection.execute(text(f"ALTER TABLE {table_name} ADD PRIMARY KEY (id)"))
+
+    for index_name, indexdef in index_defs:
+        if index_name == f"{table_name}_pkey":
+            continue
+        connection.execute(text(indexdef))
@@ -0,0 +1,276 @@
+"""
+MinHash signatures of table schemas, for similar-table lookups.
+
+The schema of a table is the set of its columns, each a lowercased name and
+a type (``customer_id:STRING``). Its signature is the minimum of each of
+``NUM_HASHES`` hash functions over the set, so two signatures agree on a
+value with a probability equal to the Jaccard similarity of the two sets.
+
+For locality-sensitive hashing the signature is cut into ``BANDS`` bands of
+``ROWS_PER_BAND`` values, and each band is hashed to a bucket: tables
+sharing a bucket in any band are candidates, found with index lookups on
+``table_bands`` instead of comparing every pair of tables. With 32 bands of
+4 values, tables with a similarity of 0.5 share a bucket with a probability
+of about 0.87, tables with a similarity of 0.2 of about 0.05.
+
+The signatures are written with the catalog rows, and deleted with them.
+Saving a single field only marks its table in ``stale_signatures``, as
+recomputing the signature of a table on each of its N field saves would
+read its fields N times; ``update_stale_signatures`` signs the marked tables
+before similar tables are looked up.
+"""
+import hashlib
+import logging
+from array import array
+from itertools import groupby
+from typing import List, Dict, Any, Iterable, Tuple
+
+from sqlalchemy import and_, delete, insert, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm import Session
+
+from app.storage.models import (
+    TableModel, FieldModel, TableSignatureModel, TableBandModel, StaleSignatureModel
+)
+
+logger = logging.getLogger(__name__)
+
+# Values of a signature, and how they are banded
+NUM_HASHES = 128
+BANDS = 32
+ROWS_PER_BAND = NUM_HASHES // BANDS
+
+# Bytes of a signature value
+HASH_BYTES = 4
+
+# Tables written per statement
+SIGNATURE_BATCH_SIZE = 5000
+
+
+def column_key(name: str | None, field_type: str | None) -> str:
+    """Get the element of a schema set for a column.
+
+    Args:
+        name: The column name, compared without case.
+        field_type: The column type.
+
+    Returns:
+        The key, as ``name:TYPE``.
+    """
+    return f"{(name or '').lower()}:{(field_type or '').upper()}"
+
+
+def minhash(columns: Iterable[str]) -> bytes:
+    """Compute the MinHash signature of a set of column keys.
+
+    Each key is hashed once with SHAKE-128 to ``NUM_HASHES`` values, one per
+    hash function, and the signature keeps the minimum of each.
+
+    Args:
+        columns: The column keys, see ``column_key``.
+
+    Returns:
+        The ``NUM_HASHES`` values, as unsigned 32-bit integers.
+    """
+    hashes = [
+        array("I", hashlib.shake_128(column.encode()).digest(NUM_HASHES * HASH_BYTES))
+        for column in set(columns)
+    ]
+    signature = array("I", map(min, zip(*hashes)) if hashes else [0] * NUM_HASHES)
+    return bytes(signature)
+
+
+def band_buckets(signature: bytes) -> List[int]:
+    """Hash each band of a signature to a bucket.
+
+    Args:
+        signature: The signature, see ``minhash``.
+
+    Returns:
+        The bucket of each band, as signed 64-bit integers.
+    """
+    size = ROWS_PER_BAND * HASH_BYTES
+    return [
+        int.from_bytes(
+            hashlib.blake2b(signature[start:start + size], digest_size=8).digest(),
+            "big",
+            signed=True
+        )
+        for start in range(0, BANDS * size, size)
+    ]
+
+
+def estimate_similarity(signature: bytes, other: bytes) -> float:
+    """Estimate the Jaccard similarity of two schemas from their signatures.
+
+    Args:
+        signature: A signature.
+        other: Another signature.
+
+    Returns:
+        The share of signature values that are equal.
+    """
+    values, other_values = array("I", signature), array("I", other)
+    return sum(a == b for a, b in zip(values, other_values)) / NUM_HASHES
+
+
+def signature_rows(
+    rows: Iterable[Tuple[int, int, Iterable[str]]]
+) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    """Build the signature and band rows of tables.
+
+    Args:
+        rows: (table row id, generation, column keys) of each table.
+
+    Returns:
+        The ``table_signatures`` rows and the ``table_bands`` rows to insert.
+    """
+    signatures = []
+    bands = []
+    for entity_id, generation, columns in rows:
+        columns = set(columns)
+        if not columns:
+            continue
+
+        signature = minhash(columns)
+        signatures.append({
+            "entity_id": entity_id,
+            "generation": generation,
+            "column_count": len(columns),
+            "signature": signature,
+        })
+        bands.extend(
+            {"band": band, "bucket": bucket, "entity_id": entity_id, "generation": generation}
+            for band, bucket in enumerate(band_buckets(signature))
+        )
+    return signatures, bands
+
+
+def insert_signatures(
+    session: Session | Connection,
+    rows: Iterable[Tuple[int, int, Iterable[str]]]
+) -> None:
+    """Write the signatures of tables without one.
+
+    Tables without columns get no signature.
+
+    Args:
+        session: The session or connection writing the catalog rows.
+        rows: (table row id, generation, column keys) of each table.
+    """
+    signatures, bands = signature_rows(rows)
+    for model, values in ((TableSignatureModel, signatures), (TableBandModel, bands)):
+        for start in range(0, len(values), SIGNATURE_BATCH_SIZE):
+            session.execute(insert(model.__table__), values[start:start + SIGNATURE_BATCH_SIZE])
+
+
+def delete_signatures(session: Session, entity_ids) -> None:
+    """Delete the signatures of tables, and their stale marks.
+
+    Args:
+        session: The session deleting or updating the tables.
+        entity_ids: The IDs of the table rows, as a list or a select of IDs.
+    """
+    for model in (TableBandModel, TableSignatureModel, StaleSignatureModel):
+        session.execute(delete(model).where(model.entity_id.in_(entity_ids)))
+
+
+def _table_columns():
+    """Select (table row id, generation, column name, type), grouped by table."""
+    return select(
+        TableModel.id, TableModel.generation, FieldModel.name, FieldModel.field_type
+    ).join(
+        FieldModel,
+        and_(
+            FieldModel.project_id == TableModel.project_id,
+            FieldModel.dataset_id == TableModel.dataset_id,
+            FieldModel.table_id == TableModel.table_name,
+            FieldModel.generation == TableModel.generation
+        )
+    ).order_by(TableModel.id)
+
+
+def _grouped(rows) -> Iterable[Tuple[int, int, List[str]]]:
+    """Group the rows of ``_table_columns`` into (id, generation, column keys)."""
+    for (entity_id, generation), columns in groupby(rows, key=lambda row: (row[0], row[1])):
+        yield entity_id, generation, [column_key(row[2], row[3]) for row in columns]
+
+
+def update_signatures(session: Session, entity_ids: List[int]) -> None:
+    """Recompute the signatures of tables from their fields.
+
+    Args:
+        session: The session that saved the tables or their fields.
+        entity_ids: The IDs of the table rows.
+    """
+    if not entity_ids:
+        return
+
+    session.flush()
+    delete_signatures(session, entity_ids)
+    rows = session.execute(_table_columns().where(TableModel.id.in_(entity_ids)))
+    insert_signatures(session, _grouped(rows))
+
+
+def mark_stale(session: Session, entity_ids) -> None:
+    """Mark the signatures of tables as out of date.
+
+    Args:
+        session: The session that saved fields of the tables.
+        entity_ids: The IDs of the table rows, as a list or a select of IDs.
+    """
+    dialect = session.get_bind().dialect.name
+    insert_function = {"postgresql": postgresql.insert, "sqlite": sqlite.insert}.get(dialect, insert)
+    stmt = insert_function(StaleSignatureModel.__table__).from_select(
+        ["entity_id", "generation"],
+        select(TableModel.id, TableModel.generation).where(
+            TableModel.id.in_(entity_ids),
+            ~select(StaleSignatureModel.entity_id).where(
+                StaleSignatureModel.entity_id == TableModel.id
+            ).exists()
+        )
+    )
+    if dialect in ("postgresql", "sqlite"):
+        # A concurrent save may mark the table first
+        stmt = stmt.on_conflict_do_nothing()
+    session.execute(stmt)
+
+
+def update_stale_signatures(session: Session) -> int:
+    """Recompute the signatures marked out of date by ``mark_stale``.
+
+    Args:
+        session: A session, committed by the caller.
+
+    Returns:
+        The number of tables signed.
+    """
+    entity_ids = session.execute(select(StaleSignatureModel.entity_id)).scalars().all()
+    for start in range(0, len(entity_ids), SIGNATURE_BATCH_SIZE):
+        update_signatures(session, entity_ids[start:start + SIGNATURE_BATCH_SIZE])
+    return len(entity_ids)
+
+
+def rebuild_signatures(connection: Connection, batch_size: int = SIGNATURE_BATCH_SIZE) -> None:
+    """Recompute the signatures of all the tables of the catalog.
+
+    Args:
+        connection: A connection to the database, in a transaction.
+        batch_size: Number of tables written per statement.
+    """
+    connection.execute(delete(TableBandModel))
+    connection.execute(delete(TableSignatureModel))
+
+    result = connection.execution_options(yield_per=10000).execute(_table_columns())
+    count = 0
+    batch = []
+    for table in _grouped(result):
+        batch.append(table)
+        if len(batch) >= batch_size:
+            insert_signatures(connection, batch)
+            count += len(batch)
+            batch = []
+    insert_signatures(connection, batch)
+    count += len(batch)
+    logger.info(f"Computed the schema signatures of {count} tables")
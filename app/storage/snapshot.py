@@ -0,0 +1,337 @@
+"""
+Compact in-memory snapshot of the catalog for the browse pages.
+
+The snapshot is stored column by column. Every string is stored once in a
+string pool, and the columns are ``array('I')`` indexes into that pool. Rows
+are grouped by parent: the datasets of a project, the tables of a dataset and
+the fields of a table are contiguous, and each parent keeps the offsets of its
+children. A field costs 16 bytes plus its share of the distinct strings.
+"""
+from array import array
+import logging
+import sys
+import time
+from typing import List, Dict, Any, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app.storage.models import DatasetModel, TableModel, FieldModel
+
+logger = logging.getLogger(__name__)
+
+# Number of rows fetched per round trip while loading
+LOAD_BATCH_SIZE = 10000
+
+
+class StringPool:
+    """Deduplicated storage for the strings of the snapshot.
+
+    Index 0 stands for None.
+    """
+
+    __slots__ = ("values", "_index")
+
+    def __init__(self):
+        """Initialize an empty pool."""
+        self.values: List[str | None] = [None]
+        self._index: Dict[str, int] = {}
+
+    def add(self, value: str | None) -> int:
+        """Add a string to the pool.
+
+        Args:
+            value: The string, or None.
+
+        Returns:
+            The index of the string in the pool.
+        """
+        if value is None:
+            return 0
+
+        index = self._index.get(value)
+        if index is None:
+            index = len(self.values)
+            self._index[value] = index
+            self.values.append(sys.intern(value))
+        return index
+
+    def freeze(self) -> None:
+        """Drop the lookup table once the pool is complete."""
+        self._index = {}
+
+
+class CatalogSnapshot:
+    """Read-only, in-memory copy of the visible catalog."""
+
+    __slots__ = (
+        "version",
+        "loaded_at",
+        "strings",
+        "projects",
+        "ds_project", "ds_name", "ds_full_id", "ds_friendly_name", "ds_description",
+        "tb_project", "tb_dataset", "tb_name", "tb_full_id", "tb_friendly_name",
+        "tb_description", "tb_type", "tb_field_start", "tb_field_end",
+        "f_name", "f_type", "f_description", "f_mode",
+        "f_full_id_overrides",
+        "project_datasets", "project_tables", "dataset_tables", "table_lookup",
+    )
+
+    def __init__(self, version: int):
+        """Initialize an empty snapshot.
+
+        Args:
+            version: The catalog version the snapshot is loaded from.
+        """
+        self.version = version
+        self.loaded_at = time.time()
+        self.strings = StringPool()
+        self.projects: List[str] = []
+
+        self.ds_project, self.ds_name, self.ds_full_id = array("I"), array("I"), array("I")
+        self.ds_friendly_name, self.ds_description = array("I"), array("I")
+
+        self.tb_project, self.tb_dataset, self.tb_name = array("I"), array("I"), array("I")
+        self.tb_full_id, self.tb_friendly_name = array("I"), array("I")
+        self.tb_description, self.tb_type = array("I"), array("I")
+        self.tb_field_start, self.tb_field_end = array("I"), array("I")
+
+        self.f_name, self.f_type = array("I"), array("I")
+        self.f_description, self.f_mode = array("I"), array("I")
+        # Full IDs of fields that do not follow "<table full_id>.<name>"
+        self.f_full_id_overrides: Dict[int, str] = {}
+
+        # Offsets of the children of each parent, as (start, end)
+        self.project_datasets: Dict[str, Tuple[int, int]] = {}
+        self.project_tables: Dict[str, Tuple[int, int]] = {}
+        self.dataset_tables: Dict[Tuple[str, str], Tuple[int, int]] = {}
+        # (dataset, table name) -> table index
+        self.table_lookup: Dict[Tuple[str, str], int] = {}
+
+    @classmethod
+    def load(cls, session: Session, version: int, visible_filter) -> "CatalogSnapshot":
+        """Load the visible catalog.
+
+        Rows are read in parent order using the composite indexes, so grouping
+        children by parent needs no sorting in Python.
+
+        Args:
+            session: The session to read with.
+            version: The catalog version being loaded.
+            visible_filter: Function returning the visibility filter of a model.
+
+        Returns:
+            The loaded snapshot.
+        """
+        started = time.monotonic()
+        snapshot = cls(version)
+        add = snapshot.strings.add
+
+        def stream(stmt):
+            return session.execute(
+                stmt.execution_options(stream_results=True, yield_per=LOAD_BATCH_SIZE)
+            )
+
+        # Datasets, grouped by project
+        rows = stream(
+            select(
+                DatasetModel.project_id, DatasetModel.dataset_name, DatasetModel.full_id,
+                DatasetModel.friendly_name, DatasetModel.description
+            ).where(visible_filter(DatasetModel)).order_by(
+                DatasetModel.project_id, DatasetModel.full_id
+            )
+        )
+        for project_id, name, full_id, friendly_name, description in rows:
+            index = len(snapshot.ds_name)
+            project_id = snapshot.strings.values[add(project_id)]
+            start, _ = snapshot.project_datasets.get(project_id, (index, index))
+            snapshot.project_datasets[project_id] = (start, index + 1)
+
+            snapshot.ds_project.append(add(project_id))
+            snapshot.ds_name.append(add(name))
+            snapshot.ds_full_id.append(add(full_id))
+            snapshot.ds_friendly_name.append(add(friendly_name))
+            snapshot.ds_description.append(add(description))
+
+        snapshot.projects = list(snapshot.project_datasets)
+
+        # Tables, grouped by project and dataset
+        table_paths: Dict[Tuple[str, str, str], int] = {}
+        rows = stream(
+            select(
+                TableModel.project_id, TableModel.dataset_id, TableModel.table_name,
+                TableModel.full_id, TableModel.friendly_name, TableModel.description,
+                TableModel.table_type
+            ).where(visible_filter(TableModel)).order_by(
+                TableModel.project_id, TableModel.dataset_id, TableModel.full_id
+            )
+        )
+        for project_id, dataset_id, name, full_id, friendly_name, description, table_type in rows:
+            index = len(snapshot.tb_name)
+            project_id = snapshot.strings.values[add(project_id)]
+            dataset_id = snapshot.strings.values[add(dataset_id)]
+            name = snapshot.strings.values[add(name)]
+
+            start, _ = snapshot.project_tables.get(project_id, (index, index))
+            snapshot.project_tables[project_id] = (start, index + 1)
+            start, _ = snapshot.dataset_tables.get((project_id, dataset_id), (index, index))
+            snapshot.dataset_tables[(project_id, dataset_id)] = (start, index + 1)
+            snapshot.table_lookup.setdefault((dataset_id, name), index)
+            table_paths[(project_id, dataset_id, name)] = index
+
+            snapshot.tb_project.append(add(project_id))
+            snapshot.tb_dataset.append(add(dataset_id))
+            snapshot.tb_name.append(add(name))
+            snapshot.tb_full_id.append(add(full_id))
+            snapshot.tb_friendly_name.append(add(friendly_name))
+            snapshot.tb_description.append(add(description))
+            snapshot.tb_type.append(add(table_type))
+
+        snapshot.tb_field_start = array("I", bytes(4 * len(snapshot.tb_name)))
+        snapshot.tb_field_end = array("I", bytes(4 * len(snapshot.tb_name)))
+
+        # Fields, grouped by table in schema order. Fields of tables that are
+        # not in the catalog cannot be reached from the browse pages.
+        current_path = None
+        table_index = None
+        rows = stream(
+            select(
+                FieldModel.project_id, FieldModel.dataset_id, FieldModel.table_id,
+                FieldModel.name, FieldModel.full_id, FieldModel.field_type,
+                FieldModel.description, FieldModel.mode
+            ).where(visible_filter(FieldModel)).order_by(
+                FieldModel.project_id, FieldModel.dataset_id, FieldModel.table_id,
+                FieldModel.id
+            )
+        )
+        for project_id, dataset_id, table_id, name, full_id, field_type, description, mode in rows:
+            path = (project_id, dataset_id, table_id)
+
+            if path != current_path:
+                current_path = path
+                table_index = table_paths.get(path)
+                if table_index is not None:
+                    snapshot.tb_field_start[table_index] = len(snapshot.f_name)
+
+            if table_index is None:
+                continue
+
+            index = len(snapshot.f_name)
+            table_full_id = snapshot.strings.values[snapshot.tb_full_id[table_index]]
+            if full_id != f"{table_full_id}.{name}":
+                snapshot.f_full_id_overrides[index] = full_id
+
+            snapshot.f_name.append(add(name))
+            snapshot.f_type.append(add(field_type))
+            snapshot.f_description.append(add(description))
+            snapshot.f_mode.append(add(mode))
+            snapshot.tb_field_end[table_index] = index + 1
+
+        snapshot.strings.freeze()
+
+        logger.info(
+            f"Loaded catalog snapshot version {version}: {len(snapshot.ds_name)} datasets, "
+            f"{len(snapshot.tb_name)} tables, {len(snapshot.f_name)} fields, "
+            f"{len(snapshot.strings.values)} distinct strings "
+            f"in {time.monotonic() - started:.1f}s"
+        )
+        return snapshot
+
+    def get_projects(self) -> List[str]:
+        """Get all projects with at least one dataset."""
+        return list(self.projects)
+
+    def dataset(self, index: int) -> Dict[str, Any]:
+        """Get the dataset at an index, as a search result."""
+        s = self.strings.values
+        return {
+            "id": s[self.ds_name[index]],
+            "full_id": s[self.ds_full_id[index]],
+            "project_id": s[self.ds_project[index]],
+            "friendly_name": s[self.ds_friendly_name[index]],
+            "description": s[self.ds_description[index]]
+        }
+
+    def table(self, index: int) -> Dict[str, Any]:
+        """Get the table at an index, as a search result."""
+        s = self.strings.values
+        return {
+            "id": s[self.tb_name[index]],
+            "full_id": s[self.tb_full_id[index]],
+            "dataset_id": s[self.tb_dataset[index]],
+            "project_id": s[self.tb_project[index]],
+            "friendly_name": s[self.tb_friendly_name[index]],
+            "description": s[self.tb_description[index]],
+            "table_type": s[self.tb_type[index]]
+        }
+
+    def field_full_id(self, index: int, table_index: int) -> str:
+        """Get the full ID of the field at an index, given its table."""
+        override = self.f_full_id_overrides.get(index)
+        if override:
+            return override
+        s = self.strings.values
+        return f"{s[self.tb_full_id[table_index]]}.{s[self.f_name[index]]}"
+
+    def field(self, index: int, table_index: int) -> Dict[str, Any]:
+        """Get the field at an index, as a search result."""
+        s = self.strings.values
+        return {
+            "name": s[self.f_name[index]],
+            "full_id": self.field_full_id(index, table_index),
+            "table_id": s[self.tb_name[table_index]],
+            "dataset_id": s[self.tb_dataset[table_index]],
+            "project_id": s[self.tb_project[table_index]],
+            "field_type": s[self.f_type[index]],
+            "description": s[self.f_description[index]],
+            "mode": s[self.f_mode[index]]
+        }
+
+    def get_datasets(self, project_id: str | None = None) -> List[Dict[str, Any]]:
+        """Get datasets, with the same result as ``Database.get_datasets``."""
+        if project_id:
+            start, end = self.project_datasets.get(project_id, (0, 0))
+        else:
+            start, end = 0, len(self.ds_name)
+        return [self.dataset(i) for i in range(start, end)]
+
+    def get_tables(
+        self,
+        project_id: str | None = None,
+        dataset_id: str | None = None
+    ) -> List[Dict[str, Any]]:
+        """Get tables, with the same result as ``Database.get_tables``."""
+        if project_id and dataset_id:
+            ranges = [self.dataset_tables.get((project_id, dataset_id), (0, 0))]
+        elif project_id:
+            ranges = [self.project_tables.get(project_id, (0, 0))]
+        elif dataset_id:
+            ranges = [r for (_, d), r in self.dataset_tables.items() if d == dataset_id]
+        else:
+            ranges = [(0, len(self.tb_name))]
+
+        return [self.table(i) for start, end in ranges for i in range(start, end)]
+
+    def get_table_with_fields(self, dataset_id: str, table_id: str) -> Dict[str, Any] | None:
+        """Get a table with its fields, like ``Database.get_table_with_fields``."""
+        index = self.table_lookup.get((dataset_id, table_id))
+
+        if index is None:
+            return None
+
+        s = self.strings.values
+        table = self.table(index)
+        table_full_id = table["full_id"]
+        overrides = self.f_full_id_overrides
+
+        table["fields"] = [
+            {
+                "name": s[self.f_name[i]],
+                "full_id": overrides.get(i) or f"{table_full_id}.{s[self.f_name[i]]}",
+                "field_type": s[self.f_type[i]],
+                "description": s[self.f_description[i]],
+                "mode": s[self.f_mode[i]]
+            }
+            for i in range(self.tb_field_start[index], self.tb_field_end[index])
+        ]
+        return table
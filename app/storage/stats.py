@@ -0,0 +1,274 @@
+"""
+Incremental maintenance of the catalog statistics.
+
+Writes that add or remove catalog rows describe their effect as a ``Counter``
+of deltas keyed by ``(dataset_id, metric, key)``, which ``apply_deltas`` adds
+to the dataset rows and to the project totals of ``catalog_stats`` with one
+upsert statement. Reading the statistics then never touches the catalog
+tables.
+"""
+from collections import Counter
+import logging
+from typing import List, Dict, Any, Iterable, Tuple
+
+from sqlalchemy import func, insert, literal, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from app.storage.models import (
+    CatalogStatModel, Dataset, Table, Field, DatasetModel, TableModel, FieldModel
+)
+
+logger = logging.getLogger(__name__)
+
+# Key of the field_type metric for fields without a type
+UNKNOWN_TYPE = "UNKNOWN"
+
+# Columns identifying a statistics row
+KEY_COLUMNS = ("generation", "project_id", "dataset_id", "metric", "key")
+
+# (dataset_id, metric, key) -> change of the count
+StatsDelta = Counter
+
+
+def field_type_key(field_type: str | None) -> str:
+    """Key under which a field type is counted."""
+    return field_type or UNKNOWN_TYPE
+
+
+def count_items(
+    datasets: Iterable[Dataset] = (),
+    tables: Iterable[Table] = (),
+    fields: Iterable[Field] = ()
+) -> StatsDelta:
+    """Compute the deltas of adding metadata to the catalog.
+
+    Args:
+        datasets: Datasets being added.
+        tables: Tables being added.
+        fields: Fields being added.
+
+    Returns:
+        The deltas.
+    """
+    deltas = StatsDelta()
+
+    for dataset in datasets:
+        deltas[(dataset.id, CatalogStatModel.DATASETS, "")] += 1
+    for table in tables:
+        deltas[(table.dataset_id, CatalogStatModel.TABLES, "")] += 1
+    for field in fields:
+        deltas[(field.dataset_id, CatalogStatModel.FIELDS, "")] += 1
+        deltas[(field.dataset_id, CatalogStatModel.FIELD_TYPE, field_type_key(field.field_type))] += 1
+
+    return deltas
+
+
+def _upsert_statement(session: Session):
+    """Build an insert that adds to the value of an existing row.
+
+    Returns:
+        The statement, or None if the dialect has no upsert.
+    """
+    table = CatalogStatModel.__table__
+    dialect = session.get_bind().dialect.name
+
+    if dialect == "postgresql":
+        stmt = postgresql.insert(table)
+    elif dialect == "sqlite":
+        stmt = sqlite.insert(table)
+    else:
+        return None
+
+    return stmt.on_conflict_do_update(
+        index_elements=list(KEY_COLUMNS),
+        set_={"value": table.c.value + stmt.excluded.value}
+    )
+
+
+def apply_deltas(
+    session: Session,
+    generation: int,
+    project_id: str,
+    deltas: StatsDelta
+) -> None:
+    """Add deltas to the statistics of a generation and to its project totals.
+
+    Args:
+        session: The session making the write.
+        generation: The generation the deltas apply to.
+        project_id: The project ID.
+        deltas: The deltas keyed by (dataset_id, metric, key).
+    """
+    merged = StatsDelta()
+    for (dataset_id, metric, key), value in deltas.items():
+        merged[(dataset_id, metric, key)] += value
+        merged[("", metric, key)] += value
+
+    rows = [
+        {
+            "generation": generation,
+            "project_id": project_id,
+            "dataset_id": dataset_id,
+            "metric": metric,
+            "key": key,
+            "value": value
+        }
+        for (dataset_id, metric, key), value in merged.items()
+        if value
+    ]
+
+    if not rows:
+        return
+
+    stmt = _upsert_statement(session)
+
+    if stmt is not None:
+        session.execute(stmt, rows)
+    else:
+        for row in rows:
+            updated = session.query(CatalogStatModel).filter_by(
+                **{column: row[column] for column in KEY_COLUMNS}
+            ).update(
+                {"value": CatalogStatModel.value + row["value"]}, synchronize_session=False
+            )
+            if not updated:
+                session.execute(insert(CatalogStatModel), [row])
+
+    if any(value < 0 for value in deltas.values()):
+        session.query(CatalogStatModel).filter(
+            CatalogStatModel.generation == generation,
+            CatalogStatModel.project_id == project_id,
+            CatalogStatModel.value <= 0
+        ).delete(synchronize_session=False)
+
+
+def dataset_deltas(session: Session, generation: int, project_id: str, dataset_id: str) -> StatsDelta:
+    """Compute the deltas of removing a dataset, from its statistics.
+
+    Args:
+        session: The session to use.
+        generation: The generation of the dataset.
+        project_id: The project ID.
+        dataset_id: The dataset ID.
+
+    Returns:
+        The negated counts of the dataset.
+    """
+    rows = session.query(
+        CatalogStatModel.metric, CatalogStatModel.key, CatalogStatModel.value
+    ).filter_by(generation=generation, project_id=project_id, dataset_id=dataset_id).all()
+
+    return StatsDelta({(dataset_id, metric, key): -value for metric, key, value in rows})
+
+
+def table_deltas(
+    session: Session,
+    generation: int,
+    project_id: str,
+    dataset_id: str,
+    table_id: str
+) -> StatsDelta:
+    """Compute the deltas of removing a table and its fields.
+
+    Counting the fields of one table is served by the
+    (project_id, dataset_id, table_id) index.
+
+    Args:
+        session: The session to use.
+        generation: The generation of the table.
+        project_id: The project ID.
+        dataset_id: The dataset ID.
+        table_id: The table ID.
+
+    Returns:
+        The deltas.
+    """
+    deltas = StatsDelta({(dataset_id, CatalogStatModel.TABLES, ""): -1})
+
+    type_counts = session.query(FieldModel.field_type, func.count()).filter_by(
+        project_id=project_id,
+        dataset_id=dataset_id,
+        table_id=table_id,
+        generation=generation
+    ).group_by(FieldModel.field_type).all()
+
+    for field_type, count in type_counts:
+        deltas[(dataset_id, CatalogStatModel.FIELDS, "")] -= count
+        deltas[(dataset_id, CatalogStatModel.FIELD_TYPE, field_type_key(field_type))] -= count
+
+    return deltas
+
+
+def rebuild_stats(session: Session, generation_ids: List[int]) -> None:
+    """Recompute the statistics of generations from the catalog tables.
+
+    Args:
+        session: The session to use.
+        generation_ids: The generations to recompute.
+    """
+    if not generation_ids:
+        return
+
+    session.query(CatalogStatModel).filter(
+        CatalogStatModel.generation.in_(generation_ids)
+    ).delete(synchronize_session=False)
+
+    # As field_type_key: no type and an empty type are both unknown
+    field_type = func.coalesce(func.nullif(FieldModel.field_type, ""), UNKNOWN_TYPE)
+    sources = [
+        (DatasetModel, DatasetModel.dataset_name, CatalogStatModel.DATASETS, None),
+        (TableModel, TableModel.dataset_id, CatalogStatModel.TABLES, None),
+        (FieldModel, FieldModel.dataset_id, CatalogStatModel.FIELDS, None),
+        (FieldModel, FieldModel.dataset_id, CatalogStatModel.FIELD_TYPE, field_type),
+    ]
+
+    for model, dataset_column, metric, key in sources:
+        # Dataset rows, then project totals. Constants stay out of GROUP BY,
+        # which PostgreSQL rejects.
+        for per_dataset in (True, False):
+            group_by = [model.generation, model.project_id]
+            group_by += [dataset_column] if per_dataset else []
+            group_by += [key] if key is not None else []
+
+            query = select(
+                model.generation,
+                model.project_id,
+                dataset_column if per_dataset else literal(""),
+                literal(metric),
+                key if key is not None else literal(""),
+                func.count()
+            ).where(model.generation.in_(generation_ids)).group_by(*group_by)
+
+            session.execute(
+                insert(CatalogStatModel).from_select(list(KEY_COLUMNS) + ["value"], query)
+            )
+
+
+def summarize(rows: Iterable[Tuple[str, str, int]]) -> Dict[str, Any]:
+    """Turn statistics rows into counts.
+
+    Args:
+        rows: (metric, key, value) rows, possibly of several generations.
+
+    Returns:
+        Dict with datasets, tables and fields counts and the field type
+        distribution.
+    """
+    summary = {
+        CatalogStatModel.DATASETS: 0,
+        CatalogStatModel.TABLES: 0,
+        CatalogStatModel.FIELDS: 0,
+        "field_types": {}
+    }
+
+    for metric, key, value in rows:
+        if metric == CatalogStatModel.FIELD_TYPE:
+            summary["field_types"][key] = summary["field_types"].get(key, 0) + value
+        else:
+            summary[metric] += value
+
+    summary["field_types"] = dict(
+        sorted(summary["field_types"].items(), key=lambda item: item[1], reverse=True)
+    )
+    return summary
@@ -0,0 +1,121 @@
+"""
+Token index of the names and full IDs of the catalog.
+
+Every dataset, table and field row has one ``name_tokens`` row per distinct
+normalized word of its name and full ID: ``customerId`` and ``CUSTOMER_ID``
+both give ``customer`` and ``id``, ``p1.sales.order_items`` gives ``p1``,
+``sales``, ``order`` and ``items``, and camelCase names are also indexed
+whole (``app.search.tokenize``). The rows are written in the transaction that
+writes the catalog row, and deleted with it.
+"""
+import logging
+from typing import List, Dict, Any, Iterable, Tuple
+
+from sqlalchemy import delete, insert, select
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm import Session
+
+from app.storage.models import DatasetModel, TableModel, FieldModel, NameTokenModel
+from app.search.tokenize import identifier_terms
+
+logger = logging.getLogger(__name__)
+
+# Entity type -> (model, name column)
+TOKEN_SOURCES = {
+    NameTokenModel.DATASET: (DatasetModel, DatasetModel.dataset_name),
+    NameTokenModel.TABLE: (TableModel, TableModel.table_name),
+    NameTokenModel.FIELD: (FieldModel, FieldModel.name),
+}
+
+# Rows inserted per statement
+TOKEN_BATCH_SIZE = 10000
+
+# Tokens are cut to the size of the column
+MAX_TOKEN_LENGTH = 255
+
+
+def name_tokens(name: str | None, full_id: str | None) -> List[str]:
+    """Get the distinct tokens of a name and a full ID.
+
+    Args:
+        name: The name of the dataset, table or field.
+        full_id: Its full ID.
+
+    Returns:
+        The lowercased tokens.
+    """
+    tokens = identifier_terms(name or "") + identifier_terms(full_id or "")
+    return list(dict.fromkeys(token[:MAX_TOKEN_LENGTH] for token in tokens))
+
+
+def token_rows(
+    entity_type: str,
+    rows: Iterable[Tuple[int, int, str | None, str | None]]
+) -> List[Dict[str, Any]]:
+    """Build the token rows of catalog rows.
+
+    Args:
+        entity_type: ``dataset``, ``table`` or ``field``.
+        rows: (id, generation, name, full_id) of each catalog row.
+
+    Returns:
+        The ``name_tokens`` rows to insert.
+    """
+    return [
+        {"entity_type": entity_type, "entity_id": entity_id, "token": token, "generation": generation}
+        for entity_id, generation, name, full_id in rows
+        for token in name_tokens(name, full_id)
+    ]
+
+
+def insert_tokens(
+    session: Session | Connection,
+    entity_type: str,
+    rows: Iterable[Tuple[int, int, str | None, str | None]]
+) -> None:
+    """Write the tokens of new catalog rows.
+
+    Args:
+        session: The session or connection writing the catalog rows.
+        entity_type: ``dataset``, ``table`` or ``field``.
+        rows: (id, generation, name, full_id) of each catalog row.
+    """
+    values = token_rows(entity_type, rows)
+    for start in range(0, len(values), TOKEN_BATCH_SIZE):
+        session.execute(insert(NameTokenModel.__table__), values[start:start + TOKEN_BATCH_SIZE])
+
+
+def delete_tokens(session: Session, entity_type: str, entity_ids) -> None:
+    """Delete the tokens of catalog rows.
+
+    Args:
+        session: The session deleting the catalog rows.
+        entity_type: ``dataset``, ``table`` or ``field``.
+        entity_ids: The IDs of the rows, as a list or a select of IDs.
+    """
+    session.execute(
+        delete(NameTokenModel).where(
+            NameTokenModel.entity_type == entity_type,
+            NameTokenModel.entity_id.in_(entity_ids)
+        )
+    )
+
+
+def rebuild_tokens(connection: Connection, batch_size: int = TOKEN_BATCH_SIZE) -> None:
+    """Recompute the tokens of the whole catalog.
+
+    Args:
+        connection: A connection to the database, in a transaction.
+        batch_size: Number of catalog rows read per round trip.
+    """
+    connection.execute(delete(NameTokenModel))
+
+    for entity_type, (model, name_column) in TOKEN_SOURCES.items():
+        result = connection.execution_options(yield_per=batch_size).execute(
+            select(model.id, model.generation, name_column, model.full_id)
+        )
+        count = 0
+        for partition in result.partitions():
+            insert_tokens(connection, entity_type, partition)
+            count += len(partition)
+        logger.info(f"Indexed the names of {count} {entity_type} rows")
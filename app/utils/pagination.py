@@ -0,0 +1,64 @@
+"""
+Helpers for cursor-based (keyset) pagination.
+
+Listing endpoints page over the unique, indexed ``full_id`` column. The cursor
+handed to clients is the ``full_id`` of the last row of the previous page,
+wrapped in URL-safe base64 so that callers treat it as opaque.
+"""
+import base64
+import binascii
+from typing import List, Dict, Any
+
+# Upper bound on the page size accepted by the listing endpoints
+MAX_PAGE_SIZE = 5000
+
+
+def encode_cursor(full_id: str) -> str:
+    """Encode the key of the last row of a page into an opaque cursor.
+
+    Args:
+        full_id: The full ID of the last row returned.
+
+    Returns:
+        The cursor string.
+    """
+    return base64.urlsafe_b64encode(full_id.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> str:
+    """Decode a cursor produced by :func:`encode_cursor`.
+
+    Args:
+        cursor: The opaque cursor string.
+
+    Returns:
+        The full ID the next page starts after.
+
+    Raises:
+        ValueError: If the cursor is malformed.
+    """
+    padded = cursor + "=" * (-len(cursor) % 4)
+    try:
+        # urlsafe_b64decode drops characters outside the alphabet, so "!!!" would be ""
+        full_id = base64.b64decode(padded.encode("ascii"), altchars=b"-_", validate=True).decode("utf-8")
+    except (binascii.Error, UnicodeError) as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+
+    if not full_id:
+        raise ValueError(f"Invalid cursor: {cursor}")
+    return full_id
+
+
+def next_cursor(items: List[Dict[str, Any]], limit: int | None) -> str | None:
+    """Compute the cursor for the page following ``items``.
+
+    Args:
+        items: The rows of the current page, ordered by ``full_id``.
+        limit: The page size that was requested.
+
+    Returns:
+        The cursor for the next page, or None if this was the last page.
+    """
+    if not limit or len(items) < limit:
+        return None
+    return encode_cursor(items[-1]["full_id"])
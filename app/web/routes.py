@@ -2,14 +2,16 @@
 Web routes for BigQuery metadata UI.
 """
 
-from fastapi import APIRouter, Request, Form, Query, status
+from fastapi import APIRouter, Depends, Request, Form, Query, status
 from fastapi.responses import HTMLResponse, JSONResponse, RedirectResponse
 from fastapi.templating import Jinja2Templates
 from typing import Annotated
 import os
 import logging
 
+from app.dependencies import get_db, get_search
 from app.storage.db import Database
+from app.search.results import DEFAULT_SEARCH_LIMIT, total_label
 from app.search.search import MetadataSearch
 
 logger = logging.getLogger(__name__)
@@ -19,25 +21,31 @@ templates_dir = os.path.join(os.path.dirname(__file__), "templates")
 os.makedirs(templates_dir, exist_ok=True)
 
 templates = Jinja2Templates(directory=templates_dir)
+templates.env.filters["total"] = total_label
 web_router = APIRouter()
-db = Database()
-search_engine = MetadataSearch()
 
 
+# Not async: searches block on executor futures, off the event loop
 @web_router.get("/", response_class=HTMLResponse)
-async def index(
+def index(
     request: Request,
+    db: Annotated[Database, Depends(get_db)],
+    search_engine: Annotated[MetadataSearch, Depends(get_search)],
     # Common parameters
     project_id: Annotated[str | None, Query(description="Project ID to filter by")] = None,
     dataset_id: Annotated[str | None, Query(description="Dataset ID to filter by")] = None,
     # Search mode
-    search_mode: Annotated[str | None, Query(description="Search mode (fuzzy or field)")] = None,
+    search_mode: Annotated[str | None, Query(description="Search mode (fuzzy, semantic or field)")] = None,
     # Fuzzy search parameters
     q: Annotated[str | None, Query(description="Search query for fuzzy search")] = None,
     # Field-specific search parameters
     name: Annotated[str | None, Query(description="Name to search for")] = None,
     description: Annotated[str | None, Query(description="Description to search for")] = None,
     type: Annotated[str | None, Query(description="Type to filter by")] = None,
+    # Facet filters of searches
+    table_type: Annotated[str | None, Query(description="Table type facet to filter by")] = None,
+    field_type: Annotated[str | None, Query(description="Field type facet to filter by")] = None,
+    offset: Annotated[int, Query(ge=0, description="Number of results per entity type to skip")] = 0,
 ):
     """Homepage with integrated search functionality."""
     projects = db.get_projects()
@@ -49,9 +57,21 @@ async def index(
     if project_id:
         datasets = db.get_datasets(project_id=project_id)
     
+    filters = {"dataset": dataset_id, "table_type": table_type, "field_type": field_type}
+    
     # Handle fuzzy search mode
     if search_mode == "fuzzy" and q:
-        results = search_engine.search(query=q, project_id=project_id)
+        results = search_engine.fuzzy_search(
+            query=q, project_id=project_id, limit=DEFAULT_SEARCH_LIMIT, offset=offset,
+            facets=True, filters=filters
+        )
+        search_performed = True
+    
+    # Handle semantic search mode
+    elif search_mode == "semantic" and q:
+        results = search_engine.semantic_search(
+            query=q, project_id=project_id, limit=DEFAULT_SEARCH_LIMIT, offset=offset
+        )
         search_performed = True
     
     # Handle field-specific search mode
@@ -60,14 +80,19 @@ async def index(
         results = search_engine.advanced_search(
             terms=terms, 
             project_id=project_id,
-            dataset_id=dataset_id
+            dataset_id=dataset_id,
+            limit=DEFAULT_SEARCH_LIMIT,
+            offset=offset
         )
         search_performed = True
     
     # For backward compatibility or direct access without search_mode
     elif q:
         # If we have a general query but no mode, default to fuzzy search
-        results = search_engine.search(query=q, project_id=project_id)
+        results = search_engine.fuzzy_search(
+            query=q, project_id=project_id, limit=DEFAULT_SEARCH_LIMIT, offset=offset,
+            facets=True, filters=filters
+        )
         search_performed = True
     elif name or description or type:
         # If we have field parameters but no mode, default to field search
@@ -75,7 +100,9 @@ async def index(
         results = search_engine.advanced_search(
             terms=terms, 
             project_id=project_id,
-            dataset_id=dataset_id
+            dataset_id=dataset_id,
+            limit=DEFAULT_SEARCH_LIMIT,
+            offset=offset
         )
         search_performed = True
 
@@ -91,6 +118,8 @@ async def index(
             "description": description,
             "type": type,
             "dataset_id": dataset_id,
+            "table_type": table_type,
+            "field_type": field_type,
             "search_mode": search_mode,
             "results": results,
             "search_performed": search_performed
@@ -99,7 +128,11 @@ async def index(
 
 
 @web_router.get("/project/{project_id}", response_class=HTMLResponse)
-async def project_details(request: Request, project_id: str):
+async def project_details(
+    request: Request,
+    project_id: str,
+    db: Annotated[Database, Depends(get_db)],
+):
     """Project details page."""
     datasets = db.get_datasets(project_id=project_id)
 
@@ -110,7 +143,12 @@ async def project_details(request: Request, project_id: str):
 
 
 @web_router.get("/dataset/{project_id}/{dataset_id}", response_class=HTMLResponse)
-async def dataset_details(request: Request, project_id: str, dataset_id: str):
+async def dataset_details(
+    request: Request,
+    project_id: str,
+    dataset_id: str,
+    db: Annotated[Database, Depends(get_db)],
+):
     """Dataset details page."""
     tables = db.get_tables(project_id=project_id, dataset_id=dataset_id)
 
@@ -126,7 +164,11 @@ async def dataset_details(request: Request, project_id: str, dataset_id: str):
 
 
 @web_router.post("/dataset/{project_id}/{dataset_id}/delete")
-async def delete_dataset(project_id: str, dataset_id: str):
+async def delete_dataset(
+    project_id: str,
+    dataset_id: str,
+    db: Annotated[Database, Depends(get_db)],
+):
     """Delete a dataset and all its associated tables and fields."""
     success = db.delete_dataset(dataset_id=dataset_id, project_id=project_id)
     
@@ -147,7 +189,11 @@ async def delete_dataset(project_id: str, dataset_id: str):
     "/table/{project_id}/{dataset_id}/{table_id}", response_class=HTMLResponse
 )
 async def table_details(
-    request: Request, project_id: str, dataset_id: str, table_id: str
+    request: Request,
+    project_id: str,
+    dataset_id: str,
+    table_id: str,
+    db: Annotated[Database, Depends(get_db)],
 ):
     """Table details page."""
     table = db.get_table_with_fields(dataset_id=dataset_id, table_id=table_id)
@@ -165,7 +211,12 @@ async def table_details(
 
 
 @web_router.post("/table/{project_id}/{dataset_id}/{table_id}/delete")
-async def delete_table(project_id: str, dataset_id: str, table_id: str):
+async def delete_table(
+    project_id: str,
+    dataset_id: str,
+    table_id: str,
+    db: Annotated[Database, Depends(get_db)],
+):
     """Delete a table and all its associated fields."""
     success = db.delete_table(
         dataset_id=dataset_id, 
@@ -186,18 +237,24 @@ async def delete_table(project_id: str, dataset_id: str, table_id: str):
     )
 
 
+# Not async: searches block on executor futures, off the event loop
 @web_router.get("/search", response_class=HTMLResponse)
-async def search_page(
+def search_page(
     request: Request,
+    db: Annotated[Database, Depends(get_db)],
+    search_engine: Annotated[MetadataSearch, Depends(get_search)],
     q: Annotated[str | None, Query(description="Search query")] = None,
     project_id: Annotated[str | None, Query(description="Project ID to filter by")] = None,
+    offset: Annotated[int, Query(ge=0, description="Number of results per entity type to skip")] = 0,
 ):
     """Search page."""
     results = {}
     projects = db.get_projects()
 
     if q:
-        results = search_engine.search(query=q, project_id=project_id)
+        results = search_engine.search(
+            query=q, project_id=project_id, limit=DEFAULT_SEARCH_LIMIT, offset=offset
+        )
 
     return templates.TemplateResponse(
         "search.html",
@@ -212,7 +269,10 @@ async def search_page(
 
 
 @web_router.get("/datasets")
-async def get_datasets(project_id: str | None = None):
+async def get_datasets(
+    db: Annotated[Database, Depends(get_db)],
+    project_id: str | None = None,
+):
     """Get datasets for a project as JSON."""
     if not project_id:
         return JSONResponse(content=[])
@@ -224,7 +284,10 @@ async def get_datasets(project_id: str | None = None):
 
 
 @web_router.get("/advanced-search", response_class=HTMLResponse)
-async def advanced_search_page(request: Request):
+async def advanced_search_page(
+    request: Request,
+    db: Annotated[Database, Depends(get_db)],
+):
     """Advanced search page."""
     projects = db.get_projects()
     datasets = []  # Empty list initially, will be populated via JavaScript
@@ -240,14 +303,19 @@ async def advanced_search_page(request: Request):
     )
 
 
+# Not async: searches block on executor futures, off the event loop
 @web_router.post("/advanced-search", response_class=HTMLResponse)
-async def advanced_search_results(
+def advanced_search_results(
     request: Request,
+    db: Annotated[Database, Depends(get_db)],
+    search_engine: Annotated[MetadataSearch, Depends(get_search)],
     name: Annotated[str | None, Form(description="Name to search for")] = None,
     description: Annotated[str | None, Form(description="Description to search for")] = None,
     type: Annotated[str | None, Form(description="Type to filter by")] = None,
     project_id: Annotated[str | None, Form(description="Project ID to filter by")] = None,
     dataset_id: Annotated[str | None, Form(description="Dataset ID to filter by")] = None,
+    query: Annotated[str | None, Form(description="Structured query")] = None,
+    explain: Annotated[bool, Form(description="Whether to show the query plan")] = False,
 ):
     """Advanced search results."""
     projects = db.get_projects()
@@ -258,11 +326,19 @@ async def advanced_search_results(
 
     terms = {"name": name or "", "description": description or "", "type": type or ""}
 
-    results = search_engine.advanced_search(
-        terms=terms, 
-        project_id=project_id,
-        dataset_id=dataset_id
-    )
+    results = {}
+    error = None
+    try:
+        results = search_engine.advanced_search(
+            terms=terms, 
+            project_id=project_id,
+            dataset_id=dataset_id,
+            limit=DEFAULT_SEARCH_LIMIT,
+            query=query,
+            explain=explain
+        )
+    except ValueError as e:
+        error = str(e)
 
     return templates.TemplateResponse(
         "advanced_search.html",
@@ -275,6 +351,9 @@ async def advanced_search_results(
             "type": type,
             "project_id": project_id,
             "dataset_id": dataset_id,
+            "query": query,
+            "explain": explain,
+            "error": error,
             "results": results,
         },
     )
@@ -1,5 +1,8 @@
 // BigQuery Metadata Search scripts
 
+// Milliseconds without typing before name suggestions are requested
+const SUGGEST_DELAY_MS = 150;
+
 document.addEventListener('DOMContentLoaded', function() {
     // Enable tooltips
     const tooltipTriggerList = [].slice.call(document.querySelectorAll('[data-bs-toggle="tooltip"]'));
@@ -90,4 +93,62 @@ document.addEventListener('DOMContentLoaded', function() {
             updateDatasets(fieldProjectSelect.value);
         }
     }
+    
+    // Suggest names while typing in the search boxes
+    document.querySelectorAll('input[name="q"]').forEach(function(input) {
+        const datalist = document.createElement('datalist');
+        datalist.id = `${input.id || 'q'}-suggestions`;
+        input.after(datalist);
+        input.setAttribute('list', datalist.id);
+        input.setAttribute('autocomplete', 'off');
+        
+        let timer = null;
+        let controller = null;
+        
+        const suggest = async () => {
+            // The last word is completed, the words before it are kept
+            const value = input.value;
+            const start = value.lastIndexOf(' ') + 1;
+            const prefix = value.slice(start).trim();
+            
+            // Cancel the request of the previous keystroke
+            if (controller) {
+                controller.abort();
+            }
+            
+            if (prefix.length < 2) {
+                datalist.replaceChildren();
+                return;
+            }
+            
+            controller = new AbortController();
+            
+            try {
+                const response = await fetch(
+                    `/api/suggest?prefix=${encodeURIComponent(prefix)}&limit=10`,
+                    {signal: controller.signal}
+                );
+                if (!response.ok) {
+                    return;
+                }
+                const suggestions = await response.json();
+                
+                datalist.replaceChildren(...suggestions.map(suggestion => {
+                    const option = document.createElement('option');
+                    option.value = value.slice(0, start) + suggestion.text;
+                    return option;
+                }));
+            } catch (error) {
+                if (error.name !== 'AbortError') {
+                    console.error('Error fetching suggestions:', error);
+                }
+            }
+        };
+        
+        // Wait for a pause in typing before asking
+        input.addEventListener('input', function() {
+            clearTimeout(timer);
+            timer = setTimeout(suggest, SUGGEST_DELAY_MS);
+        });
+    });
 });
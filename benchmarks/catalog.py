@@ -0,0 +1,325 @@
+"""
+Synthetic catalogs and query mixes for the benchmarks.
+
+Names and descriptions are made of business words drawn from a Zipf
+distribution, so a few words (``id``, ``customer``, ``date``...) are in most
+names and most words are rare, as in real warehouses. Dataset, table and
+field counts, description lengths and the Zipf exponent are configurable,
+and a seed makes catalogs and query mixes reproducible.
+
+The catalog is loaded as a generation of each project with
+``Database.bulk_load``, so it works with SQLite and PostgreSQL alike.
+"""
+import bisect
+import itertools
+import random
+from dataclasses import asdict, dataclass
+from typing import List, Dict, Any, Iterator, Tuple
+
+from app.storage.models import Dataset, Table, Field
+
+# Identifier words, roughly the most common first
+WORDS = [
+    "id", "name", "date", "customer", "type", "status", "created", "updated", "code",
+    "amount", "order", "user", "account", "event", "total", "count", "product", "ts",
+    "value", "price", "payment", "country", "region", "session", "item", "invoice",
+    "address", "email", "phone", "currency", "source", "channel", "campaign", "device",
+    "category", "store", "line", "quantity", "discount", "tax", "shipment", "refund",
+    "balance", "transaction", "merchant", "supplier", "warehouse", "inventory", "sku",
+    "brand", "platform", "browser", "page", "click", "impression", "conversion", "revenue",
+    "cost", "margin", "budget", "forecast", "target", "score", "rank", "segment", "cohort",
+    "subscription", "plan", "tier", "trial", "churn", "retention", "visit", "referrer",
+    "language", "timezone", "latitude", "longitude", "city", "state", "postal", "street",
+    "contract", "employee", "department", "manager", "salary", "hire", "ticket", "agent",
+    "priority", "resolution", "feedback", "rating", "review", "comment", "message", "thread",
+    "attachment", "file", "version", "release", "build", "deploy", "metric", "dimension",
+    "partition", "cluster", "job", "run", "step", "stage", "pipeline", "batch", "snapshot",
+    "history", "audit", "log", "flag", "hash", "key", "token", "secret", "policy", "rule",
+    "limit", "quota", "usage", "bill", "credit", "debit", "ledger", "journal", "asset",
+    "liability", "vendor", "carrier", "route", "vehicle", "driver", "trip", "fare", "zone",
+    "sensor", "reading", "temperature", "pressure", "humidity", "battery", "firmware",
+    "model", "feature", "label", "prediction", "probability", "experiment", "variant",
+]
+
+# Words between the identifier words of descriptions
+FILLER_WORDS = ["the", "of", "for", "and", "in", "by", "per", "when", "with", "from"]
+
+# Field names often end with these
+FIELD_SUFFIXES = ["", "", "", "id", "at", "date", "count", "amount", "code", "flag"]
+
+# Value distributions of the other columns
+FIELD_TYPES = {
+    "STRING": 40, "INTEGER": 20, "TIMESTAMP": 10, "FLOAT": 8, "BOOLEAN": 6, "DATE": 6,
+    "NUMERIC": 5, "RECORD": 3, "JSON": 2,
+}
+FIELD_MODES = {"NULLABLE": 80, "REQUIRED": 15, "REPEATED": 5}
+TABLE_TYPES = {"TABLE": 85, "VIEW": 12, "EXTERNAL": 3}
+
+# Rows passed to each bulk_load call
+LOAD_BATCH_SIZE = 20000
+
+# Names kept to build queries from
+SAMPLE_SIZE = 1000
+
+
+@dataclass
+class CatalogSpec:
+    """Shape of a synthetic catalog.
+
+    ``tables`` and ``fields`` are averages, per dataset and per table.
+    """
+
+    projects: int = 1
+    datasets: int = 20
+    tables: int = 50
+    fields: int = 30
+    description_words: int = 12
+    zipf: float = 1.1
+    seed: int = 0
+
+    def as_dict(self) -> Dict[str, Any]:
+        """The spec as a JSON-serializable dict."""
+        return asdict(self)
+
+
+class ZipfWords:
+    """Draws words with probabilities following Zipf's law."""
+
+    def __init__(self, words: List[str], exponent: float, rng: random.Random):
+        """Initialize the sampler.
+
+        Args:
+            words: The words, the most frequent first.
+            exponent: The Zipf exponent; larger values favor the first words more.
+            rng: The random generator.
+        """
+        self.words = words
+        self.rng = rng
+        self.cumulative = list(itertools.accumulate(
+            1 / (rank ** exponent) for rank in range(1, len(words) + 1)
+        ))
+
+    def draw(self, k: int = 1) -> List[str]:
+        """Draw k words."""
+        total = self.cumulative[-1]
+        return [
+            self.words[bisect.bisect(self.cumulative, self.rng.random() * total)]
+            for _ in range(k)
+        ]
+
+
+def _weighted(rng: random.Random, weights: Dict[str, int]) -> str:
+    """Draw a key of a dict of weights."""
+    return rng.choices(list(weights), weights=list(weights.values()))[0]
+
+
+def _unique(name: str, seen: set) -> str:
+    """Suffix a name with a number until it is not in a set, then add it."""
+    unique = name
+    for i in itertools.count(2):
+        if unique not in seen:
+            break
+        unique = f"{name}_{i}"
+    seen.add(unique)
+    return unique
+
+
+class CatalogGenerator:
+    """Generates the datasets, tables and fields of a ``CatalogSpec``."""
+
+    def __init__(self, spec: CatalogSpec):
+        """Initialize the generator.
+
+        Args:
+            spec: The shape of the catalog.
+        """
+        self.spec = spec
+        self.rng = random.Random(spec.seed)
+        self.words = ZipfWords(WORDS, spec.zipf, self.rng)
+        # Names of the generated entries, for queries
+        self.samples: Dict[str, List[Tuple[str, ...]]] = {"dataset": [], "table": [], "field": []}
+        self.counts = {"datasets": 0, "tables": 0, "fields": 0}
+
+    def _name(self, words: int) -> str:
+        return "_".join(dict.fromkeys(self.words.draw(words)))
+
+    def _description(self) -> str | None:
+        mean = self.spec.description_words
+        if mean <= 0 or self.rng.random() < 0.3:
+            return None
+
+        length = max(1, round(self.rng.expovariate(1 / mean)))
+        words = [
+            self.rng.choice(FILLER_WORDS) if self.rng.random() < 0.3 else self.words.draw()[0]
+            for _ in range(length)
+        ]
+        return " ".join(words).capitalize() + "."
+
+    def _sample(self, kind: str, *values: str) -> None:
+        """Keep a uniform sample of the generated names (reservoir sampling)."""
+        seen = self.counts[kind + "s"]
+        sample = self.samples[kind]
+        if len(sample) < SAMPLE_SIZE:
+            sample.append(values)
+        else:
+            slot = self.rng.randrange(seen)
+            if slot < SAMPLE_SIZE:
+                sample[slot] = values
+
+    def project(self, project_id: str) -> Iterator[Tuple[List[Dataset], List[Table], List[Field]]]:
+        """Generate the catalog of a project.
+
+        Args:
+            project_id: The project ID.
+
+        Yields:
+            Batches of datasets, tables and fields of about ``LOAD_BATCH_SIZE`` rows.
+        """
+        spec = self.spec
+        datasets, tables, fields = [], [], []
+        dataset_names = set()
+
+        for _ in range(spec.datasets):
+            dataset_id = _unique(self._name(self.rng.choice([1, 2])), dataset_names)
+            datasets.append(Dataset(
+                id=dataset_id,
+                full_id=f"{project_id}.{dataset_id}",
+                project_id=project_id,
+                description=self._description()
+            ))
+            self.counts["datasets"] += 1
+            self._sample("dataset", dataset_id)
+
+            table_names = set()
+            for _ in range(self.rng.randint(1, 2 * spec.tables - 1)):
+                table_id = _unique(self._name(self.rng.choice([1, 2, 2, 3])), table_names)
+                table_full_id = f"{project_id}.{dataset_id}.{table_id}"
+                tables.append(Table(
+                    id=table_id,
+                    full_id=table_full_id,
+                    dataset_id=dataset_id,
+                    project_id=project_id,
+                    description=self._description(),
+                    table_type=_weighted(self.rng, TABLE_TYPES)
+                ))
+                self.counts["tables"] += 1
+                self._sample("table", dataset_id, table_id)
+
+                field_names = set()
+                for _ in range(self.rng.randint(1, 2 * spec.fields - 1)):
+                    words = self.words.draw(self.rng.choice([1, 2, 2, 3]))
+                    words.append(self.rng.choice(FIELD_SUFFIXES))
+                    name = _unique("_".join(dict.fromkeys(filter(None, words))), field_names)
+                    field_type = _weighted(self.rng, FIELD_TYPES)
+                    fields.append(Field(
+                        name=name,
+                        full_id=f"{table_full_id}.{name}",
+                        table_id=table_id,
+                        dataset_id=dataset_id,
+                        project_id=project_id,
+                        field_type=field_type,
+                        description=self._description(),
+                        mode=_weighted(self.rng, FIELD_MODES)
+                    ))
+                    self.counts["fields"] += 1
+                    self._sample("field", dataset_id, table_id, name, field_type)
+
+            if len(datasets) + len(tables) + len(fields) >= LOAD_BATCH_SIZE:
+                yield datasets, tables, fields
+                datasets, tables, fields = [], [], []
+
+        if datasets:
+            yield datasets, tables, fields
+
+
+def project_ids(spec: CatalogSpec) -> List[str]:
+    """IDs of the projects of a catalog."""
+    return [f"bench-{i}" for i in range(spec.projects)]
+
+
+def load_catalog(db, spec: CatalogSpec) -> CatalogGenerator:
+    """Replace the benchmark projects with a synthetic catalog.
+
+    Args:
+        db: The ``Database``.
+        spec: The shape of the catalog.
+
+    Returns:
+        The generator, with the counts and a sample of the loaded names.
+    """
+    generator = CatalogGenerator(spec)
+
+    for project_id in project_ids(spec):
+        db.delete_project(project_id)
+        generation_id = db.begin_generation(project_id)
+        for datasets, tables, fields in generator.project(project_id):
+            db.bulk_load(generation_id, datasets, tables, fields)
+        db.activate_generation(generation_id)
+
+    return generator
+
+
+class QueryMix:
+    """Queries of the benchmarks, drawn like the catalog names.
+
+    Common words are queried more often than rare ones, and some queries are
+    names or prefixes of catalog entries.
+    """
+
+    def __init__(self, generator: CatalogGenerator, seed: int = 1):
+        """Initialize the mix.
+
+        Args:
+            generator: The generator of the catalog, for its words and names.
+            seed: Seed of the queries.
+        """
+        self.rng = random.Random(seed)
+        self.words = ZipfWords(WORDS, generator.spec.zipf, self.rng)
+        self.samples = generator.samples
+
+    def _pick(self, kind: str) -> Tuple[str, ...]:
+        return self.rng.choice(self.samples[kind])
+
+    def search(self) -> str:
+        """A query for ``MetadataSearch.search``."""
+        kind = self.rng.random()
+        if kind < 0.5:
+            return self.words.draw()[0]
+        if kind < 0.8:
+            return " ".join(dict.fromkeys(self.words.draw(2)))
+        if kind < 0.9:
+            word = self.words.draw()[0]
+            return word[:max(2, len(word) - 2)]
+        return self._pick("field")[2]
+
+    def advanced(self) -> Dict[str, str]:
+        """The form terms of an ``advanced_search``."""
+        kind = self.rng.random()
+        if kind < 0.5:
+            return {"name": self.words.draw()[0]}
+        if kind < 0.8:
+            return {"name": self.words.draw()[0], "type": self._pick("field")[3]}
+        return {"description": self.words.draw()[0]}
+
+    def structured(self) -> str:
+        """A structured query of ``advanced_search``."""
+        kind = self.rng.random()
+        dataset_id, table_id, name, field_type = self._pick("field")
+        if kind < 0.3:
+            return f"name:{name[:3]}* type:{field_type}"
+        if kind < 0.6:
+            return f"dataset:{dataset_id} {self.words.draw()[0]}"
+        if kind < 0.8:
+            return f"table:{table_id} -{self.words.draw()[0]}"
+        return f'"{name}" type:{field_type}'
+
+    def prefix(self) -> str:
+        """A typed prefix for the name suggestions."""
+        name = self._pick(self.rng.choice(["dataset", "table", "field"]))[-1]
+        if self.rng.random() < 0.5 and "_" in name:
+            name = name.split("_")[0]
+        return name[:self.rng.randint(1, max(1, len(name)))]
+
+    def draw(self, kind: str, n: int) -> List[Any]:
+        """Draw n queries of a kind ('search', 'advanced', 'structured' or 'prefix')."""
+        return [getattr(self, kind)() for _ in range(n)]
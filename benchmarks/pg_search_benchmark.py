@@ -0,0 +1,179 @@
+"""
+Benchmark of LIKE search against PostgreSQL full-text search.
+
+Loads a synthetic catalog into the PostgreSQL database at DATABASE_URL and
+times ``MetadataSearch.search`` with both backends:
+
+    DATABASE_URL=postgresql://... python benchmarks/pg_search_benchmark.py --fields 10000000
+
+The catalog is generated in the database with ``generate_series``, one table
+per 50 fields and one dataset per 100 tables, with names and descriptions drawn
+from a small vocabulary of identifier words. Loading 10M fields takes several
+minutes; pass ``--skip-load`` to rerun the queries on an existing catalog.
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from alembic import command
+from alembic.config import Config
+from sqlalchemy import text
+
+from app.search.search import MetadataSearch
+from app.storage.db import Database
+
+PROJECT_ID = "bench"
+
+WORDS = [
+    "customer", "order", "invoice", "payment", "product", "account", "session",
+    "event", "user", "address", "shipment", "refund", "campaign", "device",
+    "country", "currency", "amount", "status", "created", "updated", "id",
+    "name", "type", "code", "ts", "date", "total", "count", "score", "region",
+]
+
+FIELDS_PER_TABLE = 50
+TABLES_PER_DATASET = 100
+
+
+def load_catalog(db: Database, n_fields: int) -> None:
+    """Replace the benchmark project with a synthetic catalog.
+
+    Args:
+        db: The database.
+        n_fields: Number of fields to generate.
+    """
+    n_tables = max(n_fields // FIELDS_PER_TABLE, 1)
+    n_datasets = max(n_tables // TABLES_PER_DATASET, 1)
+    words = "ARRAY[" + ", ".join(f"'{w}'" for w in WORDS) + "]"
+    k = len(WORDS)
+
+    def word(expr: str) -> str:
+        return f"({words})[1 + (({expr}) % {k})]"
+
+    db.delete_project(PROJECT_ID)
+
+    with db.engine.begin() as connection:
+        generation = connection.execute(text(
+            "INSERT INTO catalog_generations (project_id, status, activated_at) "
+            "VALUES (:project_id, 'current', now()) RETURNING id"
+        ), {"project_id": PROJECT_ID}).scalar()
+        params = {"project_id": PROJECT_ID, "generation": generation}
+
+        print(f"Loading {n_datasets} datasets, {n_tables} tables, {n_fields} fields")
+        connection.execute(text(
+            f"""
+            INSERT INTO datasets (dataset_name, full_id, project_id, description, generation)
+            SELECT 'ds_' || {word('d')} || '_' || d, :project_id || '.ds_' || {word('d')} || '_' || d,
+                :project_id, 'Data about ' || {word('d * 7')}, :generation
+            FROM generate_series(1, {n_datasets}) d
+            """
+        ), params)
+        connection.execute(text(
+            f"""
+            INSERT INTO tables (table_name, full_id, dataset_id, project_id, description,
+                table_type, generation)
+            SELECT {word('t')} || '_' || {word('t / 3')} || '_' || t,
+                :project_id || '.ds_' || {word(f't % {n_datasets} + 1')} || '_' || (t % {n_datasets} + 1)
+                    || '.' || {word('t')} || '_' || {word('t / 3')} || '_' || t,
+                'ds_' || {word(f't % {n_datasets} + 1')} || '_' || (t % {n_datasets} + 1),
+                :project_id, 'Table of ' || {word('t * 11')} || ' ' || {word('t * 13')},
+                'TABLE', :generation
+            FROM generate_series(1, {n_tables}) t
+            """
+        ), params)
+        connection.execute(text(
+            f"""
+            INSERT INTO fields (name, full_id, table_id, dataset_id, project_id, field_type,
+                description, mode, generation)
+            SELECT f.name, f.table_full_id || '.' || f.name, f.table_name, f.dataset_id,
+                :project_id, 'STRING', 'The ' || {word('f.i * 17')} || ' of the '
+                    || {word('f.i * 19')}, 'NULLABLE', :generation
+            FROM (
+                SELECT i,
+                    {word('i')} || '_' || {word('i / 7')} || '_' || (i % {FIELDS_PER_TABLE}) AS name,
+                    {word('t')} || '_' || {word('t / 3')} || '_' || t AS table_name,
+                    'ds_' || {word(f't % {n_datasets} + 1')} || '_' || (t % {n_datasets} + 1) AS dataset_id,
+                    :project_id || '.ds_' || {word(f't % {n_datasets} + 1')} || '_' || (t % {n_datasets} + 1)
+                        || '.' || {word('t')} || '_' || {word('t / 3')} || '_' || t AS table_full_id
+                FROM (
+                    SELECT i, (i - 1) / {FIELDS_PER_TABLE} + 1 AS t
+                    FROM generate_series(1, {n_fields}) i
+                ) s
+            ) f
+            """
+        ), params)
+
+    with db.engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+        connection.execute(text("VACUUM ANALYZE datasets, tables, fields"))
+
+    db.rebuild_stats(PROJECT_ID)
+
+
+def run_queries(search: MetadataSearch, queries, repeat: int) -> list:
+    """Time each query.
+
+    Returns:
+        Latencies in milliseconds.
+    """
+    latencies = []
+    for _ in range(repeat):
+        for query in queries:
+            started = time.perf_counter()
+            search.search(query, project_id=PROJECT_ID)
+            latencies.append((time.perf_counter() - started) * 1000)
+    return latencies
+
+
+def report(name: str, latencies: list) -> None:
+    """Print latency percentiles."""
+    latencies = sorted(latencies)
+    pick = lambda q: latencies[min(int(q * len(latencies)), len(latencies) - 1)]
+    print(
+        f"{name:10} n={len(latencies):4} mean={statistics.mean(latencies):9.1f} ms "
+        f"p50={pick(0.5):9.1f} ms p95={pick(0.95):9.1f} ms max={latencies[-1]:9.1f} ms"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--fields", type=int, default=1_000_000, help="Number of fields")
+    parser.add_argument("--queries", type=int, default=20, help="Number of distinct queries")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs of each query")
+    parser.add_argument("--skip-load", action="store_true", help="Reuse the loaded catalog")
+    parser.add_argument("--skip-like", action="store_true", help="Only time full-text search")
+    args = parser.parse_args()
+
+    db = Database()
+    if db.engine.dialect.name != "postgresql":
+        sys.exit("DATABASE_URL must point to PostgreSQL")
+
+    command.upgrade(Config(os.path.join(os.path.dirname(__file__), "..", "alembic.ini")), "head")
+
+    if not args.skip_load:
+        started = time.perf_counter()
+        load_catalog(db, args.fields)
+        print(f"Loaded in {time.perf_counter() - started:.0f}s")
+
+    rng = random.Random(0)
+    queries = [
+        " ".join(rng.sample(WORDS, rng.choice([1, 1, 2]))) for _ in range(args.queries)
+    ]
+
+    full_text = MetadataSearch()
+    if full_text.backend is None:
+        sys.exit("Full-text search is not available, check the migrations")
+    report("fulltext", run_queries(full_text, queries, args.repeat))
+
+    if not args.skip_like:
+        like = MetadataSearch()
+        like._backend, like._backend_selected = None, True
+        report("like", run_queries(like, queries, 1))
+
+
+if __name__ == "__main__":
+    main()
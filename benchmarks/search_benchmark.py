@@ -0,0 +1,378 @@
+"""
+Search latency benchmarks over a synthetic catalog.
+
+Loads a synthetic catalog (``benchmarks/catalog.py``) into the database at
+DATABASE_URL, a temporary SQLite file by default, replays a mix of queries
+against ``MetadataSearch.search``, ``advanced_search`` and the HTTP
+endpoints, and reports latency percentiles, throughput and memory:
+
+    python benchmarks/search_benchmark.py --datasets 20 --tables 50 --fields 30
+    DATABASE_URL=postgresql://... python benchmarks/search_benchmark.py --fields 100
+
+Results can be saved as a baseline in ``benchmarks/baselines`` and later runs
+compared with it, so that regressions show up between commits:
+
+    python benchmarks/search_benchmark.py --save-baseline
+    python benchmarks/search_benchmark.py --check
+
+HTTP requests are served in process through the ASGI application, without a
+network or server; pass ``--base-url`` to time a running server instead.
+The search cache is off unless SEARCH_CACHE_SIZE is set, so repeated queries
+are searched again.
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import platform
+import resource
+import statistics
+import sys
+import tempfile
+import time
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Callable
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+BASELINES_DIR = os.path.join(os.path.dirname(__file__), "baselines")
+
+# Operations timed by default, in order
+TARGETS = ["search", "advanced", "structured", "http-search", "http-advanced", "http-suggest"]
+
+# Latency statistics compared with the baseline; throughput is compared inversely
+COMPARED = ("p50_ms", "p95_ms", "p99_ms")
+
+
+def percentile(latencies: List[float], q: float) -> float:
+    """Nearest-rank percentile of sorted latencies."""
+    return latencies[max(math.ceil(q * len(latencies)) - 1, 0)]
+
+
+def peak_rss_mb() -> float:
+    """Peak resident memory of the process, in MB."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return peak / (1024 * 1024 if sys.platform == "darwin" else 1024)
+
+
+def measure(operations: List[Callable[[], Any]], repeat: int, concurrency: int) -> Dict[str, Any]:
+    """Time operations.
+
+    Args:
+        operations: The operations, run ``repeat`` times each.
+        repeat: Runs of each operation.
+        concurrency: Operations run at once, from as many threads.
+
+    Returns:
+        Latency percentiles in milliseconds, throughput in operations per
+        second and the peak memory of the process.
+    """
+    def timed(operation):
+        started = time.perf_counter()
+        operation()
+        return (time.perf_counter() - started) * 1000
+
+    runs = operations * repeat
+    rss_before = peak_rss_mb()
+    started = time.perf_counter()
+
+    if concurrency > 1:
+        with ThreadPoolExecutor(concurrency) as pool:
+            latencies = list(pool.map(timed, runs))
+    else:
+        latencies = [timed(operation) for operation in runs]
+
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    rss = peak_rss_mb()
+    return {
+        "n": len(latencies),
+        "mean_ms": round(statistics.mean(latencies), 3),
+        "p50_ms": round(percentile(latencies, 0.50), 3),
+        "p95_ms": round(percentile(latencies, 0.95), 3),
+        "p99_ms": round(percentile(latencies, 0.99), 3),
+        "max_ms": round(latencies[-1], 3),
+        "qps": round(len(latencies) / elapsed, 1),
+        "peak_rss_mb": round(rss, 1),
+        "rss_growth_mb": round(rss - rss_before, 1),
+    }
+
+
+class HttpClient:
+    """Sends requests to the application, in process or over HTTP."""
+
+    def __init__(self, base_url: str | None = None):
+        """Initialize the client.
+
+        Args:
+            base_url: URL of a running server; None serves requests in process.
+        """
+        self.base_url = base_url
+        self.app = None
+        if base_url is None:
+            from app.main import create_app
+            self.app = create_app()
+
+    def request(self, method: str, path: str, body: Dict[str, Any] | None = None, **params) -> Any:
+        """Send a request and decode its JSON response.
+
+        Raises:
+            RuntimeError: If the response is an error.
+        """
+        query = urllib.parse.urlencode(params)
+        payload = json.dumps(body).encode() if body is not None else b""
+
+        if self.base_url is not None:
+            url = f"{self.base_url.rstrip('/')}{path}" + (f"?{query}" if query else "")
+            request = urllib.request.Request(
+                url, data=payload or None, method=method,
+                headers={"Content-Type": "application/json"}
+            )
+            with urllib.request.urlopen(request) as response:
+                return json.loads(response.read())
+
+        status, content = asyncio.run(self._asgi(method, path, query.encode(), payload))
+        if status >= 400:
+            raise RuntimeError(f"{method} {path} returned {status}: {content[:200]!r}")
+        return json.loads(content)
+
+    async def _asgi(self, method: str, path: str, query: bytes, payload: bytes):
+        """Call the ASGI application with one request."""
+        received = False
+        status = None
+        chunks = []
+
+        async def receive():
+            nonlocal received
+            if received:
+                return {"type": "http.disconnect"}
+            received = True
+            return {"type": "http.request", "body": payload, "more_body": False}
+
+        async def send(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            elif message["type"] == "http.response.body":
+                chunks.append(message.get("body", b""))
+
+        scope = {
+            "type": "http", "http_version": "1.1", "method": method, "scheme": "http",
+            "path": path, "raw_path": path.encode(), "query_string": query, "root_path": "",
+            "headers": [(b"content-type", b"application/json")],
+            "client": ("127.0.0.1", 0), "server": ("localhost", 80),
+        }
+        await self.app(scope, receive, send)
+        return status, b"".join(chunks)
+
+
+def operations_for(target: str, mix, search, http: HttpClient | None, n: int, limit: int):
+    """Build the operations of a benchmark target.
+
+    Args:
+        target: One of ``TARGETS``.
+        mix: The ``QueryMix``.
+        search: The ``MetadataSearch``.
+        http: The HTTP client, for the ``http-`` targets.
+        n: Number of operations.
+        limit: Page size of the searches.
+
+    Returns:
+        Functions running one query each.
+    """
+    if target == "search":
+        return [lambda q=q: search.search(q, limit=limit) for q in mix.draw("search", n)]
+    if target == "advanced":
+        return [lambda t=t: search.advanced_search(t, limit=limit) for t in mix.draw("advanced", n)]
+    if target == "structured":
+        return [
+            lambda q=q: search.advanced_search({}, limit=limit, query=q)
+            for q in mix.draw("structured", n)
+        ]
+    if target == "http-search":
+        return [
+            lambda q=q: http.request("POST", "/api/search", {"query": q, "limit": limit})
+            for q in mix.draw("search", n)
+        ]
+    if target == "http-advanced":
+        return [
+            lambda t=t: http.request("POST", "/api/advanced-search", dict(t, limit=limit))
+            for t in mix.draw("advanced", n)
+        ]
+    if target == "http-suggest":
+        return [lambda p=p: http.request("GET", "/api/suggest", prefix=p) for p in mix.draw("prefix", n)]
+    raise ValueError(f"Unknown target '{target}', expected one of: {', '.join(TARGETS)}")
+
+
+def compare(results: Dict[str, Dict], baseline: Dict[str, Dict], tolerance: float) -> List[str]:
+    """Print the results next to a baseline.
+
+    Args:
+        results: The statistics of each target.
+        baseline: The statistics of the baseline run.
+        tolerance: Relative slowdown tolerated, e.g. 0.25 for 25%.
+
+    Returns:
+        The regressions, as messages.
+    """
+    regressions = []
+    print(f"\n{'target':14} {'stat':12} {'baseline':>10} {'current':>10} {'change':>8}")
+    for target, stats in results.items():
+        before = baseline.get(target)
+        if before is None:
+            continue
+
+        for stat in COMPARED + ("qps",):
+            change = stats[stat] / before[stat] - 1 if before[stat] else 0.0
+            slower = -change if stat == "qps" else change
+            flag = ""
+            if slower > tolerance:
+                flag = " <-- regression"
+                regressions.append(f"{target} {stat}: {before[stat]} -> {stats[stat]}")
+            print(f"{target:14} {stat:12} {before[stat]:10} {stats[stat]:10} {change:+8.0%}{flag}")
+
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    catalog = parser.add_argument_group("catalog")
+    catalog.add_argument("--projects", type=int, default=1, help="Number of projects")
+    catalog.add_argument("--datasets", type=int, default=20, help="Datasets per project")
+    catalog.add_argument("--tables", type=int, default=50, help="Average tables per dataset")
+    catalog.add_argument("--fields", type=int, default=30, help="Average fields per table")
+    catalog.add_argument("--description-words", type=int, default=12, help="Average words of a description")
+    catalog.add_argument("--zipf", type=float, default=1.1, help="Zipf exponent of the name words")
+    catalog.add_argument("--seed", type=int, default=0, help="Seed of the catalog and queries")
+    catalog.add_argument("--skip-load", action="store_true", help="Reuse the loaded catalog")
+
+    run = parser.add_argument_group("run")
+    run.add_argument("--targets", default=",".join(TARGETS), help="Comma-separated targets")
+    run.add_argument("--backend", default=os.environ.get("SEARCH_BACKEND", "auto"), help="SEARCH_BACKEND")
+    run.add_argument("--queries", type=int, default=200, help="Distinct queries per target")
+    run.add_argument("--repeat", type=int, default=3, help="Runs of each query")
+    run.add_argument("--concurrency", type=int, default=1, help="Queries run at once")
+    run.add_argument("--limit", type=int, default=50, help="Page size of the searches")
+    run.add_argument("--base-url", help="Time the HTTP targets against a running server")
+
+    baseline = parser.add_argument_group("baseline")
+    baseline.add_argument("--baseline", help="Baseline name, the database dialect by default")
+    baseline.add_argument("--save-baseline", action="store_true", help="Save the results as the baseline")
+    baseline.add_argument("--check", action="store_true", help="Exit with an error on regressions")
+    baseline.add_argument("--tolerance", type=float, default=0.25, help="Slowdown tolerated by --check")
+    args = parser.parse_args()
+
+    # Read by the app modules when they are imported
+    os.environ.setdefault(
+        "DATABASE_URL", f"sqlite:///{os.path.join(tempfile.gettempdir(), 'bq-metadata-bench.db')}"
+    )
+    os.environ["SEARCH_BACKEND"] = args.backend
+    os.environ.setdefault("SEARCH_CACHE_SIZE", "0")
+
+    from alembic import command
+    from alembic.config import Config
+    from sqlalchemy import text
+
+    from app.search.search import MetadataSearch
+    from app.storage.fts import install_fts
+    from app.storage.db import Database
+    from benchmarks.catalog import CatalogGenerator, CatalogSpec, QueryMix, load_catalog, project_ids
+
+    spec = CatalogSpec(
+        projects=args.projects, datasets=args.datasets, tables=args.tables, fields=args.fields,
+        description_words=args.description_words, zipf=args.zipf, seed=args.seed
+    )
+    db = Database()
+    dialect = db.engine.dialect.name
+
+    if dialect == "postgresql":
+        command.upgrade(Config(os.path.join(os.path.dirname(__file__), "..", "alembic.ini")), "head")
+    else:
+        db.ensure_schema()
+
+    started = time.perf_counter()
+    if args.skip_load:
+        # Generate the catalog again for the names the queries are made of
+        generator = CatalogGenerator(spec)
+        for project_id in project_ids(spec):
+            for _ in generator.project(project_id):
+                pass
+    else:
+        generator = load_catalog(db, spec)
+        if dialect == "postgresql":
+            with db.engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+                connection.execute(text("ANALYZE datasets, tables, fields, name_tokens"))
+        elif args.backend == "auto":
+            with db.engine.begin() as connection:
+                install_fts(connection)
+        print(
+            f"Loaded {generator.counts['datasets']} datasets, {generator.counts['tables']} tables, "
+            f"{generator.counts['fields']} fields in {time.perf_counter() - started:.1f}s"
+        )
+
+    search = MetadataSearch()
+    targets = [target.strip() for target in args.targets.split(",") if target.strip()]
+    http = HttpClient(args.base_url) if any(t.startswith("http-") for t in targets) else None
+    mix = QueryMix(generator, seed=args.seed + 1)
+
+    print(f"{dialect}, backend {args.backend}: {args.queries} queries x {args.repeat}, concurrency {args.concurrency}")
+    print(f"{'target':14} {'p50':>9} {'p95':>9} {'p99':>9} {'max':>9} {'qps':>8} {'rss MB':>8}")
+
+    results = {}
+    for target in targets:
+        operations = operations_for(target, mix, search, http, args.queries, args.limit)
+        # Warm up: backend selection, in-process indexes, connections
+        for operation in operations[:10]:
+            operation()
+
+        stats = results[target] = measure(operations, args.repeat, args.concurrency)
+        print(
+            f"{target:14} {stats['p50_ms']:9.2f} {stats['p95_ms']:9.2f} {stats['p99_ms']:9.2f} "
+            f"{stats['max_ms']:9.2f} {stats['qps']:8.1f} {stats['peak_rss_mb']:8.1f}"
+        )
+
+    settings = {
+        "dialect": dialect,
+        "backend": args.backend,
+        "queries": args.queries,
+        "repeat": args.repeat,
+        "concurrency": args.concurrency,
+        "limit": args.limit,
+        "http": "server" if args.base_url else "in-process",
+    }
+    path = os.path.join(BASELINES_DIR, f"{args.baseline or dialect}.json")
+
+    if args.save_baseline:
+        os.makedirs(BASELINES_DIR, exist_ok=True)
+        with open(path, "w") as f:
+            json.dump({
+                "catalog": spec.as_dict(),
+                "settings": settings,
+                "environment": {"python": platform.python_version(), "machine": platform.machine()},
+                "results": results,
+            }, f, indent=2)
+            f.write("\n")
+        print(f"\nSaved the baseline to {path}")
+        return
+
+    if not os.path.exists(path):
+        return
+
+    with open(path) as f:
+        saved = json.load(f)
+
+    if saved["catalog"] != spec.as_dict() or saved["settings"] != settings:
+        print(f"\nNot compared with {path}, it was run with other settings")
+        return
+
+    regressions = compare(results, saved["results"], args.tolerance)
+    if regressions and args.check:
+        sys.exit("Regressions: " + "; ".join(regressions))
+
+
+if __name__ == "__main__":
+    main()
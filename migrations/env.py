@@ -0,0 +1,57 @@
+"""
+Alembic environment for the BigQuery metadata database.
+"""
+from logging.config import fileConfig
+
+from alembic import context
+from sqlalchemy import create_engine, event, pool
+
+from app.search.tokenize import register_sqlite_functions
+from app.storage.db import DATABASE_URL
+from app.storage.models import Base
+
+config = context.config
+
+if config.config_file_name is not None:
+    fileConfig(config.config_file_name)
+
+target_metadata = Base.metadata
+
+
+def run_migrations_offline() -> None:
+    """Emit the migration SQL without connecting to the database."""
+    context.configure(
+        url=DATABASE_URL,
+        target_metadata=target_metadata,
+        literal_binds=True,
+        dialect_opts={"paramstyle": "named"},
+    )
+
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+def run_migrations_online() -> None:
+    """Run the migrations against the database."""
+    connectable = create_engine(DATABASE_URL, poolclass=pool.NullPool)
+
+    if connectable.dialect.name == "sqlite":
+        # Writes to the catalog tables fire the FTS5 triggers
+        event.listen(connectable, "connect", register_sqlite_functions)
+
+    with connectable.connect() as connection:
+        context.configure(
+            connection=connection,
+            target_metadata=target_metadata,
+            # SQLite cannot alter tables in place
+            render_as_batch=connection.dialect.name == "sqlite",
+        )
+
+        with context.begin_transaction():
+            context.run_migrations()
+
+
+if context.is_offline_mode():
+    run_migrations_offline()
+else:
+    run_migrations_online()
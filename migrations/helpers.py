@@ -0,0 +1,96 @@
+"""
+Shared helpers for the migration scripts.
+"""
+from typing import Sequence
+
+from alembic import context, op
+import sqlalchemy as sa
+
+
+def is_postgres() -> bool:
+    """Whether the migration runs against PostgreSQL."""
+    return op.get_bind().dialect.name == "postgresql"
+
+
+def has_table(table_name: str) -> bool:
+    """Whether a table exists in the database.
+
+    In offline (``--sql``) mode there is no database to inspect, and the
+    generated script assumes an empty database.
+    """
+    if context.is_offline_mode():
+        return False
+    return sa.inspect(op.get_bind()).has_table(table_name)
+
+
+def has_column(table_name: str, column_name: str) -> bool:
+    """Whether a column exists, assuming it does not in offline mode."""
+    if context.is_offline_mode():
+        return False
+    columns = sa.inspect(op.get_bind()).get_columns(table_name)
+    return any(c["name"] == column_name for c in columns)
+
+
+def is_partitioned(table_name: str) -> bool:
+    """Whether a PostgreSQL table is partitioned, assuming not in offline mode."""
+    if context.is_offline_mode() or not is_postgres():
+        return False
+    return op.get_bind().execute(sa.text(
+        """
+        SELECT EXISTS (
+            SELECT 1 FROM pg_partitioned_table p JOIN pg_class c ON c.oid = p.partrelid
+            WHERE c.relname = :table_name AND pg_table_is_visible(c.oid)
+        )
+        """
+    ), {"table_name": table_name}).scalar()
+
+
+def create_index(
+    index_name: str,
+    table_name: str,
+    columns: Sequence[str],
+    unique: bool = False,
+    **kw
+) -> None:
+    """Create an index if it does not exist yet.
+
+    On PostgreSQL the index is built with ``CREATE INDEX CONCURRENTLY`` outside
+    of the migration transaction so that writes to the table are not blocked.
+    If a concurrent build fails it leaves an INVALID index behind, which must be
+    dropped before rerunning the migration. Partitioned tables do not support
+    concurrent builds, so their indexes are built in the migration transaction.
+
+    Args:
+        index_name: Name of the index.
+        table_name: Table to index.
+        columns: Indexed columns or expressions.
+        unique: Whether the index is unique.
+        **kw: Dialect-specific index options.
+    """
+    if is_postgres() and not is_partitioned(table_name):
+        with op.get_context().autocommit_block():
+            op.create_index(
+                index_name, table_name, columns, unique=unique,
+                if_not_exists=True, postgresql_concurrently=True, **kw
+            )
+    else:
+        op.create_index(
+            index_name, table_name, columns, unique=unique, if_not_exists=True, **kw
+        )
+
+
+def drop_index(index_name: str, table_name: str) -> None:
+    """Drop an index if it exists, concurrently on PostgreSQL.
+
+    Args:
+        index_name: Name of the index.
+        table_name: Table the index belongs to.
+    """
+    if is_postgres() and not is_partitioned(table_name):
+        with op.get_context().autocommit_block():
+            op.drop_index(
+                index_name, table_name=table_name,
+                if_exists=True, postgresql_concurrently=True
+            )
+    else:
+        op.drop_index(index_name, table_name=table_name, if_exists=True)
@@ -0,0 +1,88 @@
+"""
+Initial schema, as previously created by ``Base.metadata.create_all``.
+
+Databases created before migrations were introduced already have these tables;
+they are left untouched, so running ``alembic upgrade head`` against them is
+safe.
+
+Revision ID: 0001
+Revises:
+Create Date: 2025-03-20
+"""
+from alembic import op
+import sqlalchemy as sa
+
+from migrations.helpers import has_table
+
+revision = "0001"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def _timestamps() -> list:
+    return [
+        sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+        sa.Column("updated_at", sa.DateTime(timezone=True)),
+    ]
+
+
+def upgrade() -> None:
+    if not has_table("datasets"):
+        op.create_table(
+            "datasets",
+            sa.Column("id", sa.Integer, primary_key=True, autoincrement=True),
+            sa.Column("dataset_name", sa.String(255), nullable=False),
+            sa.Column("full_id", sa.String(255), unique=True, nullable=False),
+            sa.Column("project_id", sa.String(255), nullable=False),
+            sa.Column("friendly_name", sa.String(255)),
+            sa.Column("description", sa.Text),
+            *_timestamps(),
+        )
+        op.create_index("ix_datasets_project", "datasets", ["project_id"])
+        op.create_index("ix_datasets_name", "datasets", ["dataset_name"])
+        op.create_index("ix_datasets_full_id", "datasets", ["full_id"])
+
+    if not has_table("tables"):
+        op.create_table(
+            "tables",
+            sa.Column("id", sa.Integer, primary_key=True, autoincrement=True),
+            sa.Column("table_name", sa.String(255), nullable=False),
+            sa.Column("full_id", sa.String(255), unique=True, nullable=False),
+            sa.Column("dataset_id", sa.String(255), nullable=False),
+            sa.Column("project_id", sa.String(255), nullable=False),
+            sa.Column("friendly_name", sa.String(255)),
+            sa.Column("description", sa.Text),
+            sa.Column("table_type", sa.String(50)),
+            *_timestamps(),
+        )
+        op.create_index("ix_tables_dataset", "tables", ["dataset_id"])
+        op.create_index("ix_tables_project", "tables", ["project_id"])
+        op.create_index("ix_tables_name", "tables", ["table_name"])
+        op.create_index("ix_tables_full_id", "tables", ["full_id"])
+
+    if not has_table("fields"):
+        op.create_table(
+            "fields",
+            sa.Column("id", sa.Integer, primary_key=True, autoincrement=True),
+            sa.Column("full_id", sa.String(255), unique=True, nullable=False),
+            sa.Column("name", sa.String(255), nullable=False),
+            sa.Column("table_id", sa.String(255), nullable=False),
+            sa.Column("dataset_id", sa.String(255), nullable=False),
+            sa.Column("project_id", sa.String(255), nullable=False),
+            sa.Column("field_type", sa.String(50)),
+            sa.Column("description", sa.Text),
+            sa.Column("mode", sa.String(50)),
+            *_timestamps(),
+        )
+        op.create_index("ix_fields_table", "fields", ["table_id"])
+        op.create_index("ix_fields_dataset", "fields", ["dataset_id"])
+        op.create_index("ix_fields_project", "fields", ["project_id"])
+        op.create_index("ix_fields_name", "fields", ["name"])
+        op.create_index("ix_fields_full_id", "fields", ["full_id"])
+
+
+def downgrade() -> None:
+    op.drop_table("fields")
+    op.drop_table("tables")
+    op.drop_table("datasets")
@@ -0,0 +1,70 @@
+"""
+Index audit: drop redundant indexes and add composites matching the queries.
+
+Dropped:
+    ix_*_full_id: duplicates the index behind the unique constraint on full_id.
+    ix_datasets_name: superseded by ix_datasets_name_project.
+    ix_tables_project: superseded by ix_tables_project_dataset.
+    ix_tables_dataset: superseded by ix_tables_dataset_name.
+    ix_fields_project: superseded by ix_fields_project_dataset_table.
+
+Added:
+    ix_datasets_name_project: dataset lookups by name and project
+        (save_dataset, delete_dataset).
+    ix_tables_project_dataset: get_tables, delete_dataset and the project and
+        dataset filters of MetadataSearch.advanced_search.
+    ix_tables_dataset_name: table lookups in get_table_with_fields, save_table
+        and delete_table.
+    ix_fields_project_dataset_table: get_fields, get_table_with_fields,
+        delete_table, delete_dataset and the project and dataset filters of
+        MetadataSearch.
+    ix_fields_project_full_id: keyset pagination of fields within a project.
+
+Indexes are created before the ones they supersede are dropped, and on
+PostgreSQL both happen concurrently, so the migration can run without downtime.
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2025-03-20
+"""
+from migrations.helpers import create_index, drop_index
+
+revision = "0002"
+down_revision = "0001"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    create_index("ix_datasets_name_project", "datasets", ["dataset_name", "project_id"])
+    create_index("ix_tables_project_dataset", "tables", ["project_id", "dataset_id"])
+    create_index("ix_tables_dataset_name", "tables", ["dataset_id", "table_name"])
+    create_index(
+        "ix_fields_project_dataset_table", "fields",
+        ["project_id", "dataset_id", "table_id"]
+    )
+    create_index("ix_fields_project_full_id", "fields", ["project_id", "full_id"])
+
+    drop_index("ix_datasets_full_id", "datasets")
+    drop_index("ix_datasets_name", "datasets")
+    drop_index("ix_tables_full_id", "tables")
+    drop_index("ix_tables_project", "tables")
+    drop_index("ix_tables_dataset", "tables")
+    drop_index("ix_fields_full_id", "fields")
+    drop_index("ix_fields_project", "fields")
+
+
+def downgrade() -> None:
+    create_index("ix_datasets_full_id", "datasets", ["full_id"])
+    create_index("ix_datasets_name", "datasets", ["dataset_name"])
+    create_index("ix_tables_full_id", "tables", ["full_id"])
+    create_index("ix_tables_project", "tables", ["project_id"])
+    create_index("ix_tables_dataset", "tables", ["dataset_id"])
+    create_index("ix_fields_full_id", "fields", ["full_id"])
+    create_index("ix_fields_project", "fields", ["project_id"])
+
+    drop_index("ix_fields_project_full_id", "fields")
+    drop_index("ix_fields_project_dataset_table", "fields")
+    drop_index("ix_tables_dataset_name", "tables")
+    drop_index("ix_tables_project_dataset", "tables")
+    drop_index("ix_datasets_name_project", "datasets")
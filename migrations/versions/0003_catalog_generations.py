@@ -0,0 +1,125 @@
+"""
+Catalog generations.
+
+Adds the ``catalog_generations`` table and a ``generation`` column to
+datasets, tables and fields. Existing rows are assigned to one current
+generation per project. ``full_id`` becomes unique per generation instead of
+globally, since a project's previous generation is kept next to the current one.
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2025-03-24
+"""
+from alembic import op
+import sqlalchemy as sa
+
+from migrations.helpers import create_index, drop_index, has_column, has_table, is_postgres
+
+revision = "0003"
+down_revision = "0002"
+branch_labels = None
+depends_on = None
+
+CATALOG_TABLES = ("datasets", "tables", "fields")
+
+
+def upgrade() -> None:
+    if not has_table("catalog_generations"):
+        op.create_table(
+            "catalog_generations",
+            sa.Column("id", sa.Integer, primary_key=True, autoincrement=True),
+            sa.Column("project_id", sa.String(255), nullable=False),
+            sa.Column("status", sa.String(20), nullable=False),
+            sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+            sa.Column("activated_at", sa.DateTime(timezone=True)),
+        )
+        op.create_index(
+            "ix_catalog_generations_project_status", "catalog_generations",
+            ["project_id", "status"]
+        )
+        op.create_index("ix_catalog_generations_status", "catalog_generations", ["status"])
+        op.create_index(
+            "uq_catalog_generations_current", "catalog_generations", ["project_id"],
+            unique=True,
+            postgresql_where=sa.text("status = 'current'"),
+            sqlite_where=sa.text("status = 'current'"),
+        )
+
+    for table_name in CATALOG_TABLES:
+        if has_column(table_name, "generation"):
+            continue
+
+        generation = sa.Column("generation", sa.Integer, nullable=False, server_default="0")
+
+        if is_postgres():
+            op.add_column(table_name, generation)
+            op.execute(
+                f"ALTER TABLE {table_name} DROP CONSTRAINT IF EXISTS {table_name}_full_id_key"
+            )
+        else:
+            # SQLite recreates the table; the naming convention gives an
+            # unnamed UNIQUE(full_id) constraint a name so it can be dropped
+            unique_name = next(
+                (
+                    u["name"] or f"uq_{table_name}_full_id"
+                    for u in sa.inspect(op.get_bind()).get_unique_constraints(table_name)
+                    if u["column_names"] == ["full_id"]
+                ),
+                None
+            )
+            with op.batch_alter_table(
+                table_name,
+                naming_convention={"uq": "uq_%(table_name)s_%(column_0_name)s"},
+            ) as batch_op:
+                batch_op.add_column(generation)
+                if unique_name:
+                    batch_op.drop_constraint(unique_name, type_="unique")
+
+    # One current generation per existing project
+    op.execute(
+        """
+        INSERT INTO catalog_generations (project_id, status, activated_at)
+        SELECT project_id, 'current', CURRENT_TIMESTAMP FROM (
+            SELECT project_id FROM datasets WHERE generation = 0
+            UNION SELECT project_id FROM tables WHERE generation = 0
+            UNION SELECT project_id FROM fields WHERE generation = 0
+        ) AS projects
+        WHERE project_id NOT IN (
+            SELECT project_id FROM catalog_generations WHERE status = 'current'
+        )
+        """
+    )
+
+    for table_name in CATALOG_TABLES:
+        op.execute(
+            f"""
+            UPDATE {table_name} SET generation = (
+                SELECT g.id FROM catalog_generations g
+                WHERE g.project_id = {table_name}.project_id AND g.status = 'current'
+            )
+            WHERE generation = 0
+            """
+        )
+        create_index(
+            f"uq_{table_name}_full_id_generation", table_name,
+            ["full_id", "generation"], unique=True
+        )
+
+
+def downgrade() -> None:
+    for table_name in CATALOG_TABLES:
+        # Only the current generation survives the downgrade
+        op.execute(
+            f"""
+            DELETE FROM {table_name} WHERE generation NOT IN (
+                SELECT id FROM catalog_generations WHERE status = 'current'
+            )
+            """
+        )
+        drop_index(f"uq_{table_name}_full_id_generation", table_name)
+
+        with op.batch_alter_table(table_name) as batch_op:
+            batch_op.drop_column("generation")
+            batch_op.create_unique_constraint(f"{table_name}_full_id_key", ["full_id"])
+
+    op.drop_table("catalog_generations")
@@ -0,0 +1,75 @@
+"""
+Optional partitioning of tables and fields by project on PostgreSQL.
+
+Partitioning is opt-in and selected with an Alembic ``-x`` argument:
+
+    alembic -x partition=list upgrade head      # one partition per project
+    alembic -x partition=hash:32 upgrade head   # 32 hash partitions
+
+Without the argument, or on SQLite, this migration does nothing. The
+conversion copies both tables, so it should be run in a maintenance window.
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2025-03-27
+"""
+import logging
+
+from alembic import context, op
+
+from app.storage.partitioning import (
+    HASH, LIST, PARTITIONED_TABLES, get_partitioning, partition_table, unpartition_table
+)
+from migrations.helpers import is_postgres
+
+revision = "0004"
+down_revision = "0003"
+branch_labels = None
+depends_on = None
+
+logger = logging.getLogger("alembic.runtime.migration")
+
+
+def _requested_partitioning() -> tuple:
+    """Parse the ``partition`` -x argument into (strategy, modulus)."""
+    value = context.get_x_argument(as_dictionary=True).get("partition")
+
+    if not value:
+        return None, None
+
+    strategy, _, modulus = value.partition(":")
+
+    if strategy not in (LIST, HASH):
+        raise ValueError(f"partition must be '{LIST}' or '{HASH}:<modulus>', got {value!r}")
+
+    return strategy, int(modulus or 16)
+
+
+def upgrade() -> None:
+    strategy, modulus = _requested_partitioning()
+
+    if strategy is None or not is_postgres():
+        logger.info("Skipping partitioning of tables and fields")
+        return
+
+    connection = op.get_bind()
+
+    if get_partitioning(connection) is not None:
+        logger.info("tables and fields are already partitioned")
+        return
+
+    for table_name in PARTITIONED_TABLES:
+        partition_table(connection, table_name, strategy, modulus=modulus)
+
+
+def downgrade() -> None:
+    if not is_postgres():
+        return
+
+    connection = op.get_bind()
+
+    if get_partitioning(connection) is None:
+        return
+
+    for table_name in PARTITIONED_TABLES:
+        unpartition_table(connection, table_name)
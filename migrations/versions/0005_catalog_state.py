@@ -0,0 +1,29 @@
+"""
+Catalog version counter.
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2025-04-01
+"""
+from alembic import op
+import sqlalchemy as sa
+
+from migrations.helpers import has_table
+
+revision = "0005"
+down_revision = "0004"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    if not has_table("catalog_state"):
+        op.create_table(
+            "catalog_state",
+            sa.Column("id", sa.Integer, primary_key=True),
+            sa.Column("version", sa.Integer, nullable=False),
+        )
+
+
+def downgrade() -> None:
+    op.drop_table("catalog_state")
@@ -0,0 +1,70 @@
+"""
+Catalog statistics.
+
+Adds the ``catalog_stats`` table holding the counts of datasets, tables and
+fields per dataset and per project, and fills it from the existing catalog.
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2025-04-08
+"""
+from alembic import op
+import sqlalchemy as sa
+
+from migrations.helpers import has_table
+
+revision = "0006"
+down_revision = "0005"
+branch_labels = None
+depends_on = None
+
+# (source table, dataset column, metric, key expression)
+SOURCES = (
+    ("datasets", "dataset_name", "datasets", None),
+    ("tables", "dataset_id", "tables", None),
+    ("fields", "dataset_id", "fields", None),
+    ("fields", "dataset_id", "field_type", "COALESCE(field_type, 'UNKNOWN')"),
+)
+
+
+def upgrade() -> None:
+    if not has_table("catalog_stats"):
+        op.create_table(
+            "catalog_stats",
+            sa.Column("id", sa.Integer, primary_key=True, autoincrement=True),
+            sa.Column("generation", sa.Integer, nullable=False),
+            sa.Column("project_id", sa.String(255), nullable=False),
+            sa.Column("dataset_id", sa.String(255), nullable=False),
+            sa.Column("metric", sa.String(20), nullable=False),
+            sa.Column("key", sa.String(50), nullable=False),
+            sa.Column("value", sa.BigInteger, nullable=False),
+        )
+        op.create_index(
+            "uq_catalog_stats", "catalog_stats",
+            ["generation", "project_id", "dataset_id", "metric", "key"],
+            unique=True
+        )
+
+    # Recompute everything, the table may have been created empty on startup
+    op.execute("DELETE FROM catalog_stats")
+
+    for table_name, dataset_column, metric, key in SOURCES:
+        for dataset_expr in (dataset_column, "''"):
+            group_by = ["generation", "project_id"]
+            if dataset_expr != "''":
+                group_by.append(dataset_expr)
+            if key:
+                group_by.append(key)
+
+            op.execute(
+                f"""
+                INSERT INTO catalog_stats (generation, project_id, dataset_id, metric, key, value)
+                SELECT generation, project_id, {dataset_expr}, '{metric}', {key or "''"}, COUNT(*)
+                FROM {table_name}
+                GROUP BY {", ".join(group_by)}
+                """
+            )
+
+
+def downgrade() -> None:
+    op.drop_table("catalog_stats")
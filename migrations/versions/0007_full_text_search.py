@@ -0,0 +1,79 @@
+"""
+Full-text search columns (PostgreSQL).
+
+Adds a generated ``search_vector`` column to datasets, tables and fields with a
+GIN index, used by ``app.search.postgres.PostgresFullTextSearch``. Names are
+weighted A, friendly names and full IDs B, descriptions C and field types D.
+Full IDs are split on dots so that each of their parts is a word.
+
+Adding a stored generated column rewrites the table, so on large catalogs run
+this migration in a maintenance window. The indexes are then built
+concurrently. Other databases are left unchanged.
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2025-04-15
+"""
+from alembic import op
+
+from migrations.helpers import create_index, drop_index, is_postgres
+
+revision = "0007"
+down_revision = "0006"
+branch_labels = None
+depends_on = None
+
+
+def _weighted(column: str, weight: str, split_dots: bool = False) -> str:
+    value = f"coalesce({column}, '')"
+    if split_dots:
+        value = f"translate({value}, '.', ' ')"
+    return f"setweight(to_tsvector('simple'::regconfig, {value}), '{weight}')"
+
+
+SEARCH_VECTORS = {
+    "datasets": [
+        _weighted("dataset_name", "A"),
+        _weighted("friendly_name", "B"),
+        _weighted("full_id", "B", split_dots=True),
+        _weighted("description", "C"),
+    ],
+    "tables": [
+        _weighted("table_name", "A"),
+        _weighted("friendly_name", "B"),
+        _weighted("full_id", "B", split_dots=True),
+        _weighted("description", "C"),
+    ],
+    "fields": [
+        _weighted("name", "A"),
+        _weighted("full_id", "B", split_dots=True),
+        _weighted("description", "C"),
+        _weighted("field_type", "D"),
+    ],
+}
+
+
+def upgrade() -> None:
+    if not is_postgres():
+        return
+
+    for table_name, parts in SEARCH_VECTORS.items():
+        op.execute(
+            f"ALTER TABLE {table_name} ADD COLUMN IF NOT EXISTS search_vector tsvector "
+            f"GENERATED ALWAYS AS ({' || '.join(parts)}) STORED"
+        )
+
+    for table_name in SEARCH_VECTORS:
+        create_index(
+            f"ix_{table_name}_search_vector", table_name, ["search_vector"],
+            postgresql_using="gin"
+        )
+
+
+def downgrade() -> None:
+    if not is_postgres():
+        return
+
+    for table_name in SEARCH_VECTORS:
+        drop_index(f"ix_{table_name}_search_vector", table_name)
+        op.execute(f"ALTER TABLE {table_name} DROP COLUMN IF EXISTS search_vector")
@@ -0,0 +1,76 @@
+"""
+Optional trigram indexes for substring search (PostgreSQL).
+
+Creates the ``pg_trgm`` extension and GIN trigram indexes on the names, full
+IDs and descriptions of datasets, tables and fields, used by
+``app.search.trigram.PostgresTrigramSearch``. The indexes are large, so they
+are opt-in and selected with an Alembic ``-x`` argument:
+
+    alembic -x trigram=on upgrade head
+
+Without the argument, or on other databases, this migration does nothing. The
+description indexes previously created by ``scripts/init-db.sql`` are replaced.
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2025-04-22
+"""
+import logging
+
+from alembic import context, op
+
+from migrations.helpers import create_index, drop_index, is_postgres
+
+revision = "0008"
+down_revision = "0007"
+branch_labels = None
+depends_on = None
+
+logger = logging.getLogger("alembic.runtime.migration")
+
+TRIGRAM_COLUMNS = {
+    "datasets": ["dataset_name", "friendly_name", "full_id", "description"],
+    "tables": ["table_name", "friendly_name", "full_id", "description"],
+    "fields": ["name", "full_id", "description", "field_type"],
+}
+
+# Indexes created by earlier versions of scripts/init-db.sql
+LEGACY_INDEXES = {
+    "idx_datasets_description_trgm": "datasets",
+    "idx_tables_description_trgm": "tables",
+    "idx_fields_description_trgm": "fields",
+    "idx_fields_name_trgm": "fields",
+}
+
+
+def _requested() -> bool:
+    """Whether the ``trigram`` -x argument asks for the indexes."""
+    value = context.get_x_argument(as_dictionary=True).get("trigram", "")
+    return value.lower() in ("on", "true", "1", "yes")
+
+
+def upgrade() -> None:
+    if not _requested() or not is_postgres():
+        logger.info("Skipping trigram indexes")
+        return
+
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+
+    for index_name, table_name in LEGACY_INDEXES.items():
+        drop_index(index_name, table_name)
+
+    for table_name, columns in TRIGRAM_COLUMNS.items():
+        for column in columns:
+            create_index(
+                f"ix_{table_name}_{column}_trgm", table_name, [column],
+                postgresql_using="gin", postgresql_ops={column: "gin_trgm_ops"}
+            )
+
+
+def downgrade() -> None:
+    if not is_postgres():
+        return
+
+    for table_name, columns in TRIGRAM_COLUMNS.items():
+        for column in columns:
+            drop_index(f"ix_{table_name}_{column}_trgm", table_name)
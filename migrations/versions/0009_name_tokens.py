@@ -0,0 +1,55 @@
+"""
+Token index of catalog names.
+
+Adds the ``name_tokens`` table holding the normalized words of the name and
+full ID of every dataset, table and field row (``app.storage.tokens``), used
+by ``app.search.name_tokens.NameTokenSearch``, and fills it from the existing
+catalog. New rows get their tokens when they are saved.
+
+In offline (``--sql``) mode the table is created empty; run the upgrade
+online, or ``rebuild_tokens``, to fill it.
+
+Revision ID: 0009
+Revises: 0008
+Create Date: 2025-04-29
+"""
+import logging
+
+from alembic import context, op
+import sqlalchemy as sa
+
+from app.storage.tokens import rebuild_tokens
+from migrations.helpers import has_table
+
+revision = "0009"
+down_revision = "0008"
+branch_labels = None
+depends_on = None
+
+logger = logging.getLogger("alembic.runtime.migration")
+
+
+def upgrade() -> None:
+    if not has_table("name_tokens"):
+        op.create_table(
+            "name_tokens",
+            sa.Column("entity_type", sa.String(10), primary_key=True),
+            sa.Column("entity_id", sa.Integer, primary_key=True),
+            sa.Column("token", sa.String(255), primary_key=True),
+            sa.Column("generation", sa.Integer, nullable=False),
+        )
+        op.create_index(
+            "ix_name_tokens_lookup", "name_tokens", ["entity_type", "token", "entity_id"]
+        )
+        op.create_index("ix_name_tokens_generation", "name_tokens", ["generation"])
+
+    if context.is_offline_mode():
+        logger.warning("name_tokens is not filled in offline mode")
+        return
+
+    # Recompute everything, the table may have been created empty on startup
+    rebuild_tokens(op.get_bind())
+
+
+def downgrade() -> None:
+    op.drop_table("name_tokens")
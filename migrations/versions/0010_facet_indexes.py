@@ -0,0 +1,29 @@
+"""
+Indexes for the facet filters of searches.
+
+Added:
+    ix_tables_type: the table_type facet filter (app.search.facets).
+    ix_fields_type: the field_type facet filter (app.search.facets).
+
+The project and dataset facet filters use the existing composite indexes.
+
+Revision ID: 0010
+Revises: 0009
+Create Date: 2025-05-06
+"""
+from migrations.helpers import create_index, drop_index
+
+revision = "0010"
+down_revision = "0009"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    create_index("ix_tables_type", "tables", ["table_type"])
+    create_index("ix_fields_type", "fields", ["field_type"])
+
+
+def downgrade() -> None:
+    drop_index("ix_fields_type", "fields")
+    drop_index("ix_tables_type", "tables")
@@ -0,0 +1,65 @@
+"""
+Schema signatures of tables.
+
+Adds the ``table_signatures`` table holding the MinHash signature of the
+(column name, type) set of every table row, and ``table_bands`` holding the
+LSH bucket of each band of the signatures (``app.storage.signatures``), used
+by ``app.search.similar.SimilarTables``, and fills them from the existing
+catalog. New tables get their signatures when they are saved.
+
+In offline (``--sql``) mode the tables are created empty; run the upgrade
+online, or ``rebuild_signatures``, to fill them.
+
+Revision ID: 0011
+Revises: 0010
+Create Date: 2025-05-13
+"""
+import logging
+
+from alembic import context, op
+import sqlalchemy as sa
+
+from app.storage.signatures import rebuild_signatures
+from migrations.helpers import has_table
+
+revision = "0011"
+down_revision = "0010"
+branch_labels = None
+depends_on = None
+
+logger = logging.getLogger("alembic.runtime.migration")
+
+
+def upgrade() -> None:
+    if not has_table("table_signatures"):
+        op.create_table(
+            "table_signatures",
+            sa.Column("entity_id", sa.Integer, primary_key=True),
+            sa.Column("generation", sa.Integer, nullable=False),
+            sa.Column("column_count", sa.Integer, nullable=False),
+            sa.Column("signature", sa.LargeBinary, nullable=False),
+        )
+        op.create_index("ix_table_signatures_generation", "table_signatures", ["generation"])
+
+    if not has_table("table_bands"):
+        op.create_table(
+            "table_bands",
+            sa.Column("band", sa.SmallInteger, primary_key=True),
+            sa.Column("bucket", sa.BigInteger, primary_key=True),
+            sa.Column("entity_id", sa.Integer, primary_key=True),
+            sa.Column("generation", sa.Integer, nullable=False),
+        )
+        op.create_index("ix_table_bands_entity", "table_bands", ["entity_id"])
+        op.create_index("ix_table_bands_generation", "table_bands", ["generation"])
+
+    if context.is_offline_mode():
+        logger.warning("table_signatures and table_bands are not filled in offline mode")
+        return
+
+    # Recompute everything, the tables may have been created empty on startup
+    rebuild_signatures(op.get_bind())
+
+
+def downgrade() -> None:
+    op.drop_table("table_bands")
+    op.drop_table("table_signatures")
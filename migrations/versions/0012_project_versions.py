@@ -0,0 +1,33 @@
+"""
+Catalog version of each project.
+
+Adds the ``project_versions`` table, incremented with the catalog version by
+the writes that change a project, so the name completions recount only the
+projects that changed.
+
+Revision ID: 0012
+Revises: 0011
+Create Date: 2025-05-20
+"""
+from alembic import op
+import sqlalchemy as sa
+
+from migrations.helpers import has_table
+
+revision = "0012"
+down_revision = "0011"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    if not has_table("project_versions"):
+        op.create_table(
+            "project_versions",
+            sa.Column("project_id", sa.String(255), primary_key=True),
+            sa.Column("version", sa.Integer, nullable=False),
+        )
+
+
+def downgrade() -> None:
+    op.drop_table("project_versions")
@@ -0,0 +1,35 @@
+"""
+Stale schema signatures.
+
+Adds the ``stale_signatures`` table marking the table rows whose signatures
+are out of date: saving a field marks its table instead of recomputing the
+signature, and the marked tables are signed before the next similar-tables
+lookup (``app.storage.signatures``).
+
+Revision ID: 0013
+Revises: 0012
+Create Date: 2025-05-27
+"""
+from alembic import op
+import sqlalchemy as sa
+
+from migrations.helpers import has_table
+
+revision = "0013"
+down_revision = "0012"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    if not has_table("stale_signatures"):
+        op.create_table(
+            "stale_signatures",
+            sa.Column("entity_id", sa.Integer, primary_key=True),
+            sa.Column("generation", sa.Integer, nullable=False),
+        )
+        op.create_index("ix_stale_signatures_generation", "stale_signatures", ["generation"])
+
+
+def downgrade() -> None:
+    op.drop_table("stale_signatures")
@@ -35,7 +35,11 @@ def get_missing_tables(db: Database) -> List[Tuple[str, str, str]]:
             FROM fields f
             LEFT JOIN tables t ON 
                 (f.project_id || '.' || f.dataset_id || '.' || f.table_id) = t.full_id
+                AND t.generation = f.generation
             WHERE t.full_id IS NULL
+                AND f.generation IN (
+                    SELECT id FROM catalog_generations WHERE status = 'current'
+                )
         """)
         
         result = session.execute(query)
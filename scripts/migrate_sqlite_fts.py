@@ -0,0 +1,51 @@
+#!/usr/bin/env python
+"""
+Script to add the FTS5 search tables to an existing SQLite database.
+
+Creates the external-content FTS tables and the triggers keeping them in sync,
+then indexes the current catalog. Rerunning it rebuilds the indexes; --drop
+removes them again, after which searches fall back to LIKE queries.
+"""
+import argparse
+import sys
+import os
+import logging
+import time
+
+# Add the project root to sys.path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from app.storage.db import Database, DATABASE_URL
+from app.storage.fts import install_fts, uninstall_fts
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+)
+logger = logging.getLogger(__name__)
+
+def main():
+    """Main function to migrate the database."""
+    parser = argparse.ArgumentParser(description="Create the SQLite full-text search tables")
+    parser.add_argument("--drop", action="store_true", help="Drop the search tables and triggers instead")
+    args = parser.parse_args()
+    
+    db = Database()
+    
+    if db.engine.dialect.name != "sqlite":
+        logger.error(f"Full-text search tables are only used with SQLite, not {DATABASE_URL}")
+        sys.exit(1)
+    
+    db.ensure_schema()
+    start = time.perf_counter()
+    
+    with db.engine.begin() as connection:
+        if args.drop:
+            uninstall_fts(connection)
+            logger.info("Dropped the full-text search tables")
+        else:
+            install_fts(connection)
+            logger.info(f"Created the full-text search tables in {time.perf_counter() - start:.1f}s")
+
+if __name__ == "__main__":
+    main()
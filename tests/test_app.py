@@ -0,0 +1,72 @@
+"""
+Tests for the application factory and its services.
+"""
+import unittest
+from unittest.mock import patch
+import asyncio
+import os
+import sys
+
+# Add the project root to sys.path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from app.api.api import _accepts_gzip
+from app.dependencies import Services
+from app.main import create_app
+
+
+class TestServices(unittest.TestCase):
+    """Tests for the lazily created services."""
+
+    @patch("app.dependencies.Database")
+    def test_create_app_does_not_connect(self, mock_db_class):
+        """Test that creating the app does not create the database."""
+        app = create_app()
+
+        self.assertIsInstance(app.state.services, Services)
+        mock_db_class.assert_not_called()
+
+    @patch("app.dependencies.Database")
+    def test_lifespan_warms_up_storage(self, mock_db_class):
+        """Test that startup creates the schema in the background."""
+        services = Services()
+        app = create_app(services)
+
+        async def run_lifespan():
+            async with app.router.lifespan_context(app):
+                pass
+
+        # Warm up in the foreground so the test does not race the thread
+        with patch.object(services, "start_warm_up", side_effect=services.warm_up) as start:
+            asyncio.run(run_lifespan())
+
+        start.assert_called_once()
+        mock_db_class.return_value.ensure_schema.assert_called_once()
+
+    @patch("app.dependencies.Database")
+    def test_warm_up_failure(self, mock_db_class):
+        """Test that a failed startup is reported instead of raised."""
+        mock_db_class.return_value.ensure_schema.side_effect = RuntimeError("connection refused")
+        services = Services()
+
+        services.warm_up()
+
+        self.assertEqual(services.startup_error, "connection refused")
+
+
+class TestExport(unittest.TestCase):
+    """Tests for the export endpoint helpers."""
+
+    def test_accepts_gzip(self):
+        """Test that gzip is used only when the client gives it a non-zero weight."""
+        self.assertTrue(_accepts_gzip("gzip, deflate"))
+        self.assertTrue(_accepts_gzip("br;q=1.0, GZIP;q=0.5"))
+        self.assertTrue(_accepts_gzip("*"))
+        self.assertFalse(_accepts_gzip("gzip;q=0"))
+        self.assertFalse(_accepts_gzip("*;q=0.5, gzip;q=0"))
+        self.assertFalse(_accepts_gzip("identity"))
+        self.assertFalse(_accepts_gzip(None))
+
+
+if __name__ == "__main__":
+    unittest.main()
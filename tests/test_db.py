@@ -0,0 +1,734 @@
+"""
+Tests for the database operations.
+"""
+import unittest
+from unittest.mock import patch
+import os
+import sys
+import tempfile
+import time
+
+# Add the project root to sys.path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from sqlalchemy import text
+from sqlalchemy.exc import IntegrityError, OperationalError
+
+from app.search import memory, query_language, semantic
+from app.search.memory import InMemorySearch
+from app.search.query_language import parse_query
+from app.search.search import MetadataSearch
+from app.search.sqlite_fts import SqliteFullTextSearch
+from app.storage.db import Database
+from app.storage.deadlines import statement_deadline
+from app.storage.fts import install_fts
+from app.storage.models import Dataset, Table, Field, FieldModel, NameTokenModel, StaleSignatureModel
+from app.utils.pagination import next_cursor
+
+
+class TestDatabase(unittest.TestCase):
+    """Tests for the Database class against a temporary SQLite database."""
+
+    def setUp(self):
+        """Create a fresh database with a small catalog."""
+        self.tmpdir = tempfile.TemporaryDirectory()
+        url = f"sqlite:///{os.path.join(self.tmpdir.name, 'test.db')}"
+
+        self.url_patch = patch("app.storage.db.DATABASE_URL", url)
+        self.url_patch.start()
+        Database._instance = None
+        self.db = Database()
+
+        self.db.save_dataset(Dataset(id="sales", full_id="p1.sales", project_id="p1"))
+        for table_name in ("orders", "customers"):
+            self.db.save_table(Table(
+                id=table_name,
+                full_id=f"p1.sales.{table_name}",
+                dataset_id="sales",
+                project_id="p1",
+                table_type="TABLE"
+            ))
+            for i in range(5):
+                self.db.save_field(Field(
+                    name=f"col_{i}",
+                    full_id=f"p1.sales.{table_name}.col_{i}",
+                    table_id=table_name,
+                    dataset_id="sales",
+                    project_id="p1",
+                    field_type="STRING"
+                ))
+
+    def tearDown(self):
+        """Dispose of the database."""
+        self.db.engine.dispose()
+        Database._instance = None
+        self.url_patch.stop()
+        self.tmpdir.cleanup()
+
+    def test_get_fields_keyset_pagination(self):
+        """Test paging through fields with a cursor."""
+        seen = []
+        cursor = None
+
+        while True:
+            page = self.db.get_fields(project_id="p1", limit=3, cursor=cursor)
+            seen.extend(f["full_id"] for f in page)
+            cursor = next_cursor(page, 3)
+            if cursor is None:
+                break
+
+        self.assertEqual(len(seen), 10)
+        self.assertEqual(seen, sorted(seen))
+        self.assertEqual(len(set(seen)), 10)
+
+    def test_get_tables_pagination_last_page(self):
+        """Test that the last page does not produce a cursor."""
+        page = self.db.get_tables(project_id="p1", limit=5)
+
+        self.assertEqual(len(page), 2)
+        self.assertIsNone(next_cursor(page, 5))
+
+    def test_invalid_cursor(self):
+        """Test that a malformed cursor is rejected."""
+        with self.assertRaises(ValueError):
+            self.db.get_datasets(limit=10, cursor="!!not-base64!!")
+        for cursor in ("!!!", "", "cDEu=x"):
+            with self.assertRaises(ValueError):
+                self.db.get_datasets(limit=10, cursor=cursor)
+
+    def test_iter_export(self):
+        """Test streaming the catalog filtered by dataset."""
+        records = list(self.db.iter_export(project_id="p1", dataset_id="sales"))
+        types = [r["type"] for r in records]
+
+        self.assertEqual(types.count("dataset"), 1)
+        self.assertEqual(types.count("table"), 2)
+        self.assertEqual(types.count("field"), 10)
+        self.assertEqual(records[0]["id"], "sales")
+        self.assertEqual(types, sorted(types, key=["dataset", "table", "field"].index))
+
+    def test_iter_export_entity_subset(self):
+        """Test exporting only fields."""
+        records = list(self.db.iter_export(entity_types=["field"]))
+
+        self.assertEqual({r["type"] for r in records}, {"field"})
+        self.assertEqual(records[0]["full_id"], "p1.sales.customers.col_0")
+
+    def _load_generation(self, table_names):
+        """Bulk load a generation of project p1 with the given tables."""
+        generation_id = self.db.begin_generation("p1")
+        self.db.bulk_load(
+            generation_id,
+            datasets=[Dataset(id="sales", full_id="p1.sales", project_id="p1")],
+            tables=[
+                Table(id=name, full_id=f"p1.sales.{name}", dataset_id="sales", project_id="p1")
+                for name in table_names
+            ],
+            fields=[
+                Field(
+                    name="id",
+                    full_id=f"p1.sales.{name}.id",
+                    table_id=name,
+                    dataset_id="sales",
+                    project_id="p1"
+                )
+                for name in table_names
+            ]
+        )
+        return generation_id
+
+    def test_generation_invisible_until_activated(self):
+        """Test that a loading generation does not affect readers."""
+        generation_id = self._load_generation(["invoices"])
+
+        self.assertEqual(len(self.db.get_tables(project_id="p1")), 2)
+        self.assertEqual(len(self.db.get_fields(project_id="p1")), 10)
+
+        self.db.activate_generation(generation_id)
+
+        tables = self.db.get_tables(project_id="p1")
+        self.assertEqual([t["id"] for t in tables], ["invoices"])
+        self.assertEqual(len(self.db.get_fields(project_id="p1")), 1)
+        self.assertEqual(self.db.get_projects(), ["p1"])
+
+    def test_rollback_generation(self):
+        """Test switching back to the previous generation."""
+        self.db.activate_generation(self._load_generation(["invoices"]))
+
+        self.assertIsNotNone(self.db.rollback_generation("p1"))
+
+        tables = self.db.get_tables(project_id="p1")
+        self.assertEqual(sorted(t["id"] for t in tables), ["customers", "orders"])
+        self.assertIsNone(self.db.rollback_generation("p1"))
+
+    def test_gc_generations(self):
+        """Test that only the configured number of generations is kept."""
+        for name in ("a", "b", "c"):
+            self.db.activate_generation(self._load_generation([name]), keep=2)
+
+        statuses = [g["status"] for g in self.db.list_generations("p1")]
+        self.assertEqual(statuses, ["current", "retired"])
+
+    def test_abort_generation(self):
+        """Test that an aborted load leaves no rows behind."""
+        generation_id = self._load_generation(["invoices"])
+        self.db.abort_generation(generation_id)
+
+        self.assertEqual(len(self.db.list_generations("p1")), 1)
+        with self.db.get_session() as session:
+            count = session.query(FieldModel).filter_by(generation=generation_id).count()
+        self.assertEqual(count, 0)
+
+    def test_delete_project(self):
+        """Test deleting a project with all its generations."""
+        self._load_generation(["invoices"])
+
+        self.assertTrue(self.db.delete_project("p1"))
+
+        self.assertEqual(self.db.get_projects(), [])
+        self.assertEqual(self.db.list_generations("p1"), [])
+        with self.db.get_session() as session:
+            self.assertEqual(session.query(FieldModel).count(), 0)
+        self.assertFalse(self.db.delete_project("p1"))
+
+    def test_stats_maintained_by_writes(self):
+        """Test that the statistics follow saves and deletes."""
+        stats = self.db.get_stats(project_id="p1")
+        self.assertEqual(
+            (stats["datasets"], stats["tables"], stats["fields"]), (1, 2, 10)
+        )
+        self.assertEqual(stats["field_types"], {"STRING": 10})
+
+        self.db.save_field(Field(
+            name="col_0",
+            full_id="p1.sales.orders.col_0",
+            table_id="orders",
+            dataset_id="sales",
+            project_id="p1",
+            field_type="INTEGER"
+        ))
+        self.assertTrue(self.db.delete_table("sales", "customers", "p1"))
+
+        stats = self.db.get_stats(project_id="p1", dataset_id="sales")
+        self.assertEqual((stats["tables"], stats["fields"]), (1, 5))
+        self.assertEqual(stats["field_types"], {"STRING": 4, "INTEGER": 1})
+
+        self.assertTrue(self.db.delete_dataset("sales", "p1"))
+        stats = self.db.get_stats()
+        self.assertEqual((stats["datasets"], stats["tables"], stats["fields"]), (0, 0, 0))
+        self.assertEqual(stats["projects"], [])
+
+    def test_stats_follow_generations(self):
+        """Test that the statistics of the current generation are returned."""
+        generation_id = self._load_generation(["invoices", "payments"])
+        self.assertEqual(self.db.get_stats(project_id="p1")["tables"], 2)
+
+        self.db.activate_generation(generation_id)
+        stats = self.db.get_stats()
+
+        self.assertEqual((stats["tables"], stats["fields"]), (2, 2))
+        self.assertEqual(stats["field_types"], {"UNKNOWN": 2})
+        self.assertEqual([p["project_id"] for p in stats["projects"]], ["p1"])
+
+        # An empty type is unknown, when saved and when recounted
+        self.db.save_field(Field(
+            name="note", full_id="p1.sales.invoices.note", table_id="invoices",
+            dataset_id="sales", project_id="p1", field_type=""
+        ))
+        self.assertEqual(self.db.get_stats()["field_types"], {"UNKNOWN": 3})
+        before = self.db.get_stats()
+        self.db.rebuild_stats()
+        self.assertEqual(self.db.get_stats(), before)
+
+    def test_snapshot_matches_database(self):
+        """Test that the snapshot serves the same results as the database."""
+        snapshot = self.db.load_snapshot()
+
+        self.assertEqual(snapshot.get_projects(), self.db.get_projects())
+        self.assertEqual(snapshot.get_datasets("p1"), self.db.get_datasets(project_id="p1"))
+        self.assertEqual(
+            sorted(snapshot.get_tables(dataset_id="sales"), key=lambda t: t["full_id"]),
+            sorted(self.db.get_tables(dataset_id="sales"), key=lambda t: t["full_id"])
+        )
+        self.assertEqual(
+            snapshot.get_table_with_fields("sales", "orders"),
+            self.db.get_table_with_fields("sales", "orders")
+        )
+        self.assertIsNone(snapshot.get_table_with_fields("sales", "missing"))
+        self.assertEqual(snapshot.get_tables(project_id="p2"), [])
+
+    def test_snapshot_reloads_on_catalog_change(self):
+        """Test that reads switch to a new snapshot after a load."""
+        with patch("app.storage.db.CATALOG_SNAPSHOT", True):
+            self.assertEqual(len(self.db.get_tables(project_id="p1")), 2)
+            version = self.db.snapshot().version
+
+            self.db.activate_generation(self._load_generation(["invoices"]))
+
+            tables = self.db.get_tables(project_id="p1")
+            self.assertEqual([t["id"] for t in tables], ["invoices"])
+            self.assertGreater(self.db.snapshot().version, version)
+            self.assertEqual(
+                self.db.get_table_with_fields("sales", "invoices")["fields"][0]["full_id"],
+                "p1.sales.invoices.id"
+            )
+
+    def test_sqlite_full_text_search(self):
+        """Test that the FTS5 tables index existing rows and follow writes."""
+        with self.db.engine.begin() as connection:
+            install_fts(connection)
+
+        search = SqliteFullTextSearch(self.db)
+        self.assertTrue(search.available())
+
+        self.db.save_field(Field(
+            name="customerId",
+            full_id="p1.sales.orders.customerId",
+            table_id="orders",
+            dataset_id="sales",
+            project_id="p1",
+            field_type="STRING",
+            description="Customer of the order"
+        ))
+
+        fields = search.search("customer id")["fields"]
+        self.assertEqual([f["name"] for f in fields], ["customerId"])
+
+        result = search.search("orders col", entity_type="field")
+        self.assertEqual(len(result["fields"]), 5)
+        self.assertEqual(result["tables"], [])
+
+        self.assertEqual(len(search.search("customers")["tables"]), 1)
+        self.assertTrue(self.db.delete_table("sales", "customers", "p1"))
+        self.assertEqual(search.search("customers")["tables"], [])
+        self.assertEqual(search.search("AND OR \"")["fields"], [])
+
+        # Bulk loads index their rows without the insert triggers, and restore them
+        generation_id = self.db.begin_generation("p2")
+        self.db.bulk_load(
+            generation_id,
+            datasets=[Dataset(id="events", full_id="p2.events", project_id="p2")],
+            fields=[Field(
+                name="sessionKey", full_id="p2.events.clicks.sessionKey", table_id="clicks",
+                dataset_id="events", project_id="p2", field_type="STRING"
+            )]
+        )
+        self.db.activate_generation(generation_id)
+        fields = search.search("session key")["fields"]
+        self.assertEqual([f["name"] for f in fields], ["sessionKey"])
+        self.assertGreater(fields[0]["score"], 0)
+        self.db.save_field(Field(
+            name="clickTime", full_id="p2.events.clicks.clickTime", table_id="clicks",
+            dataset_id="events", project_id="p2", field_type="TIMESTAMP"
+        ))
+        self.assertEqual([f["name"] for f in search.search("click time")["fields"]], ["clickTime"])
+
+        # A failed bulk load rolls back the dropped triggers with its rows
+        generation_id = self.db.begin_generation("p3")
+        with self.assertRaises(IntegrityError):
+            self.db.bulk_load(generation_id, datasets=[
+                Dataset(id="logs", full_id="p3.logs", project_id="p3"),
+                Dataset(id="logs", full_id="p3.logs", project_id="p3"),
+            ])
+        with self.db.engine.connect() as connection:
+            triggers = connection.execute(text(
+                "SELECT name FROM sqlite_master WHERE type = 'trigger' AND name LIKE '%fts_ai'"
+            )).scalars().all()
+        self.assertEqual(len(triggers), 3)
+        self.db.save_field(Field(
+            name="zebraCount", full_id="p2.events.clicks.zebraCount", table_id="clicks",
+            dataset_id="events", project_id="p2", field_type="INTEGER"
+        ))
+        self.assertEqual([f["name"] for f in search.search("zebra")["fields"]], ["zebraCount"])
+
+    def _searches(self):
+        """The search engine, and the in-memory backend if numpy is installed."""
+        searches = [MetadataSearch()]
+        if memory.np is not None:
+            searches.append(InMemorySearch(self.db))
+        return searches
+
+    @unittest.skipUnless(memory.np is not None, "numpy is not installed")
+    def test_in_memory_search(self):
+        """Test that the inverted index ranks matches and follows catalog changes."""
+        self.db.save_field(Field(
+            name="customerId",
+            full_id="p1.sales.orders.customerId",
+            table_id="orders",
+            dataset_id="sales",
+            project_id="p1",
+            description="Customer of the order"
+        ))
+        search = InMemorySearch(self.db)
+
+        # Name matches rank above the fields of the customers table
+        fields = search.search("customer")["fields"]
+        self.assertEqual(len(fields), 6)
+        self.assertEqual(fields[0]["name"], "customerId")
+        self.assertEqual(fields[0]["table_id"], "orders")
+
+        result = search.search("orders col_3")
+        self.assertEqual([f["full_id"] for f in result["fields"]], ["p1.sales.orders.col_3"])
+        self.assertEqual(result["tables"], [])
+
+        tables = search.search("cust", entity_type="table")["tables"]
+        self.assertEqual([t["id"] for t in tables], ["customers"])
+        self.assertEqual(search.search("customerid", project_id="p2")["fields"], [])
+        result = search.search("customer", project_id="p1", limit=2, offset=1)
+        self.assertEqual([f["full_id"] for f in result["fields"]], [f["full_id"] for f in fields[1:3]])
+        self.assertEqual(result["meta"]["totals"]["fields"], {"value": 6, "relation": "eq"})
+
+        # Without numpy, searches use the database
+        with patch.object(memory, "np", None), patch("app.search.search.SEARCH_BACKEND", "memory"):
+            self.assertNotIsInstance(MetadataSearch().backend, InMemorySearch)
+
+        self.db.activate_generation(self._load_generation(["invoices"]))
+        self.assertEqual(search.build().version, self.db.catalog_version())
+        self.assertEqual(search.search("customer")["fields"], [])
+        self.assertEqual(len(search.search("invoices id")["fields"]), 1)
+
+    def test_search_limits(self):
+        """Test that paged searches rank, score and count their matches."""
+        self.db.save_field(Field(
+            name="col",
+            full_id="p1.sales.orders.col",
+            table_id="orders",
+            dataset_id="sales",
+            project_id="p1"
+        ))
+
+        for search in self._searches():
+            first = search.search("col", limit=4)
+            second = search.search("col", limit=4, offset=4)
+
+            self.assertEqual(first["fields"][0]["full_id"], "p1.sales.orders.col")
+            self.assertGreater(first["fields"][0]["score"], first["fields"][1]["score"])
+            self.assertEqual(len(second["fields"]), 4)
+            self.assertFalse(
+                {f["full_id"] for f in first["fields"]} & {f["full_id"] for f in second["fields"]}
+            )
+            self.assertEqual(first["meta"]["totals"]["fields"], {"value": 11, "relation": "eq"})
+            self.assertEqual(first["meta"]["totals"]["tables"], {"value": 0, "relation": "eq"})
+
+        with patch("app.search.results.TOTAL_COUNT_CAP", 5):
+            result = MetadataSearch().search("col", limit=4, offset=4)
+        self.assertEqual(result["meta"]["totals"]["fields"], {"value": 5, "relation": "gte"})
+
+    def test_fuzzy_search(self):
+        """Test that queries matching nothing are corrected to catalog names."""
+        self.db.save_field(Field(
+            name="customer_id",
+            full_id="p1.sales.orders.customer_id",
+            table_id="orders",
+            dataset_id="sales",
+            project_id="p1"
+        ))
+        search = MetadataSearch()
+
+        # No corrections until the index is built in the background
+        self.assertNotIn("corrected_query", search.fuzzy_search("custmer_id", limit=10))
+        search.fuzzy.build()
+
+        result = search.fuzzy_search("custmer_id", limit=10)
+        self.assertEqual(result["corrected_query"], "customer_id")
+        self.assertEqual(result["suggestions"][0], {"text": "customer_id", "distance": 1, "count": 1})
+        self.assertEqual([f["full_id"] for f in result["fields"]], ["p1.sales.orders.customer_id"])
+
+        result = search.fuzzy_search("cusotmers", limit=10)
+        self.assertEqual(result["corrected_query"], "customers")
+        self.assertEqual([t["id"] for t in result["tables"]], ["customers"])
+
+        result = search.fuzzy_search("col_1", limit=10)
+        self.assertNotIn("suggestions", result)
+
+    def test_search_facets(self):
+        """Test facet counts and facet filters of searches."""
+        self.db.save_field(Field(
+            name="col_total",
+            full_id="p1.sales.orders.col_total",
+            table_id="orders",
+            dataset_id="sales",
+            project_id="p1",
+            field_type="INT64"
+        ))
+        self.db.save_table(Table(
+            id="orders_view",
+            full_id="p1.sales.orders_view",
+            dataset_id="sales",
+            project_id="p1",
+            table_type="VIEW"
+        ))
+
+        for search in self._searches():
+            result = search.search("col", limit=2, facets=True)
+            self.assertEqual(
+                result["facets"]["fields"]["field_type"],
+                [{"value": "STRING", "count": 10}, {"value": "INT64", "count": 1}]
+            )
+            self.assertEqual(result["facets"]["fields"]["dataset"], [{"value": "sales", "count": 11}])
+            self.assertEqual(
+                search.search("orders", limit=1, facets=True)["facets"]["tables"]["table_type"],
+                [{"value": "TABLE", "count": 1}, {"value": "VIEW", "count": 1}]
+            )
+            self.assertEqual(
+                search.search("sales", limit=5, facets=True)["facets"]["datasets"],
+                {"project": [{"value": "p1", "count": 1}], "dataset": [{"value": "sales", "count": 1}]}
+            )
+
+            result = search.search("col", limit=5, filters={"field_type": "INT64"})
+            self.assertEqual([f["name"] for f in result["fields"]], ["col_total"])
+            self.assertEqual(result["tables"], [])
+            self.assertNotIn("facets", result)
+
+            result = search.search("orders", limit=5, project_id="p1", filters={"project": "p2"})
+            self.assertEqual(result["meta"]["totals"]["tables"], {"value": 0, "relation": "eq"})
+
+    @unittest.skipUnless(semantic.np is not None, "numpy is not installed")
+    def test_semantic_search(self):
+        """Test that descriptions are matched by similar words."""
+        for name, description in (
+            ("cust_no", "Number of the customer account"),
+            ("order_total", "Total amount of the order, in cents"),
+        ):
+            self.db.save_field(Field(
+                name=name,
+                full_id=f"p1.sales.orders.{name}",
+                table_id="orders",
+                dataset_id="sales",
+                project_id="p1",
+                description=description
+            ))
+        search = MetadataSearch()
+        search.semantic.build()
+
+        result = search.semantic_search("customers account numbers", entity_type="field", limit=10)
+        self.assertEqual(result["fields"][0]["full_id"], "p1.sales.orders.cust_no")
+        self.assertEqual(result["meta"]["totals"]["fields"], {"value": 1, "relation": "eq"})
+
+        result = search.semantic_search("amount of orders", limit=10)
+        self.assertEqual(result["fields"][0]["name"], "order_total")
+        self.assertEqual(result["tables"][0]["id"], "orders")
+        self.assertGreater(result["fields"][0]["score"], 0.3)
+        self.assertEqual(search.semantic_search("amount of orders", project_id="p2")["fields"], [])
+
+        # Names sharing no word part with the query are not similar
+        self.db.save_field(Field(
+            name="impression_date",
+            full_id="p1.sales.orders.impression_date",
+            table_id="orders",
+            dataset_id="sales",
+            project_id="p1"
+        ))
+        search.semantic.build()
+        names = [field["name"] for field in search.semantic_search("client", entity_type="field")["fields"]]
+        self.assertNotIn("impression_date", names)
+
+        # Rows deleted since the build are left out of the page
+        index = search.semantic.index()
+        self.db.delete_table("sales", "orders", project_id="p1")
+        self.assertEqual(index.search("amount of orders")["fields"], [])
+
+    def test_suggest(self):
+        """Test name completions and their per-project rebuild."""
+        search = MetadataSearch()
+
+        self.assertEqual(
+            search.suggest("COL", limit=2),
+            [{"text": "col_0", "count": 2}, {"text": "col_1", "count": 2}]
+        )
+        self.assertEqual(search.suggest("cu"), [{"text": "customers", "count": 1}])
+        self.assertEqual(search.suggest("x"), [])
+
+        p1_counts = search.suggester._projects["p1"][1]
+        self.db.save_dataset(Dataset(id="customer_events", full_id="p2.customer_events", project_id="p2"))
+        search.suggester.build()
+
+        self.assertEqual([s["text"] for s in search.suggest("cu")], ["customer_events", "customers"])
+        self.assertIs(search.suggester._projects["p1"][1], p1_counts)
+
+        # A rename keeps the totals of the project, and is still recounted
+        self.db.save_field(Field(
+            name="customer_ref",
+            full_id="p1.sales.orders.col_0",
+            table_id="orders",
+            dataset_id="sales",
+            project_id="p1"
+        ))
+        search.suggester.build()
+        self.assertEqual(
+            search.suggest("customer_"),
+            [{"text": "customer_events", "count": 1}, {"text": "customer_ref", "count": 1}]
+        )
+        self.assertEqual(search.suggest("col_0"), [{"text": "col_0", "count": 1}])
+
+    def test_name_token_search(self):
+        """Test that saved names are tokenized and searched by token."""
+        self.db.save_field(Field(
+            name="customerId",
+            full_id="p1.sales.orders.customerId",
+            table_id="orders",
+            dataset_id="sales",
+            project_id="p1"
+        ))
+
+        with patch("app.search.search.SEARCH_BACKEND", "tokens"):
+            search = MetadataSearch()
+            for query in ("customer id", "CUSTOMER_ID", "customerid", "orders cust"):
+                result = search.search(query, entity_type="field", limit=10)
+                self.assertEqual(
+                    [f["full_id"] for f in result["fields"]], ["p1.sales.orders.customerId"], query
+                )
+            self.assertEqual(search.search("col", limit=20)["meta"]["totals"]["fields"]["value"], 10)
+
+        self.db.delete_table("sales", "orders", "p1")
+        with self.db.get_session() as session:
+            tokens = session.query(NameTokenModel.entity_type, NameTokenModel.entity_id).distinct().all()
+        self.assertEqual(sorted(entity_type for entity_type, _ in tokens), ["dataset"] + ["field"] * 5 + ["table"])
+
+    def test_batch_search(self):
+        """Test that batch queries are answered together, keyed by query, within the budget."""
+        search = MetadataSearch()
+        batch = search.batch_search(
+            [("col 2", 10), ("COL", 3), ("orders", 10), ("col 2", 5), ("missing", 10)],
+            entity_type="field"
+        )
+
+        results = batch["results"]
+        self.assertEqual(list(results), ["col 2", "COL", "orders", "missing"])
+        self.assertEqual(
+            [f["full_id"] for f in results["col 2"]["fields"]],
+            ["p1.sales.customers.col_2", "p1.sales.orders.col_2"]
+        )
+        self.assertEqual(len(results["COL"]["fields"]), 3)
+        self.assertEqual(results["COL"]["meta"]["totals"]["fields"], {"value": 10, "relation": "eq"})
+        self.assertEqual(len(results["orders"]["fields"]), 5)
+        self.assertEqual(results["missing"]["fields"], [])
+        self.assertEqual(batch["meta"], {"returned": 10, "truncated": []})
+
+        batch = search.batch_search([("col 2", 10), ("orders", 10)], max_results=4)
+        self.assertEqual(len(batch["results"]["col 2"]["fields"]), 2)
+        self.assertEqual(batch["results"]["orders"]["tables"][0]["full_id"], "p1.sales.orders")
+        self.assertEqual(len(batch["results"]["orders"]["fields"]), 1)
+        self.assertEqual(batch["meta"], {"returned": 4, "truncated": ["orders"]})
+
+    def test_structured_search(self):
+        """Test that structured queries look up indexes first and explain their plan."""
+        self.db.save_field(Field(
+            name="customer_id",
+            full_id="p1.sales.orders.customer_id",
+            table_id="orders",
+            dataset_id="sales",
+            project_id="p1",
+            field_type="INTEGER",
+            description="Deprecated, use customer_key"
+        ))
+        search = MetadataSearch()
+
+        result = search.advanced_search({}, query="name:col* type:string table:orders -col_4", limit=10)
+        self.assertEqual(
+            [f["full_id"] for f in result["fields"]],
+            [f"p1.sales.orders.col_{i}" for i in range(4)]
+        )
+        self.assertEqual(result["tables"], [])
+
+        result = search.advanced_search({"name": "cust"}, query="-deprecated", limit=10)
+        self.assertEqual([t["full_id"] for t in result["tables"]], ["p1.sales.customers"])
+        self.assertEqual(result["fields"], [])
+
+        result = search.advanced_search({}, query="name:col_1 type:STRING", limit=10, explain=True)
+        plan = result["plan"]["fields"]
+        self.assertEqual(len(result["fields"]), 2)
+        self.assertEqual(
+            [(step["term"], step["access"], step["indexes"], step["rows"]) for step in plan["steps"]],
+            [
+                ("name:col_1", "index", ["ix_fields_name"], 2),
+                ("type:STRING", "index", ["ix_fields_type"], 10),
+            ]
+        )
+        self.assertIn("ix_fields_name", plan["database"][0])
+        self.assertTrue(result["plan"]["datasets"]["skipped"])
+
+        # Every index leading with the column is a candidate
+        plan = search.advanced_search({}, query="project:p1", explain=True)["plan"]["fields"]
+        self.assertEqual(
+            plan["steps"][0]["indexes"], ["ix_fields_project_dataset_table", "ix_fields_project_full_id"]
+        )
+
+        # Without explain, lookups are only counted up to PROBE_ROWS to order them
+        with patch.object(query_language, "PROBE_ROWS", 3), self.db.get_session() as session:
+            steps = query_language.plan_query(
+                session, session.query(FieldModel), FieldModel, parse_query("type:STRING name:col_1")
+            )
+        self.assertEqual([(str(step.predicate), step.rows) for step in steps], [("name:col_1", 2), ("type:STRING", 3)])
+
+        with self.assertRaises(ValueError):
+            search.advanced_search({}, query="owner:me")
+
+    def test_similar_tables(self):
+        """Test that tables with similar columns are found from their signatures."""
+        generation_id = self.db.begin_generation("p2")
+        self.db.bulk_load(
+            generation_id,
+            datasets=[Dataset(id="events", full_id="p2.events", project_id="p2")],
+            tables=[
+                Table(id=name, full_id=f"p2.events.{name}", dataset_id="events", project_id="p2")
+                for name in ("clicks", "logs")
+            ],
+            fields=[
+                Field(
+                    name=name, full_id=f"p2.events.clicks.{name}", table_id="clicks",
+                    dataset_id="events", project_id="p2", field_type=field_type
+                )
+                for name, field_type in [(f"COL_{i}", "STRING") for i in range(4)] + [("ts", "TIMESTAMP")]
+            ] + [
+                Field(
+                    name="message", full_id="p2.events.logs.message", table_id="logs",
+                    dataset_id="events", project_id="p2", field_type="STRING"
+                )
+            ]
+        )
+        self.db.activate_generation(generation_id)
+        search = MetadataSearch()
+
+        # Tables whose fields were saved one by one are signed on the next lookup
+        with self.db.get_session() as session:
+            self.assertEqual(session.query(StaleSignatureModel).count(), 2)
+        result = search.similar_tables("sales", "orders")
+        with self.db.get_session() as session:
+            self.assertEqual(session.query(StaleSignatureModel).count(), 0)
+        self.assertEqual(result["table"]["column_count"], 5)
+        self.assertEqual(
+            [(t["full_id"], t["similarity"], t["shared_columns"]) for t in result["similar"]],
+            [("p1.sales.customers", 1.0, 5), ("p2.events.clicks", 0.6667, 4)]
+        )
+
+        result = search.similar_tables("sales", "orders", project_id="p1", min_similarity=1)
+        self.assertEqual([t["full_id"] for t in result["similar"]], ["p1.sales.customers"])
+        self.assertIsNone(search.similar_tables("sales", "missing"))
+
+        self.db.delete_table("sales", "customers", "p1")
+        result = search.similar_tables("sales", "orders")
+        self.assertEqual([t["full_id"] for t in result["similar"]], ["p2.events.clicks"])
+
+    def test_search_entity_timings(self):
+        """Test that statements past their deadline are cancelled and timings reported."""
+        with statement_deadline(time.monotonic() - 1):
+            with self.db.get_session() as session:
+                with self.assertRaises(OperationalError):
+                    session.execute(text(
+                        "WITH RECURSIVE c(x) AS (SELECT 1 UNION ALL SELECT x + 1 FROM c "
+                        "WHERE x < 100000000) SELECT count(*) FROM c"
+                    )).scalar()
+
+        # The deadline does not stick to the pooled connection
+        with self.db.get_session() as session:
+            self.assertEqual(session.query(FieldModel).count(), 10)
+
+        result = MetadataSearch().search("col", limit=4)
+        self.assertEqual(result["meta"]["timed_out"], [])
+        self.assertEqual(set(result["meta"]["timings_ms"]), {"datasets", "tables", "fields"})
+        self.assertEqual(result["meta"]["totals"]["fields"], {"value": 10, "relation": "eq"})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,88 @@
+"""
+Tests for the SQL instrumentation.
+"""
+import unittest
+from unittest.mock import patch
+import os
+import sys
+import tempfile
+
+# Add the project root to sys.path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from app.storage.db import Database
+from app.storage.instrumentation import (
+    OperationStats, end_request, instrument_engine, query_stats, start_request
+)
+from app.storage.models import Dataset, Table
+
+
+class TestInstrumentation(unittest.TestCase):
+    """Tests for the statement timing hooks."""
+
+    def setUp(self):
+        """Create an instrumented temporary database."""
+        self.tmpdir = tempfile.TemporaryDirectory()
+        url = f"sqlite:///{os.path.join(self.tmpdir.name, 'test.db')}"
+
+        self.url_patch = patch("app.storage.db.DATABASE_URL", url)
+        self.url_patch.start()
+        Database._instance = None
+        self.db = Database()
+        self.db.save_dataset(Dataset(id="sales", full_id="p1.sales", project_id="p1"))
+        self.db.save_table(Table(
+            id="orders", full_id="p1.sales.orders", dataset_id="sales", project_id="p1"
+        ))
+
+        instrument_engine(self.db.engine)
+        query_stats.reset()
+
+    def tearDown(self):
+        """Dispose of the database."""
+        self.db.engine.dispose()
+        Database._instance = None
+        self.url_patch.stop()
+        self.tmpdir.cleanup()
+        query_stats.reset()
+
+    def test_statements_attributed_to_caller(self):
+        """Test that statements are recorded under the calling method."""
+        self.db.get_table_with_fields("sales", "orders")
+
+        operations = query_stats.snapshot()["operations"]
+        self.assertIn("Database.get_table_with_fields", operations)
+        self.assertEqual(operations["Database.get_table_with_fields"]["count"], 2)
+
+    def test_request_query_count(self):
+        """Test that statements are counted per request and N+1 is flagged."""
+        token = start_request()
+        with patch("app.storage.instrumentation.N_PLUS_ONE_THRESHOLD", 2):
+            for _ in range(2):
+                self.db.get_table_with_fields("sales", "orders")
+
+            with self.assertLogs("app.storage.instrumentation", level="WARNING") as logs:
+                queries = end_request(token, "GET /table")
+
+        self.assertEqual(queries.count, 4)
+        self.assertIn("Possible N+1 queries: GET /table", logs.output[0])
+
+    def test_slow_query_logged(self):
+        """Test that statements above the threshold are logged."""
+        with patch("app.storage.instrumentation.SLOW_QUERY_MS", 0):
+            with self.assertLogs("app.storage.instrumentation", level="WARNING") as logs:
+                self.db.get_tables(project_id="p1")
+
+        self.assertIn("Slow query in Database.get_tables", logs.output[0])
+
+    def test_percentile(self):
+        """Test percentile estimates from the histogram."""
+        stats = OperationStats()
+        for elapsed_ms in [0.5] * 90 + [30] * 10:
+            stats.record(elapsed_ms, None)
+
+        self.assertEqual(stats.percentile(0.5), 1.0)
+        self.assertEqual(stats.percentile(0.99), 50.0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -2,14 +2,23 @@
 Tests for the search functionality.
 """
 import unittest
+from concurrent.futures import ThreadPoolExecutor
 from unittest.mock import patch, MagicMock
 import os
 import sys
+import time
 
 # Add the project root to sys.path
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 
+from app.search.cache import SearchCache
+from app.search.executor import EntityExecutor
+from app.search.fuzzy import SymSpellIndex, edit_distance
+from app.search.suggest import NameCompletions
+from app.search.postgres import PostgresFullTextSearch, prefix_tsquery
+from app.search.query_language import EXACT, PREFIX, SUBSTRING, Predicate, parse_query
 from app.search.search import MetadataSearch
+from app.search.trigram import PostgresTrigramSearch, like_pattern
 from app.storage.models import DatasetModel, TableModel, FieldModel
 
 
@@ -151,6 +160,220 @@ class TestMetadataSearch(unittest.TestCase):
         self.assertEqual(result["tables"][0]["dataset_id"], "dataset1")
         self.assertEqual(result["tables"][0]["project_id"], "project1")
 
+    @patch('app.search.search.Database')
+    def test_postgres_backend_selected(self, mock_db):
+        """Test that PostgreSQL databases use full-text search."""
+        mock_db.return_value.engine.dialect.name = "postgresql"
+        
+        empty = {"datasets": [], "tables": [], "fields": []}
+        
+        with patch.object(PostgresFullTextSearch, "available", return_value=True):
+            with patch.object(PostgresFullTextSearch, "search", return_value=empty) as mock_search:
+                search = MetadataSearch()
+                search.search("customer id", project_id="project1")
+        
+        self.assertIsInstance(search.backend, PostgresFullTextSearch)
+        mock_search.assert_called_once_with(
+            "customer id", project_id="project1", entity_type=None, limit=None, offset=0,
+            facets=False, filters={}
+        )
+    
+    @patch('app.search.search.Database')
+    def test_postgres_backend_missing_columns(self, mock_db):
+        """Test falling back to LIKE search before the migration ran."""
+        mock_db.return_value.engine.dialect.name = "postgresql"
+        
+        with patch.object(PostgresFullTextSearch, "available", return_value=False):
+            with patch.object(PostgresTrigramSearch, "available", return_value=False):
+                self.assertIsNone(MetadataSearch().backend)
+    
+    @patch('app.search.search.Database')
+    def test_trigram_backend(self, mock_db):
+        """Test that the trigram indexes serve advanced search and the search fallback."""
+        mock_db.return_value.engine.dialect.name = "postgresql"
+        
+        empty = {"datasets": [], "tables": [], "fields": []}
+        
+        with patch.object(PostgresFullTextSearch, "available", return_value=False), \
+                patch.object(PostgresTrigramSearch, "available", return_value=True), \
+                patch.object(PostgresTrigramSearch, "advanced_search", return_value=empty) as mock_advanced:
+            search = MetadataSearch()
+            search.advanced_search({"name": "_ts"}, project_id="project1")
+            
+            self.assertIsInstance(search.backend, PostgresTrigramSearch)
+        
+        mock_advanced.assert_called_once_with(
+            {"name": "_ts"}, project_id="project1", dataset_id=None, limit=None, offset=0
+        )
+    
+    def test_like_pattern(self):
+        """Test that LIKE wildcards in terms are matched literally."""
+        self.assertEqual(like_pattern("cust_id"), "%cust\\_id%")
+        self.assertEqual(like_pattern("50%"), "%50\\%%")
+        self.assertEqual(like_pattern("a\\b"), "%a\\\\b%")
+    
+    @patch('app.search.search.Database')
+    def test_search_cached_until_catalog_changes(self, mock_db):
+        """Test that repeated searches are served from the cache."""
+        mock_db.return_value.catalog_version.return_value = 1
+        mock_session = mock_db.return_value.get_session.return_value.__enter__.return_value
+        mock_session.query.return_value.filter.return_value.all.return_value = []
+        
+        search = MetadataSearch()
+        search.cache = SearchCache(max_size=10, ttl=60)
+        
+        search.search("User_ID", entity_type="field")
+        search.search("  user_id ", entity_type="FIELD")
+        self.assertEqual(mock_db.return_value.get_session.call_count, 1)
+        
+        mock_db.return_value.catalog_version.return_value = 2
+        search.search("user_id", entity_type="field")
+        self.assertEqual(mock_db.return_value.get_session.call_count, 2)
+        
+        stats = search.cache.stats()
+        self.assertEqual((stats["hits"], stats["misses"], stats["invalidations"]), (1, 2, 1))
+        self.assertEqual(stats["hit_rate"], 0.3333)
+    
+    def test_search_cache_eviction_and_expiry(self):
+        """Test LRU eviction and TTL expiry of cache entries."""
+        cache = SearchCache(max_size=2, ttl=60)
+        keys = [cache.key("search", 1, query=q) for q in ("a", "b", "c")]
+        
+        cache.get_or_compute(keys[0], 1, lambda: "a")
+        cache.get_or_compute(keys[1], 1, lambda: "b")
+        cache.get_or_compute(keys[0], 1, lambda: "stale")
+        cache.get_or_compute(keys[2], 1, lambda: "c")
+        
+        self.assertEqual(cache.get_or_compute(keys[0], 1, lambda: "new"), "a")
+        self.assertEqual(cache.get_or_compute(keys[1], 1, lambda: "new"), "new")
+        self.assertEqual(cache.stats()["evictions"], 2)
+        
+        cache.ttl = 0
+        cache.get_or_compute(keys[2], 1, lambda: "c")
+        self.assertEqual(cache.get_or_compute(keys[2], 1, lambda: "fresh"), "fresh")
+        self.assertEqual(cache.stats()["expirations"], 1)
+    
+    def test_search_cache_skips_timed_out_results(self):
+        """Test that results missing timed out entity types are not cached."""
+        cache = SearchCache(max_size=2, ttl=60)
+        key = cache.key("search", 1, query="a")
+        partial = {"fields": [], "meta": {"timed_out": ["fields"]}}
+        
+        self.assertEqual(cache.get_or_compute(key, 1, lambda: partial)["meta"]["timed_out"], ["fields"])
+        self.assertEqual(cache.stats()["size"], 0)
+        complete = {"fields": [{"id": "a"}], "meta": {"timed_out": []}}
+        cache.get_or_compute(key, 1, lambda: complete)
+        self.assertEqual(cache.get_or_compute(key, 1, lambda: partial)["fields"], [{"id": "a"}])
+    
+    def test_search_cache_copies_results(self):
+        """Test that callers get their own copies, marked when served from the cache."""
+        cache = SearchCache(max_size=2, ttl=60)
+        key = cache.key("search", 1, query="a")
+        compute = lambda: {"fields": [{"id": "a"}], "meta": {"timings_ms": {"fields": 1.0}}}
+        
+        first = cache.get_or_compute(key, 1, compute)
+        self.assertFalse(first["meta"]["cached"])
+        first["fields"].append({"id": "b"})
+        
+        second = cache.get_or_compute(key, 1, compute)
+        self.assertTrue(second["meta"]["cached"])
+        self.assertEqual(second["fields"], [{"id": "a"}])
+    
+    def test_search_cache_single_flight(self):
+        """Test that concurrent lookups of a missing key compute it once."""
+        cache = SearchCache(max_size=2, ttl=60)
+        key = cache.key("search", 1, query="a")
+        calls = []
+        
+        def compute():
+            calls.append(1)
+            time.sleep(0.2)
+            return {"fields": [{"id": "a"}]}
+        
+        with ThreadPoolExecutor(max_workers=4) as pool:
+            results = list(pool.map(lambda _: cache.get_or_compute(key, 1, compute), range(4)))
+        
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, [{"fields": [{"id": "a"}]}] * 4)
+        stats = cache.stats()
+        self.assertEqual((stats["misses"], stats["hits"], stats["waits"]), (1, 3, 3))
+    
+    def test_entity_executor_timeout(self):
+        """Test that a slow entity type does not delay the others."""
+        def search_entity(name):
+            if name == "field":
+                time.sleep(0.5)
+            result = {"datasets": [], "tables": [], "fields": []}
+            result[name + "s"] = [{"id": name}]
+            return result
+        
+        result = EntityExecutor(workers=3, timeout_ms=100).run(search_entity, None, 10, 0)
+        
+        self.assertEqual(result["datasets"], [{"id": "dataset"}])
+        self.assertEqual(result["tables"], [{"id": "table"}])
+        self.assertEqual(result["fields"], [])
+        self.assertEqual(result["meta"]["timed_out"], ["fields"])
+        self.assertEqual(result["meta"]["totals"]["fields"], {"value": 0, "relation": "gte"})
+        self.assertLess(result["meta"]["timings_ms"]["tables"], 100)
+    
+    def test_edit_distance(self):
+        """Test the bounded edit distance with transpositions."""
+        self.assertEqual(edit_distance("custmer_id", "customer_id", 2), 1)
+        self.assertEqual(edit_distance("prodcut", "product", 2), 1)
+        self.assertEqual(edit_distance("kitten", "sitting", 3), 3)
+        self.assertEqual(edit_distance("kitten", "sitting", 2), 3)
+        self.assertEqual(edit_distance("id", "identifier", 2), 3)
+    
+    def test_symspell_lookup(self):
+        """Test that lookups rank terms by distance, then by count."""
+        index = SymSpellIndex({"amount": 10, "account": 50, "amounts": 2, "id": 5})
+        
+        self.assertEqual(
+            index.lookup("ammount"),
+            [("amount", 1, 10), ("account", 2, 50), ("amounts", 2, 2)]
+        )
+        self.assertEqual(index.lookup("ie"), [])
+    
+    def test_name_completions(self):
+        """Test that completions are the most common names with the prefix."""
+        completions = NameCompletions(
+            {"user_id": 5, "User_ID": 7, "user_name": 3, "users": 1, "order_id": 9}
+        )
+        
+        self.assertEqual(
+            completions.complete("us"),
+            [{"text": "User_ID", "count": 12}, {"text": "user_name", "count": 3},
+             {"text": "users", "count": 1}]
+        )
+        self.assertEqual(completions.complete("user_", limit=1), [{"text": "User_ID", "count": 12}])
+        self.assertEqual(completions.complete("zz"), [])
+    
+    def test_prefix_tsquery(self):
+        """Test building a prefix tsquery from a query."""
+        self.assertEqual(prefix_tsquery("Cust_ID"), "cust:* & id:*")
+        self.assertEqual(prefix_tsquery("order & !total"), "order:* & total:*")
+        self.assertIsNone(prefix_tsquery("._-"))
+    
+    def test_parse_query(self):
+        """Test parsing a structured query into terms."""
+        predicates = parse_query('name:cust* type:string "exact phrase" -deprecated table:*ord*')
+        
+        self.assertEqual(predicates, [
+            Predicate("name", "cust", PREFIX),
+            Predicate("type", "STRING", EXACT),
+            Predicate("text", "exact phrase", SUBSTRING),
+            Predicate("text", "deprecated", SUBSTRING, negated=True),
+            Predicate("table", "ord", SUBSTRING),
+        ])
+        self.assertEqual(
+            [str(p) for p in predicates],
+            ["name:cust*", "type:STRING", '"exact phrase"', "-deprecated", "table:*ord*"]
+        )
+        with self.assertRaises(ValueError):
+            parse_query("owner:me")
+        with self.assertRaises(ValueError):
+            parse_query("name:*")
+
 
 if __name__ == "__main__":
     unittest.main()